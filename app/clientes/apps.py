@@ -7,3 +7,6 @@ class ClientesConfig(AppConfig):
     """
     Configuración de la aplicación clientes.
     """
+
+    def ready(self):
+        from . import signals  # noqa: F401
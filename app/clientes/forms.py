@@ -8,7 +8,8 @@ descuentos por segmento.
 """
 
 from django import forms
-from .models import Cliente, TasaComision
+from monedas.models import Moneda
+from .models import Cliente, PoliticaLimite, TasaComision
 
 
 class ClienteForm(forms.ModelForm):
@@ -132,3 +133,45 @@ class TasaComisionForm(forms.ModelForm):
         """
         v = self.cleaned_data["porcentaje"]
         return v
+
+
+class PoliticaLimiteForm(forms.ModelForm):
+    """
+    Formulario para las políticas de límites (por segmento o por cliente).
+
+    Los montos vacíos heredan el valor del segmento o de los defaults del
+    sistema. La moneda vacía indica montos en PYG.
+    """
+
+    class Meta:
+        """
+        Configuración del formulario PoliticaLimiteForm.
+
+        Attributes:
+            model (Model): Modelo PoliticaLimite.
+            fields (list): Ámbito, moneda y máximos.
+            widgets (dict): Widgets con estilos Bootstrap.
+            labels (dict): Etiquetas legibles.
+        """
+        model = PoliticaLimite
+        fields = ["tipo_cliente", "cliente", "moneda", "max_por_operacion", "max_diario", "max_mensual"]
+        widgets = {
+            "tipo_cliente": forms.Select(attrs={"class": "form-select"}),
+            "cliente": forms.Select(attrs={"class": "form-select"}),
+            "moneda": forms.Select(attrs={"class": "form-select"}),
+            "max_por_operacion": forms.NumberInput(attrs={"class": "form-control", "step": "0.01", "min": "0"}),
+            "max_diario": forms.NumberInput(attrs={"class": "form-control", "step": "0.01", "min": "0"}),
+            "max_mensual": forms.NumberInput(attrs={"class": "form-control", "step": "0.01", "min": "0"}),
+        }
+        labels = {
+            "tipo_cliente": "Segmento",
+            "cliente": "Cliente",
+            "moneda": "Moneda (vacío = PYG)",
+            "max_por_operacion": "Máximo por operación",
+            "max_diario": "Máximo diario",
+            "max_mensual": "Máximo mensual",
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["moneda"].queryset = Moneda.objects.filter(es_base=False)
@@ -0,0 +1,149 @@
+"""
+Límites efectivos por cliente, compilados y cacheados.
+
+Los límites de un cliente salen de tres niveles, cada uno reemplazando al
+anterior campo por campo (un campo vacío hereda):
+
+1. defaults del sistema por segmento (``commons.limits.CLIENT_LIMITS``, en PYG),
+2. PoliticaLimite del segmento del cliente,
+3. PoliticaLimite del propio cliente.
+
+El resultado se guarda en el cache compartido bajo la versión
+``commons.versiones.LIMITES`` y el segmento del cliente: validar límites no
+consulta la base mientras no cambie ninguna política.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from typing import NamedTuple, Optional
+
+from django.core.cache import cache
+from django.db.models import Q
+
+from commons.limits import CLIENT_LIMITS
+from commons.versiones import LIMITES, obtener_version
+from .models import PoliticaLimite
+
+#: Segmento del cliente -> clave de CLIENT_LIMITS.
+_SEGMENTO_DEFAULT = {"MIN": "minorista", "CORP": "corporativo", "VIP": "vip"}
+
+_CAMPOS = ("max_por_operacion", "max_diario", "max_mensual")
+
+
+class Limites(NamedTuple):
+    """Máximos por operación, diario y mensual; ``None`` = sin límite."""
+    max_por_operacion: Optional[Decimal] = None
+    max_diario: Optional[Decimal] = None
+    max_mensual: Optional[Decimal] = None
+
+    def combinar(self, politica):
+        """Reemplaza los campos que ``politica`` define."""
+        return self._replace(**{
+            campo: getattr(politica, campo)
+            for campo in _CAMPOS
+            if getattr(politica, campo) is not None
+        })
+
+
+SIN_LIMITES = Limites()
+
+
+class LimitesCliente(NamedTuple):
+    """
+    Límites efectivos de un cliente.
+
+    Attributes:
+        pyg (Limites): Montos en PYG, por moneda operada.
+        por_moneda (dict): ``{moneda_id: Limites}`` en unidades de cada moneda.
+    """
+    pyg: Limites
+    por_moneda: dict
+
+    def moneda(self, moneda_id):
+        """Límites en unidades de ``moneda_id`` (sin límite si no hay política)."""
+        return self.por_moneda.get(moneda_id, SIN_LIMITES)
+
+
+def segmento(cliente):
+    """Segmento del cliente (``MIN`` si no tiene)."""
+    return (getattr(cliente, "tipo", None) or "MIN").upper()
+
+
+def _compilar(tipo, politicas):
+    """Aplica sobre los defaults de ``tipo`` las políticas de segmento y de cliente."""
+    default = CLIENT_LIMITS[_SEGMENTO_DEFAULT.get(tipo, "minorista")]
+    pyg = Limites(
+        max_diario=Decimal(str(default["diario"])),
+        max_mensual=Decimal(str(default["mensual"])),
+    )
+    por_moneda = {}
+    # Primero las de segmento, después las del cliente (que las reemplazan)
+    for politica in sorted(politicas, key=lambda p: p.cliente_id is not None):
+        if politica.moneda_id is None:
+            pyg = pyg.combinar(politica)
+        else:
+            base = por_moneda.get(politica.moneda_id, SIN_LIMITES)
+            por_moneda[politica.moneda_id] = base.combinar(politica)
+    return LimitesCliente(pyg=pyg, por_moneda=por_moneda)
+
+
+def compilar_limites(clientes):
+    """
+    Construye los límites efectivos de varios clientes con una sola consulta.
+
+    :return: ``{cliente_id: LimitesCliente}``
+    :rtype: dict
+    """
+    tipos = {c.pk: segmento(c) for c in clientes}
+    politicas = PoliticaLimite.objects.filter(
+        Q(tipo_cliente__in=set(tipos.values())) | Q(cliente_id__in=list(tipos))
+    )
+    por_segmento, por_cliente = defaultdict(list), defaultdict(list)
+    for politica in politicas:
+        if politica.cliente_id is None:
+            por_segmento[politica.tipo_cliente].append(politica)
+        else:
+            por_cliente[politica.cliente_id].append(politica)
+    return {
+        pk: _compilar(tipo, por_segmento[tipo] + por_cliente[pk])
+        for pk, tipo in tipos.items()
+    }
+
+
+def limites_para_clientes(clientes):
+    """
+    Límites efectivos de varios clientes.
+
+    Se leen del cache compartido en una sola operación; los que falten se
+    compilan juntos (una consulta) y se guardan. La clave incluye la versión
+    de límites y el segmento del cliente, por lo que editar una política o
+    cambiar el segmento invalida lo cacheado.
+
+    :return: ``{cliente_id: LimitesCliente}``
+    :rtype: dict
+    """
+    version = obtener_version(LIMITES)
+    claves = {c.pk: f"limites:{version}:{c.pk}:{segmento(c)}" for c in clientes}
+    cacheados = cache.get_many(list(claves.values()))
+
+    resultado, faltantes = {}, []
+    for cliente in clientes:
+        limites = cacheados.get(claves[cliente.pk])
+        if limites is None:
+            faltantes.append(cliente)
+        else:
+            resultado[cliente.pk] = limites
+    if faltantes:
+        compilados = compilar_limites(faltantes)
+        cache.set_many({claves[pk]: limites for pk, limites in compilados.items()}, timeout=None)
+        resultado.update(compilados)
+    return resultado
+
+
+def limites_para(cliente):
+    """
+    Límites efectivos de ``cliente`` (ver ``limites_para_clientes``).
+
+    :return: Límites en PYG y por moneda extranjera
+    :rtype: LimitesCliente
+    """
+    return limites_para_clientes([cliente])[cliente.pk]
@@ -0,0 +1,86 @@
+# Generated by Django 5.2.5 on 2026-10-16 22:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copiar_limites(apps, schema_editor):
+    """
+    Pasa LimitePYG y LimiteMoneda a políticas de cliente.
+
+    ``LimitePYG.max_mensual`` no se copia: nunca se validó (el tope mensual
+    en PYG era el del segmento) y copiarlo lo volvería un límite nuevo. La
+    política del cliente lo hereda del segmento, como hasta ahora.
+    """
+    LimitePYG = apps.get_model('clientes', 'LimitePYG')
+    LimiteMoneda = apps.get_model('clientes', 'LimiteMoneda')
+    PoliticaLimite = apps.get_model('clientes', 'PoliticaLimite')
+
+    politicas = [
+        PoliticaLimite(cliente_id=lim.cliente_id, max_por_operacion=lim.max_por_operacion)
+        for lim in LimitePYG.objects.all()
+    ]
+    politicas += [
+        PoliticaLimite(cliente_id=lim.cliente_id, moneda_id=lim.moneda_id,
+                       max_por_operacion=lim.max_por_operacion, max_mensual=lim.max_mensual)
+        for lim in LimiteMoneda.objects.all()
+    ]
+    PoliticaLimite.objects.bulk_create(politicas, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0007_limitepyg_limitemoneda'),
+        ('monedas', '0006_tasacambio_tasa_previa'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PoliticaLimite',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo_cliente', models.CharField(blank=True, choices=[('MIN', 'Minorista'), ('CORP', 'Corporativo'), ('VIP', 'VIP')], help_text='Segmento al que aplica. Vacío si aplica a un cliente.', max_length=10, null=True)),
+                ('max_por_operacion', models.DecimalField(blank=True, decimal_places=2, max_digits=18, null=True)),
+                ('max_diario', models.DecimalField(blank=True, decimal_places=2, max_digits=18, null=True)),
+                ('max_mensual', models.DecimalField(blank=True, decimal_places=2, max_digits=18, null=True)),
+                ('cliente', models.ForeignKey(blank=True, help_text='Cliente al que aplica. Vacío si aplica a un segmento.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='politicas_limite', to='clientes.cliente')),
+                ('moneda', models.ForeignKey(blank=True, help_text='Moneda de los montos. Vacío = PYG.', null=True, on_delete=django.db.models.deletion.CASCADE, to='monedas.moneda')),
+            ],
+            options={
+                'verbose_name': 'Política de límites',
+                'verbose_name_plural': 'Políticas de límites',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='politicalimite',
+            constraint=models.CheckConstraint(condition=models.Q(models.Q(('cliente__isnull', True), ('tipo_cliente__isnull', False)), models.Q(('cliente__isnull', False), ('tipo_cliente__isnull', True)), _connector='OR'), name='politica_limite_segmento_o_cliente'),
+        ),
+        migrations.AddConstraint(
+            model_name='politicalimite',
+            constraint=models.UniqueConstraint(condition=models.Q(('moneda__isnull', False)), fields=('tipo_cliente', 'moneda'), name='politica_limite_segmento_moneda'),
+        ),
+        migrations.AddConstraint(
+            model_name='politicalimite',
+            constraint=models.UniqueConstraint(condition=models.Q(('moneda__isnull', True), ('tipo_cliente__isnull', False)), fields=('tipo_cliente',), name='politica_limite_segmento_pyg'),
+        ),
+        migrations.AddConstraint(
+            model_name='politicalimite',
+            constraint=models.UniqueConstraint(condition=models.Q(('moneda__isnull', False)), fields=('cliente', 'moneda'), name='politica_limite_cliente_moneda'),
+        ),
+        migrations.AddConstraint(
+            model_name='politicalimite',
+            constraint=models.UniqueConstraint(condition=models.Q(('cliente__isnull', False), ('moneda__isnull', True)), fields=('cliente',), name='politica_limite_cliente_pyg'),
+        ),
+        migrations.RunPython(copiar_limites, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='limitepyg',
+            name='cliente',
+        ),
+        migrations.DeleteModel(
+            name='LimiteMoneda',
+        ),
+        migrations.DeleteModel(
+            name='LimitePYG',
+        ),
+    ]
@@ -257,33 +257,96 @@ class TasaComision(models.Model):
         """
         return cls.vigente_para_tipo(cliente.tipo, fecha=fecha)
 
-class LimitePYG(models.Model):
+class PoliticaLimite(models.Model):
     """
-    Máximo permitido por operación en PYG para un cliente.
-    (Manténlo simple al inicio: límite por operación. Si luego querés
-     diario/mensual, agregamos campos opcionales.)
-    """
-    cliente = models.OneToOneField("clientes.Cliente", on_delete=models.CASCADE)
-    max_por_operacion = models.DecimalField(max_digits=18, decimal_places=2)
-    max_mensual = models.DecimalField(max_digits=18, decimal_places=2, null=True, blank=True)
+    Límites de operación configurables por segmento o por cliente.
 
-    def __str__(self):
-        return f"Limite PYG {self.cliente}: {self.max_por_operacion}"
+    Cada registro aplica a un segmento (``tipo_cliente``) o a un cliente
+    puntual, y a una moneda extranjera (montos en esa moneda) o, con
+    ``moneda`` vacía, a los montos en PYG. Los campos vacíos heredan el valor
+    del nivel anterior: defaults del sistema (``commons.limits``), luego el
+    segmento, luego el cliente.
 
+    El conjunto efectivo de cada cliente se compila y cachea en
+    ``clientes.limites``.
 
-class LimiteMoneda(models.Model):
-    """
-    Límites por MONEDA EXTRANJERA para el cliente.
-    Por ahora: por operación mensual
+    Attributes:
+        tipo_cliente (CharField): Segmento al que aplica (excluyente con ``cliente``).
+        cliente (ForeignKey): Cliente al que aplica (excluyente con ``tipo_cliente``).
+        moneda (ForeignKey): Moneda de los montos; vacía = PYG.
+        max_por_operacion (DecimalField): Máximo por operación.
+        max_diario (DecimalField): Máximo acumulado en el día.
+        max_mensual (DecimalField): Máximo acumulado en el mes.
     """
-    cliente = models.ForeignKey("clientes.Cliente", on_delete=models.CASCADE)
-    moneda = models.ForeignKey("monedas.Moneda", on_delete=models.CASCADE)
-    max_por_operacion = models.DecimalField(max_digits=18, decimal_places=2)  # p.ej. 5,000 USD
-
+    tipo_cliente = models.CharField(
+        max_length=10, choices=Cliente.SEGMENTOS, null=True, blank=True,
+        help_text="Segmento al que aplica. Vacío si aplica a un cliente.",
+    )
+    cliente = models.ForeignKey(
+        Cliente, on_delete=models.CASCADE, null=True, blank=True,
+        related_name="politicas_limite",
+        help_text="Cliente al que aplica. Vacío si aplica a un segmento.",
+    )
+    moneda = models.ForeignKey(
+        "monedas.Moneda", on_delete=models.CASCADE, null=True, blank=True,
+        help_text="Moneda de los montos. Vacío = PYG.",
+    )
+    max_por_operacion = models.DecimalField(max_digits=18, decimal_places=2, null=True, blank=True)
+    max_diario = models.DecimalField(max_digits=18, decimal_places=2, null=True, blank=True)
     max_mensual = models.DecimalField(max_digits=18, decimal_places=2, null=True, blank=True)
 
     class Meta:
-        unique_together = ("cliente", "moneda")
+        """
+        Configuración de metadatos del modelo PoliticaLimite.
+
+        Attributes:
+            constraints (list): Segmento o cliente (uno solo) y una política
+                por ámbito y moneda.
+        """
+        verbose_name = "Política de límites"
+        verbose_name_plural = "Políticas de límites"
+        constraints = [
+            models.CheckConstraint(
+                condition=(
+                    models.Q(tipo_cliente__isnull=False, cliente__isnull=True)
+                    | models.Q(tipo_cliente__isnull=True, cliente__isnull=False)
+                ),
+                name="politica_limite_segmento_o_cliente",
+            ),
+            models.UniqueConstraint(
+                fields=["tipo_cliente", "moneda"], condition=models.Q(moneda__isnull=False),
+                name="politica_limite_segmento_moneda",
+            ),
+            models.UniqueConstraint(
+                fields=["tipo_cliente"], condition=models.Q(moneda__isnull=True, tipo_cliente__isnull=False),
+                name="politica_limite_segmento_pyg",
+            ),
+            models.UniqueConstraint(
+                fields=["cliente", "moneda"], condition=models.Q(moneda__isnull=False),
+                name="politica_limite_cliente_moneda",
+            ),
+            models.UniqueConstraint(
+                fields=["cliente"], condition=models.Q(moneda__isnull=True, cliente__isnull=False),
+                name="politica_limite_cliente_pyg",
+            ),
+        ]
 
     def __str__(self):
-        return f"Limite {self.cliente} - {self.moneda}"
\ No newline at end of file
+        """
+        Retorna la representación en cadena de la política.
+
+        Returns:
+            str: Ámbito (segmento o cliente) y moneda de los montos.
+        """
+        ambito = self.cliente if self.cliente_id else self.get_tipo_cliente_display()
+        return f"Límites {ambito} ({self.moneda.codigo if self.moneda_id else 'PYG'})"
+
+    def clean(self):
+        """
+        Valida que la política aplique a un segmento o a un cliente, no a ambos.
+
+        Raises:
+            ValidationError: Si no se indica ámbito o se indican los dos.
+        """
+        if bool(self.tipo_cliente) == bool(self.cliente_id):
+            raise ValidationError("Indicá un segmento o un cliente (uno solo).")
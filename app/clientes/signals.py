@@ -0,0 +1,24 @@
+"""
+Señales de la app 'clientes'.
+
+Los cambios en TasaComision (descuento por segmento) invalidan el snapshot de
+precios mediante la versión ``commons.versiones.COMISIONES``. Los cambios en
+PoliticaLimite invalidan los límites compilados (``commons.versiones.LIMITES``).
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from commons.versiones import COMISIONES, LIMITES, notificar_cambio
+from .models import PoliticaLimite, TasaComision
+
+
+@receiver(post_save, sender=TasaComision, dispatch_uid="tasacomision_version_save")
+@receiver(post_delete, sender=TasaComision, dispatch_uid="tasacomision_version_delete")
+def tasa_comision_modificada(sender, **kwargs):
+    notificar_cambio(COMISIONES)
+
+
+@receiver(post_save, sender=PoliticaLimite, dispatch_uid="politicalimite_version_save")
+@receiver(post_delete, sender=PoliticaLimite, dispatch_uid="politicalimite_version_delete")
+def politica_limite_modificada(sender, **kwargs):
+    notificar_cambio(LIMITES)
@@ -4,8 +4,13 @@
 from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
 from django.urls import reverse
-from .models import Cliente
+from decimal import Decimal
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from monedas.models import Moneda
+from .models import Cliente, PoliticaLimite
 from .forms import ClienteForm, AsignarUsuariosAClienteForm
+from .limites import limites_para
 
 User = get_user_model()
 
@@ -150,3 +155,70 @@ class ClienteViewsTest(TestCase):
 		self.cliente.refresh_from_db()
 		from commons.enums import EstadoRegistroEnum
 		self.assertEqual(self.cliente.estado, EstadoRegistroEnum.ELIMINADO.value)
+
+	def test_limite_create_y_list_view(self):
+		"""
+		Verifica que se pueda crear una política de límites y que aparezca en la lista.
+		"""
+		data = {"cliente": self.cliente.id, "max_por_operacion": "1500"}
+		response = self.client.post(reverse("clientes:limite_create"), data)
+		self.assertEqual(response.status_code, 302)
+		self.assertTrue(PoliticaLimite.objects.filter(cliente=self.cliente, moneda=None).exists())
+		response = self.client.get(reverse("clientes:limites_list"))
+		self.assertContains(response, "Empresa W")
+
+
+class PoliticaLimiteTest(TestCase):
+	"""
+	Pruebas de la resolución y el cache de límites efectivos.
+	"""
+	def setUp(self):
+		cache.clear()
+		self.cliente = Cliente.objects.create(nombre="Cliente Limites", tipo="CORP")
+		self.usd = Moneda.objects.create(codigo="USD", nombre="Dólar")
+
+	def test_defaults_del_sistema(self):
+		limites = limites_para(self.cliente)
+		self.assertEqual(limites.pyg.max_diario, Decimal("5000000"))
+		self.assertIsNone(limites.pyg.max_por_operacion)
+		self.assertIsNone(limites.moneda(self.usd.id).max_mensual)
+
+	def test_cliente_reemplaza_segmento_campo_por_campo(self):
+		PoliticaLimite.objects.create(tipo_cliente="CORP", max_diario=Decimal("100"), max_mensual=Decimal("1000"))
+		PoliticaLimite.objects.create(cliente=self.cliente, max_diario=Decimal("200"))
+		PoliticaLimite.objects.create(tipo_cliente="CORP", moneda=self.usd, max_por_operacion=Decimal("50"))
+		limites = limites_para(self.cliente)
+		self.assertEqual(limites.pyg.max_diario, Decimal("200"))
+		self.assertEqual(limites.pyg.max_mensual, Decimal("1000"))
+		self.assertEqual(limites.moneda(self.usd.id).max_por_operacion, Decimal("50"))
+
+	def test_cacheado_e_invalidado_por_version(self):
+		limites_para(self.cliente)
+		with self.assertNumQueries(0):
+			limites_para(self.cliente)
+		PoliticaLimite.objects.create(cliente=self.cliente, max_por_operacion=Decimal("10"))
+		self.assertEqual(limites_para(self.cliente).pyg.max_por_operacion, Decimal("10"))
+
+	def test_segmento_o_cliente(self):
+		politica = PoliticaLimite(tipo_cliente="CORP", cliente=self.cliente, max_diario=Decimal("1"))
+		with self.assertRaises(ValidationError):
+			politica.full_clean()
+
+
+class BuscarClientesApiTest(TestCase):
+	"""
+	Pruebas de la búsqueda de clientes para autocompletado.
+	"""
+	def setUp(self):
+		user = get_user_model().objects.create_user(email="buscar@example.com", password="x")
+		self.client.force_login(user)
+		self.url = reverse("clientes:buscar_api")
+		self.acme = Cliente.objects.create(nombre="Acme SA", tipo="CORP")
+		Cliente.objects.create(nombre="Beta", tipo="MIN")
+
+	def test_por_nombre_o_id(self):
+		data = self.client.get(self.url, {"q": "acm"}).json()
+		self.assertEqual([c["id"] for c in data["clientes"]], [self.acme.id])
+		data = self.client.get(self.url, {"q": str(self.acme.id)}).json()
+		self.assertIn(self.acme.id, [c["id"] for c in data["clientes"]])
+		self.assertEqual(self.client.get(self.url).json(), {"clientes": []})
@@ -8,6 +8,7 @@ app_name = 'clientes'
 urlpatterns = [
      # Listado de clientes
     path("", views.clientes_list, name="clientes_list"),
+    path("buscar/", views.buscar_clientes_api, name="buscar_api"),
 
     # CRUD
     path("nuevo/", views.cliente_create, name="cliente_create"),
@@ -27,4 +28,10 @@ urlpatterns = [
     path("comisiones/<int:pk>/editar/", views.comision_edit, name="comision_edit"),
     path("comisiones/<int:pk>/eliminar/", views.comision_delete, name="comision_delete"),
     path("comisiones/<int:pk>/restaurar/", views.comision_restore, name="comision_restore"),
+
+    # Políticas de límites
+    path("limites/", views.limites_list, name="limites_list"),
+    path("limites/nuevo/", views.limite_create, name="limite_create"),
+    path("limites/<int:pk>/editar/", views.limite_edit, name="limite_edit"),
+    path("limites/<int:pk>/eliminar/", views.limite_delete, name="limite_delete"),
 ]
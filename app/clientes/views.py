@@ -1,9 +1,12 @@
+from django.conf import settings
+from django.db.models import Q
+from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from .models import Cliente, TasaComision
+from .models import Cliente, PoliticaLimite, TasaComision
 from commons.enums import EstadoRegistroEnum
-from .forms import AsignarUsuariosAClienteForm, ClienteForm, TasaComisionForm
+from .forms import AsignarUsuariosAClienteForm, ClienteForm, PoliticaLimiteForm, TasaComisionForm
 from usuarios.decorators import role_required
 
 
@@ -36,6 +39,32 @@ def clientes_list(request):
     return render(request, "clientes/clientes_list.html", {"clientes": clientes, "show_deleted": show_deleted})
 
 
+@login_required
+def buscar_clientes_api(request):
+    """
+    Búsqueda de clientes para filtros con autocompletado.
+
+    ``GET ?q=texto`` busca por nombre (contiene) o por id exacto, incluidos
+    los clientes eliminados lógicamente (siguen teniendo historial).
+
+    Returns:
+        JsonResponse: ``{"clientes": [{"id", "nombre", "tipo"}]}``, a lo sumo
+        ``CLIENTES_BUSQUEDA_MAX`` ordenados por nombre.
+    """
+    q = request.GET.get("q", "").strip()
+    if not q:
+        return JsonResponse({"clientes": []})
+    filtro = Q(nombre__icontains=q)
+    if q.isdigit():
+        filtro |= Q(pk=int(q))
+    clientes = (
+        Cliente.objects.filter(filtro)
+        .order_by("nombre", "pk")
+        .values("id", "nombre", "tipo")[:settings.CLIENTES_BUSQUEDA_MAX]
+    )
+    return JsonResponse({"clientes": list(clientes)})
+
+
 @login_required
 def cliente_create(request):
     """
@@ -301,3 +330,87 @@ def comision_restore(request, pk):
         messages.success(request, "Tasa de descuento restaurada.")
         return redirect("clientes:comisiones_list")
     return render(request, "clientes/comision_restore_confirm.html", {"obj": obj})
+
+
+@login_required
+def limites_list(request):
+    """
+    Muestra las políticas de límites, primero las de segmento y luego las de cliente.
+
+    Args:
+        request (HttpRequest): Objeto de solicitud HTTP.
+
+    Returns:
+        HttpResponse: Renderiza la plantilla 'clientes/limites_list.html'.
+    """
+    qs = PoliticaLimite.objects.select_related("cliente", "moneda").order_by(
+        "cliente__nombre", "tipo_cliente", "moneda__codigo"
+    )
+    return render(request, "clientes/limites_list.html", {"items": qs})
+
+
+@login_required
+def limite_create(request):
+    """
+    Crea una política de límites mediante PoliticaLimiteForm.
+
+    Args:
+        request (HttpRequest): Objeto de solicitud HTTP.
+
+    Returns:
+        HttpResponse: Renderiza el formulario o redirige a la lista de límites.
+    """
+    if request.method == "POST":
+        form = PoliticaLimiteForm(request.POST)
+        if form.is_valid():
+            form.save()
+            messages.success(request, "Política de límites creada.")
+            return redirect("clientes:limites_list")
+    else:
+        form = PoliticaLimiteForm()
+    return render(request, "clientes/limite_form.html", {"form": form})
+
+
+@login_required
+def limite_edit(request, pk):
+    """
+    Edita una política de límites existente.
+
+    Args:
+        request (HttpRequest): Objeto de solicitud HTTP.
+        pk (int): ID de la política.
+
+    Returns:
+        HttpResponse: Renderiza el formulario o redirige a la lista de límites.
+    """
+    obj = get_object_or_404(PoliticaLimite, pk=pk)
+    if request.method == "POST":
+        form = PoliticaLimiteForm(request.POST, instance=obj)
+        if form.is_valid():
+            form.save()
+            messages.success(request, "Política de límites actualizada.")
+            return redirect("clientes:limites_list")
+    else:
+        form = PoliticaLimiteForm(instance=obj)
+    return render(request, "clientes/limite_form.html", {"form": form, "obj": obj})
+
+
+@login_required
+def limite_delete(request, pk):
+    """
+    Elimina una política de límites; el ámbito vuelve a heredar los valores
+    del segmento o de los defaults del sistema.
+
+    Args:
+        request (HttpRequest): Objeto de solicitud HTTP.
+        pk (int): ID de la política.
+
+    Returns:
+        HttpResponse: Renderiza la confirmación o redirige a la lista de límites.
+    """
+    obj = get_object_or_404(PoliticaLimite, pk=pk)
+    if request.method == "POST":
+        obj.delete()
+        messages.success(request, "Política de límites eliminada.")
+        return redirect("clientes:limites_list")
+    return render(request, "clientes/limite_delete_confirm.html", {"obj": obj})
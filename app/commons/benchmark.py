@@ -0,0 +1,54 @@
+"""
+Utilidades compartidas por los comandos ``benchmark_*``.
+"""
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+class ContadorConsultas:
+    """``execute_wrapper`` que cuenta las consultas SQL ejecutadas."""
+
+    def __init__(self):
+        self.total = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.total += 1
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def contar_consultas():
+    """Context manager que devuelve un ContadorConsultas activo en el bloque."""
+    contador = ContadorConsultas()
+    with connection.execute_wrapper(contador):
+        yield contador
+
+
+def medir(fn, repeticiones):
+    """
+    Ejecuta ``fn`` ``repeticiones`` veces (tras una de calentamiento).
+
+    Returns:
+        tuple: (duración total en segundos, consultas ejecutadas).
+    """
+    fn()
+    with contar_consultas() as contador:
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            fn()
+        duracion = time.perf_counter() - inicio
+    return duracion, contador.total
+
+
+def percentiles(muestras, *cuantiles):
+    """
+    Percentiles (por rango más cercano) de ``muestras``.
+
+    Example:
+        ``percentiles(latencias, 50, 99)`` -> ``(p50, p99)``
+    """
+    ordenadas = sorted(muestras)
+    n = len(ordenadas)
+    return tuple(ordenadas[min(n - 1, max(0, -(-q * n // 100) - 1))] for q in cuantiles)
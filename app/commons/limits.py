@@ -1,4 +1,6 @@
-# Límites de transacción por tipo de cliente
+# Límites de transacción por tipo de cliente (PYG).
+# Son los defaults del sistema: una PoliticaLimite de segmento o de cliente
+# los reemplaza campo por campo (ver clientes.limites).
 CLIENT_LIMITS = {
     'minorista': {
         'diario': 2000000,    # monto máximo diario
@@ -0,0 +1,75 @@
+"""
+Histogramas de latencia en memoria, por proceso.
+
+Cada ``Histograma`` cuenta observaciones en cubetas fijas (en milisegundos),
+como los de Prometheus: registrar es O(1) y con memoria constante, y los
+percentiles se estiman con el límite superior de la cubeta que los contiene.
+Son seguros entre hilos.
+"""
+import threading
+from bisect import bisect_left
+
+#: Límites superiores de las cubetas, en milisegundos (la última es infinita).
+CUBETAS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class Histograma:
+    def __init__(self, cubetas=CUBETAS_MS):
+        self.cubetas = tuple(cubetas)
+        self._conteos = [0] * (len(self.cubetas) + 1)
+        self._total_ms = 0.0
+        self._lock = threading.Lock()
+
+    def registrar(self, ms):
+        with self._lock:
+            self._conteos[bisect_left(self.cubetas, ms)] += 1
+            self._total_ms += ms
+
+    def _percentil(self, conteos, q):
+        n = sum(conteos)
+        objetivo = -(-q * n // 100)
+        acumulado = 0
+        for i, conteo in enumerate(conteos):
+            acumulado += conteo
+            if acumulado >= objetivo:
+                return self.cubetas[i] if i < len(self.cubetas) else float("inf")
+
+    def resumen(self):
+        """
+        :return: ``{"n", "promedio_ms", "p50_ms", "p99_ms", "cubetas"}``; en
+            ``cubetas`` las claves son el límite superior (``"+Inf"`` la última)
+        """
+        with self._lock:
+            conteos, total = list(self._conteos), self._total_ms
+        n = sum(conteos)
+        etiquetas = [str(c) for c in self.cubetas] + ["+Inf"]
+        return {
+            "n": n,
+            "promedio_ms": total / n if n else None,
+            "p50_ms": self._percentil(conteos, 50) if n else None,
+            "p99_ms": self._percentil(conteos, 99) if n else None,
+            "cubetas": dict(zip(etiquetas, conteos)),
+        }
+
+
+class Registro:
+    """Histogramas con nombre, creados al primer uso."""
+
+    def __init__(self):
+        self._histogramas = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, nombre):
+        with self._lock:
+            if nombre not in self._histogramas:
+                self._histogramas[nombre] = Histograma()
+            return self._histogramas[nombre]
+
+    def resumen(self):
+        with self._lock:
+            histogramas = dict(self._histogramas)
+        return {nombre: h.resumen() for nombre, h in sorted(histogramas.items())}
+
+    def limpiar(self):
+        with self._lock:
+            self._histogramas.clear()
@@ -0,0 +1,61 @@
+"""
+Paginación por clave (keyset) sobre ``(fecha, id)``.
+
+En lugar de OFFSET, cada página se pide con un cursor opaco que codifica la
+última ``(fecha, id)`` vista y se traduce en un filtro que recorre el índice
+desde ese punto: el costo de una página no depende de cuántas filas haya
+antes ni de cuánto crezca la tabla.
+"""
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from django.db.models import Q
+
+
+def codificar_cursor(fecha, pk):
+    return urlsafe_b64encode(f'{fecha.isoformat()}|{pk}'.encode()).decode()
+
+
+def decodificar_cursor(cursor):
+    """
+    :raises ValueError: Si el cursor no es uno generado por ``codificar_cursor``.
+    """
+    try:
+        fecha, pk = urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(fecha), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Cursor inválido.')
+
+
+def paginar_por_clave(qs, campo, cursor=None, limite=50, descendente=True):
+    """
+    Una página de ``qs`` ordenada por ``(campo, id)``.
+
+    Para que sea eficiente debe existir un índice que empiece por los filtros
+    de igualdad de ``qs`` y siga por ``campo``.
+
+    :param qs: QuerySet (de modelos o de ``values()`` que incluya ``id`` y ``campo``)
+    :param campo: Nombre del campo de fecha
+    :param cursor: Valor de ``siguiente`` de la página anterior (o None)
+    :param limite: Filas por página
+    :param descendente: Más recientes primero
+    :return: ``(filas, siguiente)``; ``siguiente`` es None en la última página
+    :rtype: tuple[list, str | None]
+    :raises ValueError: Si el cursor es inválido.
+    """
+    if cursor:
+        fecha, pk = decodificar_cursor(cursor)
+        op = 'lt' if descendente else 'gt'
+        qs = qs.filter(Q(**{f'{campo}__{op}': fecha}) | Q(**{campo: fecha, f'pk__{op}': pk}))
+    signo = '-' if descendente else ''
+    filas = list(qs.order_by(f'{signo}{campo}', f'{signo}id')[:limite + 1])
+
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        ultima = filas[-1]
+        if isinstance(ultima, dict):
+            siguiente = codificar_cursor(ultima[campo], ultima['id'])
+        else:
+            siguiente = codificar_cursor(getattr(ultima, campo), ultima.pk)
+    return filas, siguiente
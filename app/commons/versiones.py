@@ -0,0 +1,66 @@
+"""
+Contadores de versión compartidos a través del cache de Django.
+
+Permiten invalidar cachés que viven en memoria de cada proceso (snapshot de
+precios, tablero de tasas, etc.) sin consultar la base de datos: cada cambio
+relevante incrementa la versión y los lectores comparan contra la versión con
+la que construyeron su copia local.
+
+Las versiones son enteros en nanosegundos (``time.time_ns()``), estrictamente
+crecientes, por lo que también sirven como marca de tiempo del último cambio.
+
+Para que la invalidación alcance a todos los workers, ``CACHES['default']``
+debe apuntar a un backend compartido (Redis/Memcached) en producción.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+#: Cambios en TasaCambio (alta, edición, activación, borrado).
+TASAS = "tasas"
+#: Cambios en comisiones por moneda y tasas de descuento por segmento.
+COMISIONES = "comisiones"
+#: Cambios en políticas de límites (clientes.PoliticaLimite).
+LIMITES = "limites"
+
+_PREFIJO = "version:"
+
+
+def _clave(nombre):
+    return f"{_PREFIJO}{nombre}"
+
+
+def obtener_version(nombre):
+    """
+    Devuelve la versión actual de ``nombre``.
+
+    Si la clave no existe (cache vacío o reiniciado) se inicializa con la hora
+    actual, lo que fuerza a los lectores a reconstruir sus copias locales.
+    """
+    clave = _clave(nombre)
+    version = cache.get(clave)
+    if version is None:
+        cache.add(clave, time.time_ns(), timeout=None)
+        version = cache.get(clave)
+    return version
+
+
+def incrementar_version(nombre):
+    """Marca ``nombre`` como modificado y devuelve la nueva versión."""
+    clave = _clave(nombre)
+    nueva = max(time.time_ns(), (cache.get(clave) or 0) + 1)
+    cache.set(clave, nueva, timeout=None)
+    return nueva
+
+
+def notificar_cambio(nombre):
+    """
+    Incrementa la versión ahora y nuevamente al confirmar la transacción.
+
+    El primer incremento hace visible el cambio a lecturas dentro de la misma
+    transacción; el segundo evita que otro worker se quede con una copia
+    construida antes del COMMIT.
+    """
+    incrementar_version(nombre)
+    transaction.on_commit(lambda: incrementar_version(nombre))
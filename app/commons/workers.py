@@ -0,0 +1,35 @@
+"""
+Bucle común de los workers que atienden colas en la base de datos
+(webhooks de Stripe, checkouts, vencimiento de pendientes).
+"""
+import threading
+from collections import Counter
+
+from django.db import close_old_connections, connection
+
+
+def atender_cola(procesar_lote, clave, una_vez=False, espera=1.0, detener=None):
+    """
+    Llama a ``procesar_lote()`` hasta que se active ``detener`` o, con
+    ``una_vez``, hasta que un lote vuelva sin trabajo.
+
+    ``procesar_lote`` devuelve un dict de contadores; ``clave`` es el que
+    indica si el lote hizo algo. Tras un lote vacío se esperan ``espera``
+    segundos (o hasta ``detener``).
+
+    :return: Contadores sumados de todos los lotes
+    :rtype: collections.Counter
+    """
+    detener = detener or threading.Event()
+    total = Counter()
+    while not detener.is_set():
+        if not connection.in_atomic_block:
+            # Como entre peticiones: descartar conexiones caídas o vencidas
+            close_old_connections()
+        resultado = procesar_lote()
+        total.update(resultado)
+        if not resultado[clave]:
+            if una_vez:
+                break
+            detener.wait(espera)
+    return total
@@ -34,11 +34,75 @@ SITE_URL = os.getenv("SITE_URL", "http://localhost:8000")
 # === Stripe (modo test) ===
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY", "")  # sk_test_...
 STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET", "")  # whsec_...
+# API alternativa (p. ej. el servidor falso de transaccion.stripe_fake); vacío = api.stripe.com
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE", "")
+# Pasarela de pagos (transaccion.pasarela): backend, timeouts en segundos,
+# conexiones keep-alive por proceso y reintentos con espera exponencial
+PASARELA_BACKEND = os.getenv("PASARELA_BACKEND", "transaccion.pasarela.BackendStripe")
+STRIPE_TIMEOUT_CONEXION = float(os.getenv("STRIPE_TIMEOUT_CONEXION", "3"))
+STRIPE_TIMEOUT_LECTURA = float(os.getenv("STRIPE_TIMEOUT_LECTURA", "10"))
+STRIPE_POOL_CONEXIONES = int(os.getenv("STRIPE_POOL_CONEXIONES", "16"))
+STRIPE_REINTENTOS = int(os.getenv("STRIPE_REINTENTOS", "2"))
+STRIPE_REINTENTO_BASE = float(os.getenv("STRIPE_REINTENTO_BASE", "0.25"))
+STRIPE_REINTENTO_TOPE = float(os.getenv("STRIPE_REINTENTO_TOPE", "4"))
+# Cola de checkouts (procesar_checkouts): hilos por proceso, intentos por
+# trabajo y segundos tras los que un trabajo tomado se da por abandonado
+STRIPE_CHECKOUT_WORKERS = int(os.getenv("STRIPE_CHECKOUT_WORKERS", "4"))
+STRIPE_CHECKOUT_INTENTOS = int(os.getenv("STRIPE_CHECKOUT_INTENTOS", "5"))
+STRIPE_CHECKOUT_VENCIMIENTO = int(os.getenv("STRIPE_CHECKOUT_VENCIMIENTO", "120"))
+# Bandeja de webhooks (procesar_webhooks): eventos por lote e intentos antes de ERROR
+STRIPE_WEBHOOK_LOTE = int(os.getenv("STRIPE_WEBHOOK_LOTE", "500"))
+STRIPE_WEBHOOK_INTENTOS = int(os.getenv("STRIPE_WEBHOOK_INTENTOS", "5"))
 
 # Usamos SITE_URL para formar las URLs de retorno
 STRIPE_SUCCESS_URL = os.getenv("STRIPE_SUCCESS_URL", f"{SITE_URL}/pagos/success/")
 STRIPE_CANCEL_URL  = os.getenv("STRIPE_CANCEL_URL",  f"{SITE_URL}/pagos/cancel/")
 
+# Vencimiento de las transacciones PENDIENTES (vencer_pendientes), en minutos.
+# Reglas "<tipo>:<medio>=<minutos>" separadas por comas; medio es el
+# payment_type del medio de pago o "sin_medio", "*" vale para cualquiera y
+# gana la regla más específica. 0 o sin regla = no vence.
+TRANSACCION_VENCIMIENTO = {
+    regla.strip(): int(minutos)
+    for regla, minutos in (
+        par.split("=", 1)
+        for par in os.getenv("TRANSACCION_VENCIMIENTO", "*:*=1440,compra:tarjeta=60").split(",")
+        if par.strip()
+    )
+}
+# Transacciones que cancela cada UPDATE del barrido de vencidas
+TRANSACCION_VENCIMIENTO_LOTE = int(os.getenv("TRANSACCION_VENCIMIENTO_LOTE", "1000"))
+
+# Segundos que se guarda la respuesta de una petición con clave de idempotencia
+# (transacciones/nueva/ y transacciones/calcular/)
+IDEMPOTENCIA_TTL = int(os.getenv("IDEMPOTENCIA_TTL", "3600"))
+
+# Máximo de ítems por pedido de cotización en lote (transacciones/calcular/)
+COTIZACION_LOTE_MAX = int(os.getenv("COTIZACION_LOTE_MAX", "10000"))
+# Máximo de órdenes por lote de transacciones (transacciones/lote/)
+TRANSACCION_LOTE_MAX = int(os.getenv("TRANSACCION_LOTE_MAX", "1000"))
+# Máximo de clientes por consulta de margen de límites (transacciones/limites/disponibles/)
+LIMITES_CONSULTA_MAX = int(os.getenv("LIMITES_CONSULTA_MAX", "500"))
+# Tamaño de página por defecto y máximo de monedas/cotizaciones_json/
+COTIZACIONES_PAGINA_MAX = int(os.getenv("COTIZACIONES_PAGINA_MAX", "500"))
+# Filas por página del historial de transacciones (paginación por clave)
+TRANSACCIONES_PAGINA = int(os.getenv("TRANSACCIONES_PAGINA", "50"))
+# Resultados máximos de la búsqueda de clientes (clientes/buscar/)
+CLIENTES_BUSQUEDA_MAX = int(os.getenv("CLIENTES_BUSQUEDA_MAX", "20"))
+# Filas por lectura (cursor del servidor) y por bloque escrito en las exportaciones CSV
+EXPORTACION_CHUNK = int(os.getenv("EXPORTACION_CHUNK", "2000"))
+# Segundos que se cachean los totales de las tarjetas del dashboard
+DASHBOARD_CONTADORES_TTL = int(os.getenv("DASHBOARD_CONTADORES_TTL", "60"))
+# Canal SSE de tasas (monedas/cotizaciones_stream/): sondeo de la versión de
+# tasas por worker, comentario keep-alive y reintento sugerido al navegador
+SSE_INTERVALO_SONDEO = float(os.getenv("SSE_INTERVALO_SONDEO", "0.5"))
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", "15"))
+SSE_REINTENTO_MS = int(os.getenv("SSE_REINTENTO_MS", "3000"))
+# Tasas activas en memoria compartida entre workers (monedas.memoria_compartida).
+# Ruta vacía = archivo en el directorio temporal, con el nombre de la base.
+TASAS_MMAP_RUTA = os.getenv("TASAS_MMAP_RUTA", "")
+TASAS_MMAP_CAPACIDAD = int(os.getenv("TASAS_MMAP_CAPACIDAD", "512"))
+
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -76,6 +140,16 @@ DATABASES = {
     }
 }
 
+# Cache compartido: las versiones de commons.versiones invalidan los snapshots
+# de cada worker. LocMem solo sirve con un proceso (desarrollo, tests);
+# prod.py exige Redis o Memcached.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME":"django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
     {"NAME":"django.contrib.auth.password_validation.MinimumLengthValidator"},
@@ -7,6 +7,30 @@ DEBUG = False
 SECRET_KEY = os.environ["DJANGO_SECRET_KEY"]
 ALLOWED_HOSTS = os.environ["DJANGO_ALLOWED_HOSTS"].split(",")
 
+# Las versiones de commons.versiones (tasas, límites, comisiones) se leen en
+# cada cotización y tienen que verse desde todos los workers: hace falta un
+# cache compartido en memoria. Un cache por proceso dejaría snapshots viejos en
+# cada worker, y uno en base de datos haría de cada lectura de versión una
+# consulta SQL.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.redis.RedisCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    }
+}
+_CACHES_COMPARTIDOS = (
+    "django.core.cache.backends.redis.RedisCache",
+    "django.core.cache.backends.memcached.PyMemcacheCache",
+    "django.core.cache.backends.memcached.PyLibMCCache",
+)
+if CACHES["default"]["BACKEND"] not in _CACHES_COMPARTIDOS or not CACHES["default"]["LOCATION"]:
+    from django.core.exceptions import ImproperlyConfigured
+    raise ImproperlyConfigured(
+        f"CACHE_BACKEND={CACHES['default']['BACKEND']} (CACHE_LOCATION={CACHES['default']['LOCATION']!r}): "
+        "en producción el cache tiene que ser Redis o Memcached, con CACHE_LOCATION "
+        "(p. ej. redis://localhost:6379/0)."
+    )
+
 SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
 SECURE_SSL_REDIRECT = True
 
@@ -4,6 +4,7 @@ import os
 import json
 import requests
 from django.conf import settings
+from commons.versiones import TASAS, obtener_version
 from monedas.models import TasaCambio
 
 def landing_page(request):
@@ -31,7 +32,12 @@ def landing_page(request):
         - ``fuente`` (str): Fuente de la información de la tasa.
         - ``fecha_creacion`` (datetime): Fecha y hora de creación de la tasa.
         - ``estado`` (str): Estado de la tasa ("Activa" o "Inactiva").
-    - ``ultima_actualizacion_tasas``: Fecha de la última tasa registrada en el sistema, o ``None`` si no hay registros.
+    - ``version_tasas``: Versión global de tasas (``commons.versiones.TASAS``); clave del
+      fragmento cacheado del tablero. Mientras no cambie ninguna tasa, los visitantes
+      anónimos se sirven sin consultar la base de datos.
+
+    ``tasas`` se pasa como función para que la consulta solo se ejecute cuando el
+    fragmento no está en cache.
 
     **Ejemplo de uso:**
 
@@ -48,16 +54,25 @@ def landing_page(request):
     if request.user.is_authenticated:
         return redirect('usuarios:dashboard')
 
-    # Obtener las tasas activas del sistema (últimas por moneda)
+    # El tablero se cachea en la plantilla bajo la versión de tasas; la
+    # función solo se evalúa si el fragmento no está en cache.
+    context = {
+        'tasas': _tasas_activas,
+        'version_tasas': obtener_version(TASAS),
+    }
+
+    return render(request, "landing.html", context)
+
+
+def _tasas_activas():
+    """Tasas activas del sistema (una por moneda), como diccionarios para el tablero."""
     tasas_qs = (
         TasaCambio.objects.select_related('moneda')
         .filter(activa=True)
         .order_by('moneda__codigo')
     )
-
-    tasas_obj = []
-    for t in tasas_qs:
-        tasas_obj.append({
+    return [
+        {
             'moneda_codigo': t.moneda.codigo,
             'moneda_nombre': t.moneda.nombre,
             'compra': t.compra,
@@ -66,17 +81,6 @@ def landing_page(request):
             'fuente': t.fuente,
             'fecha_creacion': t.fecha_creacion,
             'estado': 'Activa' if t.activa else 'Inactiva',
-        })
-
-    # Obtener la última fecha de actualización de tasas
-    ultima_actualizacion_tasas = None
-    if tasas_obj:
-        ultima_actualizacion_tasas = max(t['fecha_creacion'] for t in tasas_obj)
-
-    # Contexto para la plantilla
-    context = {
-        'tasas': tasas_obj,
-        'ultima_actualizacion_tasas': ultima_actualizacion_tasas
-    }
-
-    return render(request, "landing.html", context)
+        }
+        for t in tasas_qs
+    ]
@@ -0,0 +1,176 @@
+"""
+Canal de eventos (Server-Sent Events) con las tasas activas.
+
+Cada worker ASGI tiene un único ``PublicadorTasas``. Mientras haya clientes
+conectados, una tarea de fondo lee la versión compartida de tasas
+(``commons.versiones.TASAS``) cada ``SSE_INTERVALO_SONDEO`` segundos. Leer la
+versión cuesta una lectura de cache. Solo cuando la versión cambia se consulta
+la base, una vez por worker, y el delta resultante se reparte a todas las
+conexiones abiertas.
+
+Formato de cada evento ``tasas``::
+
+    {"v": <versión>, "tasas": [{"moneda", "compra", "venta", "variacion"}, ...],
+     "bajas": ["EUR", ...]}
+
+El primer evento de cada conexión trae todas las tasas activas; los
+siguientes, solo las monedas que cambiaron (``bajas`` = monedas que dejaron de
+tener tasa activa).
+"""
+import asyncio
+import json
+import logging
+import statistics
+import time
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from commons.versiones import TASAS, obtener_version
+from .models import TasaCambio
+
+logger = logging.getLogger(__name__)
+
+#: Cola máxima por conexión; un cliente que no consume se desconecta
+#: (EventSource reconecta y recibe el estado completo).
+COLA_MAX = 32
+
+
+def _tasas_activas():
+    """``{codigo: {moneda, compra, venta, variacion}}`` de las tasas activas, en una consulta."""
+    filas = (TasaCambio.objects.filter(activa=True)
+             .values_list('moneda__codigo', 'compra', 'venta', 'variacion'))
+    return {
+        codigo: {'moneda': codigo, 'compra': str(compra), 'venta': str(venta), 'variacion': str(variacion)}
+        for codigo, compra, venta, variacion in filas
+    }
+
+
+def calcular_delta(anterior, actual):
+    """Tasas nuevas o modificadas y monedas dadas de baja entre dos estados."""
+    cambios = [t for codigo, t in sorted(actual.items()) if anterior.get(codigo) != t]
+    bajas = sorted(set(anterior) - set(actual))
+    return cambios, bajas
+
+
+def formatear_evento(version, tasas, bajas=()):
+    """Serializa un evento SSE ``tasas``."""
+    data = json.dumps({'v': version, 'tasas': tasas, 'bajas': list(bajas)}, separators=(',', ':'))
+    return f'event: tasas\nid: {version}\ndata: {data}\n\n'
+
+
+class PublicadorTasas:
+    """
+    Publicador por proceso: una tarea de sondeo, N colas de suscriptores.
+
+    Métricas (por worker): ``clientes`` conectados, ``eventos`` publicados y
+    latencia de publicación, medida desde la marca de tiempo de la versión
+    (``time.time_ns()`` al modificar la tasa) hasta el encolado del delta.
+    """
+
+    def __init__(self):
+        self._suscriptores = set()
+        self._tarea = None
+        self._loop = None
+        self._cerrojo = None
+        self.version = None
+        self.estado = {}
+        self.eventos = 0
+        self.latencias_ms = deque(maxlen=1000)
+
+    @property
+    def clientes(self):
+        return len(self._suscriptores)
+
+    def _reiniciar_si_cambio_loop(self):
+        # En tests cada AsyncClient corre en su propio event loop.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._tarea = None
+            self._cerrojo = asyncio.Lock()
+            self._suscriptores = set()
+
+    async def suscribir(self):
+        """Registra una conexión y devuelve ``(cola, evento_inicial)``."""
+        self._reiniciar_si_cambio_loop()
+        cola = asyncio.Queue(maxsize=COLA_MAX)
+        self._suscriptores.add(cola)
+        # Con el cerrojo: dos primeras conexiones simultáneas esperan la misma
+        # carga inicial y arrancan una sola tarea de sondeo
+        async with self._cerrojo:
+            if self._tarea is None or self._tarea.done():
+                await self._actualizar()
+                self._tarea = asyncio.create_task(self._sondear())
+        inicial = formatear_evento(self.version, list(self.estado.values()))
+        return cola, inicial
+
+    def desuscribir(self, cola):
+        self._suscriptores.discard(cola)
+
+    async def _actualizar(self):
+        """Relee las tasas si cambió la versión; devuelve el evento delta o ``None``."""
+        version = await sync_to_async(obtener_version)(TASAS)
+        if version == self.version:
+            return None
+        actual = await sync_to_async(_tasas_activas)()
+        cambios, bajas = calcular_delta(self.estado, actual)
+        self.version, self.estado = version, actual
+        if not cambios and not bajas:
+            return None
+        return formatear_evento(version, cambios, bajas)
+
+    def _publicar(self, evento):
+        for cola in list(self._suscriptores):
+            try:
+                cola.put_nowait(evento)
+            except asyncio.QueueFull:
+                self._suscriptores.discard(cola)
+                while not cola.empty():
+                    cola.get_nowait()
+                cola.put_nowait(None)
+                logger.info('[SSE] Cliente lento desconectado')
+        self.eventos += 1
+        self.latencias_ms.append((time.time_ns() - self.version) / 1e6)
+
+    async def _sondear(self):
+        while self._suscriptores:
+            await asyncio.sleep(settings.SSE_INTERVALO_SONDEO)
+            try:
+                evento = await self._actualizar()
+            except Exception:
+                logger.exception('[SSE] Error al leer tasas')
+                continue
+            if evento:
+                self._publicar(evento)
+
+    def metricas(self):
+        latencias = sorted(self.latencias_ms)
+        return {
+            'clientes': self.clientes,
+            'eventos': self.eventos,
+            'latencia_ms_p50': round(statistics.median(latencias), 1) if latencias else None,
+            'latencia_ms_max': round(latencias[-1], 1) if latencias else None,
+        }
+
+
+publicador = PublicadorTasas()
+
+
+async def flujo_tasas():
+    """Generador asíncrono con el contenido SSE de una conexión."""
+    cola, inicial = await publicador.suscribir()
+    try:
+        yield f'retry: {settings.SSE_REINTENTO_MS}\n' + inicial
+        while True:
+            try:
+                evento = await asyncio.wait_for(cola.get(), timeout=settings.SSE_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            if evento is None:
+                return
+            yield evento
+    finally:
+        publicador.desuscribir(cola)
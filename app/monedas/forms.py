@@ -7,6 +7,7 @@ Contiene formularios para la gestión de Moneda y TasaCambio:
   y restricción de moneda base (solo 'PYG').
 - TasaCambioForm: creación y edición de tasas de cambio, validando que
   venta >= compra y limitando la selección a monedas activas no base.
+- ComisionMonedaForm: edición de la comisión de compra/venta de una moneda.
 
 Los widgets utilizan clases de Bootstrap para una interfaz consistente.
 """
@@ -15,7 +16,7 @@ from django import forms
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 
-from .models import Moneda, TasaCambio
+from .models import ComisionMoneda, Moneda, TasaCambio
 
 
 class MonedaForm(forms.ModelForm):
@@ -129,3 +130,21 @@ class TasaCambioForm(forms.ModelForm):
         if compra and venta and venta < compra:
             raise ValidationError('El precio de venta no puede ser menor al de compra.')
         return cleaned
+
+
+class ComisionMonedaForm(forms.ModelForm):
+    """
+    Formulario para editar la comisión (PYG por unidad) de una moneda.
+    """
+
+    class Meta:
+        model = ComisionMoneda
+        fields = ['compra', 'venta']
+        labels = {
+            'compra': 'Comisión de compra',
+            'venta': 'Comisión de venta',
+        }
+        widgets = {
+            'compra': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.0001', 'min': '0'}),
+            'venta': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.0001', 'min': '0'}),
+        }
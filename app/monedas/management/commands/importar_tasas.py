@@ -0,0 +1,41 @@
+"""
+Importa cotizaciones históricas desde un archivo CSV o JSON.
+
+Ejemplo::
+
+    python manage.py importar_tasas bcp_2015_2024.csv --fuente "Banco Central"
+"""
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from monedas.services import importar_tasas, leer_feed_tasas
+
+
+class Command(BaseCommand):
+    help = 'Carga masiva de tasas de cambio (CSV: moneda,compra,venta,ts[,fuente] o JSON equivalente).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', type=str, help='Ruta del feed')
+        parser.add_argument('--formato', choices=['csv', 'json'], help='Por defecto, según la extensión')
+        parser.add_argument('--fuente', type=str, default='', help='Fuente para filas sin columna "fuente"')
+        parser.add_argument('--lote', type=int, default=1000, help='Filas por bulk_create')
+
+    def handle(self, *args, **options):
+        ruta = Path(options['archivo'])
+        formato = options['formato'] or ruta.suffix.lstrip('.').lower()
+        try:
+            filas = leer_feed_tasas(ruta.read_text(encoding='utf-8-sig'), formato)
+        except OSError as e:
+            raise CommandError(f'No se pudo leer {ruta}: {e}')
+        except ValueError as e:
+            raise CommandError(f'Feed inválido: {e}')
+
+        resultado = importar_tasas(filas, fuente=options['fuente'], lote=options['lote'])
+
+        for error in resultado.errores:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado.leidas} filas leídas: {resultado.insertadas} insertadas, '
+            f'{resultado.duplicadas} duplicadas, {len(resultado.errores)} con error.'
+        ))
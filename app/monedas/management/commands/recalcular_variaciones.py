@@ -0,0 +1,55 @@
+"""
+Recalcula tasa previa y variación % de las tasas de cambio.
+
+Útil tras corregir datos históricos o importar tasas con ``ts_fuente``
+retroactivo. Todo el trabajo se hace en un único UPDATE con funciones de
+ventana.
+
+Ejemplo::
+
+    python manage.py recalcular_variaciones --moneda USD BRL --desde 2024-01-01
+"""
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from monedas.models import Moneda
+from monedas.services import recalcular_variaciones
+
+
+def _fecha(valor):
+    d = parse_date(valor)
+    if d is None:
+        raise CommandError(f'Fecha inválida: {valor} (usar YYYY-MM-DD)')
+    return d
+
+
+class Command(BaseCommand):
+    help = 'Recalcula tasa_previa y variacion de TasaCambio para una o más monedas y/o un rango de fechas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--moneda', nargs='+', help='Códigos ISO (por defecto, todas)')
+        parser.add_argument('--desde', type=_fecha, help='Fecha inicial inclusiva (YYYY-MM-DD)')
+        parser.add_argument('--hasta', type=_fecha, help='Fecha final inclusiva (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        monedas_ids = None
+        if options['moneda']:
+            codigos = [c.upper() for c in options['moneda']]
+            encontradas = dict(Moneda.objects.all_with_inactive()
+                               .filter(codigo__in=codigos).values_list('codigo', 'id'))
+            faltantes = sorted(set(codigos) - set(encontradas))
+            if faltantes:
+                raise CommandError(f'Monedas no encontradas: {", ".join(faltantes)}')
+            monedas_ids = list(encontradas.values())
+
+        desde = hasta = None
+        if options['desde']:
+            desde = timezone.make_aware(datetime.combine(options['desde'], time.min))
+        if options['hasta']:
+            hasta = timezone.make_aware(datetime.combine(options['hasta'] + timedelta(days=1), time.min))
+
+        modificadas = recalcular_variaciones(monedas_ids, desde=desde, hasta=hasta)
+        self.stdout.write(self.style.SUCCESS(f'{modificadas} tasas actualizadas.'))
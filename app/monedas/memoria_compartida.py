@@ -0,0 +1,255 @@
+"""
+Tasas activas en memoria compartida entre workers (archivo mapeado con mmap).
+
+Con varios workers, cada proceso tenía que consultar las tasas activas por su
+cuenta y, tras un cambio, los procesos podían cotizar con versiones distintas
+por un instante. Acá un solo proceso publica las tasas activas, junto con la
+versión (``commons.versiones.TASAS``), en un archivo de tamaño fijo. Todos los
+procesos lo mapean y leen sin copiar ni consultar la base.
+
+Formato (little endian)::
+
+    cabecera  <4sHHQQII  magia 'GXTS', formato, reservado, secuencia,
+                         versión, cantidad, capacidad
+    registro  <QQqqi3sx  tasa_id, moneda_id, compra*100, venta*100,
+                         variacion*100, código ISO
+
+La ``secuencia`` funciona como seqlock: el escritor la deja impar mientras
+escribe y par al terminar, y el lector repite la lectura si la ve impar o
+cambiada, hasta ``INTENTOS_LECTURA`` veces. Los escritores se serializan con
+``flock`` sobre el archivo. Un escritor que falla a mitad de camino deja la
+cabecera sin versión (secuencia par, cantidad 0); uno que muere sin llegar a
+cerrarla deja la secuencia impar, y el próximo ``publicar_tasas`` la repara.
+"""
+import fcntl
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import connection
+
+from commons.versiones import TASAS, obtener_version
+from .models import TasaCambio
+
+MAGIA = b'GXTS'
+FORMATO = 1
+_CABECERA = struct.Struct('<4sHHQQII')
+_SECUENCIA = struct.Struct('<Q')
+_OFFSET_SECUENCIA = 8
+_REGISTRO = struct.Struct('<QQqqi3sx')
+#: compra, venta y variación se guardan como enteros con 2 decimales.
+_ESCALA = 100
+#: Lecturas inconsistentes seguidas tras las que el lector se rinde.
+INTENTOS_LECTURA = 1000
+
+
+class TasaCompartida(NamedTuple):
+    """Tasa activa tal como se publica en memoria compartida."""
+    id: int
+    moneda_id: int
+    codigo: str
+    compra: Decimal
+    venta: Decimal
+    variacion: Decimal
+
+
+def ruta_archivo():
+    """
+    Ruta del archivo compartido.
+
+    Por defecto incluye el nombre de la base, así los tests (``test_<db>``)
+    nunca pisan el archivo del servidor de desarrollo.
+    """
+    if settings.TASAS_MMAP_RUTA:
+        return settings.TASAS_MMAP_RUTA
+    nombre = connection.settings_dict['NAME'] or 'default'
+    return os.path.join(tempfile.gettempdir(), f'global_exchange_tasas_{nombre}.bin')
+
+
+def _tamano(capacidad):
+    return _CABECERA.size + capacidad * _REGISTRO.size
+
+
+def _a_entero(valor):
+    return int((Decimal(valor) * _ESCALA).to_integral_value())
+
+
+def _a_decimal(valor):
+    return Decimal(valor).scaleb(-2)
+
+
+def _abrir(ruta, capacidad):
+    """Abre (o crea con el tamaño de ``capacidad``) el archivo y lo mapea."""
+    fd = os.open(ruta, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if os.fstat(fd).st_size < _tamano(capacidad):
+            os.ftruncate(fd, _tamano(capacidad))
+        mm = mmap.mmap(fd, os.fstat(fd).st_size)
+    except Exception:
+        os.close(fd)
+        raise
+    return fd, mm
+
+
+def _capacidad(mm):
+    return (len(mm) - _CABECERA.size) // _REGISTRO.size
+
+
+def _escribir(mm, version, filas):
+    capacidad = _capacidad(mm)
+    if len(filas) > capacidad:
+        raise ValueError(f'{len(filas)} tasas activas superan TASAS_MMAP_CAPACIDAD={capacidad}')
+    # Convertir todo antes de tocar el archivo: un código no ASCII o un monto
+    # fuera de rango falla acá, sin dejar una escritura a medias
+    registros = [
+        _REGISTRO.pack(tasa_id, moneda_id, _a_entero(compra), _a_entero(venta),
+                       _a_entero(variacion), codigo.encode('ascii'))
+        for tasa_id, moneda_id, codigo, compra, venta, variacion in filas
+    ]
+
+    secuencia = _SECUENCIA.unpack_from(mm, _OFFSET_SECUENCIA)[0]
+    secuencia += 1 if secuencia % 2 == 0 else 2  # impar: escritura en curso
+    _SECUENCIA.pack_into(mm, _OFFSET_SECUENCIA, secuencia)
+    completa = False
+    try:
+        for i, registro in enumerate(registros):
+            offset = _CABECERA.size + i * _REGISTRO.size
+            mm[offset:offset + _REGISTRO.size] = registro
+        completa = True
+    finally:
+        # Siempre par al salir; si falló, sin versión ni registros (los
+        # lectores no la aceptan y consultan la base)
+        _CABECERA.pack_into(mm, 0, MAGIA, FORMATO, 0, secuencia + 1,
+                            version if completa else 0, len(registros) if completa else 0, capacidad)
+
+
+def publicar_tasas(version=None):
+    """
+    Escribe las tasas activas en el archivo compartido.
+
+    Si otro proceso ya publicó ``version`` mientras se esperaba el lock, no
+    vuelve a consultar la base: un cambio de tasas genera una sola lectura de
+    la base entre todos los workers.
+
+    :param version: Versión de tasas a publicar; por defecto la actual
+    :return: Versión publicada
+    """
+    version = version or obtener_version(TASAS)
+    fd, mm = _abrir(ruta_archivo(), settings.TASAS_MMAP_CAPACIDAD)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        magia, _, _, secuencia, publicada, _, _ = _CABECERA.unpack_from(mm, 0)
+        # Secuencia impar con el lock libre: un escritor murió a mitad de camino
+        if magia == MAGIA and publicada == version and secuencia % 2 == 0:
+            return version
+        filas = list(
+            TasaCambio.objects.filter(activa=True)
+            .order_by('moneda_id')
+            .values_list('id', 'moneda_id', 'moneda__codigo', 'compra', 'venta', 'variacion')
+        )
+        _escribir(mm, version, filas)
+        mm.flush()
+        return version
+    finally:
+        mm.close()
+        os.close(fd)  # libera también el flock
+
+
+class LectorTasas:
+    """
+    Lector por proceso del archivo compartido.
+
+    Mapea el archivo una sola vez y decodifica los registros solo cuando la
+    secuencia cambió; mientras tanto cada lectura cuesta un ``unpack`` de 8
+    bytes.
+    """
+
+    def __init__(self, ruta, capacidad):
+        self.ruta = ruta
+        fd, self._mm = _abrir(ruta, capacidad)
+        os.close(fd)  # el mapeo sigue vigente sin el descriptor
+        self._secuencia = None
+        self._datos = (None, {})
+
+    def leer(self):
+        """
+        Devuelve ``(version, {moneda_id: TasaCompartida})``.
+
+        ``version`` es ``None`` si todavía no se publicó nada. Devuelve
+        ``None`` si tras ``INTENTOS_LECTURA`` intentos no logra una lectura
+        consistente (escritura en curso, o un escritor que murió a mitad).
+        """
+        mm = self._mm
+        for _ in range(INTENTOS_LECTURA):
+            inicio = _SECUENCIA.unpack_from(mm, _OFFSET_SECUENCIA)[0]
+            if inicio % 2:
+                time.sleep(0)  # escritura en curso
+                continue
+            if inicio == self._secuencia:
+                return self._datos
+            magia, _, _, _, version, cantidad, _ = _CABECERA.unpack_from(mm, 0)
+            tasas = {}
+            try:
+                # Una lectura rota puede traer cualquier cantidad o código
+                for i in range(min(cantidad, _capacidad(mm)) if magia == MAGIA else 0):
+                    tasa_id, moneda_id, compra, venta, variacion, codigo = _REGISTRO.unpack_from(
+                        mm, _CABECERA.size + i * _REGISTRO.size)
+                    tasas[moneda_id] = TasaCompartida(tasa_id, moneda_id, codigo.decode('ascii'),
+                                                      _a_decimal(compra), _a_decimal(venta),
+                                                      _a_decimal(variacion))
+            except (struct.error, UnicodeDecodeError):
+                tasas = None
+            if _SECUENCIA.unpack_from(mm, _OFFSET_SECUENCIA)[0] == inicio and tasas is not None:
+                self._secuencia = inicio
+                self._datos = (version if magia == MAGIA and version else None, tasas)
+                return self._datos
+            time.sleep(0)
+        return None
+
+    def cerrar(self):
+        self._mm.close()
+
+
+_lector = None
+_lock = threading.Lock()
+
+
+def lector():
+    """Lector del proceso actual (se reabre si cambió la ruta, p. ej. en tests)."""
+    global _lector
+    ruta = ruta_archivo()
+    with _lock:
+        if _lector is None or _lector.ruta != ruta:
+            if _lector is not None:
+                _lector.cerrar()
+            _lector = LectorTasas(ruta, settings.TASAS_MMAP_CAPACIDAD)
+        return _lector
+
+
+def tasas_compartidas(version):
+    """
+    Tasas activas de ``version`` leídas de memoria compartida.
+
+    Si el archivo quedó atrás, el primer proceso que lo nota lo republica.
+    Dentro de una transacción no se publica: se vería lo no confirmado y un
+    rollback dejaría el archivo con datos que nunca existieron. En ese caso
+    (o si falla el archivo) devuelve ``None`` y el llamador consulta la base.
+
+    :rtype: dict[int, TasaCompartida] | None
+    """
+    try:
+        leido = lector().leer()
+        if (leido is None or leido[0] != version) and not connection.in_atomic_block:
+            publicar_tasas(version)
+            leido = lector().leer()
+    except (OSError, ValueError, struct.error):
+        return None
+    if leido is None or leido[0] != version:
+        return None
+    return leido[1]
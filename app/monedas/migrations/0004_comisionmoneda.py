@@ -0,0 +1,46 @@
+# Generated by Django 5.2.5 on 2026-10-16 20:48
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+from monedas.models import COMISIONES_POR_DEFECTO
+
+
+def cargar_comisiones(apps, schema_editor):
+    Moneda = apps.get_model('monedas', 'Moneda')
+    ComisionMoneda = apps.get_model('monedas', 'ComisionMoneda')
+    monedas = {m.codigo: m for m in Moneda._base_manager.filter(codigo__in=COMISIONES_POR_DEFECTO)}
+    ComisionMoneda.objects.bulk_create(
+        [
+            ComisionMoneda(moneda=monedas[codigo], compra=compra, venta=venta)
+            for codigo, (compra, venta) in COMISIONES_POR_DEFECTO.items()
+            if codigo in monedas
+        ],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monedas', '0003_alter_tasacambio_options_tasacambio_es_automatica_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComisionMoneda',
+            fields=[
+                ('moneda', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='comision', serialize=False, to='monedas.moneda')),
+                ('compra', models.DecimalField(decimal_places=4, default=0, max_digits=12, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Comisión compra')),
+                ('venta', models.DecimalField(decimal_places=4, default=0, max_digits=12, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Comisión venta')),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Comisión por moneda',
+                'verbose_name_plural': 'Comisiones por moneda',
+                'ordering': ['moneda__codigo'],
+            },
+        ),
+        migrations.RunPython(cargar_comisiones, migrations.RunPython.noop),
+    ]
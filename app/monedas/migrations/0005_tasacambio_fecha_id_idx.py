@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-16 20:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monedas', '0004_comisionmoneda'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tasacambio',
+            index=models.Index(fields=['-fecha_creacion', '-id'], name='tasa_fecha_id_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-16 20:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monedas', '0005_tasacambio_fecha_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tasacambio',
+            name='tasa_previa',
+            field=models.ForeignKey(blank=True, editable=False, help_text='Tasa anterior de la moneda, base de la variación', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='monedas.tasacambio'),
+        ),
+        # Enlaza el historial existente (la variación ya guardada no se toca;
+        # para recalcularla: manage.py recalcular_variaciones).
+        migrations.RunSQL(
+            """
+            UPDATE monedas_tasacambio AS t
+            SET tasa_previa_id = s.previa_id
+            FROM (
+                SELECT id, LAG(id) OVER (
+                    PARTITION BY moneda_id ORDER BY COALESCE(ts_fuente, fecha_creacion), id
+                ) AS previa_id
+                FROM monedas_tasacambio
+            ) AS s
+            WHERE t.id = s.id AND s.previa_id IS NOT NULL
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -13,8 +13,11 @@ Contiene los modelos principales para gestión de monedas y tasas de cambio:
   - Solo puede existir una tasa activa por moneda.
   - Calcula variación respecto a la tasa previa.
   - Incluye auditoría de fuente, base y timestamp.
+
+- ComisionMoneda: comisión fija (en PYG) de compra y venta por moneda.
+  - Una fila por moneda; sin fila rige COMISIONES_POR_DEFECTO (o cero).
 """
-from decimal import Decimal
+from decimal import ROUND_HALF_UP, Decimal
 
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator, MinValueValidator, MaxValueValidator
@@ -26,6 +29,9 @@ ISO4217 = RegexValidator(
     message='Usá un código ISO 4217 de 3 letras mayúsculas (ej.: PYG, USD, BRL).'
 )
 
+# Tope de TasaCambio.variacion (max_digits=5, decimal_places=2)
+VARIACION_MAX = Decimal('999.99')
+
 
 class MonedaManager(models.Manager):
     """
@@ -139,6 +145,9 @@ class TasaCambio(models.Model):
     venta = models.DecimalField('Venta', max_digits=12, decimal_places=2)
     variacion = models.DecimalField('Variación %', max_digits=5, decimal_places=2, default=0,
                                     editable=False)
+    tasa_previa = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True,
+                                    related_name='+', editable=False,
+                                    help_text='Tasa anterior de la moneda, base de la variación')
 
     base_codigo = models.CharField('Base de cotización', max_length=3, validators=[ISO4217], default='PYG')
     fuente = models.CharField('Fuente', max_length=120, blank=True, help_text='Ej: Banco Central, API Externa, Manual')
@@ -154,6 +163,7 @@ class TasaCambio(models.Model):
         indexes = [
             models.Index(fields=['moneda', 'activa', '-fecha_creacion']),
             models.Index(fields=['moneda', 'ts_fuente']),
+            models.Index(fields=['-fecha_creacion', '-id'], name='tasa_fecha_id_idx'),
         ]
         constraints = [
             models.UniqueConstraint(fields=['moneda'], condition=models.Q(activa=True),
@@ -177,62 +187,39 @@ class TasaCambio(models.Model):
             raise ValidationError('El precio de venta no puede ser menor al precio de compra.')
         self.base_codigo = 'PYG'
 
-    def _tasa_previa(self):
-        """Retorna la tasa anterior para calcular variación porcentual."""
-        qs = TasaCambio.objects.filter(moneda=self.moneda)
-        if self.ts_fuente:
-            qs = qs.filter(
-                models.Q(ts_fuente__lt=self.ts_fuente) |
-                models.Q(ts_fuente__isnull=True, fecha_creacion__lt=self.fecha_creacion)
-            )
-        else:
-            qs = qs.filter(fecha_creacion__lt=self.fecha_creacion)
-        return qs.order_by('-ts_fuente', '-fecha_creacion').first()
-
     def calcular_variacion(self):
-        """Calcula la variación % respecto a la tasa previa."""
-        prev = (
-            TasaCambio.objects.filter(moneda=self.moneda)
-            .order_by('-ts_fuente', '-fecha_creacion')
-            .first()
-        )
-        if not prev:
-            return Decimal('0.00')
-        if prev.compra > 0:
-            v = ((self.compra - prev.compra) / prev.compra) * 100
-            return v.quantize(Decimal('0.01'))
-        return Decimal('0.00')
+        """Calcula la variación % respecto a ``tasa_previa``."""
+        return variacion_porcentual(self.compra, self.tasa_previa.compra if self.tasa_previa else None)
 
     def save(self, *args, **kwargs):
         """
         Guarda la tasa de cambio asegurando:
         - Única tasa activa por moneda.
-        - Cálculo de variación.
+        - Cálculo de variación contra la tasa previa.
         - Integridad de PYG como base.
+
+        En un alta, la tasa previa es la activa de la moneda: se obtiene (y
+        bloquea) por el índice único parcial, sin ordenar el historial. Las
+        tasas cargadas con ``ts_fuente`` retroactivo se corrigen luego con
+        ``manage.py recalcular_variaciones``.
         """
         if self.moneda and self.moneda.es_base:
             raise ValidationError('No se puede guardar tasa para PYG.')
         self.base_codigo = 'PYG'
 
-        is_new = self.pk is None
-
-        if is_new:
-            self.variacion = self.calcular_variacion()
-
         with transaction.atomic():
-            if is_new and self.activa:
-                self.activa = False
+            if self.pk is None:
+                previa = (TasaCambio.objects
+                          .select_for_update()
+                          .only('id', 'compra')
+                          .filter(moneda=self.moneda, activa=True)
+                          .first())
+                self.tasa_previa = previa
+                self.variacion = self.calcular_variacion()
+                if self.activa and previa:
+                    TasaCambio.objects.filter(pk=previa.pk).update(activa=False)
                 super().save(*args, **kwargs)
 
-                (TasaCambio.objects
-                 .select_for_update()
-                 .filter(moneda=self.moneda, activa=True)
-                 .exclude(pk=self.pk)
-                 .update(activa=False))
-
-                self.activa = True
-                super().save(update_fields=['activa'])
-
             else:
                 if self.activa:
                     (TasaCambio.objects
@@ -241,3 +228,80 @@ class TasaCambio(models.Model):
                      .exclude(pk=self.pk)
                      .update(activa=False))
                 super().save(*args, **kwargs)
+
+
+def variacion_porcentual(compra, compra_previa):
+    """Variación % de ``compra`` respecto a ``compra_previa`` (0 si no hay previa)."""
+    if not compra_previa or compra_previa <= 0:
+        return Decimal('0.00')
+    v = ((Decimal(compra) - compra_previa) / compra_previa) * 100
+    # Mismo redondeo que ROUND() de PostgreSQL (ver monedas.services.recalcular_variaciones)
+    return max(min(v, VARIACION_MAX), -VARIACION_MAX).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+# Comisiones (compra, venta) de las monedas sin ComisionMoneda propia: los
+# valores del antiguo static/comisiones.json. La migración 0004 las cargó para
+# las monedas existentes; las que se den de alta después las toman de acá
+# hasta que se les configure una comisión.
+COMISIONES_POR_DEFECTO = {
+    'USD': (Decimal('50'), Decimal('100')),
+    'EUR': (Decimal('60'), Decimal('120')),
+    'BRL': (Decimal('10'), Decimal('20')),
+    'ARS': (Decimal('1'), Decimal('2')),
+    'CLP': (Decimal('2'), Decimal('4')),
+    'JPY': (Decimal('8'), Decimal('16')),
+    'GBP': (Decimal('70'), Decimal('140')),
+    'CHF': (Decimal('60'), Decimal('120')),
+    'UYU': (Decimal('3'), Decimal('6')),
+    'PEN': (Decimal('15'), Decimal('30')),
+    'CAD': (Decimal('40'), Decimal('80')),
+    'AUD': (Decimal('35'), Decimal('70')),
+    'NZD': (Decimal('30'), Decimal('60')),
+    'CNY': (Decimal('8'), Decimal('16')),
+    'KRW': (Decimal('1'), Decimal('2')),
+    'INR': (Decimal('2'), Decimal('4')),
+    'MXN': (Decimal('7'), Decimal('14')),
+    'COP': (Decimal('0.05'), Decimal('0.1')),
+    'ZAR': (Decimal('6'), Decimal('12')),
+    'RUB': (Decimal('1.5'), Decimal('3')),
+    'TRY': (Decimal('4'), Decimal('8')),
+    'SGD': (Decimal('40'), Decimal('80')),
+    'HKD': (Decimal('7'), Decimal('14')),
+    'SEK': (Decimal('5'), Decimal('10')),
+    'NOK': (Decimal('5'), Decimal('10')),
+    'DKK': (Decimal('8'), Decimal('16')),
+    'PLN': (Decimal('14'), Decimal('28')),
+    'CZK': (Decimal('2'), Decimal('4')),
+    'HUF': (Decimal('0.3'), Decimal('0.6')),
+}
+
+
+class ComisionMoneda(models.Model):
+    """
+    Comisión fija, en PYG por unidad, que se suma (compra) o resta (venta)
+    a la tasa de la moneda al cotizar.
+
+    Reemplaza al antiguo ``static/comisiones.json``. Los cambios invalidan el
+    snapshot de precios de todos los workers (ver ``monedas.signals``).
+    """
+
+    moneda = models.OneToOneField(Moneda, on_delete=models.CASCADE, related_name='comision',
+                                  primary_key=True)
+    compra = models.DecimalField('Comisión compra', max_digits=12, decimal_places=4, default=0,
+                                 validators=[MinValueValidator(0)])
+    venta = models.DecimalField('Comisión venta', max_digits=12, decimal_places=4, default=0,
+                                validators=[MinValueValidator(0)])
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['moneda__codigo']
+        verbose_name = 'Comisión por moneda'
+        verbose_name_plural = 'Comisiones por moneda'
+
+    def clean(self):
+        """No se cargan comisiones para la moneda base."""
+        if self.moneda_id and self.moneda.es_base:
+            raise ValidationError('La moneda base (PYG) no tiene comisión de cambio.')
+
+    def __str__(self):
+        return f'{self.moneda.codigo}: compra {self.compra} / venta {self.venta}'
@@ -0,0 +1,304 @@
+"""
+Servicios de la app 'monedas'.
+
+- indice_comisiones: comisiones por código de moneda, cacheadas por versión.
+- importar_tasas / leer_feed_tasas: carga masiva de cotizaciones históricas.
+- recalcular_variaciones: corrige tasa_previa y variación en un solo UPDATE.
+"""
+import csv
+import io
+import json
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from commons.versiones import COMISIONES, TASAS, notificar_cambio, obtener_version
+from .models import COMISIONES_POR_DEFECTO, VARIACION_MAX, ComisionMoneda, Moneda, TasaCambio, variacion_porcentual
+
+
+def _cargar_indice_comisiones():
+    # Sin fila propia rige la comisión por defecto del código: así una moneda
+    # dada de alta después de la migración 0004 no cotiza con comisión cero
+    indice = {}
+    filas = Moneda.objects.all_with_inactive().filter(es_base=False).values_list(
+        'codigo', 'comision__compra', 'comision__venta'
+    )
+    for codigo, compra, venta in filas:
+        if compra is not None:
+            indice[codigo] = (compra, venta)
+        elif codigo in COMISIONES_POR_DEFECTO:
+            indice[codigo] = COMISIONES_POR_DEFECTO[codigo]
+    return indice
+
+
+def indice_comisiones():
+    """
+    Devuelve ``{codigo: (compra, venta)}`` con las comisiones por moneda:
+    la de su ComisionMoneda o, si no tiene, la de ``COMISIONES_POR_DEFECTO``.
+
+    El índice se guarda en el cache compartido bajo la versión actual de
+    comisiones: al editar una ComisionMoneda la versión cambia y el próximo
+    lector (de cualquier worker) lo recarga con una sola consulta. Las altas
+    y cambios de Moneda también cambian esa versión (ver ``monedas.signals``).
+
+    :return: Diccionario de comisiones (Decimal) por código ISO
+    :rtype: dict
+    """
+    clave = f'comisiones:indice:{obtener_version(COMISIONES)}'
+    indice = cache.get(clave)
+    if indice is None:
+        indice = _cargar_indice_comisiones()
+        cache.set(clave, indice, timeout=None)
+    return indice
+
+
+def comision_para(codigo):
+    """Comisión ``(compra, venta)`` de una moneda; cero si no está configurada ni tiene valor por defecto."""
+    return indice_comisiones().get(codigo, (Decimal('0'), Decimal('0')))
+
+
+@dataclass
+class ResultadoImportacion:
+    """
+    Resumen de una importación de tasas.
+
+    Attributes:
+        leidas (int): Filas recibidas.
+        insertadas (int): Tasas nuevas guardadas.
+        duplicadas (int): Filas válidas omitidas por ya existir (moneda, ts_fuente, fuente).
+        errores (list[str]): Mensajes de las filas rechazadas.
+    """
+    leidas: int = 0
+    insertadas: int = 0
+    duplicadas: int = 0
+    errores: list = field(default_factory=list)
+
+
+def _parse_ts(valor):
+    """Acepta fecha (``YYYY-MM-DD``) o fecha-hora ISO; devuelve datetime aware."""
+    valor = str(valor or '').strip()
+    ts = None
+    d = parse_date(valor)
+    if d is not None:
+        ts = datetime.combine(d, time.min)
+    else:
+        ts = parse_datetime(valor)
+    if ts is None:
+        raise ValueError
+    if timezone.is_naive(ts):
+        ts = timezone.make_aware(ts)
+    return ts
+
+
+def leer_feed_tasas(contenido, formato):
+    """
+    Convierte un feed CSV o JSON en una lista de diccionarios.
+
+    CSV: encabezado con columnas ``moneda,compra,venta,ts`` y opcional ``fuente``.
+    JSON: lista de objetos con las mismas claves, o ``{"tasas": [...]}``.
+
+    :param contenido: Texto del feed
+    :param formato: ``'csv'`` o ``'json'``
+    :rtype: list[dict]
+    """
+    if formato == 'csv':
+        return list(csv.DictReader(io.StringIO(contenido)))
+    if formato == 'json':
+        data = json.loads(contenido)
+        if isinstance(data, dict):
+            data = data.get('tasas', [])
+        if not isinstance(data, list):
+            raise ValueError('se esperaba una lista de tasas')
+        return data
+    raise ValueError(f'Formato no soportado: {formato}')
+
+
+# Lo que no entra en las columnas de TasaCambio haría fallar el bulk_create entero
+_COMPRA = TasaCambio._meta.get_field('compra')
+TASA_MAX = Decimal(10) ** (_COMPRA.max_digits - _COMPRA.decimal_places)
+FUENTE_MAX = TasaCambio._meta.get_field('fuente').max_length
+
+
+def _normalizar_filas(filas, fuente, monedas, resultado):
+    """Valida las filas y las agrupa por moneda: ``{moneda: {(ts, fuente): (compra, venta)}}``."""
+    series = defaultdict(dict)
+    for n, fila in enumerate(filas, start=1):
+        if not isinstance(fila, dict):
+            resultado.errores.append(f'Fila {n}: se esperaba un objeto con moneda, compra, venta y ts.')
+            continue
+        codigo = str(fila.get('moneda') or '').strip().upper()
+        moneda = monedas.get(codigo)
+        if moneda is None:
+            resultado.errores.append(f'Fila {n}: moneda "{codigo}" no encontrada.')
+            continue
+        if moneda.es_base:
+            resultado.errores.append(f'Fila {n}: no se cargan tasas para la moneda base.')
+            continue
+        try:
+            compra = Decimal(str(fila.get('compra')).strip())
+            venta = Decimal(str(fila.get('venta')).strip())
+            ts = _parse_ts(fila.get('ts'))
+            if not (compra.is_finite() and venta.is_finite()):
+                raise ValueError
+        except (InvalidOperation, ValueError, TypeError):
+            resultado.errores.append(f'Fila {n}: compra, venta o ts inválidos.')
+            continue
+        if compra <= 0 or venta < compra:
+            resultado.errores.append(f'Fila {n}: se requiere 0 < compra <= venta.')
+            continue
+        if venta >= TASA_MAX:
+            resultado.errores.append(f'Fila {n}: compra y venta deben ser menores a {TASA_MAX}.')
+            continue
+        fuente_fila = str(fila.get('fuente') or fuente).strip()
+        if len(fuente_fila) > FUENTE_MAX:
+            resultado.errores.append(f'Fila {n}: la fuente supera los {FUENTE_MAX} caracteres.')
+            continue
+        clave = (ts, fuente_fila)
+        if clave in series[moneda]:
+            resultado.duplicadas += 1
+        series[moneda][clave] = (compra, venta)
+    return series
+
+
+_SQL_RECALCULAR = """
+    UPDATE {tabla} AS t
+    SET tasa_previa_id = s.previa_id, variacion = s.variacion
+    FROM (
+        SELECT id, ts, previa_id,
+               CASE WHEN compra_previa > 0
+                    THEN GREATEST(LEAST(ROUND((compra - compra_previa) * 100 / compra_previa, 2),
+                                        %(max)s), -%(max)s)
+                    ELSE 0 END AS variacion
+        FROM (
+            SELECT id, compra, COALESCE(ts_fuente, fecha_creacion) AS ts,
+                   LAG(id) OVER w AS previa_id, LAG(compra) OVER w AS compra_previa
+            FROM {tabla}
+            {filtro_monedas}
+            WINDOW w AS (PARTITION BY moneda_id ORDER BY COALESCE(ts_fuente, fecha_creacion), id)
+        ) AS serie
+    ) AS s
+    WHERE t.id = s.id
+      {filtro_fechas}
+      AND (t.tasa_previa_id IS DISTINCT FROM s.previa_id OR t.variacion <> s.variacion)
+"""
+
+
+def recalcular_variaciones(monedas_ids=None, desde=None, hasta=None):
+    """
+    Recalcula ``tasa_previa`` y ``variacion`` con un único UPDATE basado en
+    ``LAG() OVER (PARTITION BY moneda ORDER BY ts)``.
+
+    La serie se ordena por ``ts_fuente`` (o ``fecha_creacion`` si falta) y la
+    ventana recorre todo el historial de cada moneda, de modo que la primera
+    tasa del rango se compara contra su anterior real aunque quede afuera.
+    Solo se escriben las filas cuyo valor cambia.
+
+    :param monedas_ids: Monedas a recalcular; ``None`` para todas
+    :param desde: Fecha-hora inicial (inclusiva) de las tasas a corregir
+    :param hasta: Fecha-hora final (exclusiva)
+    :return: Cantidad de tasas modificadas
+    :rtype: int
+    """
+    params = {'max': VARIACION_MAX, 'monedas': list(monedas_ids or []), 'desde': desde, 'hasta': hasta}
+    filtro_fechas = ''
+    if desde is not None:
+        filtro_fechas += 'AND s.ts >= %(desde)s '
+    if hasta is not None:
+        filtro_fechas += 'AND s.ts < %(hasta)s '
+    sql = _SQL_RECALCULAR.format(
+        tabla=TasaCambio._meta.db_table,
+        filtro_monedas='WHERE moneda_id = ANY(%(monedas)s)' if monedas_ids is not None else '',
+        filtro_fechas=filtro_fechas,
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        modificadas = cursor.rowcount
+        if modificadas:
+            notificar_cambio(TASAS)
+    return modificadas
+
+
+def activar_tasas_recientes(monedas_ids):
+    """
+    Deja activa únicamente la tasa más reciente (por ``ts_fuente`` o, si falta,
+    ``fecha_creacion``) de cada moneda indicada.
+
+    Son dos UPDATE en lugar de uno porque PostgreSQL verifica
+    ``uniq_tasa_activa_por_moneda`` fila a fila: activar antes de desactivar
+    violaría el índice parcial aunque el estado final sea válido.
+    """
+    recientes = (
+        TasaCambio.objects.filter(moneda_id__in=monedas_ids)
+        .annotate(ts_efectivo=Coalesce('ts_fuente', 'fecha_creacion'))
+        .order_by('moneda_id', F('ts_efectivo').desc(), '-id')
+        .distinct('moneda_id')
+        .values_list('id', flat=True)
+    )
+    with transaction.atomic():
+        ids = list(recientes)
+        (TasaCambio.objects.filter(moneda_id__in=monedas_ids, activa=True)
+         .exclude(id__in=ids).update(activa=False))
+        TasaCambio.objects.filter(id__in=ids, activa=False).update(activa=True)
+
+
+def importar_tasas(filas, fuente='', lote=1000):
+    """
+    Carga masiva de cotizaciones sin pasar por ``TasaCambio.save()``.
+
+    - Valida cada fila; las inválidas se reportan y no detienen la carga.
+    - Ordena la serie de cada moneda por ``ts`` y calcula ``variacion`` en
+      memoria.
+    - Inserta con ``bulk_create`` en lotes de ``lote`` filas; los duplicados
+      (``uniq_tasa_moneda_ts_fuente``) se omiten en la base.
+    - Enlaza ``tasa_previa`` (y corrige la variación de la primera tasa de la
+      serie y de las posteriores ya existentes) con ``recalcular_variaciones``.
+    - Activa solo la tasa más reciente de cada moneda afectada.
+
+    Las tasas se marcan ``es_automatica=True``. Como ``bulk_create`` no emite
+    señales, al final se notifica el cambio de versión de tasas.
+
+    :param filas: Iterable de dicts con ``moneda``, ``compra``, ``venta``, ``ts`` y opcional ``fuente``
+    :param fuente: Fuente por defecto para filas sin ``fuente``
+    :param lote: Tamaño de cada ``bulk_create``
+    :rtype: ResultadoImportacion
+    """
+    filas = list(filas)
+    resultado = ResultadoImportacion(leidas=len(filas))
+    monedas = {m.codigo: m for m in Moneda.objects.all_with_inactive()}
+    series = _normalizar_filas(filas, fuente, monedas, resultado)
+    if not series:
+        return resultado
+
+    nuevas = []
+    for moneda, serie in series.items():
+        claves = sorted(serie, key=lambda k: k[0])
+        previa = None
+        for ts, fuente_fila in claves:
+            compra, venta = serie[(ts, fuente_fila)]
+            nuevas.append(TasaCambio(
+                moneda=moneda, compra=compra, venta=venta, base_codigo='PYG',
+                fuente=fuente_fila, ts_fuente=ts, variacion=variacion_porcentual(compra, previa),
+                activa=False, es_automatica=True,
+            ))
+            previa = compra
+
+    monedas_ids = [m.id for m in series]
+    with transaction.atomic():
+        antes = TasaCambio.objects.filter(moneda_id__in=monedas_ids).count()
+        for i in range(0, len(nuevas), lote):
+            TasaCambio.objects.bulk_create(nuevas[i:i + lote], ignore_conflicts=True)
+        resultado.insertadas = TasaCambio.objects.filter(moneda_id__in=monedas_ids).count() - antes
+        resultado.duplicadas += len(nuevas) - resultado.insertadas
+        desde = min(t.ts_fuente for t in nuevas)
+        recalcular_variaciones(monedas_ids, desde=desde)
+        activar_tasas_recientes(monedas_ids)
+        notificar_cambio(TASAS)
+    return resultado
@@ -0,0 +1,32 @@
+"""
+Señales de la app 'monedas'.
+
+Cada alta, edición, activación o borrado de una TasaCambio incrementa la
+versión global de tasas (``commons.versiones.TASAS``) para invalidar las
+cachés que dependen de ella (snapshot de precios, tableros de cotizaciones).
+Los cambios de Moneda también la incrementan, porque los tableros muestran
+su nombre y solo listan monedas activas. Lo mismo ocurre con ComisionMoneda y la versión
+``commons.versiones.COMISIONES``, que también cambia con las monedas: una
+moneda nueva sin comisión propia cotiza con la de ``COMISIONES_POR_DEFECTO``.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from commons.versiones import COMISIONES, TASAS, notificar_cambio
+from .models import ComisionMoneda, Moneda, TasaCambio
+
+
+@receiver(post_save, sender=TasaCambio, dispatch_uid="tasacambio_version_save")
+@receiver(post_delete, sender=TasaCambio, dispatch_uid="tasacambio_version_delete")
+@receiver(post_save, sender=Moneda, dispatch_uid="moneda_version_save")
+@receiver(post_delete, sender=Moneda, dispatch_uid="moneda_version_delete")
+def tasa_cambio_modificada(sender, **kwargs):
+    notificar_cambio(TASAS)
+
+
+@receiver(post_save, sender=ComisionMoneda, dispatch_uid="comisionmoneda_version_save")
+@receiver(post_delete, sender=ComisionMoneda, dispatch_uid="comisionmoneda_version_delete")
+@receiver(post_save, sender=Moneda, dispatch_uid="moneda_comisiones_save")
+@receiver(post_delete, sender=Moneda, dispatch_uid="moneda_comisiones_delete")
+def comision_moneda_modificada(sender, **kwargs):
+    notificar_cambio(COMISIONES)
@@ -1,8 +1,21 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client, override_settings
+from asgiref.sync import sync_to_async
+import asyncio
+import json
 from django.urls import reverse
 from django.utils import timezone
-from .models import Moneda, TasaCambio
+from django.core.cache import cache
+from .models import ComisionMoneda, Moneda, TasaCambio
+from .services import importar_tasas, indice_comisiones, leer_feed_tasas
+from .eventos import calcular_delta, flujo_tasas, publicador
+from . import memoria_compartida
+from commons.versiones import TASAS, obtener_version
+from django.core.management import call_command
+import os
+import tempfile
+from io import StringIO
 from decimal import Decimal
+from unittest import mock
 
 class MonedaModelTest(TestCase):
     """Pruebas unitarias para el modelo Moneda."""
@@ -48,6 +61,29 @@ class TasaCambioModelTest(TestCase):
             activa=True
         )
         self.assertAlmostEqual(tasa2.variacion, Decimal('1.43'), places=2)
+        self.assertEqual(tasa2.tasa_previa, self.tasa1)
+
+    def test_recalcular_variaciones(self):
+        tasa2 = TasaCambio.objects.create(moneda=self.moneda_usd, compra=7100, venta=7300)
+        # Tasa retroactiva: queda entre tasa1 y tasa2 en la serie.
+        intermedia = TasaCambio.objects.create(
+            moneda=self.moneda_usd, compra=7050, venta=7250, activa=False,
+            ts_fuente=self.tasa1.fecha_creacion + timezone.timedelta(microseconds=1),
+        )
+        TasaCambio.objects.filter(pk=self.tasa1.pk).update(variacion=Decimal('9.99'))
+
+        out = StringIO()
+        call_command('recalcular_variaciones', '--moneda', 'USD', stdout=out)
+        self.assertIn('3 tasas actualizadas', out.getvalue())
+
+        for t in (self.tasa1, tasa2, intermedia):
+            t.refresh_from_db()
+        self.assertEqual((self.tasa1.tasa_previa, self.tasa1.variacion), (None, Decimal('0.00')))
+        self.assertEqual((intermedia.tasa_previa, intermedia.variacion), (self.tasa1, Decimal('0.71')))
+        self.assertEqual((tasa2.tasa_previa, tasa2.variacion), (intermedia, Decimal('0.71')))
+
+        call_command('recalcular_variaciones', stdout=out)
+        self.assertIn('0 tasas actualizadas', out.getvalue())
 
 class MonedaViewsTest(TestCase):
     """Pruebas de vistas para la app monedas."""
@@ -151,3 +187,356 @@ class TasaCambioViewsTest(TestCase):
         response = self.client.get(reverse('monedas:tasas_comisiones_json'))
         self.assertEqual(response.status_code, 200)
         self.assertIn('tasas', response.json())
+
+
+class ComisionMonedaTest(TestCase):
+    """Pruebas de la comisión por moneda y su índice cacheado."""
+
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        cache.clear()
+        self.user = get_user_model().objects.create_user(email="test@comisiones.com", password="testpass123")
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.moneda_usd = Moneda.objects.create(codigo='USD', nombre='Dólar')
+        ComisionMoneda.objects.create(moneda=self.moneda_usd, compra=Decimal('50'), venta=Decimal('100'))
+
+    def test_indice_por_codigo(self):
+        self.assertEqual(indice_comisiones()['USD'], (Decimal('50'), Decimal('100')))
+
+    def test_indice_cacheado(self):
+        indice_comisiones()
+        with self.assertNumQueries(0):
+            indice_comisiones()
+
+    def test_comisiones_json_endpoint(self):
+        response = Client().get(reverse('monedas:comisiones_json'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['comisiones'],
+                         [{'currency': 'USD', 'commission_buy': 50.0, 'commission_sell': 100.0}])
+
+    def test_editar_comision_invalida_indice(self):
+        indice_comisiones()
+        response = self.client.post(reverse('monedas:comision_moneda_edit', args=[self.moneda_usd.id]),
+                                    {'compra': '55', 'venta': '110'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(indice_comisiones()['USD'], (Decimal('55'), Decimal('110')))
+
+    def test_moneda_nueva_sin_comision_usa_la_por_defecto(self):
+        indice_comisiones()
+        Moneda.objects.create(codigo='EUR', nombre='Euro')
+        Moneda.objects.create(codigo='XAU', nombre='Oro')
+        indice = indice_comisiones()
+        self.assertEqual(indice['EUR'], (Decimal('60'), Decimal('120')))
+        self.assertNotIn('XAU', indice)
+        response = self.client.get(reverse('monedas:monedas_list'))
+        self.assertContains(response, '60 / 120')
+
+
+class CotizacionesJsonTest(TestCase):
+    """Pruebas de filtros, paginación y GET condicional de cotizaciones_json."""
+
+    def setUp(self):
+        cache.clear()
+        self.usd = Moneda.objects.create(codigo='USD', nombre='Dólar')
+        self.eur = Moneda.objects.create(codigo='EUR', nombre='Euro')
+        for i in range(3):
+            TasaCambio.objects.create(moneda=self.usd, compra=7000 + i, venta=7200 + i)
+        TasaCambio.objects.create(moneda=self.eur, compra=8000, venta=8200)
+        self.url = reverse('monedas:cotizaciones_json')
+
+    def test_solo_activas(self):
+        data = self.client.get(self.url, {'activas': '1'}).json()
+        self.assertEqual(sorted(c['moneda'] for c in data['cotizaciones']), ['EUR', 'USD'])
+        self.assertTrue(all(c['activa'] for c in data['cotizaciones']))
+        # La variación también: el sondeo de cotizaciones_stream.js arma con esto sus deltas
+        usd = next(c for c in data['cotizaciones'] if c['moneda'] == 'USD')
+        self.assertAlmostEqual(usd['variacion'], 0.01, places=2)
+
+    def test_filtro_por_moneda(self):
+        data = self.client.get(self.url, {'moneda': 'usd'}).json()
+        self.assertEqual(len(data['cotizaciones']), 3)
+
+    def test_filtro_por_fecha(self):
+        manana = (timezone.localdate() + timezone.timedelta(days=1)).isoformat()
+        self.assertEqual(len(self.client.get(self.url, {'desde': manana}).json()['cotizaciones']), 0)
+        hoy = timezone.localdate().isoformat()
+        self.assertEqual(len(self.client.get(self.url, {'hasta': hoy}).json()['cotizaciones']), 4)
+
+    def test_paginacion_por_cursor(self):
+        vistos = []
+        params = {'limite': 3}
+        while True:
+            data = self.client.get(self.url, params).json()
+            vistos += [c['id'] for c in data['cotizaciones']]
+            if not data['siguiente']:
+                break
+            params['cursor'] = data['siguiente']
+        esperados = list(TasaCambio.objects.order_by('-fecha_creacion', '-id').values_list('id', flat=True))
+        self.assertEqual(vistos, esperados)
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.client.get(self.url, {'desde': 'ayer'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'cursor': 'xx'}).status_code, 400)
+
+    def test_get_condicional(self):
+        response = self.client.get(self.url, {'activas': '1'})
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {'activas': '1'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        TasaCambio.objects.create(moneda=self.eur, compra=8100, venta=8300)
+        response = self.client.get(self.url, {'activas': '1'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class ImportarTasasTest(TestCase):
+    """Pruebas de la carga masiva de tasas (servicio y comando)."""
+
+    def setUp(self):
+        self.usd = Moneda.objects.create(codigo='USD', nombre='Dólar')
+        self.filas = [
+            {'moneda': 'usd', 'compra': '7100', 'venta': '7300', 'ts': '2024-01-03'},
+            {'moneda': 'USD', 'compra': '7000', 'venta': '7200', 'ts': '2024-01-01'},
+            {'moneda': 'USD', 'compra': '7070', 'venta': '7250', 'ts': '2024-01-02'},
+        ]
+
+    def test_variacion_y_activacion(self):
+        version = obtener_version(TASAS)
+        resultado = importar_tasas(self.filas, fuente='BCP')
+        self.assertEqual((resultado.insertadas, resultado.duplicadas, resultado.errores), (3, 0, []))
+
+        tasas = list(TasaCambio.objects.filter(moneda=self.usd).order_by('ts_fuente'))
+        self.assertEqual([t.variacion for t in tasas], [Decimal('0.00'), Decimal('1.00'), Decimal('0.42')])
+        self.assertEqual([t.activa for t in tasas], [False, False, True])
+        self.assertNotEqual(obtener_version(TASAS), version)
+
+    def test_reimportar_omite_duplicados(self):
+        importar_tasas(self.filas, fuente='BCP')
+        resultado = importar_tasas(self.filas, fuente='BCP')
+        self.assertEqual((resultado.insertadas, resultado.duplicadas), (0, 3))
+        self.assertEqual(TasaCambio.objects.filter(moneda=self.usd).count(), 3)
+
+    def test_historia_no_desactiva_tasa_mas_reciente(self):
+        actual = TasaCambio.objects.create(moneda=self.usd, compra=7400, venta=7600)
+        importar_tasas(self.filas, fuente='BCP')
+        actual.refresh_from_db()
+        self.assertTrue(actual.activa)
+        self.assertEqual(TasaCambio.objects.filter(moneda=self.usd, activa=True).count(), 1)
+
+    def test_filas_invalidas(self):
+        resultado = importar_tasas([
+            {'moneda': 'XXX', 'compra': '1', 'venta': '2', 'ts': '2024-01-01'},
+            {'moneda': 'USD', 'compra': '10', 'venta': '5', 'ts': '2024-01-01'},
+            {'moneda': 'USD', 'compra': 'abc', 'venta': '5', 'ts': '2024-01-01'},
+        ])
+        self.assertEqual(resultado.insertadas, 0)
+        self.assertEqual(len(resultado.errores), 3)
+
+    def test_json_malformado_son_errores_por_fila(self):
+        filas = leer_feed_tasas(json.dumps([
+            ['USD', 7000, 7200],
+            'USD',
+            {'moneda': 'USD', 'compra': 7000, 'venta': 7200, 'ts': 1700000000},
+            {'moneda': 'USD', 'compra': 'NaN', 'venta': 'NaN', 'ts': '2024-01-01'},
+            {'moneda': 'USD', 'compra': '7000', 'venta': 'Infinity', 'ts': '2024-01-01'},
+            {'moneda': 'USD', 'compra': '1e12', 'venta': '1e12', 'ts': '2024-01-01'},
+            {'moneda': 'USD', 'compra': 7000, 'venta': 7200, 'ts': '2024-01-01', 'fuente': 12345},
+            {'moneda': 'USD', 'compra': 7000, 'venta': 7200, 'ts': '2024-01-02', 'fuente': 'x' * 121},
+        ]), 'json')
+        resultado = importar_tasas(filas, fuente='BCP')
+        self.assertEqual(resultado.insertadas, 1)
+        self.assertEqual([e.split(':')[0] for e in resultado.errores],
+                         ['Fila 1', 'Fila 2', 'Fila 3', 'Fila 4', 'Fila 5', 'Fila 6', 'Fila 8'])
+        self.assertEqual(TasaCambio.objects.get(moneda=self.usd).fuente, '12345')
+        with self.assertRaises(ValueError):
+            leer_feed_tasas('42', 'json')
+
+    def test_comando_csv(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('moneda,compra,venta,ts\nUSD,7000,7200,2024-01-01\nUSD,7100,7300,2024-01-02T10:00:00\n')
+        self.addCleanup(os.unlink, f.name)
+        out = StringIO()
+        call_command('importar_tasas', f.name, '--fuente', 'BCP', stdout=out)
+        self.assertIn('2 insertadas', out.getvalue())
+        self.assertEqual(TasaCambio.objects.get(moneda=self.usd, activa=True).compra, Decimal('7100'))
+
+
+class TableroTasasCacheTest(TestCase):
+    """El tablero de tasas de la landing y del dashboard se cachea por versión de tasas."""
+
+    def setUp(self):
+        cache.clear()
+        self.usd = Moneda.objects.create(codigo='USD', nombre='Dólar')
+        TasaCambio.objects.create(moneda=self.usd, compra=7000, venta=7200)
+
+    def test_landing_anonima_sin_consultas(self):
+        self.client.get('/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/')
+        self.assertContains(response, '7000')
+
+        TasaCambio.objects.create(moneda=self.usd, compra=7100, venta=7300)
+        response = self.client.get('/')
+        self.assertContains(response, '7100')
+        self.assertNotContains(response, '7000')
+
+    def test_dashboard_invalida_al_cambiar_tasas(self):
+        from usuarios.models import User
+        self.client.force_login(User.objects.create_user(email='dash@example.com', password='x'))
+        self.assertContains(self.client.get(reverse('usuarios:dashboard')), '7200')
+
+        TasaCambio.objects.create(moneda=self.usd, compra=7100, venta=7350)
+        self.assertContains(self.client.get(reverse('usuarios:dashboard')), '7350')
+
+        self.usd.nombre = 'Dólar estadounidense'
+        self.usd.save()
+        self.assertContains(self.client.get(reverse('usuarios:dashboard')), 'Dólar estadounidense')
+
+
+@override_settings(SSE_INTERVALO_SONDEO=0.01)
+class CotizacionesStreamTest(TestCase):
+    """Pruebas del canal SSE de tasas activas."""
+
+    def setUp(self):
+        cache.clear()
+        self.usd = Moneda.objects.create(codigo='USD', nombre='Dólar')
+        self.eur = Moneda.objects.create(codigo='EUR', nombre='Euro')
+        TasaCambio.objects.create(moneda=self.usd, compra=7000, venta=7200)
+        self.url = reverse('monedas:cotizaciones_stream')
+
+    def test_calcular_delta(self):
+        usd = {'moneda': 'USD', 'compra': '1', 'venta': '2', 'variacion': '0'}
+        eur = {'moneda': 'EUR', 'compra': '3', 'venta': '4', 'variacion': '0'}
+        cambios, bajas = calcular_delta({'USD': usd, 'EUR': eur}, {'USD': {**usd, 'compra': '1.5'}})
+        self.assertEqual([c['moneda'] for c in cambios], ['USD'])
+        self.assertEqual(bajas, ['EUR'])
+
+    def test_wsgi_responde_204(self):
+        self.assertEqual(self.client.get(self.url).status_code, 204)
+
+    @staticmethod
+    def _datos(chunk):
+        texto = chunk.decode() if isinstance(chunk, bytes) else chunk
+        linea = next(l for l in texto.splitlines() if l.startswith('data: '))
+        return json.loads(linea[len('data: '):])
+
+    async def test_estado_inicial_y_delta(self):
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        flujo = aiter(response.streaming_content)
+
+        inicial = self._datos(await anext(flujo))
+        self.assertEqual([t['moneda'] for t in inicial['tasas']], ['USD'])
+        self.assertEqual(publicador.clientes, 1)
+
+        await sync_to_async(TasaCambio.objects.create)(moneda=self.eur, compra=8000, venta=8200)
+        delta = self._datos(await asyncio.wait_for(anext(flujo), timeout=5))
+        self.assertEqual([t['moneda'] for t in delta['tasas']], ['EUR'])
+        self.assertEqual(delta['tasas'][0]['venta'], '8200.00')
+        self.assertEqual(delta['bajas'], [])
+        self.assertGreaterEqual(publicador.metricas()['eventos'], 1)
+        self.assertIsNotNone(publicador.metricas()['latencia_ms_p50'])
+
+    async def test_desuscribe_al_cerrar(self):
+        flujo = flujo_tasas()
+        await anext(flujo)
+        self.assertEqual(publicador.clientes, 1)
+        await flujo.aclose()
+        self.assertEqual(publicador.clientes, 0)
+
+    async def test_conexiones_simultaneas_un_solo_sondeo(self):
+        with mock.patch('monedas.eventos.asyncio.create_task', wraps=asyncio.create_task) as crear:
+            suscripciones = await asyncio.gather(*(publicador.suscribir() for _ in range(3)))
+        self.assertEqual(crear.call_count, 1)
+        self.assertEqual(publicador.clientes, 3)
+        for cola, inicial in suscripciones:
+            self.assertEqual([t['moneda'] for t in self._datos(inicial)['tasas']], ['USD'])
+            publicador.desuscribir(cola)
+
+
+class MemoriaCompartidaTest(TransactionTestCase):
+    """Publicación y lectura de las tasas activas en el archivo compartido."""
+
+    def setUp(self):
+        cache.clear()
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.ruta = os.path.join(directorio.name, 'tasas.bin')
+        ajustes = override_settings(TASAS_MMAP_RUTA=self.ruta)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        self.usd = Moneda.objects.create(codigo='USD', nombre='Dólar')
+        self.eur = Moneda.objects.create(codigo='EUR', nombre='Euro')
+        TasaCambio.objects.create(moneda=self.usd, compra=Decimal('7000.50'), venta=7200)
+        TasaCambio.objects.create(moneda=self.eur, compra=8000, venta=8200)
+
+    def test_publicar_y_leer(self):
+        version = obtener_version(TASAS)
+        tasas = memoria_compartida.tasas_compartidas(version)
+        self.assertEqual(tasas[self.usd.id].codigo, 'USD')
+        self.assertEqual(tasas[self.usd.id].compra, Decimal('7000.50'))
+        self.assertEqual(tasas[self.eur.id].venta, Decimal('8200.00'))
+
+        # Otro worker: mapea el mismo archivo y lee la misma versión sin consultar la base.
+        otro = memoria_compartida.LectorTasas(self.ruta, 8)
+        self.addCleanup(otro.cerrar)
+        with self.assertNumQueries(0):
+            self.assertEqual(otro.leer(), (version, tasas))
+            self.assertIs(otro.leer(), otro.leer())
+            memoria_compartida.publicar_tasas(version)
+
+    def test_republica_al_cambiar_version(self):
+        memoria_compartida.tasas_compartidas(obtener_version(TASAS))
+        TasaCambio.objects.create(moneda=self.usd, compra=7100, venta=7300)
+        version = obtener_version(TASAS)
+        tasas = memoria_compartida.tasas_compartidas(version)
+        self.assertEqual(tasas[self.usd.id].compra, Decimal('7100.00'))
+        self.assertEqual(memoria_compartida.lector().leer()[0], version)
+
+    def test_dentro_de_transaccion_no_publica(self):
+        from django.db import transaction
+        with transaction.atomic():
+            self.assertIsNone(memoria_compartida.tasas_compartidas(obtener_version(TASAS)))
+        self.assertIsNone(memoria_compartida.lector().leer()[0])
+
+    def test_escritor_interrumpido(self):
+        version = obtener_version(TASAS)
+        memoria_compartida.tasas_compartidas(version)
+        otro = memoria_compartida.LectorTasas(self.ruta, 8)
+        self.addCleanup(otro.cerrar)
+
+        # Murió con la secuencia impar: el lector se rinde en lugar de colgarse
+        fd, mm = memoria_compartida._abrir(self.ruta, 8)
+        self.addCleanup(os.close, fd)
+        self.addCleanup(mm.close)
+        secuencia = memoria_compartida._SECUENCIA.unpack_from(mm, 8)[0]
+        memoria_compartida._SECUENCIA.pack_into(mm, 8, secuencia + 1)
+        self.assertIsNone(otro.leer())
+        # ...y la próxima lectura fuera de una transacción republica
+        self.assertEqual(memoria_compartida.tasas_compartidas(version)[self.eur.id].codigo, 'EUR')
+        self.assertEqual(otro.leer()[0], version)
+
+        # Cantidad corrupta con secuencia par: se acota a la capacidad
+        magia, formato, _, secuencia, _, _, capacidad = memoria_compartida._CABECERA.unpack_from(mm, 0)
+        memoria_compartida._CABECERA.pack_into(mm, 0, magia, formato, 0, secuencia + 2, version, 10 ** 6, capacidad)
+        self.assertEqual(otro.leer()[0], version)
+
+    def test_escritura_fallida_deja_secuencia_par(self):
+        fd, mm = memoria_compartida._abrir(self.ruta, 8)
+        self.addCleanup(os.close, fd)
+        self.addCleanup(mm.close)
+        with self.assertRaises(UnicodeEncodeError):
+            memoria_compartida._escribir(mm, 5, [(1, 1, 'ÑÑÑ', 1, 1, 0)])
+        _, _, _, secuencia, version, cantidad, _ = memoria_compartida._CABECERA.unpack_from(mm, 0)
+        self.assertEqual((secuencia % 2, version, cantidad), (0, 0, 0))
+        self.assertEqual(memoria_compartida.LectorTasas(self.ruta, 8).leer(), (None, {}))
+
+    @override_settings(TASAS_MMAP_CAPACIDAD=1)
+    def test_capacidad_excedida(self):
+        self.assertIsNone(memoria_compartida.tasas_compartidas(obtener_version(TASAS)))
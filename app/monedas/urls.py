@@ -15,10 +15,14 @@ urlpatterns = [
     path('editar/<int:moneda_id>/', views.moneda_edit, name='moneda_edit'),
     path('eliminar/<int:moneda_id>/', views.moneda_delete, name='moneda_delete'),
     path('inactivas/', views.monedas_inactivas, name='monedas_inactivas'),
+    path('<int:moneda_id>/comision/', views.comision_moneda_edit, name='comision_moneda_edit'),
 
     # Tasas de cambio
     path('tasas_comisiones/', views.tasas_comisiones_json, name='tasas_comisiones_json'),
     path('cotizaciones_json/', views.cotizaciones_json, name='cotizaciones_json'),
+    path('comisiones_json/', views.comisiones_json, name='comisiones_json'),
+    path('cotizaciones_stream/', views.cotizaciones_stream, name='cotizaciones_stream'),
+    path('cotizaciones_stream/metricas/', views.cotizaciones_stream_metricas, name='cotizaciones_stream_metricas'),
     path('tasas/', views.tasas_list, name='tasas_list'),
     path('tasas/nueva/', views.tasa_create, name='tasa_create'),
     path('tasas/<int:tasa_id>/editar/', views.tasa_edit, name='tasa_edit'),
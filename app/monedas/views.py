@@ -4,8 +4,13 @@ Vistas (FBV) de la app 'monedas'.
 Incluye operaciones CRUD y gestión de tasas de cambio.
 
 Endpoints JSON:
-- cotizaciones_json: devuelve todas las cotizaciones de monedas.
+- cotizaciones_json: devuelve cotizaciones filtradas y paginadas (con ETag).
 - tasas_comisiones_json: devuelve tasas de descuento vigentes por tipo de cliente.
+- comisiones_json: devuelve las comisiones de compra/venta por moneda.
+
+Eventos:
+- cotizaciones_stream: canal SSE con las tasas activas (requiere ASGI).
+- cotizaciones_stream_metricas: clientes conectados y latencia del worker.
 
 CRUD Moneda:
 - monedas_list
@@ -13,6 +18,7 @@ CRUD Moneda:
 - moneda_edit
 - moneda_delete
 - monedas_inactivas
+- comision_moneda_edit
 
 CRUD TasaCambio:
 - tasas_list
@@ -22,49 +28,153 @@ CRUD TasaCambio:
 - tasa_marcar_activa
 """
 
+from datetime import datetime, time, timedelta, timezone as dt_timezone
 from decimal import Decimal
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, permission_required
+from django.core.handlers.asgi import ASGIRequest
 from django.db import transaction
 from django.shortcuts import render, get_object_or_404, redirect
-from .forms import MonedaForm, TasaCambioForm
-from .models import Moneda, TasaCambio
+from .forms import ComisionMonedaForm, MonedaForm, TasaCambioForm
+from .models import ComisionMoneda, Moneda, TasaCambio
+from .eventos import flujo_tasas, publicador
+from .services import comision_para, indice_comisiones
 from clientes.models import TasaComision
 from usuarios.decorators import role_required
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.core import serializers
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from commons.paginacion import paginar_por_clave
+from commons.versiones import TASAS, obtener_version
 
 # -----------------------------
 # Endpoints JSON
 # -----------------------------
+def _version_tasas_etag(request):
+    return f'cotizaciones-{obtener_version(TASAS)}'
+
+
+def _version_tasas_fecha(request):
+    return datetime.fromtimestamp(obtener_version(TASAS) / 1e9, tz=dt_timezone.utc)
+
+
+def _parse_fecha(valor, fin_de_dia=False):
+    """
+    Interpreta ``YYYY-MM-DD`` o un datetime ISO 8601.
+
+    Para fechas sin hora, ``fin_de_dia`` devuelve el inicio del día siguiente
+    (límite exclusivo), de modo que ``hasta=2025-01-31`` incluye todo ese día.
+    """
+    d = parse_date(valor)
+    if d is not None:
+        if fin_de_dia:
+            d += timedelta(days=1)
+        dt = datetime.combine(d, time.min)
+    else:
+        dt = parse_datetime(valor)
+        if dt is None:
+            raise ValueError(f'Fecha inválida: {valor}')
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return dt
+
+
+@condition(etag_func=_version_tasas_etag, last_modified_func=_version_tasas_fecha)
+@cache_control(no_cache=True)
 def cotizaciones_json(request):
-    from .models import TasaCambio
     """
-    Devuelve todas las cotizaciones registradas en formato JSON.
+    Devuelve las cotizaciones registradas en formato JSON, paginadas.
+
+    Parámetros GET (todos opcionales):
+
+    - ``activas=1``: solo las tasas activas (una por moneda).
+    - ``moneda``: código ISO; admite varios separados por coma (``USD,EUR``).
+    - ``desde`` / ``hasta``: rango sobre ``fecha_creacion`` (fecha o datetime
+      ISO 8601; ``hasta`` con solo fecha incluye el día completo).
+    - ``limite``: tamaño de página (por defecto y máximo
+      ``COTIZACIONES_PAGINA_MAX``).
+    - ``cursor``: valor de ``siguiente`` de la página anterior.
+
+    La paginación es por clave (``fecha_creacion``, ``id``) descendente, por lo
+    que el costo de cada página no depende de cuánta historia haya.
+
+    La respuesta lleva ETag y Last-Modified derivados de la versión global de
+    tasas: si no hubo cambios desde la última consulta se responde 304 sin
+    tocar la base.
 
     :param request: Objeto HttpRequest
     :type request: HttpRequest
-    :return: JsonResponse con las cotizaciones
+    :return: JsonResponse con ``cotizaciones`` y ``siguiente`` (cursor o null)
     :rtype: JsonResponse
     """
+    maximo = settings.COTIZACIONES_PAGINA_MAX
+    try:
+        qs = TasaCambio.objects.all()
+        if request.GET.get('activas') == '1':
+            qs = qs.filter(activa=True)
+        if request.GET.get('moneda'):
+            codigos = [c.strip().upper() for c in request.GET['moneda'].split(',') if c.strip()]
+            qs = qs.filter(moneda__codigo__in=codigos)
+        if request.GET.get('desde'):
+            qs = qs.filter(fecha_creacion__gte=_parse_fecha(request.GET['desde']))
+        if request.GET.get('hasta'):
+            qs = qs.filter(fecha_creacion__lt=_parse_fecha(request.GET['hasta'], fin_de_dia=True))
+        limite = min(max(int(request.GET.get('limite', maximo)), 1), maximo)
+        filas, siguiente = paginar_por_clave(
+            qs.values('id', 'moneda__codigo', 'base_codigo', 'compra', 'venta', 'variacion',
+                      'fecha_creacion', 'fuente', 'activa'),
+            'fecha_creacion', cursor=request.GET.get('cursor'), limite=limite,
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
     try:
-        cotizaciones = TasaCambio.objects.select_related('moneda').order_by('-fecha_creacion')
-        data = []
-        for tasa in cotizaciones:
-            data.append({
-                'id': tasa.id,
-                'moneda': tasa.moneda.codigo if tasa.moneda else None,
-                'base': getattr(tasa, 'base_codigo', 'PYG'),
-                'compra': float(tasa.compra) if tasa.compra else None,
-                'venta': float(tasa.venta) if tasa.venta else None,
-                'fecha': tasa.fecha_creacion.strftime('%Y-%m-%d %H:%M:%S') if tasa.fecha_creacion else None,
-                'fuente': tasa.fuente,
-            })
-        return JsonResponse({'cotizaciones': data})
+        data = [{
+            'id': f['id'],
+            'moneda': f['moneda__codigo'],
+            'base': f['base_codigo'] or 'PYG',
+            'compra': float(f['compra']) if f['compra'] else None,
+            'venta': float(f['venta']) if f['venta'] else None,
+            'variacion': float(f['variacion']),
+            'fecha': f['fecha_creacion'].strftime('%Y-%m-%d %H:%M:%S'),
+            'fuente': f['fuente'],
+            'activa': f['activa'],
+        } for f in filas]
+        return JsonResponse({'cotizaciones': data, 'siguiente': siguiente})
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
 
+async def cotizaciones_stream(request):
+    """
+    Canal Server-Sent Events con las tasas activas.
+
+    El primer evento trae todas las tasas activas y los siguientes solo los
+    cambios (ver ``monedas.eventos``). La consulta a la base la hace una sola
+    tarea por worker, sin importar cuántas pestañas estén conectadas.
+
+    Solo funciona bajo ASGI: con WSGI cada conexión retendría un hilo, así
+    que se responde 204, que le indica a EventSource que no reconecte;
+    ``cotizaciones_stream.js`` pasa entonces a sondear ``cotizaciones_json``.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    response = StreamingHttpResponse(flujo_tasas(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+def cotizaciones_stream_metricas(request):
+    """Clientes SSE conectados, eventos publicados y latencia de este worker."""
+    return JsonResponse(publicador.metricas())
+
+
 @login_required
 def tasas_comisiones_json(request):
     """
@@ -85,20 +195,42 @@ def tasas_comisiones_json(request):
     return JsonResponse({"tasas": tasas})
 
 
+def comisiones_json(request):
+    """
+    Devuelve las comisiones de compra/venta por moneda en JSON.
+
+    Es la misma fuente que usa el cotizador del servidor, servida desde el
+    índice cacheado (sin consultar la base mientras no cambien comisiones).
+
+    :param request: Objeto HttpRequest
+    :type request: HttpRequest
+    :return: JsonResponse con las comisiones por moneda
+    :rtype: JsonResponse
+    """
+    data = [
+        {'currency': codigo, 'commission_buy': float(compra), 'commission_sell': float(venta)}
+        for codigo, (compra, venta) in sorted(indice_comisiones().items())
+    ]
+    return JsonResponse({'comisiones': data})
+
+
 # -----------------------------
 # CRUD Moneda
 # -----------------------------
 @login_required
 def monedas_list(request):
     """
-    Listado de monedas activas ordenadas por base y código.
+    Listado de monedas activas ordenadas por base y código, con su comisión.
 
     :param request: Objeto HttpRequest
     :type request: HttpRequest
     :return: Renderizado de template con contexto de monedas
     :rtype: HttpResponse
     """
-    monedas = Moneda.objects.all().order_by('-es_base', 'codigo')
+    monedas = list(Moneda.objects.order_by('-es_base', 'codigo'))
+    comisiones = indice_comisiones()
+    for m in monedas:
+        m.comision_vigente = comisiones.get(m.codigo, (0, 0))
     return render(request, 'monedas/monedas_list.html', {'monedas': monedas})
 
 
@@ -204,6 +336,34 @@ def monedas_inactivas(request):
     return render(request, 'monedas/monedas_inactivas.html', {'monedas': monedas_inactivas})
 
 
+@login_required
+@transaction.atomic
+def comision_moneda_edit(request, moneda_id):
+    """
+    Crear o editar la comisión de compra/venta de una moneda.
+
+    Al guardar se invalida el snapshot de precios de todos los workers.
+
+    :param request: Objeto HttpRequest
+    :type request: HttpRequest
+    :param moneda_id: ID de la moneda
+    :type moneda_id: int
+    :return: Renderizado de formulario o redirección
+    :rtype: HttpResponse
+    """
+    moneda = get_object_or_404(Moneda.objects.all_with_inactive(), pk=moneda_id, es_base=False)
+    comision = ComisionMoneda.objects.filter(moneda=moneda).first()
+    if comision is None:
+        compra, venta = comision_para(moneda.codigo)
+        comision = ComisionMoneda(moneda=moneda, compra=compra, venta=venta)
+    form = ComisionMonedaForm(request.POST or None, instance=comision)
+    if request.method == 'POST' and form.is_valid():
+        form.save()
+        messages.success(request, f'Comisión de {moneda.codigo} actualizada.')
+        return redirect('monedas:monedas_list')
+    return render(request, 'monedas/comision_moneda_form.html', {'form': form, 'moneda': moneda})
+
+
 # -----------------------------
 # CRUD TasaCambio
 # -----------------------------
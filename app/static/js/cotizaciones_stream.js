@@ -0,0 +1,81 @@
+// Suscripción al canal SSE de tasas activas.
+// El primer evento trae todas las tasas activas; los siguientes, solo los cambios.
+// Actualiza las filas del tablero marcadas con data-moneda / data-campo y
+// reenvía cada delta como evento 'cotizaciones:delta' para los simuladores.
+// Sin ASGI el canal responde 204: entonces se sondea cotizaciones_json (que
+// responde 304 mientras no cambien las tasas) y se arman los mismos deltas.
+const API_COTIZACIONES_STREAM = '/monedas/cotizaciones_stream/';
+const API_COTIZACIONES_ACTIVAS = '/monedas/cotizaciones_json/?activas=1';
+const INTERVALO_SONDEO_MS = 15000;
+
+function actualizarTablero(delta) {
+	delta.tasas.forEach(t => {
+		const fila = document.querySelector(`tr[data-moneda="${t.moneda}"]`);
+		if (!fila) return;
+		fila.querySelectorAll('[data-campo]').forEach(celda => {
+			const valor = t[celda.dataset.campo];
+			if (valor === undefined) return;
+			if (celda.dataset.campo === 'variacion') {
+				const signo = celda.dataset.signo && parseFloat(valor) > 0 ? '+' : '';
+				celda.textContent = `${signo}${valor}%`;
+			} else {
+				celda.textContent = valor;
+			}
+		});
+	});
+}
+
+// Aplica un delta a una lista de cotizaciones ({moneda, compra, venta, ...}) y devuelve la nueva lista
+function aplicarDeltaCotizaciones(lista, delta) {
+	const porMoneda = new Map(lista.map(c => [c.moneda, c]));
+	delta.tasas.forEach(t => porMoneda.set(t.moneda, Object.assign({}, porMoneda.get(t.moneda), t)));
+	(delta.bajas || []).forEach(codigo => porMoneda.delete(codigo));
+	return Array.from(porMoneda.values());
+}
+
+function publicarDelta(delta) {
+	actualizarTablero(delta);
+	document.dispatchEvent(new CustomEvent('cotizaciones:delta', { detail: delta }));
+}
+
+// Alternativa al canal SSE: delta entre dos lecturas de las tasas activas
+function sondearCotizaciones() {
+	let anterior = new Map();
+	async function leer() {
+		try {
+			const resp = await fetch(API_COTIZACIONES_ACTIVAS);
+			if (!resp.ok) return;
+			const data = await resp.json();
+			const actual = new Map((data.cotizaciones || []).map(c => [c.moneda, {
+				moneda: c.moneda,
+				compra: Number(c.compra).toFixed(2),
+				venta: Number(c.venta).toFixed(2),
+				variacion: Number(c.variacion || 0).toFixed(2),
+			}]));
+			const tasas = Array.from(actual.values()).filter(t => {
+				const previa = anterior.get(t.moneda);
+				return !previa || previa.compra !== t.compra || previa.venta !== t.venta || previa.variacion !== t.variacion;
+			});
+			const bajas = Array.from(anterior.keys()).filter(codigo => !actual.has(codigo));
+			anterior = actual;
+			if (tasas.length || bajas.length) publicarDelta({ tasas, bajas });
+		} catch (e) {
+			// Sin red: se reintenta en el próximo intervalo
+		}
+	}
+	leer();
+	return setInterval(leer, INTERVALO_SONDEO_MS);
+}
+
+function suscribirCotizaciones() {
+	if (!window.EventSource) return sondearCotizaciones();
+	const fuente = new EventSource(API_COTIZACIONES_STREAM);
+	fuente.addEventListener('tasas', e => publicarDelta(JSON.parse(e.data)));
+	fuente.addEventListener('error', () => {
+		// 204 (servidor WSGI) o error definitivo: EventSource no reconecta
+		if (fuente.readyState === EventSource.CLOSED) sondearCotizaciones();
+	});
+	return fuente;
+}
+
+window.addEventListener('DOMContentLoaded', suscribirCotizaciones);
@@ -1,11 +1,12 @@
 // Variables globales y carga de datos de comisiones
 let comisiones = [];
-// Carga el archivo de comisiones.json y lo almacena en la variable global 'comisiones'
+// Carga las comisiones por moneda desde la API (misma fuente que el cotizador del servidor)
 async function cargarComisiones() {
 	try {
-		const resp = await fetch('/static/comisiones.json');
+		const resp = await fetch('/monedas/comisiones_json/');
 		if (!resp.ok) throw new Error('No se pudo obtener comisiones');
-		comisiones = await resp.json();
+		const data = await resp.json();
+		comisiones = data.comisiones || [];
 	} catch (e) {
 		mostrarError('Error al cargar comisiones: ' + e.message);
 	}
@@ -26,7 +27,7 @@ function obtenerSegmentoClienteActivo() {
 	return 'MIN';
 }
 // Constantes de API y referencias a elementos del DOM
-const API_COTIZACIONES = '/monedas/cotizaciones_json/';
+const API_COTIZACIONES = '/monedas/cotizaciones_json/?activas=1';
 const API_TASAS_COMISIONES = '/monedas/tasas_comisiones/';
 // Selects de monedas y campos del formulario
 const selectOrigen = document.getElementById('moneda-origen');
@@ -217,6 +218,11 @@ form.addEventListener('submit', function(e) {
 	}
 	simularConversion(monto, origen, destino);
 });
+// Mantiene las cotizaciones al día con el canal SSE (ver cotizaciones_stream.js)
+document.addEventListener('cotizaciones:delta', function(e) {
+	cotizaciones = aplicarDeltaCotizaciones(cotizaciones, e.detail);
+});
+
 // Inicialización: carga cotizaciones, tasas de comisiones y comisiones al cargar la página
 window.addEventListener('DOMContentLoaded', async function() {
 	await cargarCotizaciones();
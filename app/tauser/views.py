@@ -2,7 +2,6 @@ from django.shortcuts import render
 from django.contrib import messages
 from transaccion.models import Transaccion
 from transaccion.services import confirmar_transaccion, cancelar_transaccion
-from monedas.models import TasaCambio
 from commons.enums import EstadoTransaccionEnum
 from django.utils import timezone
 
@@ -11,7 +10,7 @@ from django.shortcuts import render
 from django.contrib import messages
 from transaccion.models import Transaccion
 from transaccion.services import confirmar_transaccion, cancelar_transaccion, calcular_transaccion
-from monedas.models import TasaCambio
+from transaccion.precios import obtener_snapshot
 from commons.enums import EstadoTransaccionEnum
 from django.utils import timezone
 
@@ -38,12 +37,9 @@ def tramitar_transacciones(request):
                 error = "No se encontró ninguna transacción con ese código."
 
             if tx:
-                # Buscar tasa actual
-                tasa_actual = (
-                    TasaCambio.objects.filter(moneda=tx.moneda, activa=True)
-                    .latest("fecha_creacion")
-                    .compra
-                )
+                # Tasa actual: misma versión que usa calcular_transaccion
+                vigente = obtener_snapshot().tasa(tx.moneda_id)
+                tasa_actual = vigente.compra if vigente else None
 
                 if accion == "buscar":
                     datos_transaccion = {
@@ -0,0 +1,347 @@
+"""
+Acumuladores de límites por cliente, moneda y período.
+
+``validate_limits`` necesita, para cada operación, lo ya comprometido por el
+cliente en la moneda durante el día y el mes. En lugar de sumar el historial
+de Transaccion en cada alta, esos totales se guardan en ``AcumuladoLimite`` y
+se ajustan con cada cambio de estado:
+
+- alta en PENDIENTE (o PAGADA): suma a la fila del día y a la del mes,
+- PENDIENTE -> PAGADA: no cambia nada (ambos estados cuentan),
+- cancelación, anulación o borrado: resta,
+- cambio de montos de una comprometida (recálculo con otra tasa): la diferencia.
+
+Las sumas son un único ``INSERT ... ON CONFLICT DO UPDATE`` (atómico frente a
+altas concurrentes del mismo cliente); las restas son un ``UPDATE``. Los días
+y meses se calculan en hora local (``TIME_ZONE``).
+
+Para que dos altas concurrentes no superen juntas un límite, ``reservar``
+bloquea las filas del cliente/moneda antes de validar (ver
+``crear_transaccion``).
+
+Quien cambie estados con ``QuerySet.update()`` (sin señales) debe llamar a
+``aplicar`` o ``aplicar_lote`` por su cuenta, y quien cree con
+``bulk_create``, a ``aplicar_lote``. ``reconstruir`` (comando
+``reconstruir_acumulados``) recalcula todo desde Transaccion.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from commons.enums import EstadoTransaccionEnum
+from .models import AcumuladoLimite, Transaccion
+from . import particiones
+
+#: Estados que consumen límite.
+ESTADOS_COMPROMETIDOS = frozenset({EstadoTransaccionEnum.PENDIENTE, EstadoTransaccionEnum.PAGADA})
+
+_CERO = Decimal("0")
+
+
+def periodos(dia):
+    """Claves ``(periodo, inicio)`` del día y del mes que contienen a ``dia``."""
+    return [
+        (AcumuladoLimite.DIARIO, dia),
+        (AcumuladoLimite.MENSUAL, dia.replace(day=1)),
+    ]
+
+
+def _deltas(txs, signo=1):
+    """Montos de ``txs`` agrupados por ``(cliente_id, moneda_id, periodo, inicio)``."""
+    deltas = defaultdict(lambda: [_CERO, _CERO])
+    for tx in txs:
+        for periodo, inicio in periodos(timezone.localdate(tx.fecha)):
+            acc = deltas[(tx.cliente_id, tx.moneda_id, periodo, inicio)]
+            acc[0] += tx.monto_operado * signo
+            acc[1] += tx.monto_pyg * signo
+    return deltas
+
+
+def _sumar(deltas):
+    tabla = AcumuladoLimite._meta.db_table
+    valores, params = [], []
+    for clave in sorted(deltas):
+        valores.append("(%s, %s, %s, %s, %s, %s)")
+        params += [*clave, *deltas[clave]]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {tabla} (cliente_id, moneda_id, periodo, inicio, monto_operado, monto_pyg)
+            VALUES {", ".join(valores)}
+            ON CONFLICT (cliente_id, moneda_id, periodo, inicio) DO UPDATE
+            SET monto_operado = {tabla}.monto_operado + EXCLUDED.monto_operado,
+                monto_pyg = {tabla}.monto_pyg + EXCLUDED.monto_pyg
+            """,
+            params,
+        )
+
+
+def aplicar(tx, signo):
+    """
+    Suma (``signo=1``) o resta (``signo=-1``) los montos de ``tx`` a sus
+    acumuladores del día y del mes. Las restas bloquean las filas en el
+    mismo orden que ``reservar_varios``.
+    """
+    aplicar_lote([tx], signo)
+
+
+def _bloquear(claves):
+    # En el orden de reservar_varios: un UPDATE ... FROM toma las filas en el
+    # orden del plan y podría cruzarse con una reserva
+    de_claves = Q()
+    for cliente_id, moneda_id, periodo, inicio in claves:
+        de_claves |= Q(cliente_id=cliente_id, moneda_id=moneda_id, periodo=periodo, inicio=inicio)
+    list(
+        AcumuladoLimite.objects.filter(de_claves)
+        .select_for_update()
+        .order_by("cliente_id", "moneda_id", "periodo", "inicio")
+        .values_list("id", flat=True)
+    )
+
+
+def _restar(deltas):
+    tabla = AcumuladoLimite._meta.db_table
+    claves = sorted(deltas)
+    _bloquear(claves)
+    valores, params = [], []
+    for clave in claves:
+        valores.append("(%s, %s, %s, %s::date, %s::numeric, %s::numeric)")
+        params += [*clave, *deltas[clave]]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {tabla} AS a
+            SET monto_operado = a.monto_operado + d.operado, monto_pyg = a.monto_pyg + d.pyg
+            FROM (VALUES {", ".join(valores)}) AS d (cliente_id, moneda_id, periodo, inicio, operado, pyg)
+            WHERE a.cliente_id = d.cliente_id AND a.moneda_id = d.moneda_id
+              AND a.periodo = d.periodo AND a.inicio = d.inicio
+            """,
+            params,
+        )
+
+
+def aplicar_lote(txs, signo=1):
+    """
+    ``aplicar`` para varias transacciones con una sola sentencia: altas hechas
+    con ``bulk_create`` (``signo=1``), que no emite señales, o salidas de los
+    estados comprometidos hechas con ``QuerySet.update()`` (``signo=-1``).
+    """
+    if not txs:
+        return
+    if signo > 0:
+        _sumar(_deltas(txs))
+    else:
+        # Sin INSERT: si la fila no existe no hay nada que descontar, y en un
+        # borrado en cascada del cliente no se debe recrear.
+        _restar(_deltas(txs, signo))
+
+
+def ajustar(antes, despues):
+    """
+    Corrige los acumuladores de una transacción comprometida cuyos montos,
+    fecha, cliente o moneda cambiaron (p. ej. al recalcularla con otra tasa):
+    descuenta ``antes`` y suma ``despues``, con una sola sentencia.
+
+    ``antes`` es cualquier objeto con los atributos de Transaccion que usa
+    ``_deltas`` (``cliente_id``, ``moneda_id``, ``fecha``, ``monto_operado``
+    y ``monto_pyg``).
+    """
+    deltas = _deltas([despues])
+    for clave, (operado, pyg) in _deltas([antes], -1).items():
+        deltas[clave][0] += operado
+        deltas[clave][1] += pyg
+    deltas = {clave: delta for clave, delta in deltas.items() if delta != [_CERO, _CERO]}
+    if deltas:
+        _bloquear(sorted(deltas))
+        _sumar(deltas)
+
+
+def _filtro_periodos(cliente, moneda, dia):
+    (diario, inicio_dia), (mensual, inicio_mes) = periodos(dia)
+    return AcumuladoLimite.objects.filter(
+        Q(periodo=diario, inicio=inicio_dia) | Q(periodo=mensual, inicio=inicio_mes),
+        cliente=cliente,
+        moneda=moneda,
+    )
+
+
+def _a_totales(filas):
+    filas = {periodo: (operado, pyg) for periodo, operado, pyg in filas}
+    diario_operado, diario_pyg = filas.get(AcumuladoLimite.DIARIO, (_CERO, _CERO))
+    mensual_operado, mensual_pyg = filas.get(AcumuladoLimite.MENSUAL, (_CERO, _CERO))
+    return {
+        "diario_pyg": diario_pyg,
+        "mensual_pyg": mensual_pyg,
+        "diario_operado": diario_operado,
+        "mensual_operado": mensual_operado,
+    }
+
+
+def totales_vacios():
+    """Totales de un cliente/moneda sin operaciones en el período."""
+    return _a_totales([])
+
+
+def totales(cliente, moneda, dia=None):
+    """
+    Totales comprometidos por ``cliente`` en ``moneda`` (una sola consulta).
+
+    Returns:
+        dict: ``diario_pyg``, ``mensual_pyg``, ``diario_operado`` y
+        ``mensual_operado`` (Decimal) para el día ``dia`` (por defecto, hoy en hora local) y su mes.
+    """
+    dia = dia or timezone.localdate()
+    return _a_totales(
+        _filtro_periodos(cliente, moneda, dia).values_list("periodo", "monto_operado", "monto_pyg")
+    )
+
+
+def totales_por_cliente(clientes_ids, dia=None):
+    """
+    Totales de varios clientes, en todas sus monedas, con una sola consulta.
+
+    Returns:
+        dict: ``{(cliente_id, moneda_id): totales}`` con el formato de
+        ``totales``. Las combinaciones sin movimientos no aparecen.
+    """
+    dia = dia or timezone.localdate()
+    (diario, inicio_dia), (mensual, inicio_mes) = periodos(dia)
+    filas = defaultdict(list)
+    for cliente_id, moneda_id, periodo, operado, pyg in AcumuladoLimite.objects.filter(
+        Q(periodo=diario, inicio=inicio_dia) | Q(periodo=mensual, inicio=inicio_mes),
+        cliente_id__in=clientes_ids,
+    ).values_list("cliente_id", "moneda_id", "periodo", "monto_operado", "monto_pyg"):
+        filas[(cliente_id, moneda_id)].append((periodo, operado, pyg))
+    return {clave: _a_totales(valores) for clave, valores in filas.items()}
+
+
+def reservar(cliente, moneda, dia=None):
+    """
+    Bloquea los acumuladores del día y del mes de ``cliente``/``moneda`` y
+    devuelve sus totales (mismo formato que ``totales``).
+
+    Debe llamarse dentro de ``transaction.atomic()``: el bloqueo de fila dura
+    hasta el COMMIT, por lo que otra alta para el mismo cliente y moneda
+    espera y valida contra los totales ya actualizados. Otros clientes o
+    monedas no se ven afectados.
+    """
+    return reservar_varios([(cliente.pk, moneda.pk)], dia)[(cliente.pk, moneda.pk)]
+
+
+def reservar_varios(pares, dia=None):
+    """
+    ``reservar`` para varios pares ``(cliente_id, moneda_id)`` con dos consultas.
+
+    Las filas se crean en cero si no existen, para tener qué bloquear, y se
+    bloquean siempre en el mismo orden (cliente, moneda, día, mes) para
+    evitar deadlocks entre altas y lotes concurrentes.
+
+    Returns:
+        dict: ``{(cliente_id, moneda_id): totales}``.
+    """
+    dia = dia or timezone.localdate()
+    pares = sorted(set(pares))
+    if not pares:
+        return {}
+    tabla = AcumuladoLimite._meta.db_table
+    valores, params = [], []
+    for cliente_id, moneda_id in pares:
+        for periodo, inicio in periodos(dia):
+            valores.append("(%s, %s, %s, %s, 0, 0)")
+            params += [cliente_id, moneda_id, periodo, inicio]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {tabla} (cliente_id, moneda_id, periodo, inicio, monto_operado, monto_pyg)
+            VALUES {", ".join(valores)}
+            ON CONFLICT (cliente_id, moneda_id, periodo, inicio) DO NOTHING
+            """,
+            params,
+        )
+
+    (diario, inicio_dia), (mensual, inicio_mes) = periodos(dia)
+    de_pares = Q()
+    for cliente_id, moneda_id in pares:
+        de_pares |= Q(cliente_id=cliente_id, moneda_id=moneda_id)
+    filas = defaultdict(list)
+    for cliente_id, moneda_id, periodo, operado, pyg in (
+        AcumuladoLimite.objects.filter(de_pares)
+        .filter(Q(periodo=diario, inicio=inicio_dia) | Q(periodo=mensual, inicio=inicio_mes))
+        .select_for_update()
+        .order_by("cliente_id", "moneda_id", "periodo")
+        .values_list("cliente_id", "moneda_id", "periodo", "monto_operado", "monto_pyg")
+    ):
+        filas[(cliente_id, moneda_id)].append((periodo, operado, pyg))
+    return {par: _a_totales(filas[par]) for par in pares}
+
+
+def reconstruir(clientes_ids=None, desde=None):
+    """
+    Recalcula los acumuladores desde Transaccion.
+
+    Bloquea la tabla de acumuladores mientras trabaja: las altas concurrentes
+    esperan y aplican su delta sobre el resultado ya reconstruido.
+
+    Args:
+        clientes_ids (list[int] | None): Limitar a estos clientes (por defecto, todos).
+        desde (date | None): Reconstruir solo desde el mes de esta fecha. Las
+            transacciones anteriores no se leen (con las tablas particionadas,
+            ni siquiera se recorren sus particiones).
+
+    Returns:
+        tuple[int, int]: (filas resultantes, filas que diferían y se corrigieron).
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {AcumuladoLimite._meta.db_table} IN EXCLUSIVE MODE")
+
+        txs = Transaccion.objects.filter(estado__in=ESTADOS_COMPROMETIDOS)
+        actuales = AcumuladoLimite.objects.all()
+        if clientes_ids is not None:
+            txs = txs.filter(cliente_id__in=clientes_ids)
+            actuales = actuales.filter(cliente_id__in=clientes_ids)
+        if desde is not None:
+            txs = txs.filter(fecha__gte=particiones.inicio_mes(desde))
+            actuales = actuales.filter(inicio__gte=desde.replace(day=1))
+
+        esperado = defaultdict(lambda: [_CERO, _CERO])
+        por_dia = (
+            txs.annotate(dia=TruncDate("fecha"))
+            .values("cliente_id", "moneda_id", "dia")
+            .annotate(operado=Sum("monto_operado"), pyg=Sum("monto_pyg"))
+            .order_by()
+        )
+        for fila in por_dia:
+            for periodo, inicio in periodos(fila["dia"]):
+                acc = esperado[(fila["cliente_id"], fila["moneda_id"], periodo, inicio)]
+                acc[0] += fila["operado"]
+                acc[1] += fila["pyg"]
+
+        existentes = {
+            (c, m, p, i): [operado, pyg]
+            for c, m, p, i, operado, pyg in actuales.values_list(
+                "cliente_id", "moneda_id", "periodo", "inicio", "monto_operado", "monto_pyg"
+            )
+        }
+        # Filas en cero (todo cancelado) equivalen a filas inexistentes
+        corregidas = sum(
+            1 for clave in esperado.keys() | existentes.keys()
+            if esperado.get(clave, [_CERO, _CERO]) != existentes.get(clave, [_CERO, _CERO])
+        )
+
+        actuales.delete()
+        AcumuladoLimite.objects.bulk_create(
+            [
+                AcumuladoLimite(
+                    cliente_id=c, moneda_id=m, periodo=p, inicio=i,
+                    monto_operado=operado, monto_pyg=pyg,
+                )
+                for (c, m, p, i), (operado, pyg) in esperado.items()
+            ],
+            batch_size=1000,
+        )
+    return len(esperado), corregidas
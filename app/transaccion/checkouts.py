@@ -0,0 +1,180 @@
+"""
+Cola de creación de Sessions de Checkout de Stripe.
+
+La vista de pago con tarjeta no llama a Stripe: ``encolar`` inserta un
+``CheckoutStripe`` y el navegador espera en una página que consulta su
+estado hasta que la URL está lista. Los workers (comando
+``procesar_checkouts``) toman trabajos con ``SELECT ... FOR UPDATE SKIP
+LOCKED``, por lo que pueden correr varios hilos y nodos a la vez sin repetir
+trabajos ni bloquearse entre sí.
+
+Un trabajo PROCESANDO cuyo worker murió se vuelve a tomar pasados
+``STRIPE_CHECKOUT_VENCIMIENTO`` segundos. Los errores de Stripe se
+reintentan con espera exponencial hasta ``STRIPE_CHECKOUT_INTENTOS``.
+"""
+import logging
+import random
+import threading
+from datetime import timedelta
+
+import stripe
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from commons.workers import atender_cola
+from commons.enums import EstadoTransaccionEnum
+from . import services
+from .models import CheckoutStripe
+
+logger = logging.getLogger(__name__)
+
+EN_CURSO = (CheckoutStripe.PENDIENTE, CheckoutStripe.PROCESANDO)
+
+#: Tope de la espera entre reintentos, en segundos.
+ESPERA_MAXIMA = 60
+
+
+def encolar(tx):
+    """
+    Encola la creación del checkout de ``tx``.
+
+    Si ya hay un trabajo en curso para la transacción (doble clic, recarga)
+    devuelve ese en lugar de crear otro.
+    """
+    en_curso = CheckoutStripe.objects.filter(transaccion=tx, estado__in=EN_CURSO).first()
+    if en_curso:
+        return en_curso
+    try:
+        with transaction.atomic():
+            return CheckoutStripe.objects.create(transaccion=tx)
+    except IntegrityError:
+        # Otra petición lo encoló entre la consulta y el INSERT
+        return CheckoutStripe.objects.get(transaccion=tx, estado__in=EN_CURSO)
+
+
+def tomar(limite=1):
+    """
+    Toma hasta ``limite`` trabajos disponibles, en orden de llegada.
+
+    Los marca PROCESANDO (con ``tomado_en`` y un intento más) en la misma
+    transacción en que los bloquea, y los devuelve con la transacción, su
+    moneda y su cliente ya cargados.
+    """
+    ahora = timezone.now()
+    vencido = ahora - timedelta(seconds=settings.STRIPE_CHECKOUT_VENCIMIENTO)
+    with transaction.atomic():
+        ids = list(
+            CheckoutStripe.objects
+            .filter(estado__in=EN_CURSO, disponible_desde__lte=ahora)
+            .filter(Q(estado=CheckoutStripe.PENDIENTE) | Q(tomado_en__lt=vencido))
+            .order_by("disponible_desde", "id")
+            .select_for_update(skip_locked=True)
+            .values_list("id", flat=True)[:limite]
+        )
+        if not ids:
+            return []
+        CheckoutStripe.objects.filter(id__in=ids).update(
+            estado=CheckoutStripe.PROCESANDO,
+            tomado_en=ahora,
+            intentos=F("intentos") + 1,
+            actualizado=ahora,
+        )
+    return list(
+        CheckoutStripe.objects.filter(id__in=ids)
+        .select_related("transaccion__moneda", "transaccion__cliente")
+        .order_by("id")
+    )
+
+
+def _terminar(trabajo, estado, **campos):
+    """Guarda el resultado, salvo que otro worker haya retomado el trabajo."""
+    return CheckoutStripe.objects.filter(
+        pk=trabajo.pk, estado=CheckoutStripe.PROCESANDO, tomado_en=trabajo.tomado_en
+    ).update(estado=estado, actualizado=timezone.now(), **campos)
+
+
+def procesar(trabajo):
+    """
+    Crea la Session de un trabajo tomado y guarda URL o error.
+
+    Si la transacción ya no está pendiente o no se paga con tarjeta el
+    trabajo falla sin reintentos.
+
+    :return: Estado final del trabajo
+    """
+    tx = trabajo.transaccion
+    try:
+        if str(tx.estado) != str(EstadoTransaccionEnum.PENDIENTE):
+            raise ValueError("La transacción no está pendiente de pago.")
+        # Misma clave en los reintentos de la pasarela; nueva en cada intento del trabajo
+        session = services.crear_sesion_checkout(tx, f"checkout-{trabajo.pk}-{trabajo.intentos}")
+    except ValueError as e:
+        estado, campos = CheckoutStripe.ERROR, {"error": str(e)}
+    except stripe.error.StripeError as e:
+        logger.warning("[STRIPE] Falló el checkout de tx #%s (intento %s): %s", tx.id, trabajo.intentos, e)
+        if trabajo.intentos >= settings.STRIPE_CHECKOUT_INTENTOS:
+            estado, campos = CheckoutStripe.ERROR, {"error": str(e)}
+        else:
+            # Espera exponencial con jitter para no reintentar todos a la vez
+            espera = min(2 ** trabajo.intentos, ESPERA_MAXIMA) * random.uniform(0.5, 1)
+            estado, campos = CheckoutStripe.PENDIENTE, {
+                "error": str(e),
+                "disponible_desde": timezone.now() + timedelta(seconds=espera),
+            }
+    else:
+        estado, campos = CheckoutStripe.LISTA, {"session_id": session.id, "url": session.url, "error": ""}
+    _terminar(trabajo, estado, **campos)
+    return estado
+
+
+def atender(lote=1, una_vez=False, espera=1.0, detener=None):
+    """
+    Bucle de un worker: toma y procesa trabajos hasta que se active
+    ``detener`` o, con ``una_vez``, hasta que no quede ninguno disponible.
+
+    :return: Trabajos procesados
+    """
+    def procesar_lote():
+        trabajos = tomar(lote)
+        for trabajo in trabajos:
+            procesar(trabajo)
+        return {"procesados": len(trabajos)}
+
+    return atender_cola(procesar_lote, "procesados", una_vez, espera, detener)["procesados"]
+
+
+def ejecutar(workers=None, lote=1, una_vez=False, espera=1.0, detener=None):
+    """
+    Atiende la cola con ``workers`` hilos (por defecto
+    ``STRIPE_CHECKOUT_WORKERS``), cada uno con su conexión a la base.
+
+    Las llamadas a Stripe son espera de red, así que los hilos escalan
+    aunque compartan el GIL. Con un solo worker se atiende en el hilo actual.
+
+    :return: Trabajos procesados entre todos los hilos
+    """
+    workers = workers or settings.STRIPE_CHECKOUT_WORKERS
+    if workers == 1:
+        return atender(lote, una_vez, espera, detener)
+
+    procesados = [0] * workers
+
+    def hilo(i):
+        try:
+            procesados[i] = atender(lote, una_vez, espera, detener)
+        except Exception:
+            logger.exception("[STRIPE] Worker de checkouts %s terminó con error", i)
+        finally:
+            connection.close()
+
+    hilos = [
+        threading.Thread(target=hilo, args=(i,), name=f"checkout-{i}", daemon=True)
+        for i in range(workers)
+    ]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    return sum(procesados)
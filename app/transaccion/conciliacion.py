@@ -0,0 +1,146 @@
+"""
+Conciliación de transacciones con las sesiones de Checkout de Stripe.
+
+``conciliar`` recorre las sesiones con la API de listado (páginas de hasta
+100, más recientes primero) y, por página, trae con una sola consulta las
+transacciones de su ``metadata.transaccion_id`` junto con si tienen
+movimiento. Las cobradas en Stripe que acá no figuran PAGADAS o no tienen
+movimiento se reparan con ``services.registrar_pagos_stripe`` (lo mismo que
+hace el webhook); el resto de las diferencias solo se informan.
+
+Tipos de discrepancia (``TIPOS``):
+
+- ``pago_no_registrado``: cobrada en Stripe, la transacción no está PAGADA.
+- ``sin_movimiento``: cobrada y PAGADA, pero sin movimiento.
+- ``monto_distinto``: lo cobrado no coincide con monto en PYG + comisión.
+- ``cobro_duplicado``: más de una sesión cobrada para la misma transacción.
+- ``sin_transaccion``: sesión sin ``transaccion_id`` o con uno inexistente.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from commons.enums import EstadoTransaccionEnum
+from . import pasarela, services
+from .models import Movimiento, Transaccion
+
+logger = logging.getLogger(__name__)
+
+PAGO_NO_REGISTRADO = "pago_no_registrado"
+SIN_MOVIMIENTO = "sin_movimiento"
+MONTO_DISTINTO = "monto_distinto"
+COBRO_DUPLICADO = "cobro_duplicado"
+SIN_TRANSACCION = "sin_transaccion"
+TIPOS = (PAGO_NO_REGISTRADO, SIN_MOVIMIENTO, MONTO_DISTINTO, COBRO_DUPLICADO, SIN_TRANSACCION)
+
+#: Discrepancias que se reparan registrando el pago.
+REPARABLES = (PAGO_NO_REGISTRADO, SIN_MOVIMIENTO)
+
+
+def _transaccion_id(session):
+    try:
+        return int(session.metadata["transaccion_id"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _monto_cobrado(tx):
+    """Lo que ``services.crear_sesion_checkout`` cobra por ``tx`` (PYG, sin decimales)."""
+    return int((tx.monto_pyg or 0) + (tx.comision or 0))
+
+
+def _discrepancia(tipo, session, tx_id, detalle=""):
+    return {"tipo": tipo, "session_id": session.id, "transaccion_id": tx_id, "detalle": detalle}
+
+
+def conciliar_pagina(sesiones, cobradas, reparar=True):
+    """
+    Concilia una página de sesiones.
+
+    :param cobradas: IDs de transacciones ya vistas cobradas en páginas
+        anteriores (se actualiza), para detectar cobros duplicados
+    :return: ``(discrepancias, reparadas)``
+    """
+    por_tx = {}
+    discrepancias = []
+    for session in sesiones:
+        tx_id = _transaccion_id(session)
+        if tx_id is None:
+            discrepancias.append(_discrepancia(SIN_TRANSACCION, session, None, "Sin metadata.transaccion_id"))
+        else:
+            por_tx.setdefault(tx_id, []).append(session)
+
+    txs = {
+        tx.pk: tx
+        for tx in Transaccion.objects.filter(pk__in=por_tx)
+        .annotate(con_movimiento=Exists(Movimiento.objects.filter(transaccion_id=OuterRef("pk"))))
+        .only("id", "estado", "monto_pyg", "comision")
+    }
+
+    a_reparar = set()
+    for tx_id, sesiones_tx in por_tx.items():
+        tx = txs.get(tx_id)
+        for session in sesiones_tx:
+            if tx is None:
+                discrepancias.append(_discrepancia(SIN_TRANSACCION, session, tx_id, "Transacción inexistente"))
+                continue
+            if session.payment_status != "paid":
+                continue
+            if tx_id in cobradas:
+                discrepancias.append(_discrepancia(COBRO_DUPLICADO, session, tx_id))
+            cobradas.add(tx_id)
+            if session.amount_total != _monto_cobrado(tx):
+                discrepancias.append(_discrepancia(
+                    MONTO_DISTINTO, session, tx_id,
+                    f"Stripe: {session.amount_total}, transacción: {_monto_cobrado(tx)}",
+                ))
+            if str(tx.estado) != str(EstadoTransaccionEnum.PAGADA):
+                discrepancias.append(_discrepancia(PAGO_NO_REGISTRADO, session, tx_id, f"Estado: {tx.estado}"))
+                a_reparar.add(tx_id)
+            elif not tx.con_movimiento:
+                discrepancias.append(_discrepancia(SIN_MOVIMIENTO, session, tx_id))
+                a_reparar.add(tx_id)
+
+    reparadas = 0
+    if reparar and a_reparar:
+        with transaction.atomic():
+            services.registrar_pagos_stripe(sorted(a_reparar))
+        reparadas = len(a_reparar)
+    return discrepancias, reparadas
+
+
+def conciliar(desde=None, limite=100, reparar=True):
+    """
+    Concilia las sesiones de Stripe, página por página.
+
+    :param desde: ``datetime``; las sesiones creadas antes no se recorren
+    :param limite: Sesiones por página (Stripe admite hasta 100)
+    :param reparar: False para solo informar
+    :return: ``{"sesiones", "paginas", "reparadas", "discrepancias": [...]}``
+    """
+    minimo = int(desde.timestamp()) if desde else None
+    resultado = {"sesiones": 0, "paginas": 0, "reparadas": 0, "discrepancias": []}
+    cobradas = set()
+    despues_de = None
+    while True:
+        pagina = pasarela.listar_sesiones_checkout(limite, despues_de)
+        sesiones = list(pagina.data)
+        # Más recientes primero: al pasar ``desde`` no queda nada por ver
+        fin = minimo is not None and sesiones and sesiones[-1].created < minimo
+        if minimo is not None:
+            sesiones = [s for s in sesiones if s.created >= minimo]
+        if sesiones:
+            discrepancias, reparadas = conciliar_pagina(sesiones, cobradas, reparar)
+            resultado["discrepancias"] += discrepancias
+            resultado["reparadas"] += reparadas
+            resultado["sesiones"] += len(sesiones)
+        resultado["paginas"] += 1
+        if fin or not pagina.has_more or not pagina.data:
+            break
+        despues_de = pagina.data[-1].id
+    logger.info(
+        "[STRIPE] Conciliación: %s sesiones, %s discrepancias, %s transacciones reparadas",
+        resultado["sesiones"], len(resultado["discrepancias"]), resultado["reparadas"],
+    )
+    return resultado
@@ -1,5 +1,11 @@
 # transacciones/forms.py
+import csv
+import io
+
 from django import forms
+from django.conf import settings
+
+from monedas.models import Moneda
 from .models import Transaccion
 from commons.enums import TipoTransaccionEnum
 
@@ -26,3 +32,52 @@ class TransaccionForm(forms.ModelForm):
                     pass
             elif self.instance.pk:
                 self.fields["medio_pago"].queryset = self.instance.cliente.metodos_pago.all()
+
+
+class TransaccionLoteForm(forms.Form):
+    """
+    Carga de un lote de órdenes desde un CSV (separado por coma o punto y coma).
+
+    Columnas: ``cliente`` (id), ``tipo`` (compra/venta), ``moneda`` (código
+    o id), ``monto_operado`` y, opcional, ``medio_pago`` (id). Deja en
+    ``cleaned_data["items"]`` los ítems para ``crear_transacciones_lote``.
+    """
+    COLUMNAS = ("cliente", "tipo", "moneda", "monto_operado")
+
+    archivo = forms.FileField(label="Archivo CSV")
+
+    def clean_archivo(self):
+        archivo = self.cleaned_data["archivo"]
+        try:
+            texto = archivo.read().decode("utf-8-sig")
+        except UnicodeDecodeError:
+            raise forms.ValidationError("El archivo debe estar codificado en UTF-8.")
+        try:
+            dialecto = csv.Sniffer().sniff(texto.split("\n", 1)[0], delimiters=",;")
+        except csv.Error:
+            dialecto = csv.excel
+        lector = csv.DictReader(io.StringIO(texto), dialect=dialecto)
+        faltantes = [c for c in self.COLUMNAS if c not in (lector.fieldnames or [])]
+        if faltantes:
+            raise forms.ValidationError(f"Faltan columnas: {', '.join(faltantes)}.")
+
+        items = [
+            {campo: (valor or "").strip() for campo, valor in fila.items() if campo}
+            for fila in lector
+        ]
+        if not items:
+            raise forms.ValidationError("El archivo no tiene filas.")
+        if len(items) > settings.TRANSACCION_LOTE_MAX:
+            raise forms.ValidationError(f"El lote supera el máximo de {settings.TRANSACCION_LOTE_MAX} filas.")
+
+        codigos = {i["moneda"].upper() for i in items if not i["moneda"].isdigit()}
+        monedas = dict(Moneda.objects.filter(codigo__in=codigos).values_list("codigo", "id"))
+        desconocidas = sorted(codigos - set(monedas))
+        if desconocidas:
+            raise forms.ValidationError(f"Monedas desconocidas: {', '.join(desconocidas)}.")
+        for item in items:
+            item["tipo"] = item["tipo"].lower()
+            if not item["moneda"].isdigit():
+                item["moneda"] = monedas[item["moneda"].upper()]
+        self.cleaned_data["items"] = items
+        return archivo
@@ -0,0 +1,151 @@
+"""
+Claves de idempotencia para las vistas que crean o cotizan transacciones.
+
+Si la petición trae una clave (cabecera ``Idempotency-Key`` o campo
+``idempotency_key`` del formulario), ``idempotente`` corre la vista dentro de
+una transacción de base que también inserta la clave en
+``ClaveIdempotencia`` y guarda la respuesta. Un doble envío o reintento con
+la misma clave recibe esa respuesta, con la cabecera ``Idempotent-Replayed``,
+sin volver a ejecutar la vista (ni cotizar, ni validar límites, ni insertar).
+
+El índice único de (alcance, clave) hace de cerrojo: el INSERT ``ON CONFLICT``
+de un reintento concurrente espera a que la primera petición termine y, si
+esta confirmó, lee su respuesta; si falló (excepción, rollback), el
+reintento queda como primera petición. No hay estado "en curso" que pueda
+quedar huérfano.
+
+Las claves se guardan por usuario; las de un anónimo, por su sesión. Una
+petición anónima sin sesión (un cliente de la API sin cookie) no tiene con
+qué separarse de otros anónimos y se atiende sin idempotencia.
+
+Las claves vencen a los ``IDEMPOTENCIA_TTL`` segundos: una clave vencida se
+reutiliza como nueva y ``purgar`` borra las vencidas. Reutilizar una clave
+vigente con otro cuerpo responde 422.
+"""
+import hashlib
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .models import ClaveIdempotencia
+
+CABECERA = "Idempotency-Key"
+CAMPO = "idempotency_key"
+
+
+def clave_de(request):
+    """Clave de idempotencia de la petición, o None si no trae."""
+    clave = (request.headers.get(CABECERA) or request.POST.get(CAMPO) or "").strip()
+    return clave or None
+
+
+def _huella(request):
+    digest = hashlib.sha256(f"{request.method} {request.path}\n".encode())
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def _titular(request):
+    """Usuario o sesión titular de las claves, o None si no hay ninguno."""
+    if request.user.is_authenticated:
+        return request.user.pk
+    session_key = request.session.session_key
+    return f"sesion:{session_key}" if session_key else None
+
+
+def asegurar_sesion(request):
+    """
+    Abre una sesión para un anónimo, para que su próximo envío tenga titular.
+    Lo llaman las vistas que entregan una clave en el formulario.
+    """
+    if not request.user.is_authenticated and not request.session.session_key:
+        request.session.save()
+        request.session.modified = True
+
+
+def _reservar(alcance, clave, huella, ahora):
+    """
+    Inserta la clave, o toma una vencida. Espera si otra petición la tiene
+    sin confirmar.
+
+    :return: True si la petición es la primera con esta clave
+    """
+    tabla = ClaveIdempotencia._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {tabla} (alcance, clave, huella, content_type, location, cuerpo, creada, vence)
+            VALUES (%s, %s, %s, '', '', ''::bytea, %s, %s)
+            ON CONFLICT (alcance, clave) DO UPDATE
+            SET huella = EXCLUDED.huella, status = NULL, content_type = '', location = '',
+                cuerpo = ''::bytea, creada = EXCLUDED.creada, vence = EXCLUDED.vence
+            WHERE {tabla}.vence <= EXCLUDED.creada
+            RETURNING id
+            """,
+            [alcance, clave, huella, ahora, ahora + timedelta(seconds=settings.IDEMPOTENCIA_TTL)],
+        )
+        return cursor.fetchone() is not None
+
+
+def _repetir(guardada, huella):
+    if guardada.huella != huella:
+        return JsonResponse(
+            {"error": "La clave de idempotencia ya se usó con otra petición."}, status=422
+        )
+    response = HttpResponse(bytes(guardada.cuerpo), status=guardada.status, content_type=guardada.content_type)
+    if guardada.location:
+        response["Location"] = guardada.location
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def idempotente(alcance):
+    """
+    Decorador de vista: las peticiones POST con clave de idempotencia se
+    ejecutan una sola vez por ``alcance`` y usuario (o sesión anónima).
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            if request.method != "POST":
+                return vista(request, *args, **kwargs)
+            # El cuerpo antes que request.POST, que en multipart consume el stream
+            huella = _huella(request)
+            clave = clave_de(request)
+            if clave is None:
+                return vista(request, *args, **kwargs)
+            if len(clave) > 255:
+                return JsonResponse({"error": "La clave de idempotencia supera los 255 caracteres."}, status=400)
+
+            titular = _titular(request)
+            if titular is None:
+                return vista(request, *args, **kwargs)
+            alcance_usuario = f"{alcance}:{titular}"
+            ahora = timezone.now()
+            with transaction.atomic():
+                if not _reservar(alcance_usuario, clave, huella, ahora):
+                    return _repetir(ClaveIdempotencia.objects.get(alcance=alcance_usuario, clave=clave), huella)
+                response = vista(request, *args, **kwargs)
+                guardada = ClaveIdempotencia.objects.filter(alcance=alcance_usuario, clave=clave)
+                if response.streaming:
+                    # No hay cuerpo que guardar: la clave no protege esta respuesta
+                    guardada.delete()
+                    return response
+                guardada.update(
+                    status=response.status_code,
+                    content_type=response.get("Content-Type", ""),
+                    location=response.get("Location", ""),
+                    cuerpo=response.content,
+                )
+            return response
+        return envoltura
+    return decorador
+
+
+def purgar(ahora=None):
+    """Borra las claves vencidas. :return: Claves borradas"""
+    return ClaveIdempotencia.objects.filter(vence__lte=ahora or timezone.now()).delete()[0]
@@ -0,0 +1,77 @@
+"""
+Benchmark de la cola de checkouts contra el Stripe falso local.
+
+Crea transacciones de compra sintéticas (cliente y moneda propios), levanta
+``transaccion.stripe_fake`` con la latencia indicada y, para cada cantidad
+de workers, encola un checkout por transacción y mide cuánto tarda
+``checkouts.ejecutar`` en vaciar la cola, junto con la latencia de las
+llamadas a Stripe según la pasarela. Al terminar borra todo lo creado.
+
+Los workers usan sus propias conexiones, así que los datos se confirman en
+la base (no se puede revertir en una transacción como en otros benchmarks).
+
+Ejemplo::
+
+    python manage.py benchmark_checkouts --trabajos 200 --latencia 0.25 --workers 1 4 16
+"""
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from clientes.models import Cliente
+from commons.enums import EstadoTransaccionEnum, TipoTransaccionEnum
+from monedas.models import Moneda
+from transaccion import acumulados, checkouts, pasarela
+from transaccion.models import CheckoutStripe, Transaccion
+from transaccion.stripe_fake import ServidorStripeFalso
+
+
+class Command(BaseCommand):
+    help = 'Mide el throughput de procesar_checkouts contra un Stripe falso con latencia.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trabajos', type=int, default=200, help='Checkouts por corrida')
+        parser.add_argument('--latencia', type=float, default=0.25,
+                            help='Segundos de latencia simulada de Stripe por llamada')
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16],
+                            help='Cantidades de workers a medir')
+
+    def handle(self, *args, **options):
+        cliente = Cliente.objects.create(nombre='Cliente bench checkouts')
+        moneda = Moneda.objects.create(codigo='ZZK', nombre='Moneda bench checkouts')
+        try:
+            txs = Transaccion.objects.bulk_create(
+                Transaccion(
+                    cliente=cliente, moneda=moneda, tipo=TipoTransaccionEnum.COMPRA,
+                    monto_operado=Decimal('100'), tasa_aplicada=Decimal('7300'),
+                    monto_pyg=Decimal('730000'), comision=Decimal('0'),
+                    estado=EstadoTransaccionEnum.PENDIENTE,
+                )
+                for _ in range(options['trabajos'])
+            )
+            acumulados.aplicar_lote(txs)
+
+            self.stdout.write(
+                f"{'workers':>8} | {'segundos':>9} | {'checkouts/s':>11} | {'p50 Stripe':>10} | {'p99 Stripe':>10}"
+            )
+            with ServidorStripeFalso(latencia=options['latencia']):
+                for workers in options['workers']:
+                    CheckoutStripe.objects.filter(transaccion__cliente=cliente).delete()
+                    CheckoutStripe.objects.bulk_create(CheckoutStripe(transaccion=tx) for tx in txs)
+
+                    pasarela.limpiar_metricas()
+                    inicio = time.perf_counter()
+                    procesados = checkouts.ejecutar(workers=workers, una_vez=True)
+                    duracion = time.perf_counter() - inicio
+                    latencia = pasarela.metricas()['checkout.crear.ok']
+                    self.stdout.write(
+                        f'{workers:>8} | {duracion:>9.2f} | {procesados / duracion:>11.1f} | '
+                        f"{'<=' + str(latencia['p50_ms']):>10} | {'<=' + str(latencia['p99_ms']):>10}"
+                    )
+        finally:
+            # Uno por uno para que las señales descuenten los acumuladores
+            for tx in Transaccion.objects.filter(cliente=cliente):
+                tx.delete()
+            cliente.delete()
+            moneda.delete(soft_delete=False)
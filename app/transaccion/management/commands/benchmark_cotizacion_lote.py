@@ -0,0 +1,87 @@
+"""
+Benchmark de calcular_api: N pedidos individuales vs. un único pedido en lote.
+
+Llama a la vista directamente (RequestFactory), incluyendo parseo y
+serialización JSON. Los datos se generan dentro de una transacción que se
+revierte al final.
+
+Ejemplo::
+
+    python manage.py benchmark_cotizacion_lote --tamanos 1 100 10000
+"""
+import json
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+
+from clientes.models import Cliente
+from commons.benchmark import contar_consultas
+from commons.enums import TipoTransaccionEnum
+from monedas.models import ComisionMoneda, Moneda, TasaCambio
+from transaccion import precios
+from transaccion.views import calcular_api
+
+
+class Command(BaseCommand):
+    help = 'Compara cotizar N ítems con N llamadas a calcular_api contra una sola llamada en lote.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanos', type=int, nargs='+', default=[1, 100, 10000],
+                            help='Cantidades de ítems a medir')
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+
+        def post(payload):
+            request = factory.post('/transacciones/calcular/', data=json.dumps(payload),
+                                   content_type='application/json')
+            response = calcular_api(request)
+            json.loads(response.content)
+            return response
+
+        with transaction.atomic():
+            items_base = self._seed()
+            post(items_base[0])  # calentar snapshot
+
+            self.stdout.write(f"{'ítems':>7} | {'individual (s)':>14} | {'lote (s)':>9} | "
+                              f"{'consultas ind.':>14} | {'consultas lote':>14} | mejora")
+            for n in options['tamanos']:
+                items = [random.choice(items_base) for _ in range(n)]
+
+                with contar_consultas() as c_ind:
+                    inicio = time.perf_counter()
+                    for item in items:
+                        post(item)
+                    t_ind = time.perf_counter() - inicio
+
+                with contar_consultas() as c_lote:
+                    inicio = time.perf_counter()
+                    post({'items': items})
+                    t_lote = time.perf_counter() - inicio
+
+                self.stdout.write(f'{n:>7} | {t_ind:>14.4f} | {t_lote:>9.4f} | '
+                                  f'{c_ind.total:>14} | {c_lote.total:>14} | x{t_ind / t_lote:.1f}')
+
+            transaction.set_rollback(True)
+        precios.descartar_snapshot_local()
+
+    def _seed(self):
+        """Crea 5 monedas con tasa y comisión, y un cliente por segmento."""
+        monedas = []
+        for i, codigo in enumerate(['ZZA', 'ZZB', 'ZZC', 'ZZD', 'ZZE']):
+            moneda = Moneda.objects.create(codigo=codigo, nombre=f'Moneda {codigo}')
+            TasaCambio.objects.create(moneda=moneda, compra=Decimal(1000 + i), venta=Decimal(1100 + i))
+            ComisionMoneda.objects.create(moneda=moneda, compra=Decimal('10'), venta=Decimal('20'))
+            monedas.append(moneda)
+        clientes = [Cliente.objects.create(nombre=f'Cliente {seg}', tipo=seg) for seg in ('MIN', 'CORP', 'VIP')]
+
+        return [
+            {'cliente': c.id, 'tipo': tipo, 'moneda': m.id, 'monto_operado': str(random.randint(1, 5000))}
+            for c in clientes
+            for m in monedas
+            for tipo in (TipoTransaccionEnum.COMPRA.value, TipoTransaccionEnum.VENTA.value)
+        ]
@@ -0,0 +1,61 @@
+"""
+Benchmark del cotizador: cotizaciones por segundo con y sin snapshot.
+
+Genera datos de prueba dentro de una transacción que se revierte al final,
+por lo que puede correrse contra cualquier base sin dejar residuos.
+
+Ejemplo::
+
+    python manage.py benchmark_cotizador --iteraciones 5000
+"""
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from clientes.models import Cliente
+from commons.benchmark import medir
+from commons.enums import TipoTransaccionEnum
+from monedas.models import Moneda, TasaCambio
+from transaccion import precios
+from transaccion.services import calcular_transaccion
+
+
+class Command(BaseCommand):
+    help = 'Mide cotizaciones por segundo de calcular_transaccion (sin snapshot vs. con snapshot).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iteraciones', type=int, default=2000, help='Cotizaciones por escenario')
+
+    def handle(self, *args, **options):
+        n = options['iteraciones']
+
+        with transaction.atomic():
+            moneda = Moneda.objects.create(codigo='ZZB', nombre='Moneda benchmark')
+            TasaCambio.objects.create(moneda=moneda, compra=Decimal('7000'), venta=Decimal('7200'))
+            cliente = Cliente.objects.create(nombre='Cliente benchmark', tipo='MIN')
+
+            def cotizar():
+                calcular_transaccion(cliente, TipoTransaccionEnum.COMPRA, moneda, Decimal('100'))
+
+            # "Antes": cada cotización vuelve a leer tasa, descuentos y comisiones,
+            # que es lo que hacía el cálculo antes del snapshot.
+            def sin_snapshot():
+                precios.descartar_snapshot_local()
+                cotizar()
+
+            escenarios = [('sin snapshot', sin_snapshot), ('con snapshot', cotizar)]
+            qps = {}
+            for nombre, fn in escenarios:
+                duracion, consultas = medir(fn, n)
+                qps[nombre] = n / duracion
+                self.stdout.write(
+                    f'{nombre:>14}: {qps[nombre]:>10.0f} cotizaciones/s | '
+                    f'{consultas / n:.2f} consultas/cotización'
+                )
+            self.stdout.write(self.style.SUCCESS(
+                f"Mejora: x{qps['con snapshot'] / qps['sin snapshot']:.1f}"
+            ))
+
+            transaction.set_rollback(True)
+        precios.descartar_snapshot_local()
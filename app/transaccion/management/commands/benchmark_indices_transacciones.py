@@ -0,0 +1,173 @@
+"""
+Benchmark de las consultas sobre Transaccion con y sin los índices compuestos.
+
+Carga millones de transacciones sintéticas (``INSERT ... SELECT`` con
+``generate_series``) dentro de una transacción que se revierte al final, mide
+latencia p50/p99 de las consultas reales de la aplicación con los índices de
+``Transaccion.Meta`` y el único de ``uuid``, los elimina (también dentro de la
+transacción) y vuelve a medir. La base queda intacta.
+
+Requiere PostgreSQL. La semilla fija hace la carga y las consultas
+reproducibles.
+
+Ejemplo::
+
+    python manage.py benchmark_indices_transacciones --filas 2000000 --repeticiones 300
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from clientes.models import Cliente
+from commons.benchmark import percentiles
+from commons.enums import EstadoTransaccionEnum
+from monedas.models import Moneda
+from transaccion.acumulados import ESTADOS_COMPROMETIDOS
+from transaccion.models import Transaccion
+
+
+class Command(BaseCommand):
+    help = 'Mide p50/p99 de las consultas de Transaccion con y sin índices compuestos, sobre datos sintéticos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=2_000_000, help='Transacciones a generar')
+        parser.add_argument('--clientes', type=int, default=5000, help='Clientes a generar')
+        parser.add_argument('--repeticiones', type=int, default=200, help='Ejecuciones por consulta y escenario')
+        parser.add_argument('--semilla', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['semilla'])
+
+        with transaction.atomic():
+            clientes, monedas, uuids = self._seed(options, rnd)
+            consultas = self._consultas(clientes, monedas, uuids)
+            n = options['repeticiones']
+
+            resultados = {'con índices': self._medir(consultas, n, rnd, options['semilla'])}
+            self._eliminar_indices()
+            resultados['sin índices'] = self._medir(consultas, n, rnd, options['semilla'])
+
+            self.stdout.write(f"{'consulta':>18} | {'escenario':>11} | {'p50 (ms)':>9} | {'p99 (ms)':>9}")
+            for nombre in consultas:
+                for escenario, medidas in resultados.items():
+                    p50, p99 = medidas[nombre]
+                    self.stdout.write(f'{nombre:>18} | {escenario:>11} | {p50:>9.3f} | {p99:>9.3f}')
+
+            transaction.set_rollback(True)
+
+    def _seed(self, options, rnd):
+        monedas = [
+            Moneda.objects.create(codigo=codigo, nombre=f'Moneda {codigo}').pk
+            for codigo in ('ZZA', 'ZZB', 'ZZC', 'ZZD', 'ZZE')
+        ]
+        segmentos = [s for s, _ in Cliente.SEGMENTOS]
+        clientes = [
+            c.pk for c in Cliente.objects.bulk_create(
+                Cliente(nombre=f'Cliente bench {i}', tipo=rnd.choice(segmentos))
+                for i in range(options['clientes'])
+            )
+        ]
+
+        self.stdout.write(f"Generando {options['filas']} transacciones...")
+        inicio = time.perf_counter()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT setseed(%s)', [(options['semilla'] % 1000) / 1000])
+            # Estados: 10% pendiente, 75% pagada, 10% cancelada, 5% anulada.
+            # Fechas: uniformes en los últimos dos años.
+            cursor.execute(
+                f"""
+                INSERT INTO {Transaccion._meta.db_table}
+                    (uuid, cliente_id, moneda_id, tipo, monto_operado, monto_pyg,
+                     tasa_aplicada, comision, estado, fecha)
+                SELECT gen_random_uuid(),
+                       (%s::bigint[])[1 + floor(random() * %s)::int],
+                       (%s::bigint[])[1 + floor(random() * %s)::int],
+                       CASE WHEN random() < 0.5 THEN 'compra' ELSE 'venta' END,
+                       m, m * 7000, 7000, 50,
+                       CASE WHEN r < 0.10 THEN 'pendiente'
+                            WHEN r < 0.85 THEN 'pagada'
+                            WHEN r < 0.95 THEN 'cancelada'
+                            ELSE 'anulada' END,
+                       now() - random() * interval '730 days'
+                FROM (
+                    SELECT round((random() * 5000)::numeric, 2) AS m, random() AS r
+                    FROM generate_series(1, %s)
+                ) AS g
+                """,
+                [clientes, len(clientes), monedas, len(monedas), options['filas']],
+            )
+            cursor.execute(f'ANALYZE {Transaccion._meta.db_table}')
+        self.stdout.write(f'Carga: {time.perf_counter() - inicio:.1f} s')
+
+        uuids = list(
+            Transaccion.objects.filter(cliente_id__in=clientes[:200]).values_list('uuid', flat=True)[:1000]
+        )
+        return clientes, monedas, uuids
+
+    def _consultas(self, clientes, monedas, uuids):
+        """Consultas de la aplicación, parametrizadas con un ``random.Random``."""
+        def inicio_mes():
+            return timezone.localtime().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+        def limites(rnd):
+            # Suma mensual de límites (como la reconstrucción de acumuladores)
+            return Transaccion.objects.filter(
+                cliente_id=rnd.choice(clientes), moneda_id=rnd.choice(monedas),
+                estado__in=ESTADOS_COMPROMETIDOS, fecha__gte=inicio_mes(),
+            ).aggregate(total=Sum('monto_pyg'))
+
+        def listado_cliente(rnd):
+            return list(Transaccion.objects.filter(
+                cliente_id=rnd.choice(clientes), estado=EstadoTransaccionEnum.PENDIENTE,
+            ).order_by('-fecha')[:20])
+
+        def listado_estado(rnd):
+            return list(Transaccion.objects.filter(
+                estado=rnd.choice([EstadoTransaccionEnum.PENDIENTE, EstadoTransaccionEnum.ANULADA]),
+            ).order_by('-fecha')[:20])
+
+        def contadores(rnd):
+            return list(Transaccion.objects.filter(cliente_id=rnd.choice(clientes))
+                        .values('estado').annotate(n=Count('id')).order_by())
+
+        def tauser(rnd):
+            return Transaccion.objects.filter(uuid=rnd.choice(uuids)).first()
+
+        return {
+            'limites': limites,
+            'listado_cliente': listado_cliente,
+            'listado_estado': listado_estado,
+            'contadores': contadores,
+            'tauser_uuid': tauser,
+        }
+
+    def _medir(self, consultas, n, rnd, semilla):
+        medidas = {}
+        for nombre, consulta in consultas.items():
+            rnd.seed(semilla)  # mismos parámetros en ambos escenarios
+            consulta(rnd)  # calentamiento
+            latencias = []
+            for _ in range(n):
+                inicio = time.perf_counter()
+                consulta(rnd)
+                latencias.append((time.perf_counter() - inicio) * 1000)
+            medidas[nombre] = percentiles(latencias, 50, 99)
+        return medidas
+
+    def _eliminar_indices(self):
+        tabla = Transaccion._meta.db_table
+        nombres = [idx.name for idx in Transaccion._meta.indexes]
+        with connection.cursor() as cursor:
+            # ALTER TABLE no admite chequeos de FK diferidos pendientes (de la carga)
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+            restricciones = connection.introspection.get_constraints(cursor, tabla)
+            unico_uuid = [n for n, r in restricciones.items() if r['unique'] and r['columns'] == ['uuid']]
+            for nombre in unico_uuid:
+                cursor.execute(f'ALTER TABLE {tabla} DROP CONSTRAINT {connection.ops.quote_name(nombre)}')
+            for nombre in nombres:
+                cursor.execute(f'DROP INDEX {connection.ops.quote_name(nombre)}')
+            cursor.execute(f'ANALYZE {tabla}')
@@ -0,0 +1,69 @@
+"""
+Concilia las transacciones con las sesiones de Checkout de Stripe
+(``transaccion.conciliacion``).
+
+Recorre las sesiones con la API de listado, repara los pagos que no quedaron
+registrados (estado PAGADA y movimiento) e informa las discrepancias. Con
+``--reporte`` las escribe en un CSV; con ``--sin-reparar`` solo informa.
+
+Ejemplo::
+
+    python manage.py conciliar_stripe --desde 2025-01-01
+    python manage.py conciliar_stripe --sin-reparar --reporte discrepancias.csv
+"""
+import csv
+import datetime
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from transaccion import conciliacion
+
+
+class Command(BaseCommand):
+    help = 'Concilia las transacciones con las sesiones de Checkout de Stripe y repara los pagos faltantes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Solo sesiones creadas desde esta fecha (YYYY-MM-DD)')
+        parser.add_argument('--pagina', type=int, default=100, help='Sesiones por página (máximo 100)')
+        parser.add_argument('--sin-reparar', action='store_true', help='Solo informar, sin reparar')
+        parser.add_argument('--reporte', help='Ruta del CSV de discrepancias')
+
+    def handle(self, *args, **options):
+        if not 1 <= options['pagina'] <= 100:
+            raise CommandError('--pagina debe estar entre 1 y 100.')
+        desde = None
+        if options['desde']:
+            try:
+                dia = datetime.date.fromisoformat(options['desde'])
+            except ValueError:
+                raise CommandError('--desde debe tener el formato YYYY-MM-DD.')
+            desde = timezone.make_aware(datetime.datetime.combine(dia, datetime.time.min))
+
+        resultado = conciliacion.conciliar(
+            desde=desde, limite=options['pagina'], reparar=not options['sin_reparar']
+        )
+        discrepancias = resultado['discrepancias']
+
+        if options['reporte']:
+            with open(options['reporte'], 'w', newline='', encoding='utf-8') as archivo:
+                writer = csv.DictWriter(archivo, fieldnames=['tipo', 'session_id', 'transaccion_id', 'detalle'])
+                writer.writeheader()
+                writer.writerows(discrepancias)
+
+        self.stdout.write(
+            f"Sesiones revisadas: {resultado['sesiones']} en {resultado['paginas']} páginas"
+        )
+        por_tipo = Counter(d['tipo'] for d in discrepancias)
+        for tipo in conciliacion.TIPOS:
+            if por_tipo[tipo]:
+                self.stdout.write(f'  {tipo}: {por_tipo[tipo]}')
+        if not options['reporte']:
+            for d in discrepancias:
+                self.stdout.write(
+                    f"  [{d['tipo']}] {d['session_id']} tx #{d['transaccion_id'] or '-'} {d['detalle']}".rstrip()
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f"Discrepancias: {len(discrepancias)} (transacciones reparadas: {resultado['reparadas']})"
+        ))
@@ -0,0 +1,113 @@
+"""
+Herramienta de carga y replay de webhooks de Stripe.
+
+Envía miles de eventos ``checkout.session.completed`` firmados con
+``STRIPE_WEBHOOK_SECRET`` (o ``--secreto``) a un servidor local, con
+``--concurrencia`` conexiones en paralelo y una fracción ``--duplicados`` de
+reenvíos del mismo evento (como los reintentos de Stripe). Informa
+respuestas por código HTTP, eventos por segundo y latencia p50/p99.
+
+Con ``--transacciones`` los eventos apuntan a esas transacciones (quedan
+pagadas al correr ``procesar_webhooks``); sin ella solo se carga la bandeja.
+Con ``--reenviar`` reenvía los eventos ya guardados en la bandeja.
+
+Ejemplo::
+
+    python manage.py disparar_webhooks --eventos 5000 --concurrencia 32 --duplicados 0.3
+    python manage.py disparar_webhooks --reenviar --url http://127.0.0.1:8000/transacciones/stripe/webhook/
+"""
+import json
+import random
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from commons.benchmark import percentiles
+from transaccion.models import EventoStripe
+from transaccion.stripe_fake import evento_pago, firmar
+
+
+class Command(BaseCommand):
+    help = 'Dispara webhooks de Stripe firmados (sintéticos o de la bandeja) contra un servidor local.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Endpoint del webhook (por defecto, SITE_URL + stripe_webhook)')
+        parser.add_argument('--eventos', type=int, default=5000, help='Envíos totales')
+        parser.add_argument('--duplicados', type=float, default=0.2,
+                            help='Fracción de envíos que repiten un evento ya enviado')
+        parser.add_argument('--concurrencia', type=int, default=16, help='Envíos en paralelo')
+        parser.add_argument('--transacciones', type=int, nargs='+', help='IDs a los que apuntan los eventos')
+        parser.add_argument('--reenviar', action='store_true', help='Reenviar los eventos de la bandeja')
+        parser.add_argument('--secreto', help='Secreto del endpoint (default: STRIPE_WEBHOOK_SECRET)')
+        parser.add_argument('--semilla', type=int, default=42)
+
+    def handle(self, *args, **options):
+        secreto = options['secreto'] or settings.STRIPE_WEBHOOK_SECRET
+        if not secreto:
+            raise CommandError('Falta el secreto del webhook (STRIPE_WEBHOOK_SECRET o --secreto).')
+        if not 0 <= options['duplicados'] < 1:
+            raise CommandError('--duplicados debe estar en [0, 1).')
+        url = options['url'] or f"{settings.SITE_URL}{reverse('transacciones:stripe_webhook')}"
+
+        cuerpos = self._cuerpos(options)
+        self.stdout.write(f'Enviando {len(cuerpos)} webhooks a {url}...')
+
+        def enviar(cuerpo):
+            pedido = urllib.request.Request(url, data=cuerpo.encode(), method='POST', headers={
+                'Content-Type': 'application/json',
+                'Stripe-Signature': firmar(cuerpo, secreto),
+            })
+            inicio = time.perf_counter()
+            try:
+                with urllib.request.urlopen(pedido, timeout=30) as respuesta:
+                    codigo = respuesta.status
+            except urllib.error.HTTPError as e:
+                codigo = e.code
+            except OSError:
+                codigo = 'sin respuesta'
+            return codigo, time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrencia']) as pool:
+            resultados = list(pool.map(enviar, cuerpos))
+        duracion = time.perf_counter() - inicio
+
+        codigos = Counter(codigo for codigo, _ in resultados)
+        p50, p99 = percentiles([latencia * 1000 for _, latencia in resultados], 50, 99)
+        self.stdout.write(f"Respuestas: {', '.join(f'{c}: {n}' for c, n in sorted(codigos.items(), key=str))}")
+        self.stdout.write(f'{len(cuerpos) / duracion:.0f} eventos/s | p50 {p50:.1f} ms | p99 {p99:.1f} ms')
+
+    def _cuerpos(self, options):
+        """Cuerpos JSON a enviar, en orden, con los duplicados intercalados."""
+        rnd = random.Random(options['semilla'])
+        if options['reenviar']:
+            eventos = [
+                json.dumps(payload)
+                for payload in EventoStripe.objects.order_by('id').values_list('payload', flat=True)
+            ]
+            if not eventos:
+                raise CommandError('La bandeja de webhooks está vacía.')
+            return eventos
+
+        transacciones = options['transacciones'] or [None]
+        enviados = []
+        for i in range(options['eventos']):
+            if enviados and rnd.random() < options['duplicados']:
+                enviados.append(rnd.choice(enviados))
+                continue
+            tx_id = transacciones[i % len(transacciones)]
+            session = {
+                'id': f'cs_test_carga_{i}',
+                'object': 'checkout.session',
+                'status': 'complete',
+                'payment_status': 'paid',
+                'metadata': {'transaccion_id': str(tx_id)} if tx_id else {},
+            }
+            enviados.append(json.dumps(evento_pago(session)))
+        return enviados
@@ -0,0 +1,48 @@
+"""
+Exporta transacciones o movimientos a un CSV comprimido con gzip.
+
+Usa el mismo generador que la descarga web (``transaccion.exportacion``):
+las filas se leen por bloques con un cursor del servidor y se escriben
+directo al archivo, con memoria constante sin importar cuántas sean.
+
+Ejemplo::
+
+    python manage.py exportar_transacciones transacciones --desde 2025-01-01 --hasta 2025-01-31
+    python manage.py exportar_transacciones movimientos --cliente 12 --salida /tmp/mov.csv.gz
+"""
+import gzip
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from transaccion import exportacion
+
+
+class Command(BaseCommand):
+    help = 'Exporta transacciones o movimientos a CSV gzip, en streaming.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tipo', choices=exportacion.TIPOS)
+        parser.add_argument('--salida', help='Archivo destino (por defecto, <tipo>_AAAAMMDD.csv.gz)')
+        parser.add_argument('--cliente', help='ID de cliente')
+        parser.add_argument('--moneda', help='Código de moneda')
+        parser.add_argument('--estado', help='Estado de la transacción')
+        parser.add_argument('--desde', help='Fecha inicial inclusiva (YYYY-MM-DD)')
+        parser.add_argument('--hasta', help='Fecha final inclusiva (YYYY-MM-DD)')
+        parser.add_argument('--chunk', type=int, default=settings.EXPORTACION_CHUNK,
+                            help='Filas por lectura y por bloque escrito')
+
+    def handle(self, *args, **options):
+        tipo = options['tipo']
+        try:
+            filtros = exportacion.leer_filtros(options)
+        except ValueError as e:
+            raise CommandError(str(e))
+        salida = options['salida'] or f'{tipo}_{timezone.localdate():%Y%m%d}.csv.gz'
+
+        qs = exportacion.consulta(tipo, **filtros)
+        with gzip.open(salida, 'wt', encoding='utf-8', newline='') as archivo:
+            for bloque in exportacion.filas_csv(tipo, qs, options['chunk']):
+                archivo.write(bloque)
+        self.stdout.write(self.style.SUCCESS(f'Exportación escrita en {salida}'))
@@ -0,0 +1,62 @@
+"""
+Mantiene el particionado mensual de Transaccion y Movimiento.
+
+Con ``--convertir`` pasa las tablas a particionadas (una vez, en una ventana
+de mantenimiento: bloquea las tablas mientras copia). Después conviene
+ejecutarlo a diario o mensualmente para tener creadas las particiones de los
+próximos meses y, con ``--retener-meses``, desacoplar las viejas (quedan como
+tablas sueltas ``<tabla>_pAAAA_MM`` para archivar).
+
+Ejemplo::
+
+    python manage.py particionar_transacciones --convertir
+    python manage.py particionar_transacciones --meses-adelante 3 --retener-meses 24
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import NotSupportedError, connection
+
+from transaccion import particiones
+
+
+class Command(BaseCommand):
+    help = 'Crea particiones mensuales futuras de Transaccion/Movimiento y desacopla las antiguas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convertir', action='store_true',
+                            help='Convertir las tablas a particionadas si todavía no lo están')
+        parser.add_argument('--meses-adelante', type=int, default=3,
+                            help='Meses futuros con partición creada (default: 3)')
+        parser.add_argument('--retener-meses', type=int,
+                            help='Desacoplar las particiones anteriores a estos meses completos '
+                                 '(por defecto, no se desacopla nada)')
+
+    def _informar(self, tabla, accion, nombres):
+        detalle = f': {", ".join(nombres)}' if nombres else ''
+        self.stdout.write(f'{tabla}: {len(nombres)} particiones {accion}{detalle}')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('El particionado requiere PostgreSQL.')
+        if options['retener_meses'] is not None and options['retener_meses'] < 1:
+            raise CommandError('--retener-meses debe ser al menos 1.')
+
+        for modelo in particiones.MODELOS:
+            tabla = modelo._meta.db_table
+            if options['convertir']:
+                try:
+                    cambios = particiones.convertir(modelo, options['meses_adelante'])
+                except NotSupportedError as e:
+                    raise CommandError(str(e))
+                if cambios is not None:
+                    self.stdout.write(f'{tabla}: convertida a particionada.')
+                    for cambio in cambios:
+                        self.stdout.write(self.style.WARNING(f'  {cambio}'))
+            if not particiones.esta_particionada(tabla):
+                raise CommandError(f'{tabla} no está particionada (usar --convertir).')
+
+            creadas = particiones.crear_futuras(tabla, options['meses_adelante'])
+            self._informar(tabla, 'creadas', creadas)
+            if options['retener_meses'] is not None:
+                viejas = particiones.desacoplar_anteriores(tabla, options['retener_meses'])
+                self._informar(tabla, 'desacopladas', viejas)
+        self.stdout.write(self.style.SUCCESS('Particiones al día.'))
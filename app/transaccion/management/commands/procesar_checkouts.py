@@ -0,0 +1,59 @@
+"""
+Worker de la cola de checkouts de Stripe (``transaccion.checkouts``).
+
+Crea las Sessions de Checkout encoladas por la vista de pago con tarjeta.
+Puede correr en varios nodos a la vez; dentro de cada uno, ``--workers``
+hilos atienden la cola en paralelo. Sin ``--una-vez`` queda escuchando hasta
+recibir Ctrl+C / SIGTERM.
+
+Ejemplo::
+
+    python manage.py procesar_checkouts --workers 8
+    python manage.py procesar_checkouts --una-vez
+"""
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from transaccion import checkouts, pasarela
+
+
+class Command(BaseCommand):
+    help = 'Procesa la cola de creación de checkouts de Stripe.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.STRIPE_CHECKOUT_WORKERS,
+                            help='Hilos que atienden la cola (default: STRIPE_CHECKOUT_WORKERS)')
+        parser.add_argument('--lote', type=int, default=1, help='Trabajos que toma cada hilo por vez')
+        parser.add_argument('--espera', type=float, default=1.0,
+                            help='Segundos entre sondeos cuando la cola está vacía')
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Procesar lo disponible y terminar')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['lote'] < 1:
+            raise CommandError('--workers y --lote deben ser al menos 1.')
+
+        detener = threading.Event()
+        if not options['una_vez']:
+            signal.signal(signal.SIGTERM, lambda *_: detener.set())
+            self.stdout.write(f"Atendiendo la cola con {options['workers']} workers...")
+        try:
+            procesados = checkouts.ejecutar(
+                workers=options['workers'],
+                lote=options['lote'],
+                una_vez=options['una_vez'],
+                espera=options['espera'],
+                detener=detener,
+            )
+        except KeyboardInterrupt:
+            detener.set()
+            raise
+        self.stdout.write(self.style.SUCCESS(f'Checkouts procesados: {procesados}'))
+        for operacion, h in pasarela.metricas().items():
+            self.stdout.write(
+                f"  {operacion}: {h['n']} llamadas, promedio {h['promedio_ms']:.0f} ms, "
+                f"p50 <= {h['p50_ms']} ms, p99 <= {h['p99_ms']} ms"
+            )
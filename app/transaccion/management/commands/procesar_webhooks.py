@@ -0,0 +1,50 @@
+"""
+Worker de la bandeja de webhooks de Stripe (``transaccion.webhooks``).
+
+Aplica los eventos pendientes por lotes: cada lote es una transacción de
+base que marca pagadas las transacciones y crea sus movimientos con
+sentencias por lote. Puede correr en varios nodos a la vez. Sin
+``--una-vez`` queda escuchando hasta recibir Ctrl+C / SIGTERM.
+
+Ejemplo::
+
+    python manage.py procesar_webhooks
+    python manage.py procesar_webhooks --lote 1000 --una-vez
+"""
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from transaccion import webhooks
+
+
+class Command(BaseCommand):
+    help = 'Procesa por lotes los webhooks de Stripe pendientes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=settings.STRIPE_WEBHOOK_LOTE,
+                            help='Eventos por lote (default: STRIPE_WEBHOOK_LOTE)')
+        parser.add_argument('--espera', type=float, default=1.0,
+                            help='Segundos entre sondeos cuando no hay pendientes')
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Procesar lo pendiente y terminar')
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser al menos 1.')
+
+        detener = threading.Event()
+        if not options['una_vez']:
+            signal.signal(signal.SIGTERM, lambda *_: detener.set())
+            self.stdout.write('Atendiendo la bandeja de webhooks...')
+
+        total = webhooks.atender(
+            lote=options['lote'], una_vez=options['una_vez'], espera=options['espera'], detener=detener
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Eventos procesados: {total['eventos']} "
+            f"(transacciones pagadas: {total['pagadas']}, ignorados: {total['ignorados']})"
+        ))
@@ -0,0 +1,21 @@
+"""
+Borra las claves de idempotencia vencidas (``transaccion.idempotencia``).
+
+Las vencidas ya no se usan (una clave vencida se reutiliza como nueva), así
+que esto solo acota el tamaño de la tabla. Pensado para correr desde cron.
+
+Ejemplo::
+
+    python manage.py purgar_idempotencia
+"""
+from django.core.management.base import BaseCommand
+
+from transaccion import idempotencia
+
+
+class Command(BaseCommand):
+    help = 'Borra las claves de idempotencia vencidas.'
+
+    def handle(self, *args, **options):
+        borradas = idempotencia.purgar()
+        self.stdout.write(self.style.SUCCESS(f'Claves de idempotencia borradas: {borradas}'))
@@ -0,0 +1,38 @@
+"""
+Reconstruye los acumuladores de límites desde las transacciones.
+
+Corrige cualquier desvío de ``AcumuladoLimite`` (cambios de estado hechos con
+``QuerySet.update()``, cargas manuales, etc.) recalculando los totales diarios
+y mensuales de las transacciones pendientes y pagadas.
+
+Ejemplo::
+
+    python manage.py reconstruir_acumulados --cliente 12 15
+    python manage.py reconstruir_acumulados --desde 2025-06-01
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from transaccion.acumulados import reconstruir
+
+
+def _fecha(valor):
+    d = parse_date(valor)
+    if d is None:
+        raise CommandError(f'Fecha inválida: {valor} (usar YYYY-MM-DD)')
+    return d
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los acumuladores de límites (AcumuladoLimite) desde Transaccion.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cliente', type=int, nargs='+', help='IDs de cliente (por defecto, todos)')
+        parser.add_argument('--desde', type=_fecha,
+                            help='Reconstruir solo desde el mes de esta fecha (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        filas, corregidas = reconstruir(options['cliente'], desde=options['desde'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{filas} acumuladores reconstruidos, {corregidas} corregidos.'
+        ))
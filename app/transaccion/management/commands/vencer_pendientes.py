@@ -0,0 +1,51 @@
+"""
+Barrido de transacciones PENDIENTES vencidas (``transaccion.vencimiento``).
+
+Cancela por lotes las pendientes que superaron el plazo de
+``TRANSACCION_VENCIMIENTO`` para su tipo y medio de pago, libera su límite
+y expira sus sesiones de Stripe abiertas. Puede correr en varios nodos a la
+vez. Con ``--una-vez`` (p. ej. desde cron) barre lo vencido y termina; si no,
+queda barriendo cada ``--espera`` segundos hasta recibir Ctrl+C / SIGTERM.
+
+Ejemplo::
+
+    python manage.py vencer_pendientes --una-vez
+    python manage.py vencer_pendientes --lote 5000 --espera 300
+"""
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from transaccion import vencimiento
+
+
+class Command(BaseCommand):
+    help = 'Cancela las transacciones pendientes vencidas y expira sus checkouts de Stripe.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=settings.TRANSACCION_VENCIMIENTO_LOTE,
+                            help='Transacciones por lote (default: TRANSACCION_VENCIMIENTO_LOTE)')
+        parser.add_argument('--espera', type=float, default=60.0,
+                            help='Segundos entre barridos cuando no hay vencidas')
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Barrer lo vencido y terminar')
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser al menos 1.')
+
+        detener = threading.Event()
+        if not options['una_vez']:
+            signal.signal(signal.SIGTERM, lambda *_: detener.set())
+            self.stdout.write('Barriendo transacciones pendientes vencidas...')
+
+        total = vencimiento.atender(
+            lote=options['lote'], una_vez=options['una_vez'], espera=options['espera'], detener=detener
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Transacciones vencidas: {total['vencidas']} "
+            f"(sesiones de Stripe expiradas: {total['sesiones_expiradas']})"
+        ))
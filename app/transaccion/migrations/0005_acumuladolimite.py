@@ -0,0 +1,64 @@
+# Generated by Django 5.2.5 on 2026-10-16 22:19
+
+import django.db.models.deletion
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+
+
+def poblar_acumulados(apps, schema_editor):
+    """Carga los acumuladores con el historial existente (pendientes y pagadas)."""
+    Transaccion = apps.get_model('transaccion', 'Transaccion')
+    AcumuladoLimite = apps.get_model('transaccion', 'AcumuladoLimite')
+
+    totales = defaultdict(lambda: [0, 0])
+    por_dia = (
+        Transaccion.objects.filter(estado__in=['pendiente', 'pagada'])
+        .annotate(dia=TruncDate('fecha'))
+        .values('cliente_id', 'moneda_id', 'dia')
+        .annotate(operado=Sum('monto_operado'), pyg=Sum('monto_pyg'))
+        .order_by()
+    )
+    for fila in por_dia:
+        for periodo, inicio in (('D', fila['dia']), ('M', fila['dia'].replace(day=1))):
+            acc = totales[(fila['cliente_id'], fila['moneda_id'], periodo, inicio)]
+            acc[0] += fila['operado']
+            acc[1] += fila['pyg']
+
+    AcumuladoLimite.objects.bulk_create(
+        [
+            AcumuladoLimite(cliente_id=c, moneda_id=m, periodo=p, inicio=i, monto_operado=op, monto_pyg=pyg)
+            for (c, m, p, i), (op, pyg) in totales.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0007_limitepyg_limitemoneda'),
+        ('monedas', '0006_tasacambio_tasa_previa'),
+        ('transaccion', '0004_transaccion_uuid'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AcumuladoLimite',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periodo', models.CharField(choices=[('D', 'Diario'), ('M', 'Mensual')], max_length=1)),
+                ('inicio', models.DateField(help_text='Día, o primer día del mes, en hora local')),
+                ('monto_operado', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('monto_pyg', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='clientes.cliente')),
+                ('moneda', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='monedas.moneda')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('cliente', 'moneda', 'periodo', 'inicio'), name='acumulado_limite_unico')],
+            },
+        ),
+        migrations.RunPython(poblar_acumulados, migrations.RunPython.noop),
+    ]
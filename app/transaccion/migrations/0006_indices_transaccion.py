@@ -0,0 +1,70 @@
+# Generated by Django 5.2.5 on 2026-10-16 22:29
+
+import uuid
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY no puede correr dentro de una transacción;
+    # así los índices se construyen sin bloquear altas de transacciones.
+    atomic = False
+
+    dependencies = [
+        ('transaccion', '0005_acumuladolimite'),
+    ]
+
+    operations = [
+        # 0004 agregó uuid con un default evaluado una sola vez: todas las
+        # filas previas quedaron con el mismo uuid. Se regeneran los repetidos
+        # (y los nulos) antes de exigir unicidad.
+        migrations.RunSQL(
+            """
+            UPDATE transaccion_transaccion AS t
+            SET uuid = gen_random_uuid()
+            WHERE t.uuid IS NULL
+               OR EXISTS (
+                   SELECT 1 FROM transaccion_transaccion AS o
+                   WHERE o.uuid = t.uuid AND o.id < t.id
+               )
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        # unique=True con AlterField construiría el índice con la tabla
+        # bloqueada: se construye CONCURRENTLY y se adopta como restricción
+        # (solo un bloqueo breve), con el nombre que le daría Django.
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS transaccion_transaccion_uuid_b9a717c3_uniq "
+                    "ON transaccion_transaccion (uuid)",
+                    reverse_sql="DROP INDEX CONCURRENTLY IF EXISTS transaccion_transaccion_uuid_b9a717c3_uniq",
+                ),
+                migrations.RunSQL(
+                    "ALTER TABLE transaccion_transaccion ADD CONSTRAINT transaccion_transaccion_uuid_b9a717c3_uniq "
+                    "UNIQUE USING INDEX transaccion_transaccion_uuid_b9a717c3_uniq",
+                    reverse_sql="ALTER TABLE transaccion_transaccion "
+                                "DROP CONSTRAINT IF EXISTS transaccion_transaccion_uuid_b9a717c3_uniq",
+                ),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='transaccion',
+                    name='uuid',
+                    field=models.UUIDField(blank=True, default=uuid.uuid4, editable=False, null=True, unique=True),
+                ),
+            ],
+        ),
+        AddIndexConcurrently(
+            model_name='transaccion',
+            index=models.Index(fields=['estado', 'fecha'], name='tx_estado_fecha_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='transaccion',
+            index=models.Index(fields=['cliente', 'estado', 'fecha'], name='tx_cliente_estado_fecha_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='transaccion',
+            index=models.Index(condition=models.Q(('estado__in', ['pendiente', 'pagada'])), fields=['cliente', 'moneda', 'fecha'], name='tx_limites_vigentes_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-16 22:49
+
+from django.db import migrations, models
+
+from transaccion.particiones import AgregarIndiceConcurrente
+
+
+class Migration(migrations.Migration):
+    # Índices para paginar el historial por (fecha, id) sin importar el
+    # estado; CONCURRENTLY (salvo tablas ya particionadas) no bloquea altas.
+    atomic = False
+
+    dependencies = [
+        ('transaccion', '0006_indices_transaccion'),
+    ]
+
+    operations = [
+        AgregarIndiceConcurrente(
+            model_name='transaccion',
+            index=models.Index(fields=['-fecha', '-id'], name='tx_fecha_id_idx'),
+        ),
+        AgregarIndiceConcurrente(
+            model_name='transaccion',
+            index=models.Index(fields=['cliente', '-fecha', '-id'], name='tx_cliente_fecha_id_idx'),
+        ),
+    ]
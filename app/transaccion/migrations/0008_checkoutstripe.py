@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-16 22:59
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transaccion', '0007_indices_listado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckoutStripe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('lista', 'Lista'), ('error', 'Error')], default='pendiente', max_length=10)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('disponible_desde', models.DateTimeField(default=django.utils.timezone.now, help_text='No se toma antes de este momento (reintentos)')),
+                ('tomado_en', models.DateTimeField(blank=True, null=True)),
+                ('session_id', models.CharField(blank=True, max_length=255)),
+                ('url', models.TextField(blank=True)),
+                ('error', models.TextField(blank=True)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+                ('transaccion', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='checkouts', to='transaccion.transaccion')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('estado__in', ['pendiente', 'procesando'])), fields=['disponible_desde', 'id'], name='checkout_cola_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('estado__in', ['pendiente', 'procesando'])), fields=('transaccion',), name='checkout_en_curso_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-16 23:21
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transaccion', '0009_eventostripe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaveIdempotencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alcance', models.CharField(help_text='Vista y usuario dueños de la clave', max_length=100)),
+                ('clave', models.CharField(max_length=255)),
+                ('huella', models.CharField(help_text='SHA-256 de método, ruta y cuerpo', max_length=64)),
+                ('status', models.PositiveSmallIntegerField(null=True)),
+                ('content_type', models.CharField(blank=True, max_length=255)),
+                ('location', models.TextField(blank=True)),
+                ('cuerpo', models.BinaryField(default=b'')),
+                ('creada', models.DateTimeField(default=django.utils.timezone.now)),
+                ('vence', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['vence'], name='clave_idempotencia_vence_idx')],
+                'constraints': [models.UniqueConstraint(fields=('alcance', 'clave'), name='clave_idempotencia_unica')],
+            },
+        ),
+    ]
@@ -1,5 +1,6 @@
 import uuid
 from django.db import models
+from django.utils import timezone
 
 from payments.models import PaymentMethod
 from clientes.models import Cliente
@@ -9,7 +10,7 @@ from monedas.models import Moneda
 
 
 class Transaccion(models.Model):
-    uuid = models.UUIDField(default=uuid.uuid4, editable=False, null=True, blank=True)
+    uuid = models.UUIDField(default=uuid.uuid4, editable=False, null=True, blank=True, unique=True)
     cliente = models.ForeignKey(
         Cliente, on_delete=models.CASCADE,
         related_name="transacciones", verbose_name="Cliente"
@@ -43,6 +44,22 @@ class Transaccion(models.Model):
     )
     fecha = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Listado y contadores por estado, global o por cliente, ordenados por fecha
+            models.Index(fields=["estado", "fecha"], name="tx_estado_fecha_idx"),
+            models.Index(fields=["cliente", "estado", "fecha"], name="tx_cliente_estado_fecha_idx"),
+            # Listado de todos los estados, paginado por (fecha, id)
+            models.Index(fields=["-fecha", "-id"], name="tx_fecha_id_idx"),
+            models.Index(fields=["cliente", "-fecha", "-id"], name="tx_cliente_fecha_id_idx"),
+            # Sumas de límites: solo los estados que consumen límite
+            models.Index(
+                fields=["cliente", "moneda", "fecha"],
+                condition=models.Q(estado__in=["pendiente", "pagada"]),
+                name="tx_limites_vigentes_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"#{self.id} | {self.uuid} | {self.get_tipo_display()} {self.moneda} - {self.cliente}"
 
@@ -72,3 +89,170 @@ class Movimiento(models.Model):
 
     def __str__(self):
         return f"{self.get_tipo_display()} {self.monto} PYG - {self.cliente}"
+
+
+class AcumuladoLimite(models.Model):
+    """
+    Total comprometido por un cliente en una moneda dentro de un período.
+
+    Suma las transacciones PENDIENTES y PAGADAS, que son las que cuentan para
+    los límites. Lo mantienen las señales de Transaccion (ver
+    ``transaccion.acumulados``), de modo que validar límites es leer una fila
+    en lugar de agregar el historial del cliente.
+    """
+    DIARIO = "D"
+    MENSUAL = "M"
+    PERIODOS = [(DIARIO, "Diario"), (MENSUAL, "Mensual")]
+
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name="+")
+    moneda = models.ForeignKey(Moneda, on_delete=models.CASCADE, related_name="+")
+    periodo = models.CharField(max_length=1, choices=PERIODOS)
+    inicio = models.DateField(help_text="Día, o primer día del mes, en hora local")
+    monto_operado = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    monto_pyg = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["cliente", "moneda", "periodo", "inicio"],
+                name="acumulado_limite_unico",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.cliente} {self.moneda} {self.get_periodo_display()} {self.inicio}: {self.monto_pyg} PYG"
+
+
+class CheckoutStripe(models.Model):
+    """
+    Trabajo de creación de una Session de Checkout de Stripe.
+
+    La vista de pago con tarjeta solo encola el trabajo; el comando
+    ``procesar_checkouts`` llama a Stripe fuera del ciclo de la petición y
+    deja la URL lista para que la página de espera redirija (ver
+    ``transaccion.checkouts``).
+
+    La FK a Transaccion no tiene restricción en la base porque la tabla puede
+    estar particionada (ver ``transaccion.particiones``).
+    """
+    PENDIENTE = "pendiente"
+    PROCESANDO = "procesando"
+    LISTA = "lista"
+    ERROR = "error"
+    ESTADOS = [
+        (PENDIENTE, "Pendiente"),
+        (PROCESANDO, "Procesando"),
+        (LISTA, "Lista"),
+        (ERROR, "Error"),
+    ]
+
+    transaccion = models.ForeignKey(
+        Transaccion, on_delete=models.CASCADE, db_constraint=False, related_name="checkouts"
+    )
+    estado = models.CharField(max_length=10, choices=ESTADOS, default=PENDIENTE)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    disponible_desde = models.DateTimeField(
+        default=timezone.now, help_text="No se toma antes de este momento (reintentos)"
+    )
+    tomado_en = models.DateTimeField(null=True, blank=True)
+    session_id = models.CharField(max_length=255, blank=True)
+    url = models.TextField(blank=True)
+    error = models.TextField(blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Cola: trabajos a tomar, en orden de llegada
+            models.Index(
+                fields=["disponible_desde", "id"],
+                condition=models.Q(estado__in=["pendiente", "procesando"]),
+                name="checkout_cola_idx",
+            ),
+        ]
+        constraints = [
+            # Un solo trabajo en curso por transacción (doble clic, reintentos del navegador)
+            models.UniqueConstraint(
+                fields=["transaccion"],
+                condition=models.Q(estado__in=["pendiente", "procesando"]),
+                name="checkout_en_curso_unico",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Checkout tx #{self.transaccion_id} ({self.get_estado_display()})"
+
+
+class EventoStripe(models.Model):
+    """
+    Bandeja de entrada de los webhooks de Stripe.
+
+    El endpoint solo verifica la firma e inserta el evento; ``evento_id`` es
+    único, así que los reintentos de Stripe se descartan en el mismo INSERT
+    (``ON CONFLICT DO NOTHING``). El comando ``procesar_webhooks`` aplica los
+    pendientes por lotes (ver ``transaccion.webhooks``).
+    """
+    PENDIENTE = "pendiente"
+    PROCESADO = "procesado"
+    IGNORADO = "ignorado"
+    ERROR = "error"
+    ESTADOS = [
+        (PENDIENTE, "Pendiente"),
+        (PROCESADO, "Procesado"),
+        (IGNORADO, "Ignorado"),
+        (ERROR, "Error"),
+    ]
+
+    evento_id = models.CharField(max_length=255, unique=True)
+    tipo = models.CharField(max_length=100)
+    transaccion_id = models.BigIntegerField(
+        null=True, blank=True, help_text="metadata.transaccion_id de la sesión (sin FK)"
+    )
+    payload = models.JSONField()
+    estado = models.CharField(max_length=10, choices=ESTADOS, default=PENDIENTE)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    recibido = models.DateTimeField(auto_now_add=True)
+    procesado_en = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["id"], condition=models.Q(estado="pendiente"), name="evento_stripe_pendiente_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.evento_id} {self.tipo} ({self.get_estado_display()})"
+
+
+class ClaveIdempotencia(models.Model):
+    """
+    Respuesta guardada de una petición con clave de idempotencia.
+
+    Un reintento o doble envío con la misma clave (cabecera
+    ``Idempotency-Key`` o campo ``idempotency_key`` del formulario) recibe la
+    respuesta original sin volver a cotizar, validar límites ni insertar (ver
+    ``transaccion.idempotencia``). Las claves vencen a los
+    ``IDEMPOTENCIA_TTL`` segundos.
+    """
+    alcance = models.CharField(max_length=100, help_text="Vista y usuario dueños de la clave")
+    clave = models.CharField(max_length=255)
+    huella = models.CharField(max_length=64, help_text="SHA-256 de método, ruta y cuerpo")
+    status = models.PositiveSmallIntegerField(null=True)
+    content_type = models.CharField(max_length=255, blank=True)
+    location = models.TextField(blank=True)
+    cuerpo = models.BinaryField(default=b"")
+    creada = models.DateTimeField(default=timezone.now)
+    vence = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["alcance", "clave"], name="clave_idempotencia_unica"),
+        ]
+        indexes = [
+            models.Index(fields=["vence"], name="clave_idempotencia_vence_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.alcance} {self.clave}"
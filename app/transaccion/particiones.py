@@ -0,0 +1,336 @@
+"""
+Particionado mensual (PostgreSQL) de Transaccion y Movimiento por ``fecha``.
+
+Es opcional: las tablas se crean sin particionar y se convierten con
+``python manage.py particionar_transacciones --convertir``. A partir de ahí
+cada mes es una partición ``<tabla>_pAAAA_MM`` (meses en hora local,
+``TIME_ZONE``) y una partición ``<tabla>_default`` recibe las filas fuera de
+rango. El mismo comando, ejecutado periódicamente, crea los meses futuros y
+desacopla los viejos.
+
+Diferencias con las tablas sin particionar (PostgreSQL exige que toda clave
+única incluya la columna de partición):
+
+- la clave primaria pasa a ser ``(id, fecha)``; ``id`` sigue saliendo de la
+  misma secuencia, por lo que el ORM lo sigue usando como clave,
+- ``Transaccion.uuid`` pasa a ser único por ``(uuid, fecha)``: la base ya no
+  impide el mismo uuid en dos fechas distintas (los uuid4 no se repiten),
+- ``Movimiento.transaccion`` pierde la FK en la base (el borrado en cascada
+  lo hace Django). Cualquier otra FK que apunte a estas tablas hace fallar
+  la conversión en lugar de borrarse.
+
+``convertir`` devuelve estos cambios y el comando los informa.
+
+Las migraciones que luego alteren esas columnas deben tenerlo en cuenta.
+
+Las consultas acotadas por fecha deben filtrar ``fecha`` directamente con
+rangos (``fecha__gte`` / ``fecha__lt``, ver ``rango_meses``) para que
+PostgreSQL descarte las particiones que no tocan; ``fecha__date`` o
+``TruncDate`` en el WHERE recorren todas.
+
+Una partición desacoplada queda como tabla independiente (para archivar o
+borrar) y sus filas dejan de verse desde el ORM.
+"""
+import re
+from datetime import date, datetime, time
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import NotSupportedError, connection, transaction
+from django.db.migrations.operations import AddIndex
+from django.utils import timezone
+
+from .models import Movimiento, Transaccion
+
+#: Modelos particionados, en el orden en que se convierten.
+MODELOS = (Transaccion, Movimiento)
+
+_MES = re.compile(r"_p(\d{4})_(\d{2})$")
+
+
+def sumar_meses(dia, meses):
+    """Primer día del mes ``meses`` posterior (o anterior) al de ``dia``."""
+    anios, mes = divmod(dia.month - 1 + meses, 12)
+    return date(dia.year + anios, mes + 1, 1)
+
+
+def inicio_mes(dia):
+    """Medianoche local del primer día del mes de ``dia`` (datetime aware)."""
+    return timezone.make_aware(datetime.combine(dia.replace(day=1), time.min))
+
+
+def rango_meses(desde, hasta=None):
+    """
+    Límites ``[inicio, fin)`` que cubren los meses de ``desde`` a ``hasta``
+    (por defecto, el mismo mes), para filtrar con ``fecha__gte``/``fecha__lt``.
+    """
+    return inicio_mes(desde), inicio_mes(sumar_meses(hasta or desde, 1))
+
+
+class AgregarIndiceConcurrente(AddIndexConcurrently):
+    """
+    ``AddIndexConcurrently`` para estas tablas: si ya están particionadas
+    (donde PostgreSQL no admite CONCURRENTLY) crea el índice con un
+    ``CREATE INDEX`` común, que se propaga a las particiones.
+    """
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT relkind FROM pg_class WHERE oid = %s::regclass", [model._meta.db_table]
+            )
+            particionada = cursor.fetchone()[0] == "p"
+        if particionada:
+            AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+        else:
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+
+def nombre_particion(tabla, mes):
+    return f"{tabla}_p{mes:%Y_%m}"
+
+
+def _cotizar(nombre):
+    return connection.ops.quote_name(nombre)
+
+
+def esta_particionada(tabla):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass", [tabla])
+        return cursor.fetchone()[0] == "p"
+
+
+def particiones(tabla):
+    """
+    Particiones mensuales de ``tabla``.
+
+    Returns:
+        dict: ``{primer día del mes: nombre de la partición}``, ordenado.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = %s::regclass
+            """,
+            [tabla],
+        )
+        nombres = [fila[0] for fila in cursor.fetchall()]
+    meses = {}
+    for nombre in nombres:
+        coincidencia = _MES.search(nombre)
+        if coincidencia:
+            meses[date(int(coincidencia[1]), int(coincidencia[2]), 1)] = nombre
+    return dict(sorted(meses.items()))
+
+
+def _crear_particion(cursor, padre, nombre, mes):
+    desde, hasta = rango_meses(mes)
+    cursor.execute(
+        f"CREATE TABLE {_cotizar(nombre)} PARTITION OF {_cotizar(padre)} "
+        f"FOR VALUES FROM ('{desde.isoformat()}') TO ('{hasta.isoformat()}')"
+    )
+
+
+def crear_particion(tabla, mes):
+    """
+    Crea la partición del mes de ``mes`` si no existe.
+
+    Si la partición por defecto ya tiene filas de ese mes, se mueven a la
+    nueva (PostgreSQL no permite crearla de otro modo).
+
+    Returns:
+        bool: ``True`` si se creó.
+    """
+    mes = mes.replace(day=1)
+    if mes in particiones(tabla):
+        return False
+    nueva, default = nombre_particion(tabla, mes), f"{tabla}_default"
+    desde, hasta = rango_meses(mes)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT EXISTS (SELECT 1 FROM {_cotizar(default)} WHERE fecha >= %s AND fecha < %s)",
+            [desde, hasta],
+        )
+        if not cursor.fetchone()[0]:
+            _crear_particion(cursor, tabla, nueva, mes)
+            return True
+        cursor.execute(f"ALTER TABLE {_cotizar(tabla)} DETACH PARTITION {_cotizar(default)}")
+        _crear_particion(cursor, tabla, nueva, mes)
+        cursor.execute(
+            f"""
+            WITH movidas AS (
+                DELETE FROM {_cotizar(default)} WHERE fecha >= %s AND fecha < %s RETURNING *
+            )
+            INSERT INTO {_cotizar(nueva)} SELECT * FROM movidas
+            """,
+            [desde, hasta],
+        )
+        cursor.execute(f"ALTER TABLE {_cotizar(tabla)} ATTACH PARTITION {_cotizar(default)} DEFAULT")
+    return True
+
+
+def crear_futuras(tabla, meses, hoy=None):
+    """Asegura las particiones del mes actual y de los ``meses`` siguientes."""
+    hoy = hoy or timezone.localdate()
+    return [
+        nombre_particion(tabla, mes)
+        for mes in (sumar_meses(hoy, n) for n in range(meses + 1))
+        if crear_particion(tabla, mes)
+    ]
+
+
+def desacoplar_anteriores(tabla, retener, hoy=None):
+    """
+    Desacopla las particiones de meses anteriores a los últimos ``retener``
+    meses completos (el mes actual siempre se conserva).
+
+    Returns:
+        list[str]: Nombres de las particiones desacopladas.
+    """
+    limite = sumar_meses(hoy or timezone.localdate(), -retener)
+    viejas = [nombre for mes, nombre in particiones(tabla).items() if mes < limite]
+    with transaction.atomic(), connection.cursor() as cursor:
+        for nombre in viejas:
+            cursor.execute(f"ALTER TABLE {_cotizar(tabla)} DETACH PARTITION {_cotizar(nombre)}")
+    return viejas
+
+
+def convertir(modelo, meses_adelante=0):
+    """
+    Convierte la tabla de ``modelo`` en una particionada por mes, con los
+    mismos datos, índices y FKs salientes.
+
+    Trabaja en una sola transacción y bloquea la tabla mientras copia: es
+    una operación de mantenimiento. No hace nada si ya está particionada.
+
+    Raises:
+        NotSupportedError: Si otra tabla, fuera de ``MODELOS``, tiene una FK
+            hacia esta.
+
+    Returns:
+        list[str] | None: Las restricciones que cambian o se pierden, o
+        ``None`` si ya estaba particionada.
+    """
+    tabla = modelo._meta.db_table
+    if esta_particionada(tabla):
+        return None
+    nueva = f"{tabla}_nueva"
+    pk = modelo._meta.pk.column
+    cambios = [f"{tabla}: la clave primaria pasa a ser ({pk}, fecha)"]
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {_cotizar(tabla)} IN ACCESS EXCLUSIVE MODE")
+
+        # FKs entrantes: solo se admiten las de las otras tablas particionadas
+        cursor.execute(
+            """
+            SELECT conname, conrelid::regclass::text FROM pg_constraint
+            WHERE contype = 'f' AND confrelid = %s::regclass AND conrelid <> confrelid
+            """,
+            [tabla],
+        )
+        entrantes = cursor.fetchall()
+        propias = {m._meta.db_table for m in MODELOS}
+        ajenas = [f"{origen}.{nombre}" for nombre, origen in entrantes if origen not in propias]
+        if ajenas:
+            raise NotSupportedError(
+                f"No se puede particionar {tabla}: tiene FKs entrantes que se perderían "
+                f"({', '.join(ajenas)}). Quitarlas o declararlas con db_constraint=False."
+            )
+
+        # Índices y restricciones actuales, para recrearlos sobre la nueva tabla
+        cursor.execute(
+            """
+            SELECT conname, contype, pg_get_constraintdef(oid), conindid
+            FROM pg_constraint WHERE conrelid = %s::regclass
+            """,
+            [tabla],
+        )
+        restricciones = cursor.fetchall()
+        cursor.execute(
+            """
+            SELECT i.indexrelid, pg_get_indexdef(i.indexrelid)
+            FROM pg_index i WHERE i.indrelid = %s::regclass
+            """,
+            [tabla],
+        )
+        indices = dict(cursor.fetchall())
+        cursor.execute(
+            "SELECT attidentity FROM pg_attribute WHERE attrelid = %s::regclass AND attname = %s",
+            [tabla, pk],
+        )
+        identidad = cursor.fetchone()[0]
+        cursor.execute(f"SELECT min(fecha) FROM {_cotizar(tabla)}")
+        primera = cursor.fetchone()[0]
+
+        cursor.execute(
+            f"""
+            CREATE TABLE {_cotizar(nueva)} (
+                LIKE {_cotizar(tabla)} INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING STORAGE
+            ) PARTITION BY RANGE (fecha)
+            """
+        )
+        hoy = timezone.localdate()
+        mes = timezone.localdate(primera).replace(day=1) if primera else hoy.replace(day=1)
+        while mes <= sumar_meses(hoy, meses_adelante):
+            _crear_particion(cursor, nueva, nombre_particion(tabla, mes), mes)
+            mes = sumar_meses(mes, 1)
+        cursor.execute(f"CREATE TABLE {_cotizar(tabla + '_default')} PARTITION OF {_cotizar(nueva)} DEFAULT")
+        cursor.execute(
+            f"INSERT INTO {_cotizar(nueva)} OVERRIDING SYSTEM VALUE SELECT * FROM {_cotizar(tabla)}"
+        )
+
+        if not identidad:
+            # Columna serial: la secuencia pertenece a la tabla vieja y se
+            # borraría con ella.
+            cursor.execute("SELECT pg_get_serial_sequence(%s, %s)", [tabla, pk])
+            cursor.execute(f"ALTER SEQUENCE {cursor.fetchone()[0]} OWNED BY {_cotizar(nueva)}.{_cotizar(pk)}")
+        for nombre, origen in entrantes:
+            cursor.execute(f"ALTER TABLE {_cotizar(origen)} DROP CONSTRAINT {_cotizar(nombre)}")
+            cambios.append(f"{origen}: se quita la FK {nombre} hacia {tabla} (el borrado en cascada lo hace Django)")
+        cursor.execute(f"DROP TABLE {_cotizar(tabla)}")
+        cursor.execute(f"ALTER TABLE {_cotizar(nueva)} RENAME TO {_cotizar(tabla)}")
+        cursor.execute("SELECT pg_get_serial_sequence(%s, %s)", [tabla, pk])
+        secuencia = cursor.fetchone()[0]
+        if identidad:
+            # La identidad de la tabla nueva toma el nombre de la original
+            cursor.execute(f"ALTER SEQUENCE {secuencia} RENAME TO {_cotizar(f'{tabla}_{pk}_seq')}")
+            secuencia = f"{tabla}_{pk}_seq"
+        cursor.execute(
+            f"SELECT setval(%s::regclass, COALESCE((SELECT max({_cotizar(pk)}) FROM {_cotizar(tabla)}), 1))",
+            [secuencia],
+        )
+
+        de_restricciones = set()
+        for nombre, tipo, definicion, indice in restricciones:
+            if tipo in ("p", "u"):
+                de_restricciones.add(indice)
+            if tipo == "p":
+                cursor.execute(
+                    f"ALTER TABLE {_cotizar(tabla)} ADD CONSTRAINT {_cotizar(nombre)} "
+                    f"PRIMARY KEY ({_cotizar(pk)}, fecha)"
+                )
+            elif tipo == "u":
+                # Una restricción única sin ``fecha`` no es posible: se le agrega
+                columnas = re.fullmatch(r"UNIQUE \((.+)\)", definicion)[1]
+                cursor.execute(
+                    f"ALTER TABLE {_cotizar(tabla)} ADD CONSTRAINT {_cotizar(nombre)} "
+                    f"UNIQUE ({columnas}, fecha)"
+                )
+                cambios.append(f"{tabla}: {nombre} pasa a ser única por ({columnas}, fecha)")
+            elif tipo == "f" and _referencia_particionada(cursor, definicion):
+                cambios.append(f"{tabla}: se quita la FK {nombre} (apunta a una tabla particionada)")
+                continue
+            elif tipo in ("f", "c"):
+                cursor.execute(f"ALTER TABLE {_cotizar(tabla)} ADD CONSTRAINT {_cotizar(nombre)} {definicion}")
+        for indice, definicion in indices.items():
+            if indice not in de_restricciones:
+                cursor.execute(definicion)
+    return cambios
+
+
+def _referencia_particionada(cursor, definicion):
+    """Una FK hacia una tabla particionada necesitaría ``fecha`` en la referencia."""
+    referida = re.search(r"REFERENCES (\S+)\(", definicion)[1]
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass", [referida])
+    return cursor.fetchone()[0] == "p"
@@ -0,0 +1,227 @@
+"""
+Pasarela de pagos: único punto de llamada a la API de Stripe.
+
+Todo acceso a Stripe (crear, obtener, listar y expirar sesiones de Checkout) pasa por
+las funciones de este módulo, que delegan en un backend configurable
+(``PASARELA_BACKEND``):
+
+- ``BackendStripe``: el SDK con un ``StripeClient`` propio (no la
+  configuración global del módulo ``stripe``), sobre una sesión de
+  ``requests`` con conexiones keep-alive (``STRIPE_POOL_CONEXIONES`` por
+  proceso) y timeouts de conexión y lectura acotados.
+- ``BackendFalso``: ``stripe_fake.StripeFalso`` en memoria, sin red, para
+  tests y benchmarks.
+
+La pasarela reintenta los errores transitorios (conexión, timeout, 429 y
+5xx) con espera exponencial y jitter, reutilizando la clave de idempotencia
+en los POST para que un reintento nunca duplique una sesión. Cada intento
+queda en un histograma de latencia por operación (``metricas()``).
+"""
+import logging
+import random
+import threading
+import time
+import uuid
+
+import requests
+import stripe
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+from commons.metricas import Registro
+
+logger = logging.getLogger(__name__)
+
+_metricas = Registro()
+
+#: Ajustes con los que se construye el backend; el resto se lee en cada llamada.
+AJUSTES_BACKEND = frozenset({
+    "PASARELA_BACKEND", "STRIPE_SECRET_KEY", "STRIPE_API_BASE",
+    "STRIPE_TIMEOUT_CONEXION", "STRIPE_TIMEOUT_LECTURA", "STRIPE_POOL_CONEXIONES",
+})
+_pasarela = None
+_lock = threading.Lock()
+
+
+class BackendStripe:
+    """Backend real: ``StripeClient`` con pool keep-alive y timeouts."""
+
+    def __init__(self):
+        sesion = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=settings.STRIPE_POOL_CONEXIONES)
+        sesion.mount("https://", adaptador)
+        sesion.mount("http://", adaptador)
+        http = stripe.RequestsClient(
+            session=sesion,
+            timeout=(settings.STRIPE_TIMEOUT_CONEXION, settings.STRIPE_TIMEOUT_LECTURA),
+        )
+        base = {"api": settings.STRIPE_API_BASE} if settings.STRIPE_API_BASE else None
+        # Los reintentos los hace la pasarela (para medirlos y acotarlos)
+        self.cliente = stripe.StripeClient(
+            settings.STRIPE_SECRET_KEY, http_client=http, base_addresses=base, max_network_retries=0
+        )
+
+    def crear_sesion(self, parametros, clave_idempotencia):
+        return self.cliente.v1.checkout.sessions.create(
+            params=parametros, options={"idempotency_key": clave_idempotencia}
+        )
+
+    def obtener_sesion(self, session_id):
+        return self.cliente.v1.checkout.sessions.retrieve(session_id)
+
+    def listar_sesiones(self, parametros):
+        return self.cliente.v1.checkout.sessions.list(params=parametros)
+
+    def expirar_sesion(self, session_id):
+        return self.cliente.v1.checkout.sessions.expire(session_id)
+
+
+class BackendFalso:
+    """Backend en memoria (``stripe_fake.StripeFalso``), sin red."""
+
+    def __init__(self, stripe_falso=None):
+        from .stripe_fake import StripeFalso
+
+        self.stripe = stripe_falso or StripeFalso()
+
+    def _llamada(self, metodo, ruta):
+        if self.stripe.simular(metodo, ruta):
+            raise stripe.error.APIError("Falla simulada", http_status=500)
+
+    def crear_sesion(self, parametros, clave_idempotencia):
+        self._llamada("POST", "/v1/checkout/sessions")
+        return stripe.checkout.Session.construct_from(
+            self.stripe.crear(parametros, clave_idempotencia), settings.STRIPE_SECRET_KEY
+        )
+
+    def obtener_sesion(self, session_id):
+        self._llamada("GET", f"/v1/checkout/sessions/{session_id}")
+        session = self.stripe.obtener(session_id)
+        if session is None:
+            raise stripe.error.InvalidRequestError("No such checkout.session", "id", http_status=404)
+        return stripe.checkout.Session.construct_from(session, settings.STRIPE_SECRET_KEY)
+
+    def listar_sesiones(self, parametros):
+        self._llamada("GET", "/v1/checkout/sessions")
+        return stripe.ListObject.construct_from(self.stripe.listar(**parametros), settings.STRIPE_SECRET_KEY)
+
+    def expirar_sesion(self, session_id):
+        self._llamada("POST", f"/v1/checkout/sessions/{session_id}/expire")
+        try:
+            session = self.stripe.expirar(session_id)
+        except ValueError as e:
+            raise stripe.error.InvalidRequestError(str(e), None, http_status=400)
+        if session is None:
+            raise stripe.error.InvalidRequestError("No such checkout.session", "id", http_status=404)
+        return stripe.checkout.Session.construct_from(session, settings.STRIPE_SECRET_KEY)
+
+
+def _reintentable(error):
+    """Errores transitorios, en los que repetir la misma llamada tiene sentido."""
+    if isinstance(error, (stripe.error.APIConnectionError, stripe.error.RateLimitError)):
+        return True
+    debe = (error.headers or {}).get("stripe-should-retry")
+    if debe is not None:
+        return debe == "true"
+    return isinstance(error, stripe.error.APIError) or (error.http_status or 0) >= 500
+
+
+def _espera(intento):
+    """Espera exponencial con jitter ("equal jitter") antes del reintento ``intento`` (desde 0)."""
+    tope = min(settings.STRIPE_REINTENTO_BASE * 2 ** intento, settings.STRIPE_REINTENTO_TOPE)
+    return tope / 2 + random.uniform(0, tope / 2)
+
+
+class Pasarela:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def _llamar(self, operacion, funcion, *args):
+        reintentos = settings.STRIPE_REINTENTOS
+        for intento in range(reintentos + 1):
+            inicio = time.perf_counter()
+            try:
+                resultado = funcion(*args)
+            except stripe.error.StripeError as e:
+                _metricas[f"{operacion}.error"].registrar((time.perf_counter() - inicio) * 1000)
+                if intento == reintentos or not _reintentable(e):
+                    raise
+                logger.warning("[STRIPE] %s falló (intento %s), se reintenta: %s", operacion, intento + 1, e)
+                time.sleep(_espera(intento))
+            else:
+                _metricas[f"{operacion}.ok"].registrar((time.perf_counter() - inicio) * 1000)
+                return resultado
+
+    def crear_sesion(self, parametros, clave_idempotencia=None):
+        clave = clave_idempotencia or str(uuid.uuid4())
+        return self._llamar("checkout.crear", self.backend.crear_sesion, parametros, clave)
+
+    def obtener_sesion(self, session_id):
+        return self._llamar("checkout.obtener", self.backend.obtener_sesion, session_id)
+
+    def listar_sesiones(self, limite=100, despues_de=None):
+        parametros = {"limit": limite}
+        if despues_de:
+            parametros["starting_after"] = despues_de
+        return self._llamar("checkout.listar", self.backend.listar_sesiones, parametros)
+
+    def expirar_sesion(self, session_id):
+        return self._llamar("checkout.expirar", self.backend.expirar_sesion, session_id)
+
+
+def pasarela():
+    """Pasarela del proceso (se crea al primer uso, con su pool de conexiones)."""
+    global _pasarela
+    with _lock:
+        if _pasarela is None:
+            _pasarela = Pasarela(import_string(settings.PASARELA_BACKEND)())
+        return _pasarela
+
+
+@receiver(setting_changed)
+def _reiniciar(setting, **kwargs):
+    global _pasarela
+    if setting in AJUSTES_BACKEND:
+        with _lock:
+            _pasarela = None
+
+
+def crear_sesion_checkout(parametros, clave_idempotencia=None):
+    """
+    Crea una sesión de Checkout.
+
+    :param clave_idempotencia: Misma clave = misma sesión (Stripe la guarda
+        24 h); por defecto una al azar, reutilizada en los reintentos.
+    """
+    return pasarela().crear_sesion(parametros, clave_idempotencia)
+
+
+def obtener_sesion_checkout(session_id):
+    return pasarela().obtener_sesion(session_id)
+
+
+def listar_sesiones_checkout(limite=100, despues_de=None):
+    """Una página de sesiones (más recientes primero): ``.data`` y ``.has_more``."""
+    return pasarela().listar_sesiones(limite, despues_de)
+
+
+def expirar_sesion_checkout(session_id):
+    """
+    Expira una sesión abierta: ya no se puede pagar.
+
+    :raises stripe.error.InvalidRequestError: Si la sesión no está abierta
+        (p. ej. ya se pagó) o no existe.
+    """
+    return pasarela().expirar_sesion(session_id)
+
+
+def metricas():
+    """Histogramas de latencia por ``<operación>.<ok|error>`` de este proceso (ver ``commons.metricas``)."""
+    return _metricas.resumen()
+
+
+def limpiar_metricas():
+    _metricas.limpiar()
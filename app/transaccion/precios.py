@@ -0,0 +1,179 @@
+"""
+Snapshot de precios en memoria para el cotizador.
+
+``calcular_transaccion`` se invoca en cada pulsación del widget de cotización,
+por lo que no puede consultar la base ni leer archivos en cada llamada. Este
+módulo mantiene, por proceso, una foto inmutable de:
+
+- las tasas de cambio activas (una por moneda),
+- las comisiones de compra/venta por moneda,
+- el descuento vigente por segmento de cliente.
+
+El snapshot se reconstruye solo cuando cambia alguna de las versiones
+compartidas (``commons.versiones.TASAS`` / ``COMISIONES``) o cuando cambia el
+día (las tasas de descuento tienen vigencia por fecha). Verificar la versión
+cuesta una lectura del cache, sin acceso a la base de datos.
+
+Las tasas se toman de ``monedas.memoria_compartida`` (archivo mapeado que
+comparten todos los workers); si no está disponible, se consultan a la base.
+"""
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+from types import MappingProxyType
+from typing import Mapping, NamedTuple
+
+from django.db import models
+from django.utils import timezone
+
+from clientes.models import TasaComision
+from commons.enums import EstadoRegistroEnum
+from commons.versiones import COMISIONES, TASAS, incrementar_version, obtener_version
+from monedas.memoria_compartida import tasas_compartidas
+from monedas.models import TasaCambio
+from monedas.services import indice_comisiones
+
+logger = logging.getLogger(__name__)
+
+
+class TasaVigente(NamedTuple):
+    """Tasa activa de una moneda, tal como se usa para cotizar."""
+    id: int
+    moneda_id: int
+    codigo: str
+    compra: Decimal
+    venta: Decimal
+
+
+class Comision(NamedTuple):
+    """Comisión fija (en PYG) de compra y venta para una moneda."""
+    compra: Decimal
+    venta: Decimal
+
+
+@dataclass(frozen=True)
+class SnapshotPrecios:
+    """
+    Foto inmutable de todo lo necesario para cotizar.
+
+    Attributes:
+        version (tuple): Versiones (tasas, comisiones) con las que se construyó.
+        fecha (date): Día para el que se resolvieron los descuentos vigentes.
+        tasas (Mapping[int, TasaVigente]): Tasa activa por ``moneda_id``.
+        comisiones (Mapping[str, Comision]): Comisión por código de moneda.
+        descuentos (Mapping[str, Decimal]): Porcentaje de descuento por segmento.
+    """
+    version: tuple
+    fecha: date
+    tasas: Mapping[int, TasaVigente]
+    comisiones: Mapping[str, Comision]
+    descuentos: Mapping[str, Decimal]
+
+    def tasa(self, moneda_id):
+        return self.tasas.get(moneda_id)
+
+    def comision(self, codigo):
+        return self.comisiones.get(codigo, Comision(Decimal("0"), Decimal("0")))
+
+    def descuento(self, segmento):
+        return self.descuentos.get(segmento, Decimal("0"))
+
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def _cargar_tasas(version_tasas):
+    # Preferir la copia en memoria compartida: un solo worker consulta la base
+    # por cada cambio y todos cotizan con la misma versión.
+    compartidas = tasas_compartidas(version_tasas)
+    if compartidas is not None:
+        return {
+            moneda_id: TasaVigente(t.id, t.moneda_id, t.codigo, t.compra, t.venta)
+            for moneda_id, t in compartidas.items()
+        }
+    tasas = {}
+    qs = TasaCambio.objects.filter(activa=True).select_related("moneda")
+    for t in qs:
+        tasas[t.moneda_id] = TasaVigente(t.id, t.moneda_id, t.moneda.codigo, t.compra, t.venta)
+    return tasas
+
+
+def _cargar_comisiones():
+    return {
+        codigo: Comision(compra, venta)
+        for codigo, (compra, venta) in indice_comisiones().items()
+    }
+
+
+def _cargar_descuentos(fecha):
+    """Descuento vigente por segmento, en una sola consulta."""
+    vigentes = (
+        TasaComision.objects.filter(
+            estado=EstadoRegistroEnum.ACTIVO.value,
+            vigente_desde__lte=fecha,
+        )
+        .filter(models.Q(vigente_hasta__isnull=True) | models.Q(vigente_hasta__gte=fecha))
+        .order_by("tipo_cliente", "-vigente_desde", "-id")
+        .values_list("tipo_cliente", "porcentaje")
+    )
+    descuentos = {}
+    for tipo_cliente, porcentaje in vigentes:
+        descuentos.setdefault(tipo_cliente, Decimal(str(porcentaje)))
+    return descuentos
+
+
+def construir_snapshot(version=None, fecha=None):
+    """Construye un snapshot nuevo leyendo la base de datos."""
+    version = version or (obtener_version(TASAS), obtener_version(COMISIONES))
+    fecha = fecha or timezone.localdate()
+    return SnapshotPrecios(
+        version=version,
+        fecha=fecha,
+        tasas=MappingProxyType(_cargar_tasas(version[0])),
+        comisiones=MappingProxyType(_cargar_comisiones()),
+        descuentos=MappingProxyType(_cargar_descuentos(fecha)),
+    )
+
+
+def obtener_snapshot():
+    """
+    Devuelve el snapshot vigente del proceso, reconstruyéndolo si quedó viejo.
+
+    La versión se lee *antes* de construir: si algo cambia durante la
+    reconstrucción, la siguiente llamada detecta la nueva versión.
+    """
+    global _snapshot
+    version = (obtener_version(TASAS), obtener_version(COMISIONES))
+    fecha = timezone.localdate()
+
+    snap = _snapshot
+    if snap is not None and snap.version == version and snap.fecha == fecha:
+        return snap
+
+    with _lock:
+        snap = _snapshot
+        if snap is None or snap.version != version or snap.fecha != fecha:
+            snap = construir_snapshot(version, fecha)
+            _snapshot = snap
+            logger.debug("[PRECIOS] Snapshot reconstruido (version=%s)", version)
+    return snap
+
+
+def invalidar_snapshot():
+    """
+    Fuerza la reconstrucción en todos los workers.
+
+    Solo hace falta ante cambios que no emiten señales (p. ej. ``.update()``
+    masivos sobre ComisionMoneda o TasaComision).
+    """
+    incrementar_version(COMISIONES)
+
+
+def descartar_snapshot_local():
+    """Descarta la copia de este proceso (la próxima cotización la reconstruye)."""
+    global _snapshot
+    with _lock:
+        _snapshot = None
@@ -1,92 +1,191 @@
 import logging
-import json
-import os
 from decimal import Decimal, ROUND_DOWN
 
 import stripe
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import transaction as dj_tx
-from django.db.models import Sum
 from django.urls import reverse
-from django.utils import timezone
 
-from clientes.models import LimitePYG, LimiteMoneda, TasaComision
-from monedas.models import TasaCambio
+from clientes.limites import limites_para, limites_para_clientes
+from clientes.models import Cliente
+from monedas.models import Moneda, TasaCambio
+from payments.models import PaymentMethod
+from . import acumulados, pasarela
 from .models import Transaccion, Movimiento
+from .precios import obtener_snapshot
 from commons.enums import EstadoTransaccionEnum, TipoTransaccionEnum, TipoMovimientoEnum
 
 logger = logging.getLogger(__name__)
-stripe.api_key = settings.STRIPE_SECRET_KEY
 
 
 # =========================
 # Cálculo de transacción
 # =========================
-def calcular_transaccion(cliente, tipo, moneda, monto_operado):
+def _tasa_y_comision(snap, segmento, tipo, moneda):
     """
-    Calcula tasa, comisión y monto_pyg.
-    """
-    # 1) Segmento del cliente (fallback 'MIN')
-    segmento = getattr(cliente, "tipo", "MIN").upper()
+    Resuelve (tasa_aplicada, comision) para un segmento/tipo/moneda.
 
-    # 2) Tasa de cambio activa
-    try:
-        tasa = (
-            TasaCambio.objects
-            .filter(moneda=moneda, activa=True)
-            .latest("fecha_creacion")
-        )
-    except TasaCambio.DoesNotExist:
+    No depende del monto, por lo que puede reutilizarse entre cotizaciones.
+    """
+    # Tasa de cambio activa
+    tasa = snap.tasa(moneda.id)
+    if tasa is None:
         raise ValidationError(f"No hay tasa de cambio activa para {moneda}.")
 
-    # 3) Comisiones (mock json opcional)
-    comisiones_path = os.path.join(settings.BASE_DIR, "static", "comisiones.json")
-    try:
-        with open(comisiones_path, "r", encoding="utf-8") as f:
-            comisiones = json.load(f)
-    except Exception:
-        comisiones = []
-
-    com = next((c for c in comisiones if c.get("currency") == moneda.codigo), None)
-    comision_buy = Decimal(str(com["commission_buy"])) if com else Decimal("0")
-    comision_sell = Decimal(str(com["commission_sell"])) if com else Decimal("0")
-
-    # 4) Descuento por segmento
-    tc = TasaComision.vigente_para_tipo(segmento)
-    descuento_pct = Decimal(str(tc.porcentaje)) if tc else Decimal("0")
-
-    # 5) Cálculo según tipo
-    monto_operado = Decimal(monto_operado)
+    # Comisiones por moneda y descuento por segmento
+    com = snap.comision(moneda.codigo)
+    descuento_pct = snap.descuento(segmento)
 
     if tipo == TipoTransaccionEnum.COMPRA:
         # Cliente compra USD/EUR => paga PYG (ingreso PYG para la casa)
         # Tasa base: compra del tablero +/- ajustes
-        tasa_base = tasa.compra
         # aplicamos esquema simple: restar la porción de comisión según descuento
-        com_final = comision_buy - (comision_buy * descuento_pct / 100)
-        tasa_aplicada = tasa_base + com_final  # si tu política es sumar/ajustar
-        comision = comision_buy
-        monto_pyg = monto_operado * tasa_aplicada
+        com_final = com.compra - (com.compra * descuento_pct / 100)
+        return tasa.compra + com_final, com.compra  # si tu política es sumar/ajustar
 
-    elif tipo == TipoTransaccionEnum.VENTA:
+    if tipo == TipoTransaccionEnum.VENTA:
         # Cliente vende USD/EUR => la casa paga PYG (egreso PYG)
-        tasa_base = tasa.venta if hasattr(tasa, "venta") else tasa.compra
-        com_final = comision_sell - (comision_sell * descuento_pct / 100)
-        tasa_aplicada = tasa_base - com_final  # política inversa en venta
-        comision = comision_sell
-        monto_pyg = monto_operado * tasa_aplicada
+        com_final = com.venta - (com.venta * descuento_pct / 100)
+        return tasa.venta - com_final, com.venta  # política inversa en venta
 
-    else:
-        raise ValidationError("Tipo de transacción inválido.")
+    raise ValidationError("Tipo de transacción inválido.")
+
+
+def calcular_transaccion(cliente, tipo, moneda, monto_operado, snapshot=None):
+    """
+    Calcula tasa, comisión y monto_pyg.
+
+    Usa el snapshot de precios del proceso (ver ``transaccion.precios``): no
+    consulta la base ni lee archivos salvo que el snapshot haya quedado viejo.
+    Se puede pasar ``snapshot`` explícito para cotizar varios ítems contra la
+    misma foto de precios.
+    """
+    snap = snapshot or obtener_snapshot()
 
+    # Segmento del cliente (fallback 'MIN')
+    segmento = getattr(cliente, "tipo", "MIN").upper()
+    tasa_aplicada, comision = _tasa_y_comision(snap, segmento, tipo, moneda)
+
+    monto_operado = Decimal(monto_operado)
     return {
         "tasa_aplicada": tasa_aplicada,
         "comision": comision,
-        "monto_pyg": monto_pyg,
+        "monto_pyg": monto_operado * tasa_aplicada,
     }
 
 
+_CAMPO_MONTO = Transaccion._meta.get_field("monto_operado")
+_CAMPO_MONTO_PYG = Transaccion._meta.get_field("monto_pyg")
+
+
+def _cabe(valor, campo):
+    """Si la parte entera de ``valor`` entra en el DecimalField ``campo``."""
+    return abs(valor) < Decimal(10) ** (campo.max_digits - campo.decimal_places)
+
+
+def _cotizar_lote(items, snap):
+    """
+    Cotiza ``items`` (ver ``calcular_transacciones_lote``) y devuelve, por
+    ítem, la cotización junto con el cliente, la moneda, el tipo y el monto
+    ya resueltos, o ``error``.
+    """
+    def _ids(campo):
+        ids = set()
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            try:
+                ids.add(int(item[campo]))
+            except (KeyError, TypeError, ValueError):
+                pass
+        return ids
+
+    clientes = Cliente.objects.in_bulk(_ids("cliente"))
+    monedas = Moneda.objects.in_bulk(_ids("moneda"))
+
+    memo = {}
+    resultados = []
+    for item in items:
+        try:
+            if not isinstance(item, dict):
+                raise ValidationError("Cada ítem debe ser un objeto.")
+            try:
+                cliente_id = int(item["cliente"])
+                moneda_id = int(item["moneda"])
+                tipo = item["tipo"]
+                monto = Decimal(str(item["monto_operado"]))
+            except KeyError as e:
+                raise ValidationError(f"Falta el campo {e}.")
+            except (TypeError, ValueError, ArithmeticError):
+                raise ValidationError("Datos de cotización inválidos.")
+            if not monto.is_finite():
+                raise ValidationError("El monto debe ser un número finito.")
+            # Lo que no entra en las columnas falla al guardar (DataError)
+            _CAMPO_MONTO.run_validators(monto)
+
+            cliente = clientes.get(cliente_id)
+            if cliente is None:
+                raise ValidationError(f"Cliente {cliente_id} no encontrado.")
+            moneda = monedas.get(moneda_id)
+            if moneda is None:
+                raise ValidationError(f"Moneda {moneda_id} no encontrada.")
+
+            # Antes de usarlo como clave del memo: un tipo no hashable (lista,
+            # objeto JSON) no debe cortar el lote
+            if tipo not in TipoTransaccionEnum.values:
+                raise ValidationError("Tipo de transacción inválido.")
+
+            segmento = (cliente.tipo or "MIN").upper()
+            clave = (segmento, tipo, moneda.id)
+            if clave not in memo:
+                try:
+                    memo[clave] = _tasa_y_comision(snap, segmento, tipo, moneda)
+                except ValidationError as e:
+                    memo[clave] = e
+            valor = memo[clave]
+            if isinstance(valor, ValidationError):
+                raise valor
+
+            tasa_aplicada, comision = valor
+            if not _cabe(monto * tasa_aplicada, _CAMPO_MONTO_PYG):
+                raise ValidationError("El monto en PYG excede el máximo admitido.")
+            resultados.append({
+                "cliente": cliente,
+                "moneda": moneda,
+                "tipo": tipo,
+                "monto_operado": monto,
+                "tasa_aplicada": tasa_aplicada,
+                "comision": comision,
+                "monto_pyg": monto * tasa_aplicada,
+            })
+        except ValidationError as e:
+            resultados.append({"error": " ".join(e.messages)})
+    return resultados
+
+
+def calcular_transacciones_lote(items, snapshot=None):
+    """
+    Cotiza una lista de ítems contra una única foto de precios.
+
+    Cada ítem es un dict con ``cliente`` (id), ``tipo``, ``moneda`` (id) y
+    ``monto_operado``. Clientes y monedas se resuelven con una consulta cada
+    uno, y tasa/comisión/descuento se calculan una sola vez por combinación
+    distinta de (segmento, tipo, moneda).
+
+    Los errores son por ítem: un ítem inválido no afecta al resto.
+
+    Returns:
+        list[dict]: Un resultado por ítem, en el mismo orden. Cada uno tiene
+        ``tasa_aplicada``, ``comision`` y ``monto_pyg``, o bien ``error``.
+    """
+    campos = ("tasa_aplicada", "comision", "monto_pyg")
+    return [
+        r if "error" in r else {campo: r[campo] for campo in campos}
+        for r in _cotizar_lote(items, snapshot or obtener_snapshot())
+    ]
+
+
 def obtener_datos_transaccion(transaccion_id):
     try:
         tx = Transaccion.objects.select_related('cliente', 'moneda').get(pk=transaccion_id)
@@ -138,109 +237,103 @@ def confirmar_transaccion_con_otp(transaccion, user, raw_code, context_match=Non
 # =========================
 # Límites y creación
 # =========================
-def _check_limit_pyg(cliente, monto_pyg):
-    """Límite por operación en PYG."""
-    try:
-        lim = LimitePYG.objects.get(cliente=cliente)
-    except LimitePYG.DoesNotExist:
-        return  # sin límite configurado
-
-    if monto_pyg > lim.max_por_operacion:
+def _check_limites(limites, monto, total_dia, total_mes, unidad):
+    """Por operación, día y mes para un juego de ``Limites`` en ``unidad``."""
+    if limites.max_por_operacion is not None and monto > limites.max_por_operacion:
         raise ValidationError(
-            f"Operación en PYG ({monto_pyg}) excede el límite por operación ({lim.max_por_operacion})."
+            f"Operación en {unidad} ({monto}) excede el límite por operación ({limites.max_por_operacion})."
         )
-
-
-def _sum_operado_en_periodo(cliente, moneda, desde):
-    """Suma en MONEDA extranjera (no PYG) desde fecha dada."""
-    return (
-        Transaccion.objects.filter(
-            cliente=cliente,
-            moneda=moneda,  # <- FIX: antes usaba 'moneda_operada' (no existe en tu modelo)
-            fecha__gte=desde,
-            estado__in=[EstadoTransaccionEnum.PENDIENTE, EstadoTransaccionEnum.PAGADA],
-        ).aggregate(total=Sum("monto_operado"))["total"]
-        or 0
-    )
-
-
-def _check_limit_moneda(cliente, moneda, monto_operado):
-    """Límites en la moneda extranjera (por operación y acumulados)."""
-    try:
-        lim = LimiteMoneda.objects.get(cliente=cliente, moneda=moneda)
-    except LimiteMoneda.DoesNotExist:
-        return
-
-    if monto_operado > lim.max_por_operacion:
+    if limites.max_diario is not None and total_dia + monto > limites.max_diario:
         raise ValidationError(
-            f"Operación {monto_operado} {moneda} excede el límite por operación ({lim.max_por_operacion} {moneda})."
+            f"Límite diario alcanzado en {unidad} | total_diario: {total_dia} + monto: {monto} > limite_diario: {limites.max_diario}"
+        )
+    if limites.max_mensual is not None and total_mes + monto > limites.max_mensual:
+        raise ValidationError(
+            f"Límite mensual alcanzado en {unidad} | total_mensual: {total_mes} + monto: {monto} > limite_mensual: {limites.max_mensual}"
         )
-
-    if lim.max_mensual:
-        now = timezone.now().astimezone(timezone.get_current_timezone())
-        inicio_mes = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        total_mes = _sum_operado_en_periodo(cliente, moneda, inicio_mes)
-        if total_mes + monto_operado > lim.max_mensual:
-            raise ValidationError(
-                f"Límite mensual en {moneda} excedido: mes {total_mes} + {monto_operado} > {lim.max_mensual}."
-            )
 
 
-def validate_limits(cliente, moneda_operada, monto_operado, monto_pyg):
+def validate_limits(cliente, moneda_operada, monto_operado, monto_pyg, totales=None):
     """
-    Validaciones antes de crear transacción:
-      1) Límite PYG por operación
-      2) Límite por moneda extranjera (operación + mensual)
-      3) Límites diarios/mensuales en PYG por tipo de cliente (CLIENT_LIMITS)
+    Validaciones antes de crear transacción, contra los límites efectivos del
+    cliente (``clientes.limites``: defaults, segmento y cliente):
+      1) Límites en la moneda extranjera (operación, diario y mensual)
+      2) Límites en PYG (operación, diario y mensual)
+
+    Los límites salen del cache y los totales del día y del mes de
+    ``transaccion.acumulados`` (una lectura indexada), no de sumar el
+    historial de transacciones. Se pueden pasar en ``totales`` si ya se
+    obtuvieron con ``acumulados.reservar``.
     """
-    from commons.limits import CLIENT_LIMITS
-
-    _check_limit_pyg(cliente, monto_pyg)
-    _check_limit_moneda(cliente, moneda_operada, monto_operado)
+    limites = limites_para(cliente)
+    if totales is None:
+        totales = acumulados.totales(cliente, moneda_operada)
+    _validar_contra(limites, moneda_operada, monto_operado, monto_pyg, totales)
 
-    # límites por tipo de cliente
-    tipo_map = {"MIN": "minorista", "CORP": "corporativo", "VIP": "vip"}
-    tipo_cliente = tipo_map.get(getattr(cliente, "tipo", "MIN"), "minorista")
-    limites = CLIENT_LIMITS.get(tipo_cliente, CLIENT_LIMITS["minorista"])
 
-    hoy = timezone.now().date()
-    inicio_mes = hoy.replace(day=1)
-    estados_validos = [EstadoTransaccionEnum.PENDIENTE, EstadoTransaccionEnum.PAGADA]
-
-    total_diario = (
-        Transaccion.objects.filter(
-            cliente=cliente,
-            moneda=moneda_operada,
-            fecha__date=hoy,
-            estado__in=estados_validos,
-        ).aggregate(total=Sum("monto_pyg"))["total"]
-        or 0
+def _validar_contra(limites, moneda, monto_operado, monto_pyg, totales):
+    """Límites en la moneda y en PYG de un ``LimitesCliente`` contra ``totales``."""
+    _check_limites(
+        limites.moneda(moneda.pk), Decimal(monto_operado),
+        totales["diario_operado"], totales["mensual_operado"], moneda.codigo,
     )
-    total_mensual = (
-        Transaccion.objects.filter(
-            cliente=cliente,
-            moneda=moneda_operada,
-            fecha__date__gte=inicio_mes,
-            fecha__date__lte=hoy,
-            estado__in=estados_validos,
-        ).aggregate(total=Sum("monto_pyg"))["total"]
-        or 0
+    _check_limites(
+        limites.pyg, Decimal(monto_pyg),
+        totales["diario_pyg"], totales["mensual_pyg"], "PYG",
     )
 
-    limite_diario = Decimal(str(limites["diario"]))
-    limite_mensual = Decimal(str(limites["mensual"]))
-    total_diario = Decimal(total_diario)
-    total_mensual = Decimal(total_mensual)
-    monto_pyg = Decimal(monto_pyg)
 
-    if total_diario + monto_pyg > limite_diario:
-        raise ValidationError(
-            f"Límite diario alcanzado | total_diario: {total_diario} + monto_pyg: {monto_pyg} > limite_diario: {limite_diario}"
-        )
-    if total_mensual + monto_pyg > limite_mensual:
-        raise ValidationError(
-            f"Límite mensual alcanzado | total_mensual: {total_mensual} + monto_pyg: {monto_pyg} > limite_mensual: {limite_mensual}"
-        )
+def _margen(limites, total_dia, total_mes):
+    """Margen por operación, diario y mensual de un juego de ``Limites``."""
+    def restante(maximo, usado):
+        return None if maximo is None else max(maximo - usado, Decimal("0"))
+
+    margen = {
+        "por_operacion": limites.max_por_operacion,
+        "diario": restante(limites.max_diario, total_dia),
+        "mensual": restante(limites.max_mensual, total_mes),
+    }
+    topes = [v for v in margen.values() if v is not None]
+    margen["disponible"] = min(topes) if topes else None
+    return margen
+
+
+def margen_limites(clientes, monedas=None, dia=None):
+    """
+    Margen de límite restante de uno o varios clientes en cada moneda.
+
+    Usa los límites efectivos cacheados (``clientes.limites``) y los
+    acumuladores del día y del mes de todos los clientes, leídos con una sola
+    consulta. ``None`` indica que no hay límite.
+
+    Args:
+        clientes (list[Cliente]): Clientes a consultar.
+        monedas (list[Moneda] | None): Por defecto, las monedas extranjeras activas.
+        dia (date | None): Día de referencia (por defecto, hoy en hora local).
+
+    Returns:
+        dict: ``{cliente_id: {codigo_moneda: {"moneda": margen, "pyg": margen}}}``,
+        donde cada margen tiene ``por_operacion``, ``diario``, ``mensual`` y
+        ``disponible`` (el menor de los tres), en unidades de la moneda o en PYG.
+    """
+    if monedas is None:
+        monedas = list(Moneda.objects.filter(es_base=False))
+    limites = limites_para_clientes(clientes)
+    usados = acumulados.totales_por_cliente([c.pk for c in clientes], dia=dia)
+    vacio = acumulados.totales_vacios()
+
+    resultado = {}
+    for cliente in clientes:
+        lim = limites[cliente.pk]
+        por_moneda = {}
+        for moneda in monedas:
+            tot = usados.get((cliente.pk, moneda.pk), vacio)
+            por_moneda[moneda.codigo] = {
+                "moneda": _margen(lim.moneda(moneda.pk), tot["diario_operado"], tot["mensual_operado"]),
+                "pyg": _margen(lim.pyg, tot["diario_pyg"], tot["mensual_pyg"]),
+            }
+        resultado[cliente.pk] = por_moneda
+    return resultado
 
 
 def crear_transaccion(
@@ -248,9 +341,15 @@ def crear_transaccion(
 ):
     """
     Crea la transacción en estado PENDIENTE (sin movimientos aún).
+
+    Los límites se validan con los acumuladores del cliente/moneda bloqueados
+    (``acumulados.reservar``), en la misma transacción que el alta: altas
+    concurrentes del mismo cliente y moneda se serializan y ninguna puede
+    sobrepasar el límite que la otra ya consumió.
     """
-    validate_limits(cliente, moneda, monto_operado, monto_pyg)
     with dj_tx.atomic():
+        totales = acumulados.reservar(cliente, moneda)
+        validate_limits(cliente, moneda, monto_operado, monto_pyg, totales=totales)
         t = Transaccion.objects.create(
             cliente=cliente,
             moneda=moneda,
@@ -265,46 +364,146 @@ def crear_transaccion(
     return t
 
 
+def crear_transacciones_lote(items, snapshot=None):
+    """
+    Crea un lote de transacciones PENDIENTES (pedidos corporativos).
+
+    Cada ítem es un dict como los de ``calcular_transacciones_lote``, con
+    ``medio_pago`` (id) opcional. Todo el lote se cotiza contra una misma
+    foto de precios y se procesa en una transacción:
+
+    - se bloquean juntos los acumuladores de todos los pares cliente/moneda
+      del lote (``acumulados.reservar_varios``, dos consultas),
+    - los límites se validan en memoria y en forma acumulativa: cada ítem ve
+      los totales del cliente más lo que ya aceptaron los ítems anteriores,
+    - las altas se guardan con un ``bulk_create`` y los acumuladores se
+      actualizan con una sola sentencia (``acumulados.aplicar_lote``).
+
+    Los errores son por ítem: un ítem inválido o que excede un límite no se
+    crea y no afecta al resto.
+
+    Returns:
+        list[dict]: Un resultado por ítem, en el mismo orden: ``transaccion``
+        (la Transaccion creada) o ``error``.
+    """
+    snap = snapshot or obtener_snapshot()
+    resultados = _cotizar_lote(items, snap)
+
+    # Los ítems con error pueden no ser dicts
+    cotizados = [(item, r) for item, r in zip(items, resultados) if "error" not in r]
+    medios = PaymentMethod.objects.in_bulk({
+        int(item["medio_pago"]) for item, _ in cotizados if str(item.get("medio_pago") or "").isdecimal()
+    })
+    validos = []
+    for item, r in cotizados:
+        medio_id = item.get("medio_pago") or None
+        medio = medios.get(int(medio_id)) if str(medio_id).isdecimal() else None
+        if r["monto_operado"] <= 0:
+            r["error"] = "El monto debe ser mayor a 0."
+        elif medio_id is not None and (medio is None or medio.cliente_id != r["cliente"].pk):
+            r["error"] = f"Medio de pago {medio_id} no pertenece al cliente."
+        else:
+            r["medio_pago"] = medio
+            validos.append(r)
+    if not validos:
+        return [{"error": r["error"]} for r in resultados]
+
+    clientes = {r["cliente"].pk: r["cliente"] for r in validos}
+    limites = limites_para_clientes(list(clientes.values()))
+    nuevas = []
+    with dj_tx.atomic():
+        totales = acumulados.reservar_varios((r["cliente"].pk, r["moneda"].pk) for r in validos)
+        for r in validos:
+            cliente, moneda = r["cliente"], r["moneda"]
+            tot = totales[(cliente.pk, moneda.pk)]
+            try:
+                _validar_contra(limites[cliente.pk], moneda, r["monto_operado"], r["monto_pyg"], tot)
+            except ValidationError as e:
+                r["error"] = " ".join(e.messages)
+                continue
+            tot["diario_operado"] += r["monto_operado"]
+            tot["mensual_operado"] += r["monto_operado"]
+            tot["diario_pyg"] += r["monto_pyg"]
+            tot["mensual_pyg"] += r["monto_pyg"]
+            r["transaccion"] = Transaccion(
+                cliente=cliente,
+                moneda=moneda,
+                tipo=r["tipo"],
+                monto_operado=r["monto_operado"],
+                monto_pyg=r["monto_pyg"],
+                tasa_aplicada=r["tasa_aplicada"],
+                comision=r["comision"],
+                medio_pago=r["medio_pago"],
+                estado=EstadoTransaccionEnum.PENDIENTE,
+            )
+            nuevas.append(r["transaccion"])
+        Transaccion.objects.bulk_create(nuevas)
+        acumulados.aplicar_lote(nuevas)
+
+    return [
+        {"error": r["error"]} if "error" in r else {"transaccion": r["transaccion"]}
+        for r in resultados
+    ]
+
+
 # =========================
 # Confirmar / Cancelar
 # =========================
+def _bloquear_pendiente(transaccion: Transaccion, accion: str) -> Transaccion:
+    """
+    Bloquea la fila de ``transaccion`` y verifica que siga PENDIENTE.
+
+    El estado en memoria puede estar viejo (el barrido de vencidas, otra
+    terminal o un webhook pudieron cambiarlo): se decide sobre la fila
+    bloqueada, igual que ``vencimiento`` y ``registrar_pagos_stripe``.
+    Debe llamarse dentro de ``transaction.atomic``.
+    """
+    bloqueada = Transaccion.objects.select_for_update().get(pk=transaccion.pk)
+    if bloqueada.estado != EstadoTransaccionEnum.PENDIENTE:
+        raise ValidationError(f"Solo transacciones pendientes pueden {accion}.")
+    return bloqueada
+
+
+def _sincronizar(transaccion: Transaccion, bloqueada: Transaccion) -> Transaccion:
+    transaccion.estado = bloqueada.estado
+    transaccion._estado_acumulado = bloqueada.estado
+    return transaccion
+
+
 def confirmar_transaccion(transaccion: Transaccion):
     """
     Confirmar manualmente (fuera de Stripe).
     Crea movimiento y marca PAGADA.
     """
-    if transaccion.estado != EstadoTransaccionEnum.PENDIENTE:
-        raise ValidationError("Solo transacciones pendientes pueden confirmarse.")
-
     with dj_tx.atomic():
-        transaccion.estado = EstadoTransaccionEnum.PAGADA
-        transaccion.save(update_fields=["estado"])
+        bloqueada = _bloquear_pendiente(transaccion, "confirmarse")
+        bloqueada.estado = EstadoTransaccionEnum.PAGADA
+        bloqueada.save(update_fields=["estado"])
 
         # Mapear a INGRESO/EGRESO en PYG según tipo de operación
         mov_tipo = (
             TipoMovimientoEnum.DEBITO
-            if transaccion.tipo == TipoTransaccionEnum.COMPRA
+            if bloqueada.tipo == TipoTransaccionEnum.COMPRA
             else TipoMovimientoEnum.CREDITO
         )
 
         Movimiento.objects.create(
-            transaccion=transaccion,
-            cliente=transaccion.cliente,
+            transaccion=bloqueada,
+            cliente_id=bloqueada.cliente_id,
             tipo=mov_tipo,
-            monto=transaccion.monto_pyg,
+            monto=bloqueada.monto_pyg,
         )
 
-    return transaccion
+    return _sincronizar(transaccion, bloqueada)
 
 
 def cancelar_transaccion(transaccion: Transaccion):
     """Cancela una transacción pendiente."""
-    if transaccion.estado != EstadoTransaccionEnum.PENDIENTE:
-        raise ValidationError("Solo transacciones pendientes pueden cancelarse.")
-
-    transaccion.estado = EstadoTransaccionEnum.CANCELADA
-    transaccion.save(update_fields=["estado"])
-    return transaccion
+    with dj_tx.atomic():
+        bloqueada = _bloquear_pendiente(transaccion, "cancelarse")
+        bloqueada.estado = EstadoTransaccionEnum.CANCELADA
+        bloqueada.save(update_fields=["estado"])
+    return _sincronizar(transaccion, bloqueada)
 
 
 # =========================
@@ -318,10 +517,14 @@ def requiere_pago_tarjeta(tx: Transaccion) -> bool:
     return str(tx.tipo) == str(TipoTransaccionEnum.COMPRA)
 
 
-def crear_checkout_para_transaccion(tx: Transaccion) -> str:
+def crear_sesion_checkout(tx: Transaccion, clave_idempotencia=None):
     """
-    Crea una Session de Checkout en PYG (zero-decimal).
+    Crea una Session de Checkout en PYG (zero-decimal) y la devuelve.
     Para COMPRA: cobra el total en PYG (monto_pyg + comisión si corresponde).
+
+    Es una llamada de red a Stripe: desde las vistas se usa a través de la
+    cola de ``transaccion.checkouts``. Con la misma ``clave_idempotencia``
+    Stripe devuelve la misma sesión en lugar de crear otra.
     """
     if not requiere_pago_tarjeta(tx):
         raise ValueError("Esta transacción no requiere pago por tarjeta.")
@@ -351,9 +554,9 @@ def crear_checkout_para_transaccion(tx: Transaccion) -> str:
         f"@ {tx.tasa_aplicada} | Cliente: {tx.cliente}"
     )
 
-    session = stripe.checkout.Session.create(
-        mode="payment",
-        line_items=[
+    session = pasarela.crear_sesion_checkout({
+        "mode": "payment",
+        "line_items": [
             {
                 "price_data": {
                     "currency": "pyg",
@@ -363,7 +566,7 @@ def crear_checkout_para_transaccion(tx: Transaccion) -> str:
                 "quantity": 1,
             }
         ],
-        metadata={
+        "metadata": {
             "transaccion_id": str(tx.id),
             "cliente_id": str(tx.cliente_id),
             "tipo": str(tx.tipo),
@@ -373,9 +576,9 @@ def crear_checkout_para_transaccion(tx: Transaccion) -> str:
             "monto_pyg": str(tx.monto_pyg),
             "comision": str(tx.comision),
         },
-        success_url=success_url,
-        cancel_url=cancel_url,
-    )
+        "success_url": success_url,
+        "cancel_url": cancel_url,
+    }, clave_idempotencia)
 
     changed = False
     if hasattr(tx, "stripe_session_id"):
@@ -392,15 +595,57 @@ def crear_checkout_para_transaccion(tx: Transaccion) -> str:
         )
 
     logger.info(f"[STRIPE] Checkout creada para tx #{tx.id}: {session.id}")
-    return session.url
+    return session
 
 
+def crear_checkout_para_transaccion(tx: Transaccion) -> str:
+    """Crea la Session de Checkout de ``tx`` y devuelve su URL de pago."""
+    return crear_sesion_checkout(tx).url
+
+
+def _movimiento_pago_stripe(tx: Transaccion) -> Movimiento:
+    """Movimiento en caja PYG de un cobro por Stripe, coherente con el tipo."""
+    if str(tx.tipo) == str(TipoTransaccionEnum.COMPRA):
+        # Se cobra monto_pyg + comisión (ver crear_sesion_checkout)
+        tipo, monto = TipoMovimientoEnum.DEBITO, (tx.monto_pyg or 0) + (tx.comision or 0)
+    else:
+        tipo, monto = TipoMovimientoEnum.CREDITO, tx.monto_pyg
+    return Movimiento(transaccion=tx, cliente_id=tx.cliente_id, medio=None, tipo=tipo, monto=monto)
+
+
+def registrar_pagos_stripe(tx_ids) -> list:
+    """
+    Marca PAGADAS las transacciones cobradas por Stripe y crea los movimientos
+    que les falten, con sentencias por lote.
+
+    Es idempotente (las ya pagadas y con movimiento no cambian) y debe
+    llamarse dentro de ``transaction.atomic``: bloquea las transacciones en
+    orden de id, así lotes concurrentes no se bloquean mutuamente.
+
+    :return: IDs de las transacciones que pasaron a PAGADA
+    """
+    txs = list(Transaccion.objects.select_for_update().filter(pk__in=tx_ids).order_by("pk"))
+    nuevas = [tx for tx in txs if str(tx.estado) != str(EstadoTransaccionEnum.PAGADA)]
+    if nuevas:
+        Transaccion.objects.filter(pk__in=[tx.pk for tx in nuevas]).update(estado=EstadoTransaccionEnum.PAGADA)
+        # update() no emite señales: sumar a los acumuladores las que no
+        # consumían límite (p. ej. canceladas que Stripe igual cobró)
+        acumulados.aplicar_lote([tx for tx in nuevas if tx.estado not in acumulados.ESTADOS_COMPROMETIDOS])
+
+    con_movimiento = set(
+        Movimiento.objects.filter(transaccion_id__in=[tx.pk for tx in txs]).values_list("transaccion_id", flat=True)
+    )
+    Movimiento.objects.bulk_create(
+        [_movimiento_pago_stripe(tx) for tx in txs if tx.pk not in con_movimiento]
+    )
+    return [tx.pk for tx in nuevas]
+
 def verificar_pago_stripe(session_id: str) -> dict:
     """
     Verifica el estado de un pago en Stripe.
     """
     try:
-        session = stripe.checkout.Session.retrieve(session_id)
+        session = pasarela.obtener_sesion_checkout(session_id)
         return {
             "payment_status": session.payment_status,  # 'paid', 'unpaid', 'no_payment_required'
             "status": session.status,                  # 'complete', 'open', 'expired'
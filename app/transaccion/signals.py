@@ -0,0 +1,72 @@
+"""
+Señales de la app 'transaccion'.
+
+Mantienen los acumuladores de límites (``transaccion.acumulados``) cuando una
+Transaccion entra o sale de los estados que consumen límite: alta, pago,
+cancelación, anulación y borrado. Si una transacción comprometida cambia
+de montos (recálculo con otra tasa), fecha, cliente o moneda, se aplica la
+diferencia.
+"""
+from types import SimpleNamespace
+
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import acumulados
+from .models import Transaccion
+
+
+#: Atributos que determinan qué acumuladores toca una transacción y cuánto.
+CAMPOS_ACUMULADOS = ("cliente_id", "moneda_id", "fecha", "monto_operado", "monto_pyg")
+
+#: ``update_fields`` que pueden cambiar los acumuladores.
+_AFECTAN = frozenset({"estado", "cliente", "moneda", *CAMPOS_ACUMULADOS})
+
+
+def _comprometida(estado):
+    return estado in acumulados.ESTADOS_COMPROMETIDOS
+
+
+def _montos(instance):
+    # __dict__ para no disparar consultas por campos diferidos: si falta
+    # alguno, None (no se sabe con qué montos se acumuló)
+    valores = {campo: instance.__dict__.get(campo) for campo in CAMPOS_ACUMULADOS}
+    return None if None in valores.values() else valores
+
+
+def _acumulada(instance):
+    """La transacción con los montos con que se acumuló (si se conocen)."""
+    if instance._montos_acumulados is None:
+        return instance
+    return SimpleNamespace(**instance._montos_acumulados)
+
+
+@receiver(post_init, sender=Transaccion, dispatch_uid="transaccion_estado_inicial")
+def recordar_estado(sender, instance, **kwargs):
+    # __dict__ para no disparar una consulta si 'estado' fue diferido
+    instance._estado_acumulado = instance.__dict__.get("estado")
+    instance._montos_acumulados = _montos(instance)
+
+
+@receiver(post_save, sender=Transaccion, dispatch_uid="transaccion_acumulados_save")
+def actualizar_acumulados(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not _AFECTAN & set(update_fields):
+        return
+    antes = not created and _comprometida(instance._estado_acumulado)
+    ahora = _comprometida(instance.estado)
+    montos = _montos(instance)
+    if antes and ahora:
+        if instance._montos_acumulados not in (None, montos):
+            acumulados.ajustar(_acumulada(instance), instance)
+    elif antes:
+        acumulados.aplicar(_acumulada(instance), -1)
+    elif ahora:
+        acumulados.aplicar(instance, 1)
+    instance._estado_acumulado = instance.estado
+    instance._montos_acumulados = montos
+
+
+@receiver(post_delete, sender=Transaccion, dispatch_uid="transaccion_acumulados_delete")
+def descontar_acumulados(sender, instance, **kwargs):
+    if _comprometida(instance._estado_acumulado):
+        acumulados.aplicar(_acumulada(instance), -1)
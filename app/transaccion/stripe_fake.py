@@ -0,0 +1,296 @@
+"""
+Stripe falso para tests y benchmarks sin red.
+
+``StripeFalso`` guarda en memoria las sesiones de Checkout y atiende crear,
+obtener, listar (más recientes primero, con ``limit``/``starting_after``)
+y expirar, respetando las claves de idempotencia; puede simular latencia y fallas. Lo
+usa directamente el backend ``pasarela.BackendFalso``.
+
+``ServidorStripeFalso`` expone lo mismo por HTTP (``/v1/checkout/sessions``)
+para probar el camino real del SDK (cliente HTTP, timeouts, reintentos):
+como context manager apunta la pasarela a su URL.
+
+``evento_pago`` y ``firmar`` arman webhooks firmados como los de Stripe.
+
+Uso::
+
+    with ServidorStripeFalso(latencia=0.2) as fake:
+        services.crear_sesion_checkout(tx)
+        fake.pagar(session_id)
+
+Para usarlo con ``runserver``: ``python -m transaccion.stripe_fake 12111`` y
+``STRIPE_API_BASE=http://127.0.0.1:12111``.
+"""
+import hashlib
+import hmac
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+def firmar(payload, secreto, timestamp=None):
+    """Cabecera ``Stripe-Signature`` para ``payload`` (str) con el secreto del endpoint."""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    firma = hmac.new(secreto.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={firma}"
+
+
+def evento_pago(session, evento_id=None, tipo="checkout.session.completed"):
+    """Evento de webhook (dict) que notifica el cobro de ``session``."""
+    return {
+        "id": evento_id or f"evt_{uuid.uuid4().hex}",
+        "object": "event",
+        "type": tipo,
+        "created": int(time.time()),
+        "data": {"object": session},
+    }
+
+
+def _anidar(pares):
+    """
+    Cuerpo form-encoded del SDK a estructura: ``metadata[tx]=1`` ->
+    ``{"metadata": {"tx": "1"}}``; ``line_items[0][...]`` -> lista.
+    """
+    datos = {}
+    for clave, valor in pares:
+        partes = clave.replace("]", "").split("[")
+        nodo = datos
+        for parte in partes[:-1]:
+            nodo = nodo.setdefault(parte, {})
+        nodo[partes[-1]] = valor
+    if isinstance(datos.get("line_items"), dict):
+        datos["line_items"] = [v for _, v in sorted(datos["line_items"].items(), key=lambda kv: int(kv[0]))]
+    return datos
+
+
+class StripeFalso:
+    """
+    Sesiones de Checkout en memoria, seguras entre hilos.
+
+    :param latencia: Segundos de espera por llamada (simula la red de Stripe)
+    """
+    url = "https://stripe-falso.invalid"
+
+    def __init__(self, latencia=0.0):
+        self.latencia = latencia
+        self.sesiones = {}
+        self.peticiones = []
+        self.fallas_pendientes = 0
+        self._por_clave = {}
+        self._lock = threading.Lock()
+
+    # --- Control desde los tests ---
+
+    def fallar(self, veces=1):
+        """Las próximas ``veces`` llamadas fallan como un error 500 de Stripe."""
+        with self._lock:
+            self.fallas_pendientes += veces
+
+    def pagar(self, session_id):
+        """Marca la sesión como completada y pagada (como tras el checkout)."""
+        with self._lock:
+            session = self.sesiones[session_id]
+            session.update(
+                status="complete",
+                payment_status="paid",
+                payment_intent=f"pi_{uuid.uuid4().hex[:24]}",
+            )
+            return session
+
+    def creadas(self):
+        """Cantidad de pedidos de creación de sesión recibidos (incluye reintentos)."""
+        return sum(1 for m, ruta in self.peticiones if m == "POST" and ruta == "/v1/checkout/sessions")
+
+    # --- API ---
+
+    def simular(self, metodo, ruta):
+        """Registra la llamada y aplica latencia. :return: True si debe fallar."""
+        with self._lock:
+            self.peticiones.append((metodo, ruta))
+            falla = self.fallas_pendientes > 0
+            if falla:
+                self.fallas_pendientes -= 1
+        if self.latencia:
+            time.sleep(self.latencia)
+        return falla
+
+    def crear(self, datos, clave_idempotencia=None):
+        with self._lock:
+            if clave_idempotencia in self._por_clave:
+                return self._por_clave[clave_idempotencia]
+        item = (datos.get("line_items") or [{}])[0]
+        precio = item.get("price_data", {})
+        monto = int(precio.get("unit_amount", 0)) * int(item.get("quantity", 1))
+        session_id = f"cs_test_{uuid.uuid4().hex}"
+        session = {
+            "id": session_id,
+            "object": "checkout.session",
+            "created": int(time.time()),
+            "mode": datos.get("mode", "payment"),
+            "currency": precio.get("currency"),
+            "amount_total": monto,
+            "metadata": {k: str(v) for k, v in (datos.get("metadata") or {}).items()},
+            "status": "open",
+            "payment_status": "unpaid",
+            "payment_intent": None,
+            "customer_details": None,
+            "success_url": datos.get("success_url"),
+            "cancel_url": datos.get("cancel_url"),
+            "url": f"{self.url}/pay/{session_id}",
+        }
+        with self._lock:
+            self.sesiones[session_id] = session
+            if clave_idempotencia:
+                self._por_clave[clave_idempotencia] = session
+        return session
+
+    def obtener(self, session_id):
+        """:return: La sesión, o None si no existe."""
+        with self._lock:
+            return self.sesiones.get(session_id)
+
+    def expirar(self, session_id):
+        """
+        :return: La sesión expirada, o None si no existe.
+        :raises ValueError: Si la sesión no está abierta (como el 400 de Stripe).
+        """
+        with self._lock:
+            session = self.sesiones.get(session_id)
+            if session is None:
+                return None
+            if session["status"] != "open":
+                raise ValueError(f"Only open Checkout Sessions can be expired (status: {session['status']}).")
+            session.update(status="expired", url=None)
+            return session
+
+    def listar(self, limit=10, starting_after=None):
+        limite = min(int(limit), 100)
+        with self._lock:
+            # dict conserva el orden de alta: invertido = más recientes primero
+            todas = list(reversed(self.sesiones.values()))
+        desde = 0
+        if starting_after:
+            ids = [s["id"] for s in todas]
+            desde = ids.index(starting_after) + 1
+        return {
+            "object": "list",
+            "url": "/v1/checkout/sessions",
+            "has_more": desde + limite < len(todas),
+            "data": todas[desde:desde + limite],
+        }
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, estado, cuerpo):
+        datos = json.dumps(cuerpo).encode()
+        try:
+            self.send_response(estado)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(datos)))
+            self.end_headers()
+            self.wfile.write(datos)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # el cliente cortó por timeout
+
+    def _error(self, estado, mensaje, tipo="invalid_request_error"):
+        self._responder(estado, {"error": {"type": tipo, "message": mensaje}})
+
+    def _atender(self, metodo):
+        fake = self.server.fake
+        largo = int(self.headers.get("Content-Length") or 0)
+        cuerpo = self.rfile.read(largo).decode() if largo else ""
+        url = urlsplit(self.path)
+        fake.conexiones.add(self.client_address)
+        if fake.simular(metodo, url.path):
+            return self._error(500, "Falla simulada", tipo="api_error")
+
+        if url.path == "/v1/checkout/sessions":
+            if metodo == "POST":
+                session = fake.crear(_anidar(parse_qsl(cuerpo)), self.headers.get("Idempotency-Key"))
+                return self._responder(200, session)
+            return self._responder(200, fake.listar(**dict(parse_qsl(url.query))))
+        if url.path.startswith("/v1/checkout/sessions/") and metodo == "GET":
+            session = fake.obtener(url.path.rsplit("/", 1)[1])
+            if session is None:
+                return self._error(404, "No such checkout.session")
+            return self._responder(200, session)
+        if url.path.startswith("/v1/checkout/sessions/") and url.path.endswith("/expire") and metodo == "POST":
+            try:
+                session = fake.expirar(url.path.split("/")[-2])
+            except ValueError as e:
+                return self._error(400, str(e))
+            if session is None:
+                return self._error(404, "No such checkout.session")
+            return self._responder(200, session)
+        return self._error(404, f"Ruta no soportada: {metodo} {url.path}")
+
+    def do_GET(self):
+        self._atender("GET")
+
+    def do_POST(self):
+        self._atender("POST")
+
+
+class ServidorStripeFalso(StripeFalso):
+    """
+    ``StripeFalso`` servido por HTTP en ``127.0.0.1`` (puerto libre por defecto).
+
+    :param puerto: Puerto a escuchar; 0 = cualquiera libre
+    """
+
+    def __init__(self, latencia=0.0, puerto=0):
+        super().__init__(latencia)
+        #: Direcciones cliente vistas (una por conexión TCP)
+        self.conexiones = set()
+        self._servidor = ThreadingHTTPServer(("127.0.0.1", puerto), _Manejador)
+        self._servidor.daemon_threads = True
+        self._servidor.fake = self
+        self._ajustes = None
+
+    @property
+    def url(self):
+        host, puerto = self._servidor.server_address[:2]
+        return f"http://{host}:{puerto}"
+
+    def iniciar(self):
+        threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+        return self
+
+    def detener(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    def __enter__(self):
+        from django.conf import settings
+        from django.test import override_settings
+
+        self.iniciar()
+        # La pasarela se reconstruye al cambiar estos ajustes (setting_changed)
+        self._ajustes = override_settings(
+            PASARELA_BACKEND="transaccion.pasarela.BackendStripe",
+            STRIPE_API_BASE=self.url,
+            STRIPE_SECRET_KEY=settings.STRIPE_SECRET_KEY or "sk_test_falso",
+        )
+        self._ajustes.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self._ajustes.disable()
+        self.detener()
+
+
+if __name__ == "__main__":
+    import sys
+
+    puerto = int(sys.argv[1]) if len(sys.argv) > 1 else 12111
+    servidor = ServidorStripeFalso(puerto=puerto)
+    print(f"Stripe falso escuchando en {servidor.url}")
+    servidor._servidor.serve_forever()
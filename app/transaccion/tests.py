@@ -1,22 +1,59 @@
 """
 Pruebas unitarias de transacciones
 """
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
 from decimal import Decimal
-from django.test import TestCase, Client
+import threading
+import uuid
+from collections import Counter
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+
+import stripe
+
+from django.conf import settings
+from django.db import IntegrityError, NotSupportedError, connection, transaction
+from django.test import LiveServerTestCase, TestCase, TransactionTestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from django.core.management import call_command
 from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.utils import timezone
 
-from clientes.models import Cliente, LimitePYG, LimiteMoneda
-from monedas.models import Moneda
+from clientes.models import Cliente, PoliticaLimite, TasaComision
+from monedas.models import ComisionMoneda, Moneda, TasaCambio
 from payments.models import PaymentMethod
-from transaccion.models import Transaccion, Movimiento
+from transaccion.models import (
+    AcumuladoLimite, CheckoutStripe, ClaveIdempotencia, EventoStripe, Transaccion, Movimiento,
+)
 from transaccion.forms import TransaccionForm
+from transaccion import (
+    acumulados, checkouts, conciliacion, idempotencia, pasarela, particiones, precios, services, vencimiento, webhooks,
+)
+from transaccion.stripe_fake import ServidorStripeFalso, evento_pago, firmar
 from transaccion.services import (
+    calcular_transaccion,
+    calcular_transacciones_lote,
     crear_transaccion,
+    crear_transacciones_lote,
     cancelar_transaccion,
+    crear_sesion_checkout,
+    margen_limites,
     confirmar_transaccion,
+    registrar_pagos_stripe,
     validate_limits,
 )
+from commons.limits import CLIENT_LIMITS
 from commons.enums import (
     TipoTransaccionEnum,
     EstadoTransaccionEnum,
@@ -67,12 +104,12 @@ class LimitValidationTest(TestCase):
         self.moneda = Moneda.objects.create(codigo="USD", nombre="Dólar")
 
     def test_excede_limite_pyg(self):
-        LimitePYG.objects.create(cliente=self.cliente, max_por_operacion=Decimal("1000"))
+        PoliticaLimite.objects.create(cliente=self.cliente, max_por_operacion=Decimal("1000"))
         with self.assertRaises(ValidationError):
             validate_limits(self.cliente, self.moneda, Decimal("50"), Decimal("2000"))
 
     def test_excede_limite_moneda(self):
-        LimiteMoneda.objects.create(cliente=self.cliente, moneda=self.moneda, max_por_operacion=Decimal("100"))
+        PoliticaLimite.objects.create(cliente=self.cliente, moneda=self.moneda, max_por_operacion=Decimal("100"))
         with self.assertRaises(ValidationError):
             validate_limits(self.cliente, self.moneda, Decimal("200"), Decimal("1400000"))
 
@@ -81,7 +118,7 @@ class LimitValidationTest(TestCase):
         Límite por operación = 5.000 PYG.
         Probar con 1.400.000 PYG -> debe FALLAR (ValidationError).
         """
-        LimitePYG.objects.create(cliente=self.cliente, max_por_operacion=Decimal("5000"))
+        PoliticaLimite.objects.create(cliente=self.cliente, max_por_operacion=Decimal("5000"))
         # El valor de moneda (200 USD) no afecta este chequeo; el que dispara es monto_pyg
         with self.assertRaisesMessage(ValidationError, "excede el límite por operación"):
             validate_limits(self.cliente, self.moneda, Decimal("200"), Decimal("1400000"))
@@ -90,8 +127,8 @@ class LimitValidationTest(TestCase):
         """
         Caso válido: subir el límite o bajar el monto_pyg para que NO falle.
         """
-        LimitePYG.objects.create(cliente=self.cliente, max_por_operacion=Decimal("2000000"))
-        LimiteMoneda.objects.create(cliente=self.cliente, moneda=self.moneda, max_por_operacion=Decimal("500"))
+        PoliticaLimite.objects.create(cliente=self.cliente, max_por_operacion=Decimal("2000000"))
+        PoliticaLimite.objects.create(cliente=self.cliente, moneda=self.moneda, max_por_operacion=Decimal("500"))
         # 1.400.000 PYG <= 2.000.000 PYG -> NO debe lanzar error
         try:
             validate_limits(self.cliente, self.moneda, Decimal("200"), Decimal("1400000"))
@@ -191,6 +228,45 @@ class TransaccionViewsTest(TestCase):
         response = self.client_http.get(url)
         self.assertEqual(response.status_code, 200)
 
+    @override_settings(TRANSACCIONES_PAGINA=2)
+    def test_transacciones_list_paginado(self):
+        otro = Cliente.objects.create(nombre="Otro Vista", tipo="MIN")
+        for i, estado in enumerate(["pendiente", "pagada", "pagada", "cancelada", "pendiente"]):
+            Transaccion.objects.create(
+                cliente=self.cliente if i < 4 else otro, moneda=self.moneda, tipo=TipoTransaccionEnum.COMPRA,
+                monto_operado=1, monto_pyg=7000, tasa_aplicada=7000, comision=0, estado=estado,
+            )
+        url = reverse("transacciones:transacciones_list")
+
+        # Contadores en un solo agregado + la página
+        with self.assertNumQueries(2):
+            response = self.client_http.get(url, {"estado": "todas"})
+        self.assertEqual(response.context["counts"],
+                         {"todas": 5, "pendiente": 2, "pagada": 2, "cancelada": 1, "anulada": 0})
+
+        vistos, cursor = [], None
+        while True:
+            params = {"estado": "todas", **({"cursor": cursor} if cursor else {})}
+            response = self.client_http.get(url, params)
+            vistos += [t.pk for t in response.context["transacciones"]]
+            cursor = response.context["siguiente"]
+            if not cursor:
+                break
+        self.assertEqual(vistos, sorted(Transaccion.objects.values_list("pk", flat=True), reverse=True))
+
+        response = self.client_http.get(url, {"estado": "pagada", "cliente": self.cliente.pk, "dir": "asc"})
+        self.assertEqual(response.context["counts"]["todas"], 4)
+        self.assertEqual(response.context["cliente_sel"], self.cliente)
+        self.assertEqual(len(response.context["transacciones"]), 2)
+        self.assertEqual(self.client_http.get(url, {"cursor": "xx"}).status_code, 400)
+
+        # ``order`` de los enlaces anteriores
+        response = self.client_http.get(url, {"estado": "todas", "order": "fecha", "dir": "asc"})
+        pks = [t.pk for t in response.context["transacciones"]]
+        self.assertEqual(pks, sorted(pks))
+        self.assertEqual(pks[0], min(vistos))
+        self.assertEqual(self.client_http.get(url, {"order": "monto"}).status_code, 400)
+
     def test_transaccion_create_view_post(self):
         url = reverse("transacciones:transaccion_create")
         data = {
@@ -201,4 +277,1206 @@ class TransaccionViewsTest(TestCase):
             "medio_pago": self.payment.id,
         }
         response = self.client_http.post(url, data)
-        self.assertIn(response.status_code, [200, 302]) 
+        self.assertIn(response.status_code, [200, 302])
+
+
+class SnapshotPreciosTest(TestCase):
+    """
+    Pruebas del snapshot de precios usado por calcular_transaccion.
+    """
+    def setUp(self):
+        cache.clear()
+        precios.descartar_snapshot_local()
+        self.cliente = Cliente.objects.create(nombre="Cliente Cotiza", tipo="VIP")
+        self.moneda = Moneda.objects.create(codigo="USD", nombre="Dólar")
+        TasaCambio.objects.create(moneda=self.moneda, compra=Decimal("7000"), venta=Decimal("7200"))
+
+    def test_calculo_con_comision_y_descuento(self):
+        ComisionMoneda.objects.create(moneda=self.moneda, compra=Decimal("50"), venta=Decimal("100"))
+        TasaComision.objects.create(tipo_cliente="VIP", porcentaje=Decimal("10"), vigente_desde="2000-01-01")
+        compra = calcular_transaccion(self.cliente, TipoTransaccionEnum.COMPRA, self.moneda, Decimal("10"))
+        self.assertEqual(compra["tasa_aplicada"], Decimal("7045"))
+        self.assertEqual(compra["comision"], Decimal("50"))
+        self.assertEqual(compra["monto_pyg"], Decimal("70450"))
+
+        venta = calcular_transaccion(self.cliente, TipoTransaccionEnum.VENTA, self.moneda, Decimal("10"))
+        self.assertEqual(venta["tasa_aplicada"], Decimal("7110"))
+
+    def test_cotizacion_en_caliente_sin_consultas(self):
+        calcular_transaccion(self.cliente, TipoTransaccionEnum.COMPRA, self.moneda, Decimal("1"))
+        with self.assertNumQueries(0):
+            calcular_transaccion(self.cliente, TipoTransaccionEnum.COMPRA, self.moneda, Decimal("1"))
+
+    def test_nueva_tasa_invalida_snapshot(self):
+        antes = precios.obtener_snapshot()
+        TasaCambio.objects.create(moneda=self.moneda, compra=Decimal("7100"), venta=Decimal("7300"))
+        despues = precios.obtener_snapshot()
+        self.assertNotEqual(antes.version, despues.version)
+        self.assertEqual(despues.tasa(self.moneda.id).compra, Decimal("7100"))
+
+    def test_cambio_de_descuento_invalida_snapshot(self):
+        antes = precios.obtener_snapshot()
+        self.assertEqual(antes.descuento("VIP"), Decimal("0"))
+        TasaComision.objects.create(tipo_cliente="VIP", porcentaje=Decimal("5"), vigente_desde="2000-01-01")
+        self.assertEqual(precios.obtener_snapshot().descuento("VIP"), Decimal("5"))
+
+    def test_sin_tasa_activa(self):
+        eur = Moneda.objects.create(codigo="EUR", nombre="Euro")
+        with self.assertRaises(ValidationError):
+            calcular_transaccion(self.cliente, TipoTransaccionEnum.COMPRA, eur, Decimal("1"))
+
+    def test_cambio_de_comision_invalida_snapshot(self):
+        comision = ComisionMoneda.objects.create(moneda=self.moneda, compra=Decimal("50"), venta=Decimal("100"))
+        self.assertEqual(precios.obtener_snapshot().comision("USD").compra, Decimal("50"))
+        comision.compra = Decimal("80")
+        comision.save()
+        self.assertEqual(precios.obtener_snapshot().comision("USD").compra, Decimal("80"))
+
+
+class CotizacionLoteTest(TestCase):
+    """
+    Pruebas de la cotización en lote (servicio y calcular_api).
+    """
+    def setUp(self):
+        cache.clear()
+        precios.descartar_snapshot_local()
+        self.min = Cliente.objects.create(nombre="Minorista", tipo="MIN")
+        self.vip = Cliente.objects.create(nombre="Vip", tipo="VIP")
+        self.usd = Moneda.objects.create(codigo="USD", nombre="Dólar")
+        self.eur = Moneda.objects.create(codigo="EUR", nombre="Euro")
+        TasaCambio.objects.create(moneda=self.usd, compra=Decimal("7000"), venta=Decimal("7200"))
+        ComisionMoneda.objects.create(moneda=self.usd, compra=Decimal("50"), venta=Decimal("100"))
+
+    def _item(self, cliente, moneda, monto, tipo=TipoTransaccionEnum.COMPRA):
+        return {"cliente": cliente.id, "tipo": tipo, "moneda": moneda.id, "monto_operado": monto}
+
+    def test_lote_coincide_con_calculo_individual(self):
+        items = [self._item(self.min, self.usd, "10"), self._item(self.vip, self.usd, "3", TipoTransaccionEnum.VENTA)]
+        resultados = calcular_transacciones_lote(items)
+        esperado = calcular_transaccion(self.vip, TipoTransaccionEnum.VENTA, self.usd, Decimal("3"))
+        self.assertEqual(resultados[0]["monto_pyg"], Decimal("70500"))
+        self.assertEqual(resultados[1], esperado)
+
+    def test_errores_por_item(self):
+        items = [
+            self._item(self.min, self.usd, "10"),
+            self._item(self.min, self.eur, "10"),  # sin tasa activa
+            {"cliente": 999999, "tipo": "compra", "moneda": self.usd.id, "monto_operado": "1"},
+            {"cliente": self.min.id, "moneda": self.usd.id},
+            self._item(self.min, self.usd, "10", tipo=["compra"]),
+            self._item(self.min, self.usd, "10", tipo="canje"),
+        ]
+        resultados = calcular_transacciones_lote(items)
+        self.assertNotIn("error", resultados[0])
+        self.assertIn("No hay tasa de cambio activa", resultados[1]["error"])
+        self.assertIn("Cliente 999999", resultados[2]["error"])
+        self.assertIn("Falta el campo", resultados[3]["error"])
+        self.assertEqual(resultados[4]["error"], "Tipo de transacción inválido.")
+        self.assertEqual(resultados[5]["error"], "Tipo de transacción inválido.")
+
+    def test_consultas_constantes(self):
+        items = [self._item(self.min, self.usd, str(i + 1)) for i in range(50)]
+        calcular_transacciones_lote(items[:1])
+        with self.assertNumQueries(2):
+            calcular_transacciones_lote(items)
+
+    def test_calcular_api_lote(self):
+        items = [self._item(self.min, self.usd, "10"), self._item(self.min, self.eur, "10")]
+        response = Client().post(reverse("transacciones:calcular_api"), data=json.dumps({"items": items}),
+                                 content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        resultados = response.json()["resultados"]
+        self.assertEqual(Decimal(resultados[0]["monto_pyg"]), Decimal("70500"))
+        self.assertIn("error", resultados[1])
+
+
+class AcumuladosLimiteTest(TestCase):
+    """
+    Pruebas de los acumuladores de límites (AcumuladoLimite).
+    """
+    def setUp(self):
+        self.cliente = Cliente.objects.create(nombre="Cliente Acumulado", tipo="MIN")
+        self.moneda = Moneda.objects.create(codigo="USD", nombre="Dólar")
+
+    def _crear(self, monto_pyg="700000"):
+        return crear_transaccion(
+            self.cliente, TipoTransaccionEnum.COMPRA, self.moneda,
+            Decimal("100"), Decimal("7000"), Decimal("50"), Decimal(monto_pyg),
+        )
+
+    def _totales(self):
+        return acumulados.totales(self.cliente, self.moneda)
+
+    def test_alta_suma_en_dia_y_mes(self):
+        self._crear()
+        self._crear("300000")
+        totales = self._totales()
+        self.assertEqual(totales["diario_pyg"], Decimal("1000000"))
+        self.assertEqual(totales["mensual_pyg"], Decimal("1000000"))
+        self.assertEqual(totales["mensual_operado"], Decimal("200"))
+
+    def test_cambios_de_estado(self):
+        tx = self._crear()
+        confirmar_transaccion(tx)
+        self.assertEqual(self._totales()["diario_pyg"], Decimal("700000"))
+
+        otra = self._crear("300000")
+        cancelar_transaccion(Transaccion.objects.get(pk=otra.pk))
+        self.assertEqual(self._totales()["diario_pyg"], Decimal("700000"))
+
+        tx.estado = EstadoTransaccionEnum.ANULADA
+        tx.save(update_fields=["estado"])
+        tx.delete()
+        self.assertEqual(self._totales()["mensual_pyg"], Decimal("0"))
+
+    def test_recalculo_aplica_diferencia(self):
+        tx = Transaccion.objects.get(pk=self._crear().pk)
+        # Como tramitar_transacciones: solo tasa y monto en PYG
+        tx.tasa_aplicada = Decimal("7500")
+        tx.monto_pyg = Decimal("750000")
+        tx.save(update_fields=["tasa_aplicada", "monto_pyg"])
+        self.assertEqual(self._totales()["diario_pyg"], Decimal("750000"))
+        self.assertEqual(self._totales()["mensual_operado"], Decimal("100"))
+
+        # La cancelación descuenta lo acumulado, no lo de la primera lectura
+        cancelar_transaccion(tx)
+        self.assertEqual(self._totales()["mensual_pyg"], Decimal("0"))
+        self.assertEqual(acumulados.reconstruir()[1], 0)
+
+    def test_limite_diario_con_acumulado(self):
+        self._crear("1500000")
+        with self.assertRaisesMessage(ValidationError, "Límite diario alcanzado"):
+            validate_limits(self.cliente, self.moneda, Decimal("100"), Decimal("600000"))
+
+    def test_validate_limits_sin_agregados(self):
+        self._crear()
+        # Solo la lectura de acumuladores: los límites vienen del cache
+        with self.assertNumQueries(1):
+            validate_limits(self.cliente, self.moneda, Decimal("10"), Decimal("70000"))
+
+    def test_reconstruir_corrige_desvios(self):
+        self._crear()
+        tx = self._crear("300000")
+        # Cambio sin señales: el acumulador queda desfasado
+        Transaccion.objects.filter(pk=tx.pk).update(estado=EstadoTransaccionEnum.CANCELADA)
+        self.assertEqual(self._totales()["diario_pyg"], Decimal("1000000"))
+
+        out = StringIO()
+        call_command("reconstruir_acumulados", stdout=out)
+        self.assertIn("2 acumuladores reconstruidos, 2 corregidos", out.getvalue())
+        self.assertEqual(self._totales()["diario_pyg"], Decimal("700000"))
+        self.assertEqual(AcumuladoLimite.objects.count(), 2)
+
+
+class MargenLimitesTest(TestCase):
+    """
+    Pruebas del margen de límite restante (servicio y API).
+    """
+    def setUp(self):
+        cache.clear()
+        self.min = Cliente.objects.create(nombre="Minorista", tipo="MIN")
+        self.vip = Cliente.objects.create(nombre="Vip", tipo="VIP")
+        self.usd = Moneda.objects.create(codigo="USD", nombre="Dólar")
+        self.eur = Moneda.objects.create(codigo="EUR", nombre="Euro")
+        PoliticaLimite.objects.create(cliente=self.min, moneda=self.usd, max_por_operacion=Decimal("500"),
+                                      max_mensual=Decimal("1000"))
+        crear_transaccion(self.min, TipoTransaccionEnum.COMPRA, self.usd,
+                          Decimal("300"), Decimal("7000"), Decimal("0"), Decimal("500000"))
+
+    def test_margen_por_moneda(self):
+        margen = margen_limites([self.min, self.vip])
+        usd = margen[self.min.pk]["USD"]
+        self.assertEqual(usd["moneda"]["mensual"], Decimal("700"))
+        self.assertEqual(usd["moneda"]["disponible"], Decimal("500"))
+        self.assertIsNone(usd["moneda"]["diario"])
+        self.assertEqual(usd["pyg"]["diario"], Decimal("1500000"))
+        self.assertEqual(margen[self.min.pk]["EUR"]["pyg"]["diario"], Decimal("2000000"))
+        self.assertIsNone(margen[self.vip.pk]["USD"]["moneda"]["disponible"])
+
+    def test_consultas_constantes(self):
+        clientes = [Cliente.objects.create(nombre=f"C{i}", tipo="CORP") for i in range(20)]
+        margen_limites(clientes)
+        # Monedas + acumuladores; los límites salen del cache
+        with self.assertNumQueries(2):
+            margen_limites(clientes + [self.min])
+
+    def test_api(self):
+        user = get_user_model().objects.create_user(email="margen@example.com", password="x")
+        self.client.force_login(user)
+        url = reverse("transacciones:limites_disponibles_api")
+        response = self.client.get(url, {"cliente": f"{self.min.pk},999999"})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["no_encontrados"], [999999])
+        self.assertEqual(data["clientes"][0]["monedas"]["USD"]["moneda"]["mensual"], "700.00")
+        self.assertEqual(self.client.get(url, {"cliente": "x"}).status_code, 400)
+
+        # Por id de moneda, como el formulario de alta
+        response = self.client.get(url, {"cliente": self.min.pk, "moneda": self.usd.pk})
+        self.assertEqual(list(response.json()["clientes"][0]["monedas"]), ["USD"])
+        self.assertEqual(self.client.get(url, {"cliente": self.min.pk, "moneda": "USD"}).status_code, 400)
+
+
+class TransaccionLoteTest(TestCase):
+    """
+    Pruebas del alta en lote (servicio, API y carga CSV).
+    """
+    def setUp(self):
+        cache.clear()
+        precios.descartar_snapshot_local()
+        self.cliente = Cliente.objects.create(nombre="Corporativo Lote", tipo="MIN")
+        self.usd = Moneda.objects.create(codigo="USD", nombre="Dólar")
+        self.eur = Moneda.objects.create(codigo="EUR", nombre="Euro")
+        TasaCambio.objects.create(moneda=self.usd, compra=Decimal("7000"), venta=Decimal("7200"))
+        ComisionMoneda.objects.create(moneda=self.usd, compra=Decimal("50"), venta=Decimal("100"))
+
+    def _item(self, monto, moneda=None, cliente=None):
+        return {
+            "cliente": (cliente or self.cliente).id, "tipo": TipoTransaccionEnum.COMPRA,
+            "moneda": (moneda or self.usd).id, "monto_operado": monto,
+        }
+
+    def test_limites_acumulativos_en_el_lote(self):
+        # 100 USD = 705.000 PYG; el diario minorista es 2.000.000
+        items = [self._item("100"), self._item("100"), self._item("100"), self._item("1", self.eur)]
+        resultados = crear_transacciones_lote(items)
+
+        self.assertIn("transaccion", resultados[0])
+        self.assertIn("transaccion", resultados[1])
+        self.assertIn("Límite diario alcanzado", resultados[2]["error"])
+        self.assertIn("No hay tasa de cambio activa", resultados[3]["error"])
+        self.assertEqual(Transaccion.objects.filter(cliente=self.cliente).count(), 2)
+        self.assertEqual(resultados[0]["transaccion"].monto_pyg, Decimal("705000"))
+        self.assertEqual(acumulados.totales(self.cliente, self.usd)["diario_pyg"], Decimal("1410000"))
+        # Un alta individual posterior ve lo consumido por el lote
+        with self.assertRaisesMessage(ValidationError, "Límite diario alcanzado"):
+            validate_limits(self.cliente, self.usd, Decimal("100"), Decimal("705000"))
+
+    def test_medio_de_pago_de_otro_cliente(self):
+        otro = Cliente.objects.create(nombre="Otro", tipo="MIN")
+        medio = PaymentMethod.objects.create(cliente=otro)
+        resultados = crear_transacciones_lote([{**self._item("1"), "medio_pago": medio.id}, self._item("0")])
+        self.assertIn("no pertenece al cliente", resultados[0]["error"])
+        self.assertIn("mayor a 0", resultados[1]["error"])
+        self.assertFalse(Transaccion.objects.exists())
+
+    def test_items_malformados_son_errores_por_item(self):
+        items = [
+            ["no", "es", "objeto"],
+            "tampoco",
+            self._item("NaN"),
+            self._item("Infinity"),
+            self._item("1E+20"),
+            self._item("1.005"),
+            self._item("9999999999999"),  # entra como monto, no en PYG
+            {**self._item("1"), "tipo": {"compra": 1}},
+            {**self._item("1"), "medio_pago": "²"},
+            self._item("1"),
+        ]
+        user = get_user_model().objects.create_user(email="malformado@example.com", password="x")
+        self.client.force_login(user)
+        response = self.client.post(
+            reverse("transacciones:transaccion_lote_api"),
+            data=json.dumps({"items": items}), content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data["creadas"], data["con_error"]), (1, 9))
+        errores = [r.get("error") for r in data["resultados"]]
+        self.assertEqual(errores[:2], ["Cada ítem debe ser un objeto."] * 2)
+        self.assertEqual(errores[2:4], ["El monto debe ser un número finito."] * 2)
+        self.assertIn("El monto en PYG excede", errores[6])
+        self.assertEqual(errores[7], "Tipo de transacción inválido.")
+        self.assertIn("no pertenece al cliente", errores[8])
+        self.assertTrue(all(errores[:9]))
+        self.assertIsNone(errores[9])
+
+    def test_consultas_constantes(self):
+        clientes = [Cliente.objects.create(nombre=f"C{i}", tipo="CORP") for i in range(5)]
+        crear_transacciones_lote([self._item("1", cliente=c) for c in clientes])
+        with CaptureQueriesContext(connection) as chico:
+            crear_transacciones_lote([self._item("1", cliente=c) for c in clientes])
+        with CaptureQueriesContext(connection) as grande:
+            crear_transacciones_lote([self._item("1", cliente=c) for c in clientes * 20])
+        self.assertEqual(len(grande), len(chico))
+        self.assertEqual(Transaccion.objects.count(), 110)
+
+    def test_api_y_csv(self):
+        user = get_user_model().objects.create_user(email="lote@example.com", password="x")
+        self.client.force_login(user)
+
+        response = self.client.post(
+            reverse("transacciones:transaccion_lote_api"),
+            data=json.dumps({"items": [self._item("10"), self._item("10", self.eur)]}),
+            content_type="application/json",
+        )
+        data = response.json()
+        self.assertEqual((data["creadas"], data["con_error"]), (1, 1))
+        self.assertEqual(Decimal(data["resultados"][0]["monto_pyg"]), Decimal("70500"))
+        self.assertEqual(data["resultados"][1]["fila"], 2)
+
+        csv_lote = f"cliente;tipo;moneda;monto_operado\n{self.cliente.id};COMPRA;usd;5\n{self.cliente.id};compra;EUR;5\n"
+        archivo = SimpleUploadedFile("lote.csv", csv_lote.encode(), content_type="text/csv")
+        response = self.client.post(reverse("transacciones:transaccion_lote"), {"archivo": archivo})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "No hay tasa de cambio activa")
+        self.assertEqual(Transaccion.objects.count(), 2)
+
+        archivo = SimpleUploadedFile("lote.csv", b"cliente,tipo\n1,compra\n", content_type="text/csv")
+        response = self.client.post(reverse("transacciones:transaccion_lote"), {"archivo": archivo})
+        self.assertContains(response, "Faltan columnas: moneda, monto_operado.")
+
+
+class ExportacionTest(TestCase):
+    """
+    Pruebas de la exportación CSV (descarga en streaming y comando gzip).
+    """
+    def setUp(self):
+        from usuarios.models import Role, UserRole
+
+        self.cliente = Cliente.objects.create(nombre="Cliente, Export", tipo="MIN")
+        self.usd = Moneda.objects.create(codigo="USD", nombre="Dólar")
+        self.eur = Moneda.objects.create(codigo="EUR", nombre="Euro")
+        for moneda, estado in [(self.usd, "pendiente"), (self.usd, "pagada"), (self.eur, "pagada")]:
+            tx = Transaccion.objects.create(
+                cliente=self.cliente, moneda=moneda, tipo=TipoTransaccionEnum.COMPRA, monto_operado=1,
+                monto_pyg=7000, tasa_aplicada=7000, comision=0, estado=estado,
+            )
+        Movimiento.objects.create(transaccion=tx, cliente=self.cliente, tipo=TipoMovimientoEnum.DEBITO, monto=7000)
+
+        user = get_user_model().objects.create_user(email="export@example.com", password="x")
+        role, _ = Role.objects.get_or_create(name="Admin", defaults={"description": "Administrador"})
+        UserRole.objects.create(user=user, role=role)
+        self.client.force_login(user)
+
+    def _descargar(self, tipo, **params):
+        response = self.client.get(reverse("transacciones:exportar", args=[tipo]), params)
+        self.assertTrue(response.streaming)
+        texto = b"".join(response.streaming_content).decode()
+        return list(csv.reader(io.StringIO(texto)))
+
+    @override_settings(EXPORTACION_CHUNK=1)
+    def test_descarga_filtrada(self):
+        filas = self._descargar("transacciones", estado="pagada")
+        self.assertEqual(filas[0][:3], ["id", "uuid", "fecha"])
+        self.assertEqual(len(filas), 3)
+        self.assertEqual(filas[1][4], "Cliente, Export")
+
+        hoy = timezone.localdate().isoformat()
+        filas = self._descargar("transacciones", moneda="usd", desde=hoy, hasta=hoy)
+        self.assertEqual([f[6] for f in filas[1:]], ["USD", "USD"])
+
+        filas = self._descargar("movimientos", moneda="EUR")
+        self.assertEqual(len(filas), 2)
+        self.assertEqual(filas[1][6], "7000.00")
+
+    def test_parametros_invalidos(self):
+        url = reverse("transacciones:exportar", args=["transacciones"])
+        self.assertEqual(self.client.get(url, {"desde": "ayer"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"estado": "x"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("transacciones:exportar", args=["otra"])).status_code, 404)
+
+    def test_comando_gzip(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            salida = os.path.join(directorio, "tx.csv.gz")
+            call_command("exportar_transacciones", "transacciones", "--salida", salida,
+                         "--cliente", str(self.cliente.pk), "--chunk", "2", stdout=StringIO())
+            with gzip.open(salida, "rt", encoding="utf-8", newline="") as archivo:
+                filas = list(csv.reader(archivo))
+        self.assertEqual(len(filas), 4)
+
+
+def _compra_pendiente(cliente, moneda):
+    return Transaccion.objects.create(
+        cliente=cliente, moneda=moneda, tipo=TipoTransaccionEnum.COMPRA, monto_operado=10,
+        monto_pyg=73000, tasa_aplicada=7300, comision=500, estado=EstadoTransaccionEnum.PENDIENTE,
+    )
+
+
+class CheckoutColaTest(TestCase):
+    """
+    Pruebas de la cola de checkouts de Stripe contra el servidor falso.
+    """
+    def setUp(self):
+        self.cliente = Cliente.objects.create(nombre="Cliente Checkout", tipo="MIN")
+        self.moneda = Moneda.objects.create(codigo="USD", nombre="Dólar")
+        self.tx = _compra_pendiente(self.cliente, self.moneda)
+        self.fake = ServidorStripeFalso()
+        self.fake.__enter__()
+        self.addCleanup(self.fake.__exit__)
+
+    def test_vista_encola_sin_llamar_a_stripe(self):
+        url = reverse("transacciones:iniciar_pago_tarjeta", args=[self.tx.pk])
+        response = self.client.get(url)
+        trabajo = CheckoutStripe.objects.get(transaccion=self.tx)
+        self.assertRedirects(response, reverse("transacciones:pago_espera", args=[trabajo.pk]))
+        # Doble clic: mismo trabajo
+        self.client.get(url)
+        self.assertEqual(CheckoutStripe.objects.count(), 1)
+        self.assertEqual(self.fake.creadas(), 0)
+
+        estado = reverse("transacciones:checkout_estado_api", args=[trabajo.pk])
+        self.assertEqual(self.client.get(estado).json(), {"estado": "pendiente"})
+
+        self.assertEqual(checkouts.ejecutar(workers=1, una_vez=True), 1)
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, CheckoutStripe.LISTA)
+        session = self.fake.sesiones[trabajo.session_id]
+        self.assertEqual(session["metadata"]["transaccion_id"], str(self.tx.pk))
+        self.assertEqual(session["amount_total"], 73500)
+        self.assertEqual(self.client.get(estado).json(), {"estado": "lista", "url": session["url"]})
+        response = self.client.get(reverse("transacciones:pago_espera", args=[trabajo.pk]))
+        self.assertRedirects(response, session["url"], fetch_redirect_response=False)
+
+    @override_settings(STRIPE_CHECKOUT_INTENTOS=2, STRIPE_REINTENTOS=0)
+    def test_reintentos_y_error(self):
+        trabajo = checkouts.encolar(self.tx)
+        self.fake.fallar(2)
+
+        checkouts.ejecutar(workers=1, una_vez=True)
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.intentos), (CheckoutStripe.PENDIENTE, 1))
+        self.assertGreater(trabajo.disponible_desde, timezone.now())
+        # En espera: no se vuelve a tomar todavía
+        self.assertEqual(checkouts.tomar(), [])
+
+        CheckoutStripe.objects.update(disponible_desde=timezone.now())
+        checkouts.ejecutar(workers=1, una_vez=True)
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.intentos), (CheckoutStripe.ERROR, 2))
+        self.assertIn("Falla simulada", trabajo.error)
+
+    def test_transaccion_no_pendiente(self):
+        trabajo = checkouts.encolar(self.tx)
+        Transaccion.objects.filter(pk=self.tx.pk).update(estado=EstadoTransaccionEnum.CANCELADA)
+        checkouts.ejecutar(workers=1, una_vez=True)
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, CheckoutStripe.ERROR)
+        self.assertEqual(self.fake.creadas(), 0)
+
+    @override_settings(STRIPE_CHECKOUT_VENCIMIENTO=60)
+    def test_retoma_trabajo_abandonado(self):
+        trabajo = checkouts.encolar(self.tx)
+        self.assertEqual(len(checkouts.tomar()), 1)
+        self.assertEqual(checkouts.tomar(), [])
+        # El worker que lo tomó murió hace más del vencimiento
+        CheckoutStripe.objects.update(tomado_en=timezone.now() - timedelta(seconds=61))
+        self.assertEqual([t.pk for t in checkouts.tomar()], [trabajo.pk])
+
+
+@override_settings(PASARELA_BACKEND="transaccion.pasarela.BackendFalso", STRIPE_REINTENTO_BASE=0)
+class PasarelaTest(TestCase):
+    """
+    Pruebas de la pasarela de pagos: idempotencia, reintentos, timeouts y métricas.
+    """
+    PARAMETROS = {
+        "mode": "payment",
+        "line_items": [{"price_data": {"currency": "pyg", "unit_amount": 1000}, "quantity": 1}],
+        "metadata": {"transaccion_id": "1"},
+    }
+
+    def setUp(self):
+        pasarela.limpiar_metricas()
+        self.fake = pasarela.pasarela().backend.stripe
+
+    def test_idempotencia_y_metricas(self):
+        a = pasarela.crear_sesion_checkout(self.PARAMETROS, "clave-1")
+        b = pasarela.crear_sesion_checkout(self.PARAMETROS, "clave-1")
+        self.assertEqual(a.id, b.id)
+        self.assertEqual(pasarela.obtener_sesion_checkout(a.id).amount_total, 1000)
+        self.assertNotEqual(pasarela.crear_sesion_checkout(self.PARAMETROS).id, a.id)
+
+        metricas = pasarela.metricas()
+        self.assertEqual(metricas["checkout.crear.ok"]["n"], 3)
+        self.assertEqual(metricas["checkout.obtener.ok"]["cubetas"]["5"], 1)
+
+    def test_reintenta_solo_errores_transitorios(self):
+        antes = len(self.fake.sesiones)
+        self.fake.fallar(2)
+        with override_settings(STRIPE_REINTENTOS=2):
+            session = pasarela.crear_sesion_checkout(self.PARAMETROS, "clave-2")
+        self.assertEqual(pasarela.metricas()["checkout.crear.error"]["n"], 2)
+        self.assertEqual(len(self.fake.sesiones), antes + 1)
+
+        self.fake.fallar(3)
+        with override_settings(STRIPE_REINTENTOS=2), self.assertRaises(stripe.error.APIError):
+            pasarela.crear_sesion_checkout(self.PARAMETROS)
+
+        # Un 404 no se reintenta
+        with self.assertRaises(stripe.error.InvalidRequestError):
+            pasarela.obtener_sesion_checkout("cs_inexistente")
+        self.assertEqual(self.fake.peticiones[-1:],
+                         [("GET", "/v1/checkout/sessions/cs_inexistente")])
+        self.assertTrue(session.id.startswith("cs_test_"))
+
+    def test_http_keep_alive_y_timeout(self):
+        with ServidorStripeFalso() as fake:
+            for _ in range(5):
+                pasarela.crear_sesion_checkout(self.PARAMETROS)
+            # Una sola conexión TCP para las cinco llamadas
+            self.assertEqual(len(fake.conexiones), 1)
+
+            fake.latencia = 0.5
+            with override_settings(STRIPE_TIMEOUT_LECTURA=0.1, STRIPE_REINTENTOS=1):
+                with self.assertRaises(stripe.error.APIConnectionError):
+                    pasarela.obtener_sesion_checkout("cs_lento")
+            self.assertEqual(pasarela.metricas()["checkout.obtener.error"]["n"], 2)
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET="whsec_test")
+class StripeWebhookTest(TestCase):
+    """
+    Pruebas de la bandeja de webhooks: recepción, duplicados y proceso por lotes.
+    """
+    def setUp(self):
+        self.cliente = Cliente.objects.create(nombre="Cliente Webhook", tipo="MIN")
+        self.moneda = Moneda.objects.create(codigo="USD", nombre="Dólar")
+        self.url = reverse("transacciones:stripe_webhook")
+
+    def _evento(self, tx_id, evento_id=None, tipo="checkout.session.completed"):
+        session = {"id": "cs_test_1", "object": "checkout.session", "metadata": {"transaccion_id": str(tx_id)}}
+        return evento_pago(session, evento_id, tipo)
+
+    def _enviar(self, evento, secreto="whsec_test"):
+        cuerpo = json.dumps(evento)
+        return self.client.post(self.url, cuerpo, content_type="application/json",
+                                HTTP_STRIPE_SIGNATURE=firmar(cuerpo, secreto))
+
+    def test_recepcion_y_duplicados(self):
+        tx = _compra_pendiente(self.cliente, self.moneda)
+        evento = self._evento(tx.pk, "evt_1")
+        # Solo el INSERT: ni la transacción ni locks en la petición
+        with self.assertNumQueries(1):
+            self.assertEqual(self._enviar(evento).status_code, 200)
+        self.assertEqual(self._enviar(evento).status_code, 200)
+        self.assertEqual(EventoStripe.objects.get().transaccion_id, tx.pk)
+        tx.refresh_from_db()
+        self.assertEqual(tx.estado, EstadoTransaccionEnum.PENDIENTE)
+
+        self.assertEqual(self._enviar(self._evento(tx.pk), secreto="whsec_otro").status_code, 400)
+        self.assertEqual(self._enviar(self._evento(tx.pk, tipo="customer.created")).status_code, 200)
+        self.assertEqual(EventoStripe.objects.count(), 1)
+
+    def test_proceso_por_lotes(self):
+        tx1 = _compra_pendiente(self.cliente, self.moneda)
+        tx2 = _compra_pendiente(self.cliente, self.moneda)
+        cobrada_cancelada = _compra_pendiente(self.cliente, self.moneda)
+        cancelar_transaccion(cobrada_cancelada)
+        for tx in (tx1, tx2, cobrada_cancelada):
+            webhooks.recibir(self._evento(tx.pk))
+        webhooks.recibir(self._evento(tx1.pk, tipo="checkout.session.async_payment_succeeded"))
+        webhooks.recibir(self._evento(999999))
+
+        salida = StringIO()
+        call_command("procesar_webhooks", "--una-vez", "--lote", "2", stdout=salida)
+        self.assertIn("Eventos procesados: 5 (transacciones pagadas: 3, ignorados: 1)", salida.getvalue())
+
+        for tx in (tx1, tx2, cobrada_cancelada):
+            tx.refresh_from_db()
+            self.assertEqual(tx.estado, EstadoTransaccionEnum.PAGADA)
+            self.assertEqual(list(tx.movimientos.values_list("tipo", "monto")),
+                             [(TipoMovimientoEnum.DEBITO, Decimal("73500.00"))])
+        # La cancelada vuelve a consumir límite
+        self.assertEqual(acumulados.totales(self.cliente, self.moneda)["diario_pyg"], Decimal("219000"))
+        self.assertEqual(EventoStripe.objects.filter(estado=EventoStripe.IGNORADO).count(), 1)
+        self.assertEqual(webhooks.procesar_lote(), {"eventos": 0, "pagadas": 0, "ignorados": 0})
+
+    @override_settings(STRIPE_WEBHOOK_INTENTOS=2)
+    def test_lote_fallido_se_reintenta(self):
+        tx = _compra_pendiente(self.cliente, self.moneda)
+        webhooks.recibir(self._evento(tx.pk))
+        with mock.patch("transaccion.services.registrar_pagos_stripe", side_effect=RuntimeError("caída")):
+            webhooks.procesar_lote()
+            evento = EventoStripe.objects.get()
+            self.assertEqual((evento.estado, evento.intentos, evento.error), (EventoStripe.PENDIENTE, 1, "caída"))
+            webhooks.procesar_lote()
+        evento.refresh_from_db()
+        self.assertEqual(evento.estado, EventoStripe.ERROR)
+        tx.refresh_from_db()
+        self.assertEqual(tx.estado, EstadoTransaccionEnum.PENDIENTE)
+
+    @override_settings(STRIPE_WEBHOOK_INTENTOS=2)
+    def test_evento_roto_no_arrastra_al_lote(self):
+        txs = [_compra_pendiente(self.cliente, self.moneda) for _ in range(5)]
+        rota = txs[2]
+        for tx in txs:
+            webhooks.recibir(self._evento(tx.pk))
+        registrar = services.registrar_pagos_stripe
+
+        def falla_con_rota(tx_ids):
+            if rota.pk in tx_ids:
+                raise RuntimeError("caída")
+            return registrar(tx_ids)
+
+        with mock.patch("transaccion.services.registrar_pagos_stripe", side_effect=falla_con_rota):
+            self.assertEqual(webhooks.procesar_lote(), {"eventos": 4, "pagadas": 4, "ignorados": 0})
+            self.assertEqual(webhooks.procesar_lote(), {"eventos": 0, "pagadas": 0, "ignorados": 0})
+
+        estados = dict(EventoStripe.objects.values_list("transaccion_id", "estado"))
+        intentos = dict(EventoStripe.objects.values_list("transaccion_id", "intentos"))
+        self.assertEqual(estados.pop(rota.pk), EventoStripe.ERROR)
+        self.assertEqual(intentos.pop(rota.pk), 2)
+        self.assertEqual(set(estados.values()), {EventoStripe.PROCESADO})
+        self.assertEqual(set(intentos.values()), {1})
+        self.assertEqual(Transaccion.objects.filter(estado=EstadoTransaccionEnum.PAGADA).count(), 4)
+
+
+@override_settings(
+    PASARELA_BACKEND="transaccion.pasarela.BackendFalso",
+    TRANSACCION_VENCIMIENTO={"*:*": 1440, "compra:tarjeta": 60, "venta:*": 0},
+)
+class VencimientoTest(TestCase):
+    """
+    Pruebas del barrido de transacciones pendientes vencidas.
+    """
+    def setUp(self):
+        self.cliente = Cliente.objects.create(nombre="Cliente Vencimiento", tipo="MIN")
+        self.moneda = Moneda.objects.create(codigo="USD", nombre="Dólar")
+        self.tarjeta = PaymentMethod.objects.create(
+            cliente=self.cliente, payment_type=PaymentTypeEnum.TARJETA.value,
+        )
+
+    def test_plazo_por_tipo_y_medio(self):
+        self.assertEqual(vencimiento.plazo("compra", "tarjeta"), 60)
+        self.assertEqual(vencimiento.plazo("compra", vencimiento.SIN_MEDIO), 1440)
+        self.assertIsNone(vencimiento.plazo("venta", "tarjeta"))
+        self.assertIsNone(vencimiento.plazo("compra", "cheque", reglas={"venta:*": 10}))
+
+    def test_vence_por_lotes_y_libera_limite(self):
+        con_tarjeta = [_compra_pendiente(self.cliente, self.moneda) for _ in range(3)]
+        Transaccion.objects.filter(pk__in=[tx.pk for tx in con_tarjeta]).update(medio_pago=self.tarjeta)
+        sin_medio = _compra_pendiente(self.cliente, self.moneda)
+        venta = _compra_pendiente(self.cliente, self.moneda)
+        Transaccion.objects.filter(pk=venta.pk).update(tipo=TipoTransaccionEnum.VENTA)
+        pagada = confirmar_transaccion(_compra_pendiente(self.cliente, self.moneda))
+
+        # Dos horas después: solo vencen las de tarjeta, en lotes de dos
+        en_dos_horas = timezone.now() + timedelta(hours=2)
+        self.assertEqual(vencimiento.vencer_lote(2, en_dos_horas)["vencidas"], 2)
+        self.assertEqual(vencimiento.vencer_lote(2, en_dos_horas)["vencidas"], 1)
+        self.assertEqual(vencimiento.vencer_lote(2, en_dos_horas)["vencidas"], 0)
+        self.assertEqual(acumulados.totales(self.cliente, self.moneda)["diario_pyg"], Decimal("219000"))
+
+        self.assertEqual(vencimiento.vencer_lote(ahora=timezone.now() + timedelta(days=2))["vencidas"], 1)
+        estados = dict(Transaccion.objects.values_list("pk", "estado"))
+        self.assertEqual(
+            [estados[tx.pk] for tx in (*con_tarjeta, sin_medio, venta, pagada)],
+            [EstadoTransaccionEnum.CANCELADA] * 4 + [EstadoTransaccionEnum.PENDIENTE, EstadoTransaccionEnum.PAGADA],
+        )
+        # Acumuladores al día: solo la venta pendiente y la pagada
+        self.assertEqual(acumulados.totales(self.cliente, self.moneda)["diario_pyg"], Decimal("146000"))
+        self.assertEqual(acumulados.reconstruir()[1], 0)
+
+    def test_confirmar_o_cancelar_despues_del_barrido(self):
+        # Instancias leídas antes de que el barrido las cancele
+        por_confirmar = _compra_pendiente(self.cliente, self.moneda)
+        por_cancelar = _compra_pendiente(self.cliente, self.moneda)
+        self.assertEqual(vencimiento.vencer_lote(ahora=timezone.now() + timedelta(days=2))["vencidas"], 2)
+
+        with self.assertRaises(ValidationError):
+            confirmar_transaccion(por_confirmar)
+        with self.assertRaises(ValidationError):
+            cancelar_transaccion(por_cancelar)
+        self.assertFalse(Movimiento.objects.filter(transaccion=por_confirmar).exists())
+        self.assertEqual(
+            set(Transaccion.objects.values_list("estado", flat=True)), {EstadoTransaccionEnum.CANCELADA}
+        )
+        self.assertEqual(acumulados.totales(self.cliente, self.moneda)["diario_pyg"], Decimal("0"))
+        self.assertEqual(acumulados.reconstruir()[1], 0)
+
+    def test_expira_checkouts_abiertos(self):
+        abierta = _compra_pendiente(self.cliente, self.moneda)
+        cobrada = _compra_pendiente(self.cliente, self.moneda)
+        en_cola = _compra_pendiente(self.cliente, self.moneda)
+        for tx in (abierta, cobrada):
+            checkouts.encolar(tx)
+        checkouts.ejecutar(workers=1, una_vez=True)
+        checkouts.encolar(en_cola)
+        fake = pasarela.pasarela().backend.stripe
+        sesiones = dict(CheckoutStripe.objects.exclude(session_id="").values_list("transaccion_id", "session_id"))
+        fake.pagar(sesiones[cobrada.pk])
+
+        # Vencidas desde hace una hora, según la fecha guardada
+        Transaccion.objects.update(fecha=timezone.now() - timedelta(days=1, hours=1))
+        acumulados.reconstruir()
+        salida = StringIO()
+        call_command("vencer_pendientes", "--una-vez", stdout=salida)
+        self.assertIn("Transacciones vencidas: 3 (sesiones de Stripe expiradas: 1)", salida.getvalue())
+
+        self.assertEqual(fake.obtener(sesiones[abierta.pk])["status"], "expired")
+        self.assertEqual(fake.obtener(sesiones[cobrada.pk])["status"], "complete")
+        self.assertEqual(
+            set(CheckoutStripe.objects.values_list("estado", "error")),
+            {(CheckoutStripe.ERROR, "La transacción venció.")},
+        )
+        self.assertEqual(acumulados.reconstruir()[1], 0)
+
+
+class IdempotenciaTest(TestCase):
+    """
+    Pruebas de las claves de idempotencia del alta y la cotización.
+    """
+    def setUp(self):
+        cache.clear()
+        precios.descartar_snapshot_local()
+        self.cliente = Cliente.objects.create(nombre="Cliente Idempotencia", tipo="MIN")
+        self.moneda = Moneda.objects.create(codigo="USD", nombre="Dólar")
+        TasaCambio.objects.create(moneda=self.moneda, compra=Decimal("7000"), venta=Decimal("7200"))
+        self.datos = {
+            "cliente": self.cliente.id,
+            "tipo": TipoTransaccionEnum.COMPRA,
+            "moneda": self.moneda.id,
+            "monto_operado": "10",
+        }
+
+    def test_doble_envio_del_formulario(self):
+        url = reverse("transacciones:transaccion_create")
+        clave = self.client.get(url).context["idempotency_key"]
+        self.assertTrue(clave)
+        datos = {**self.datos, "idempotency_key": clave}
+
+        with mock.patch("transaccion.views.calcular_transaccion", wraps=calcular_transaccion) as calcular:
+            primera = self.client.post(url, datos)
+            segunda = self.client.post(url, datos)
+        self.assertRedirects(primera, reverse("transacciones:transacciones_list"), fetch_redirect_response=False)
+        self.assertEqual((segunda.status_code, segunda["Location"]), (302, primera["Location"]))
+        self.assertEqual(segunda["Idempotent-Replayed"], "true")
+        self.assertEqual(calcular.call_count, 1)
+        self.assertEqual(Transaccion.objects.count(), 1)
+        self.assertEqual(acumulados.totales(self.cliente, self.moneda)["diario_pyg"], Transaccion.objects.get().monto_pyg)
+
+        # Sin clave (o con otra) es un alta nueva
+        self.client.post(url, self.datos)
+        self.assertEqual(Transaccion.objects.count(), 2)
+
+    def test_reintento_de_cotizacion(self):
+        url = reverse("transacciones:calcular_api")
+        cuerpo = json.dumps(self.datos)
+        user = get_user_model().objects.create_user(email="cotizador@example.com", password="x")
+        self.client.force_login(user)
+        primera = self.client.post(url, cuerpo, content_type="application/json", HTTP_IDEMPOTENCY_KEY="cot-1")
+        self.assertEqual(primera.status_code, 200)
+        # Reintento: sesión y usuario, INSERT de la clave y lectura de la
+        # respuesta, sin cotizar (los SAVEPOINT son el atomic() dentro de la
+        # transacción del test)
+        with CaptureQueriesContext(connection) as consultas:
+            segunda = self.client.post(url, cuerpo, content_type="application/json", HTTP_IDEMPOTENCY_KEY="cot-1")
+        self.assertEqual(len([q for q in consultas if "SAVEPOINT" not in q["sql"]]), 4)
+        self.assertEqual(segunda.json(), primera.json())
+        self.assertEqual(segunda["Content-Type"], "application/json")
+
+        otro = json.dumps({**self.datos, "monto_operado": "20"})
+        response = self.client.post(url, otro, content_type="application/json", HTTP_IDEMPOTENCY_KEY="cot-1")
+        self.assertEqual(response.status_code, 422)
+
+        # Vencida, la clave vale para una petición nueva
+        vence = timezone.now() + timedelta(seconds=settings.IDEMPOTENCIA_TTL + 1)
+        ClaveIdempotencia.objects.update(vence=timezone.now())
+        response = self.client.post(url, otro, content_type="application/json", HTTP_IDEMPOTENCY_KEY="cot-1")
+        self.assertNotIn("Idempotent-Replayed", response)
+        self.assertEqual(Decimal(response.json()["monto_pyg"]), Decimal(primera.json()["monto_pyg"]) * 2)
+        self.assertEqual(idempotencia.purgar(vence), 1)
+
+
+    def test_anonimos_no_comparten_claves(self):
+        url = reverse("transacciones:calcular_api")
+        cuerpo = json.dumps(self.datos)
+        otro = Client()
+        self.client.get(reverse("transacciones:transaccion_create"))
+        otro.get(reverse("transacciones:transaccion_create"))
+
+        with mock.patch("transaccion.views.calcular_transaccion", wraps=calcular_transaccion) as calcular:
+            self.client.post(url, cuerpo, content_type="application/json", HTTP_IDEMPOTENCY_KEY="cot-1")
+            ajena = otro.post(url, cuerpo, content_type="application/json", HTTP_IDEMPOTENCY_KEY="cot-1")
+            # Sin sesión no hay a quién atribuir la clave: se cotiza sin idempotencia
+            sin_sesion = Client().post(url, cuerpo, content_type="application/json", HTTP_IDEMPOTENCY_KEY="cot-1")
+            propia = self.client.post(url, cuerpo, content_type="application/json", HTTP_IDEMPOTENCY_KEY="cot-1")
+        self.assertNotIn("Idempotent-Replayed", ajena)
+        self.assertNotIn("Idempotent-Replayed", sin_sesion)
+        self.assertEqual(propia["Idempotent-Replayed"], "true")
+        self.assertEqual(calcular.call_count, 3)
+        self.assertEqual(ClaveIdempotencia.objects.count(), 2)
+
+
+class ConciliacionStripeTest(TestCase):
+    """
+    Pruebas de la conciliación de transacciones con las sesiones de Stripe.
+    """
+    def setUp(self):
+        # Stripe falso nuevo en cada prueba (la pasarela se reconstruye)
+        ajustes = override_settings(PASARELA_BACKEND="transaccion.pasarela.BackendFalso")
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.fake = pasarela.pasarela().backend.stripe
+        self.cliente = Cliente.objects.create(nombre="Cliente Conciliación", tipo="MIN")
+        self.moneda = Moneda.objects.create(codigo="USD", nombre="Dólar")
+
+    def _cobrada(self, tx):
+        session = crear_sesion_checkout(tx)
+        self.fake.pagar(session.id)
+        return session
+
+    def test_repara_pagos_e_informa(self):
+        al_dia = _compra_pendiente(self.cliente, self.moneda)
+        self._cobrada(al_dia)
+        with transaction.atomic():
+            registrar_pagos_stripe([al_dia.pk])
+        webhook_perdido = _compra_pendiente(self.cliente, self.moneda)
+        self._cobrada(webhook_perdido)
+        sin_movimiento = _compra_pendiente(self.cliente, self.moneda)
+        self._cobrada(sin_movimiento)
+        Transaccion.objects.filter(pk=sin_movimiento.pk).update(estado=EstadoTransaccionEnum.PAGADA)
+        abierta = _compra_pendiente(self.cliente, self.moneda)
+        crear_sesion_checkout(abierta)
+        duplicada = _compra_pendiente(self.cliente, self.moneda)
+        self._cobrada(duplicada)
+        self._cobrada(duplicada)
+        otro_monto = self.fake.crear({
+            "line_items": [{"price_data": {"currency": "pyg", "unit_amount": 1000}, "quantity": 1}],
+            "metadata": {"transaccion_id": str(abierta.pk)},
+        })
+        self.fake.pagar(otro_monto["id"])
+        self.fake.crear({"metadata": {"transaccion_id": "999999"}})
+        self.fake.crear({})
+
+        # Solo informar: una consulta por página de sesiones
+        with CaptureQueriesContext(connection) as consultas:
+            informe = conciliacion.conciliar(limite=3, reparar=False)
+        self.assertEqual(informe["paginas"], 3)
+        self.assertEqual(len(consultas), 3)
+        tipos = Counter((d["tipo"], d["transaccion_id"]) for d in informe["discrepancias"])
+        self.assertEqual(tipos, Counter([
+            (conciliacion.PAGO_NO_REGISTRADO, webhook_perdido.pk),
+            (conciliacion.SIN_MOVIMIENTO, sin_movimiento.pk),
+            (conciliacion.PAGO_NO_REGISTRADO, duplicada.pk),
+            (conciliacion.PAGO_NO_REGISTRADO, duplicada.pk),
+            (conciliacion.COBRO_DUPLICADO, duplicada.pk),
+            (conciliacion.MONTO_DISTINTO, abierta.pk),
+            (conciliacion.PAGO_NO_REGISTRADO, abierta.pk),
+            (conciliacion.SIN_TRANSACCION, 999999),
+            (conciliacion.SIN_TRANSACCION, None),
+        ]))
+        self.assertEqual(Movimiento.objects.count(), 1)
+
+        with tempfile.TemporaryDirectory() as carpeta:
+            reporte = os.path.join(carpeta, "reporte.csv")
+            salida = StringIO()
+            call_command("conciliar_stripe", "--pagina", "3", "--reporte", reporte, stdout=salida)
+            with open(reporte, newline="", encoding="utf-8") as archivo:
+                filas = list(csv.DictReader(archivo))
+        self.assertEqual(len(filas), 9)
+        self.assertIn("Sesiones revisadas: 9 en 3 páginas", salida.getvalue())
+        self.assertIn("Discrepancias: 9 (transacciones reparadas: 4)", salida.getvalue())
+
+        for tx in (al_dia, webhook_perdido, sin_movimiento, duplicada, abierta):
+            tx.refresh_from_db()
+            self.assertEqual(tx.estado, EstadoTransaccionEnum.PAGADA)
+            self.assertEqual(tx.movimientos.count(), 1)
+
+        # Lo reparado ya no aparece; lo que no se repara se sigue informando
+        informe = conciliacion.conciliar()
+        self.assertEqual(
+            sorted(d["tipo"] for d in informe["discrepancias"]),
+            sorted([conciliacion.COBRO_DUPLICADO, conciliacion.MONTO_DISTINTO,
+                    conciliacion.SIN_TRANSACCION, conciliacion.SIN_TRANSACCION]),
+        )
+        self.assertEqual(informe["reparadas"], 0)
+
+    def test_desde_corta_el_recorrido(self):
+        vieja = self.fake.crear({"metadata": {"transaccion_id": "999999"}})
+        vieja["created"] -= 3 * 86400
+        self._cobrada(_compra_pendiente(self.cliente, self.moneda))
+        informe = conciliacion.conciliar(desde=timezone.now() - timedelta(days=1), limite=1)
+        self.assertEqual((informe["sesiones"], informe["paginas"]), (1, 2))
+        self.assertEqual(informe["discrepancias"][0]["tipo"], conciliacion.PAGO_NO_REGISTRADO)
+
+
+class ReservaLimitesConcurrenteTest(TransactionTestCase):
+    """
+    Altas concurrentes del mismo cliente: los totales nunca superan el límite.
+    """
+    HILOS = 16
+
+    def setUp(self):
+        self.cliente = Cliente.objects.create(nombre="Cliente Concurrente", tipo="MIN")
+        self.moneda = Moneda.objects.create(codigo="USD", nombre="Dólar")
+
+    def _hammer(self, monto_pyg):
+        barrera = threading.Barrier(self.HILOS)
+        resultados = []
+
+        def alta():
+            try:
+                barrera.wait()
+                crear_transaccion(
+                    self.cliente, TipoTransaccionEnum.COMPRA, self.moneda,
+                    Decimal("10"), Decimal("7000"), Decimal("0"), monto_pyg,
+                )
+                resultados.append(True)
+            except ValidationError:
+                resultados.append(False)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=alta) for _ in range(self.HILOS)]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+        return resultados
+
+    def test_no_supera_limite_diario(self):
+        limite = Decimal(str(CLIENT_LIMITS["minorista"]["diario"]))
+        monto = Decimal("300000")
+        resultados = self._hammer(monto)
+
+        total = sum(
+            Transaccion.objects.filter(cliente=self.cliente).values_list("monto_pyg", flat=True),
+            Decimal("0"),
+        )
+        self.assertLessEqual(total, limite)
+        self.assertEqual(resultados.count(True), int(limite // monto))
+        self.assertEqual(acumulados.totales(self.cliente, self.moneda)["diario_pyg"], total)
+
+    def test_otro_cliente_no_espera(self):
+        otro = Cliente.objects.create(nombre="Otro", tipo="MIN")
+        with transaction.atomic():
+            acumulados.reservar(self.cliente, self.moneda)
+            # Con las filas de self.cliente bloqueadas, otro cliente reserva sin esperar
+            hecho = threading.Event()
+
+            def reservar_otro():
+                with transaction.atomic():
+                    acumulados.reservar(otro, self.moneda)
+                hecho.set()
+                connection.close()
+
+            hilo = threading.Thread(target=reservar_otro)
+            hilo.start()
+            self.assertTrue(hecho.wait(timeout=5))
+            hilo.join()
+
+
+class CheckoutColaConcurrenteTest(TransactionTestCase):
+    """
+    Varios workers sobre la misma cola: cada trabajo se procesa una sola vez.
+    """
+    def test_workers_no_repiten_trabajos(self):
+        cliente = Cliente.objects.create(nombre="Cliente Workers", tipo="MIN")
+        moneda = Moneda.objects.create(codigo="USD", nombre="Dólar")
+        for _ in range(20):
+            checkouts.encolar(_compra_pendiente(cliente, moneda))
+
+        salida = StringIO()
+        with ServidorStripeFalso(latencia=0.02) as fake:
+            call_command("procesar_checkouts", "--workers", "4", "--una-vez", stdout=salida)
+            self.assertEqual(fake.creadas(), 20)
+        self.assertIn("Checkouts procesados: 20", salida.getvalue())
+        self.assertEqual(CheckoutStripe.objects.filter(estado=CheckoutStripe.LISTA).count(), 20)
+        self.assertEqual(len(set(CheckoutStripe.objects.values_list("session_id", flat=True))), 20)
+
+
+class VencimientoConcurrenteTest(TransactionTestCase):
+    """
+    Barridos en paralelo: lo que otro nodo tiene bloqueado se saltea sin esperar.
+    """
+    def test_saltea_bloqueadas(self):
+        cliente = Cliente.objects.create(nombre="Cliente Barrido", tipo="MIN")
+        moneda = Moneda.objects.create(codigo="USD", nombre="Dólar")
+        bloqueada, libre = _compra_pendiente(cliente, moneda), _compra_pendiente(cliente, moneda)
+        tomada, soltar = threading.Event(), threading.Event()
+
+        def otro_nodo():
+            with transaction.atomic():
+                list(Transaccion.objects.select_for_update().filter(pk=bloqueada.pk))
+                tomada.set()
+                soltar.wait(timeout=10)
+            connection.close()
+
+        hilo = threading.Thread(target=otro_nodo)
+        hilo.start()
+        try:
+            self.assertTrue(tomada.wait(timeout=5))
+            with override_settings(TRANSACCION_VENCIMIENTO={"*:*": 1}):
+                resultado = vencimiento.vencer_lote(ahora=timezone.now() + timedelta(minutes=5))
+        finally:
+            soltar.set()
+            hilo.join()
+        self.assertEqual(resultado["vencidas"], 1)
+        self.assertEqual(
+            dict(Transaccion.objects.values_list("pk", "estado")),
+            {bloqueada.pk: EstadoTransaccionEnum.PENDIENTE, libre.pk: EstadoTransaccionEnum.CANCELADA},
+        )
+
+
+class IdempotenciaTormentaTest(TransactionTestCase):
+    """
+    Tormenta de reintentos con la misma clave: una sola transacción y la
+    misma respuesta para todos.
+    """
+    HILOS = 16
+
+    def test_tormenta_de_reintentos(self):
+        cliente = Cliente.objects.create(nombre="Cliente Tormenta", tipo="MIN")
+        moneda = Moneda.objects.create(codigo="USD", nombre="Dólar")
+        TasaCambio.objects.create(moneda=moneda, compra=Decimal("7000"), venta=Decimal("7200"))
+        datos = {
+            "cliente": cliente.id, "tipo": TipoTransaccionEnum.COMPRA, "moneda": moneda.id,
+            "monto_operado": "10", "idempotency_key": "tormenta-1",
+        }
+        url = reverse("transacciones:transaccion_create")
+        # El mismo navegador (la misma sesión) reintentando
+        navegador = Client()
+        navegador.get(url)
+        barrera = threading.Barrier(self.HILOS)
+        respuestas = []
+
+        def reintento():
+            try:
+                cliente_http = Client()
+                cliente_http.cookies = navegador.cookies
+                barrera.wait()
+                respuestas.append(cliente_http.post(url, datos))
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=reintento) for _ in range(self.HILOS)]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+
+        self.assertEqual(len(respuestas), self.HILOS)
+        self.assertEqual({(r.status_code, r["Location"]) for r in respuestas},
+                         {(302, reverse("transacciones:transacciones_list"))})
+        self.assertEqual(sum(r.has_header("Idempotent-Replayed") for r in respuestas), self.HILOS - 1)
+        tx = Transaccion.objects.get()
+        self.assertEqual(acumulados.totales(cliente, moneda)["diario_pyg"], tx.monto_pyg)
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET="whsec_test")
+class WebhooksCargaTest(LiveServerTestCase):
+    """
+    La herramienta de carga contra un servidor real: los duplicados no se guardan.
+    """
+    def test_disparar_webhooks(self):
+        url = self.live_server_url + reverse("transacciones:stripe_webhook")
+        salida = StringIO()
+        call_command("disparar_webhooks", "--url", url, "--eventos", "60", "--duplicados", "0.5",
+                     "--concurrencia", "4", stdout=salida)
+        self.assertIn("Respuestas: 200: 60", salida.getvalue())
+        unicos = EventoStripe.objects.count()
+        self.assertLess(unicos, 60)
+
+        call_command("disparar_webhooks", "--url", url, "--reenviar", stdout=StringIO())
+        self.assertEqual(EventoStripe.objects.count(), unicos)
+
+
+class ParticionadoTest(TransactionTestCase):
+    """
+    Pruebas del particionado mensual (requiere PostgreSQL). La conversión
+    persiste en la base de pruebas: los TransactionTestCase siguientes corren
+    sobre las tablas particionadas.
+    """
+    def setUp(self):
+        if connection.vendor != "postgresql":
+            self.skipTest("El particionado requiere PostgreSQL")
+        self.cliente = Cliente.objects.create(nombre="Cliente Particionado", tipo="MIN")
+        self.moneda = Moneda.objects.create(codigo="USD", nombre="Dólar")
+        self.tabla = Transaccion._meta.db_table
+        self.hoy = timezone.localdate()
+
+    def _crear(self):
+        return crear_transaccion(
+            self.cliente, TipoTransaccionEnum.COMPRA, self.moneda,
+            Decimal("10"), Decimal("7000"), Decimal("0"), Decimal("70000"),
+        )
+
+    def _convertir(self):
+        call_command("particionar_transacciones", "--convertir", "--meses-adelante", "2", stdout=StringIO())
+
+    def _mover(self, tx, mes):
+        Transaccion.objects.filter(pk=tx.pk).update(fecha=particiones.inicio_mes(mes) + timedelta(days=1))
+
+    def test_convertir_conserva_datos_e_indices(self):
+        antes = self._crear()
+        Movimiento.objects.create(transaccion=antes, cliente=self.cliente, tipo=TipoMovimientoEnum.CREDITO, monto=Decimal("1"))
+        self._convertir()
+
+        self.assertTrue(particiones.esta_particionada(self.tabla))
+        self.assertTrue(particiones.esta_particionada(Movimiento._meta.db_table))
+        meses = list(particiones.particiones(self.tabla))
+        self.assertIn(self.hoy.replace(day=1), meses)
+        self.assertEqual(meses[-1], particiones.sumar_meses(self.hoy, 2))
+
+        despues = self._crear()
+        self.assertGreater(despues.pk, antes.pk)
+        self.assertEqual(Transaccion.objects.get(uuid=antes.uuid).pk, antes.pk)
+        self.assertEqual(antes.movimientos.count(), 1)
+        with connection.cursor() as cursor:
+            indices = connection.introspection.get_constraints(cursor, self.tabla)
+        self.assertIn("tx_limites_vigentes_idx", indices)
+
+    def test_consulta_por_rango_descarta_particiones(self):
+        self._convertir()
+        self._crear()
+        desde, hasta = particiones.rango_meses(self.hoy)
+        plan = Transaccion.objects.filter(fecha__gte=desde, fecha__lt=hasta).explain()
+        self.assertIn(particiones.nombre_particion(self.tabla, self.hoy), plan)
+        self.assertNotIn(f"{self.tabla}_default", plan)
+        self.assertEqual(acumulados.reconstruir(desde=self.hoy), (2, 0))
+
+    def test_crear_particion_mueve_filas_del_default(self):
+        self._convertir()
+        tx = self._crear()
+        futuro = particiones.sumar_meses(self.hoy, 12)
+        self._mover(tx, futuro)
+
+        self.assertTrue(particiones.crear_particion(self.tabla, futuro))
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {particiones.nombre_particion(self.tabla, futuro)}")
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute(f"SELECT count(*) FROM {self.tabla}_default")
+            self.assertEqual(cursor.fetchone()[0], 0)
+        self.assertEqual(Transaccion.objects.get(pk=tx.pk).pk, tx.pk)
+
+    def test_desacoplar_anteriores(self):
+        self._convertir()
+        tx = self._crear()
+        viejo = particiones.sumar_meses(self.hoy, -6)
+        particiones.crear_particion(self.tabla, viejo)
+        self._mover(tx, viejo)
+
+        desacopladas = particiones.desacoplar_anteriores(self.tabla, 3)
+        nombre = particiones.nombre_particion(self.tabla, viejo)
+        self.assertEqual(desacopladas, [nombre])
+        self.assertFalse(Transaccion.objects.filter(pk=tx.pk).exists())
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE {nombre}")
+
+    def test_convertir_no_pierde_fks_ni_unicidad_en_silencio(self):
+        tabla = "prueba_particion"
+        modelo = SimpleNamespace(_meta=SimpleNamespace(db_table=tabla, pk=SimpleNamespace(column="id")))
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE TABLE {tabla} (id serial PRIMARY KEY, uuid uuid UNIQUE, fecha timestamptz NOT NULL)")
+            cursor.execute(f"CREATE TABLE prueba_referencia (id serial PRIMARY KEY, ref_id integer REFERENCES {tabla})")
+        self.addCleanup(self._borrar, "prueba_referencia", tabla)
+
+        with self.assertRaisesMessage(NotSupportedError, "prueba_referencia"):
+            particiones.convertir(modelo)
+        self.assertFalse(particiones.esta_particionada(tabla))
+
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TABLE prueba_referencia")
+        cambios = particiones.convertir(modelo)
+        self.assertIn(f"{tabla}: {tabla}_uuid_key pasa a ser única por (uuid, fecha)", cambios)
+        fila = [uuid.uuid4(), timezone.now()]
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {tabla} (uuid, fecha) VALUES (%s, %s)", fila)
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                cursor.execute(f"INSERT INTO {tabla} (uuid, fecha) VALUES (%s, %s)", fila)
+
+    def _borrar(self, *tablas):
+        with connection.cursor() as cursor:
+            for tabla in tablas:
+                cursor.execute(f"DROP TABLE IF EXISTS {tabla} CASCADE")
@@ -6,11 +6,17 @@ app_name = "transacciones"
 urlpatterns = [
     path("", views.transacciones_list, name="transacciones_list"),
     path("nueva/", views.transaccion_create, name="transaccion_create"),
+    path("lote/", views.transaccion_lote, name="transaccion_lote"),
+    path("lote/api/", views.transaccion_lote_api, name="transaccion_lote_api"),
     path("<int:pk>/confirmar/", views.confirmar_view, name="confirmar"),
     path("<int:pk>/cancelar/", views.cancelar_view, name="cancelar"),
     path("calcular/", views.calcular_api, name="calcular_api"),
+    path("limites/disponibles/", views.limites_disponibles_api, name="limites_disponibles_api"),
+    path("exportar/<str:tipo>.csv", views.exportar_csv, name="exportar"),
 
     path("<int:pk>/pago/tarjeta/", views.iniciar_pago_tarjeta, name="iniciar_pago_tarjeta"),
+    path("pagos/checkout/<int:pk>/", views.pago_espera, name="pago_espera"),
+    path("pagos/checkout/<int:pk>/estado/", views.checkout_estado_api, name="checkout_estado_api"),
     path("stripe/webhook/", views.stripe_webhook, name="stripe_webhook"),
     path("pagos/success/", views.pago_success, name="pago_success"),
     path("pagos/cancel/", views.pago_cancel, name="pago_cancel"),
@@ -0,0 +1,153 @@
+"""
+Vencimiento de transacciones PENDIENTES.
+
+Una transacción pendiente consume límite (``acumulados``) hasta que se paga o
+se cancela; las que nadie confirma quedarían consumiéndolo para siempre. El
+comando ``vencer_pendientes`` las cancela cuando superan el plazo de
+``TRANSACCION_VENCIMIENTO`` para su tipo y medio de pago.
+
+Cada lote es una transacción de base: toma hasta
+``TRANSACCION_VENCIMIENTO_LOTE`` vencidas con ``FOR UPDATE SKIP LOCKED``
+(varios nodos pueden barrer a la vez sin repetirse ni esperarse), las
+cancela con un solo UPDATE, descuenta sus montos de los acumuladores con
+``acumulados.aplicar_lote`` y da por terminados sus checkouts. Tras el
+COMMIT expira en Stripe las sesiones que quedaron abiertas, para que no se
+puedan pagar; si una ya se pagó, el webhook la registra igual (ver
+``services.registrar_pagos_stripe``).
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+import stripe
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from commons.workers import atender_cola
+from commons.enums import EstadoTransaccionEnum, PaymentTypeEnum, TipoTransaccionEnum
+from . import acumulados, pasarela
+from .models import CheckoutStripe, Transaccion
+
+logger = logging.getLogger(__name__)
+
+#: Medio de las transacciones sin medio de pago, en las reglas.
+SIN_MEDIO = "sin_medio"
+
+MEDIOS = [e.value for e in PaymentTypeEnum] + [SIN_MEDIO]
+
+
+def plazo(tipo, medio, reglas=None):
+    """
+    Minutos tras los que vence una transacción pendiente de ``tipo`` pagada
+    con un medio ``medio`` (``payment_type`` o ``SIN_MEDIO``).
+
+    :return: Los minutos de la regla más específica, o None si no vence
+    """
+    reglas = settings.TRANSACCION_VENCIMIENTO if reglas is None else reglas
+    for regla in (f"{tipo}:{medio}", f"{tipo}:*", f"*:{medio}", "*:*"):
+        if regla in reglas:
+            return reglas[regla] or None
+    return None
+
+
+def condicion(ahora=None):
+    """
+    Filtro de las transacciones vencidas a ``ahora``: por cada plazo
+    distinto, los tipos y medios que lo comparten.
+
+    :return: El ``Q``, o None si ninguna combinación vence
+    """
+    ahora = ahora or timezone.now()
+    por_plazo = defaultdict(lambda: defaultdict(list))
+    for tipo in TipoTransaccionEnum.values:
+        for medio in MEDIOS:
+            minutos = plazo(tipo, medio)
+            if minutos:
+                por_plazo[minutos][tipo].append(medio)
+    if not por_plazo:
+        return None
+
+    filtro = Q()
+    for minutos, por_tipo in por_plazo.items():
+        de_plazo = Q()
+        for tipo, medios in por_tipo.items():
+            de_medios = Q(medio_pago__payment_type__in=[m for m in medios if m != SIN_MEDIO])
+            if SIN_MEDIO in medios:
+                de_medios |= Q(medio_pago__isnull=True)
+            de_plazo |= Q(tipo=tipo) & de_medios
+        filtro |= de_plazo & Q(fecha__lt=ahora - timedelta(minutes=minutos))
+    # Cota común para que el índice (estado, fecha) acote el recorrido
+    return filtro & Q(fecha__lt=ahora - timedelta(minutes=min(por_plazo)))
+
+
+def vencer_lote(limite=None, ahora=None):
+    """
+    Cancela hasta ``limite`` transacciones vencidas (por defecto
+    ``TRANSACCION_VENCIMIENTO_LOTE``), las más antiguas primero, y expira sus
+    sesiones de Stripe abiertas.
+
+    :return: ``{"vencidas", "sesiones_expiradas"}`` del lote
+    """
+    limite = limite or settings.TRANSACCION_VENCIMIENTO_LOTE
+    filtro = condicion(ahora)
+    if filtro is None:
+        return {"vencidas": 0, "sesiones_expiradas": 0}
+
+    with transaction.atomic():
+        txs = list(
+            Transaccion.objects.filter(estado=EstadoTransaccionEnum.PENDIENTE)
+            .filter(filtro)
+            .order_by("fecha", "id")
+            # of=self: el medio de pago va por LEFT JOIN y no se bloquea
+            .select_for_update(skip_locked=True, of=("self",))
+            .only("id", "cliente_id", "moneda_id", "fecha", "monto_operado", "monto_pyg")[:limite]
+        )
+        if not txs:
+            return {"vencidas": 0, "sesiones_expiradas": 0}
+        ids = [tx.id for tx in txs]
+
+        Transaccion.objects.filter(id__in=ids).update(estado=EstadoTransaccionEnum.CANCELADA)
+        # update() no emite señales
+        acumulados.aplicar_lote(txs, -1)
+
+        checkouts = CheckoutStripe.objects.filter(transaccion_id__in=ids).exclude(estado=CheckoutStripe.ERROR)
+        sesiones = list(
+            checkouts.filter(estado=CheckoutStripe.LISTA)
+            .exclude(session_id="")
+            .values_list("session_id", flat=True)
+        )
+        # Un worker que esté creando la sesión no podrá guardarla (ver checkouts._terminar)
+        checkouts.update(estado=CheckoutStripe.ERROR, error="La transacción venció.", actualizado=timezone.now())
+
+    expiradas = expirar_sesiones(sesiones)
+    logger.info("[VENCIMIENTO] %s transacciones canceladas, %s sesiones expiradas", len(ids), expiradas)
+    return {"vencidas": len(ids), "sesiones_expiradas": expiradas}
+
+
+def expirar_sesiones(session_ids):
+    """
+    Expira en Stripe las sesiones de Checkout dadas. Las que ya no están
+    abiertas (pagadas o vencidas) o fallan se registran y se saltean.
+
+    :return: Sesiones expiradas
+    """
+    expiradas = 0
+    for session_id in session_ids:
+        try:
+            pasarela.expirar_sesion_checkout(session_id)
+            expiradas += 1
+        except stripe.error.StripeError as e:
+            logger.warning("[STRIPE] No se pudo expirar la sesión %s: %s", session_id, e)
+    return expiradas
+
+
+def atender(lote=None, una_vez=False, espera=60.0, detener=None):
+    """
+    Bucle del barrido: vence lotes hasta que se active ``detener`` o, con
+    ``una_vez``, hasta que no queden vencidas.
+
+    :return: Totales ``{"vencidas", "sesiones_expiradas"}``
+    """
+    return atender_cola(lambda: vencer_lote(lote), "vencidas", una_vez, espera, detener)
@@ -1,41 +1,53 @@
 from decimal import Decimal
 import json
 import logging
+import uuid
 
 import stripe
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import transaction
+from django.db.models import Count, Q
 from django.http import (
+    Http404,
     HttpResponse,
     HttpResponseBadRequest,
+    HttpResponseForbidden,
     HttpResponseRedirect,
     JsonResponse,
+    StreamingHttpResponse,
 )
+from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 
 from clientes.models import Cliente
 from monedas.models import Moneda
 
-from .forms import TransaccionForm
-from .models import Movimiento, Transaccion
+from . import checkouts, exportacion, webhooks
+from .idempotencia import asegurar_sesion, idempotente
+from .forms import TransaccionForm, TransaccionLoteForm
+from .models import CheckoutStripe, Transaccion
 from .services import (
     calcular_transaccion,
+    calcular_transacciones_lote,
     confirmar_transaccion,
     cancelar_transaccion,
     crear_transaccion,
-    crear_checkout_para_transaccion,
+    crear_transacciones_lote,
+    margen_limites,
+    registrar_pagos_stripe,
     requiere_pago_tarjeta,
     verificar_pago_stripe,
 )
 from monedas.models import TasaCambio
 from django.contrib import messages
-from commons.enums import EstadoTransaccionEnum, TipoTransaccionEnum, TipoMovimientoEnum
+from commons.paginacion import paginar_por_clave
+from commons.enums import EstadoTransaccionEnum
 from django.views.decorators.http import require_http_methods
 
 logger = logging.getLogger(__name__)
-stripe.api_key = settings.STRIPE_SECRET_KEY
 
 
 
@@ -109,9 +121,22 @@ def tramitar_transaccion_terminal(request):
     return render(request, "transacciones/terminal.html", context)
 
 def transacciones_list(request):
-    order = request.GET.get("order")
+    """
+    Historial de transacciones, filtrable por cliente y estado.
+
+    Se pagina por clave sobre ``(fecha, id)`` (``?cursor=``, ver
+    ``commons.paginacion``) y los contadores de las pestañas de estado salen
+    de un único agregado condicional, de modo que el costo de la página no
+    crece con la tabla. El filtro de cliente se completa con
+    ``clientes:buscar_api``: aquí solo se carga el cliente seleccionado.
+
+    El orden es siempre por fecha: ``?dir=asc`` lo invierte. ``?order=fecha``
+    se sigue aceptando por compatibilidad con los enlaces anteriores.
+    """
     dir_ = request.GET.get("dir")
-    cliente_id = request.GET.get("cliente")
+    if request.GET.get("order", "fecha") != "fecha":
+        return HttpResponseBadRequest("Orden inválido: solo se puede ordenar por fecha.")
+    cliente_id = request.GET.get("cliente") or None
 
     # ----- Estado: por defecto 'pendiente' -----
     estado_qs = request.GET.get("estado", "").lower().strip()
@@ -126,45 +151,44 @@ def transacciones_list(request):
     if estado_qs not in estados_validos:
         estado_qs = "pendiente"
 
-    transacciones = (
-        Transaccion.objects
-        .all()
-        .select_related("cliente", "moneda")
-    )
-
-    # filtro por cliente (si aplica)
+    base = Transaccion.objects.all()
+    cliente_sel = None
     if cliente_id:
-        transacciones = transacciones.filter(cliente_id=cliente_id)
+        if not cliente_id.isdigit():
+            return HttpResponseBadRequest("Cliente inválido.")
+        base = base.filter(cliente_id=cliente_id)
+        cliente_sel = Cliente.objects.filter(pk=cliente_id).first()
+
+    # ---- Contadores por estado (respetando cliente si está filtrado) ----
+    counts = base.aggregate(
+        todas=Count("pk"),
+        **{
+            clave: Count("pk", filter=Q(estado=estado))
+            for clave, estado in estados_validos.items()
+            if estado is not None
+        },
+    )
 
     # filtro por estado (si NO es 'todas')
     estado_enum = estados_validos[estado_qs]
+    transacciones = base.select_related("cliente", "moneda")
     if estado_enum is not None:
         transacciones = transacciones.filter(estado=estado_enum)
 
-    # orden por fecha (default desc)
-    if order == "fecha":
-        transacciones = transacciones.order_by("fecha" if dir_ == "asc" else "-fecha")
-    else:
-        transacciones = transacciones.order_by("-fecha")
-
-    # ---- Contadores por estado (respetando cliente si está filtrado) ----
-    base = Transaccion.objects.all()
-    if cliente_id:
-        base = base.filter(cliente_id=cliente_id)
-
-    counts = {
-        "pendiente": base.filter(estado=EstadoTransaccionEnum.PENDIENTE).count(),
-        "pagada": base.filter(estado=EstadoTransaccionEnum.PAGADA).count(),
-        "cancelada": base.filter(estado=EstadoTransaccionEnum.CANCELADA).count(),
-        "anulada": base.filter(estado=EstadoTransaccionEnum.ANULADA).count(),
-        "todas": base.count(),
-    }
+    # orden por fecha (default desc), paginado por clave
+    try:
+        transacciones, siguiente = paginar_por_clave(
+            transacciones, "fecha", cursor=request.GET.get("cursor"),
+            limite=settings.TRANSACCIONES_PAGINA, descendente=dir_ != "asc",
+        )
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
 
-    clientes = Cliente.objects.all()
     ctx = {
         "transacciones": transacciones,
-        "clientes": clientes,
+        "siguiente": siguiente,
         "cliente_id": cliente_id,
+        "cliente_sel": cliente_sel,
         "estado_qs": estado_qs,
         "counts": counts,
     }
@@ -191,7 +215,14 @@ def cancelar_view(request, pk):
     return redirect("transacciones:transacciones_list")
 
 
+@idempotente("transaccion_create")
 def transaccion_create(request):
+    """
+    Alta de una transacción desde el formulario.
+
+    El formulario lleva una clave de idempotencia nueva en cada render: un
+    doble envío recibe la respuesta del primero (ver ``transaccion.idempotencia``).
+    """
     if request.method == "POST":
         form = TransaccionForm(request.POST)
         if form.is_valid():
@@ -224,36 +255,208 @@ def transaccion_create(request):
                 messages.error(request, f"Error en el cálculo: {e}")
 
         # Si hay error, vuelve a mostrar el formulario con mensajes
-        return render(request, "transacciones/transaccion_form.html", {"form": form})
+        return render(request, "transacciones/transaccion_form.html",
+                      {"form": form, "idempotency_key": uuid.uuid4().hex})
     else:
         form = TransaccionForm()
+        asegurar_sesion(request)
+
+    return render(request, "transacciones/transaccion_form.html",
+                  {"form": form, "idempotency_key": uuid.uuid4().hex})
 
-    return render(request, "transacciones/transaccion_form.html", {"form": form})
+
+def _serializar_calculo(calculo):
+    if "error" in calculo:
+        return {"error": calculo["error"]}
+    return {
+        "tasa_aplicada": str(calculo["tasa_aplicada"]),
+        "comision": str(calculo["comision"]),
+        "monto_pyg": str(calculo["monto_pyg"]),
+    }
 
 
 @csrf_exempt
+@idempotente("calcular_api")
 def calcular_api(request):
+    """
+    Cotiza una operación, o un lote si el cuerpo trae ``items``.
+
+    Lote: ``{"items": [{"cliente", "tipo", "moneda", "monto_operado"}, ...]}``
+    responde ``{"resultados": [...]}`` en el mismo orden, con ``error`` en los
+    ítems que no se pudieron cotizar.
+
+    Con la cabecera ``Idempotency-Key`` un reintento recibe la misma
+    cotización sin volver a calcularla.
+    """
     if request.method == "POST":
         try:
             data = json.loads(request.body)
+
+            if isinstance(data, dict) and "items" in data:
+                items = data["items"]
+                if not isinstance(items, list):
+                    raise ValidationError("'items' debe ser una lista.")
+                if len(items) > settings.COTIZACION_LOTE_MAX:
+                    raise ValidationError(
+                        f"El lote supera el máximo de {settings.COTIZACION_LOTE_MAX} ítems."
+                    )
+                resultados = calcular_transacciones_lote(items)
+                return JsonResponse({"resultados": [_serializar_calculo(r) for r in resultados]})
+
             cliente = Cliente.objects.get(pk=int(data["cliente"]))
             tipo = data["tipo"]
             moneda = Moneda.objects.get(pk=int(data["moneda"]))
             monto = Decimal(str(data["monto_operado"]))
 
             calculo = calcular_transaccion(cliente, tipo, moneda, monto)
-            return JsonResponse(
-                {
-                    "tasa_aplicada": str(calculo["tasa_aplicada"]),
-                    "comision": str(calculo["comision"]),
-                    "monto_pyg": str(calculo["monto_pyg"]),
-                }
-            )
+            return JsonResponse(_serializar_calculo(calculo))
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=400)
     return JsonResponse({"error": "Método no permitido"}, status=405)
 
 
+def _serializar_margen(margen):
+    return {k: (None if v is None else str(v)) for k, v in margen.items()}
+
+
+@login_required
+def limites_disponibles_api(request):
+    """
+    Margen de límite restante de uno o varios clientes en todas las monedas.
+
+    ``GET ?cliente=1&cliente=2`` (o ``?cliente=1,2``) responde
+    ``{"clientes": [{"cliente", "monedas": {codigo: {"moneda", "pyg"}}}]}``,
+    donde cada margen trae ``por_operacion``, ``diario``, ``mensual`` y
+    ``disponible`` como texto decimal, o ``null`` si no hay límite.
+    ``&moneda=<id>`` (o varios, como ``cliente``) limita la respuesta a esas
+    monedas.
+    """
+    try:
+        ids = [int(v) for valor in request.GET.getlist("cliente") for v in valor.split(",") if v.strip()]
+    except ValueError:
+        return JsonResponse({"error": "IDs de cliente inválidos."}, status=400)
+    try:
+        monedas_ids = [int(v) for valor in request.GET.getlist("moneda") for v in valor.split(",") if v.strip()]
+    except ValueError:
+        return JsonResponse({"error": "IDs de moneda inválidos."}, status=400)
+    if not ids:
+        return JsonResponse({"error": "Indique al menos un cliente."}, status=400)
+    if len(ids) > settings.LIMITES_CONSULTA_MAX:
+        return JsonResponse(
+            {"error": f"Se pueden consultar hasta {settings.LIMITES_CONSULTA_MAX} clientes."}, status=400
+        )
+
+    clientes = list(Cliente.objects.filter(pk__in=ids).order_by("pk"))
+    monedas = list(Moneda.objects.filter(es_base=False, pk__in=monedas_ids)) if monedas_ids else None
+    margenes = margen_limites(clientes, monedas)
+    return JsonResponse({
+        "clientes": [
+            {
+                "cliente": cliente.pk,
+                "monedas": {
+                    codigo: {tipo: _serializar_margen(m) for tipo, m in margen.items()}
+                    for codigo, margen in margenes[cliente.pk].items()
+                },
+            }
+            for cliente in clientes
+        ],
+        "no_encontrados": sorted(set(ids) - {c.pk for c in clientes}),
+    })
+
+
+def _serializar_alta(fila, resultado):
+    if "error" in resultado:
+        return {"fila": fila, "error": resultado["error"]}
+    tx = resultado["transaccion"]
+    return {
+        "fila": fila,
+        "id": tx.pk,
+        "uuid": str(tx.uuid),
+        "tasa_aplicada": str(tx.tasa_aplicada),
+        "comision": str(tx.comision),
+        "monto_pyg": str(tx.monto_pyg),
+    }
+
+
+@login_required
+@require_http_methods(["POST"])
+def transaccion_lote_api(request):
+    """
+    Crea un lote de órdenes (pedidos corporativos).
+
+    ``{"items": [{"cliente", "tipo", "moneda", "monto_operado", "medio_pago"}, ...]}``
+    (``medio_pago`` opcional) responde ``{"resultados": [...], "creadas",
+    "con_error"}``: un resultado por ítem, en el mismo orden, con ``id`` y
+    ``uuid`` de la transacción creada o con ``error``. Los ítems con error
+    no impiden crear el resto (ver ``crear_transacciones_lote``).
+    """
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"error": "JSON inválido."}, status=400)
+    items = data.get("items") if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return JsonResponse({"error": "'items' debe ser una lista no vacía."}, status=400)
+    if len(items) > settings.TRANSACCION_LOTE_MAX:
+        return JsonResponse(
+            {"error": f"El lote supera el máximo de {settings.TRANSACCION_LOTE_MAX} ítems."}, status=400
+        )
+
+    resultados = [
+        _serializar_alta(fila, r) for fila, r in enumerate(crear_transacciones_lote(items), start=1)
+    ]
+    creadas = sum(1 for r in resultados if "error" not in r)
+    return JsonResponse({"resultados": resultados, "creadas": creadas, "con_error": len(resultados) - creadas})
+
+
+@login_required
+def transaccion_lote(request):
+    """Carga de un lote de órdenes en CSV; muestra el resultado de cada fila."""
+    filas = None
+    if request.method == "POST":
+        form = TransaccionLoteForm(request.POST, request.FILES)
+        if form.is_valid():
+            items = form.cleaned_data["items"]
+            filas = list(zip(items, crear_transacciones_lote(items)))
+            creadas = sum(1 for _, r in filas if "transaccion" in r)
+            if creadas:
+                messages.success(request, f"{creadas} transacciones creadas.")
+            if creadas < len(filas):
+                messages.warning(request, f"{len(filas) - creadas} filas con error (ver detalle).")
+    else:
+        form = TransaccionLoteForm()
+    return render(request, "transacciones/transaccion_lote.html", {"form": form, "filas": filas})
+
+
+@login_required
+def exportar_csv(request, tipo):
+    """
+    Descarga en CSV de transacciones o movimientos (``tipo``), en streaming.
+
+    Filtros GET opcionales: ``cliente`` (id), ``moneda`` (código), ``estado``
+    y ``desde``/``hasta`` (``YYYY-MM-DD``, inclusivos); ver
+    ``transaccion.exportacion``. La respuesta se genera a medida que se leen
+    las filas, por lo que la memoria no crece con el tamaño de la exportación.
+    """
+    if tipo not in exportacion.TIPOS:
+        raise Http404("Exportación desconocida.")
+    if not request.user.has_permission("transacciones.list"):
+        return HttpResponseForbidden("No tienes permisos para exportar transacciones.")
+    try:
+        filtros = exportacion.leer_filtros(request.GET)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    qs = exportacion.consulta(tipo, **filtros)
+    response = StreamingHttpResponse(
+        exportacion.filas_csv(tipo, qs, settings.EXPORTACION_CHUNK),
+        content_type="text/csv; charset=utf-8",
+    )
+    nombre = f"{tipo}_{timezone.localdate():%Y%m%d}.csv"
+    response["Content-Disposition"] = f'attachment; filename="{nombre}"'
+    return response
+
+
 def iniciar_pago_tarjeta(request, pk):
     tx = get_object_or_404(Transaccion, pk=pk)
 
@@ -267,13 +470,28 @@ def iniciar_pago_tarjeta(request, pk):
         messages.info(request, "Este tipo de transacción no se paga por tarjeta.")
         return redirect("transacciones:transacciones_list")
 
-    try:
-        url = crear_checkout_para_transaccion(tx)
-        return HttpResponseRedirect(url)
-    except Exception as e:
-        logger.exception("No se pudo iniciar el pago con Stripe para tx #%s", pk)
-        messages.error(request, f"No se pudo iniciar el pago: {e}")
-        return redirect("transacciones:transacciones_list")
+    # La Session la crea el worker de checkouts; acá solo se encola
+    trabajo = checkouts.encolar(tx)
+    return redirect("transacciones:pago_espera", pk=trabajo.pk)
+
+
+def pago_espera(request, pk):
+    """Página que espera la URL de Stripe del checkout ``pk`` y redirige."""
+    trabajo = get_object_or_404(CheckoutStripe, pk=pk)
+    if trabajo.estado == CheckoutStripe.LISTA:
+        return HttpResponseRedirect(trabajo.url)
+    return render(request, "transacciones/pago_espera.html", {"trabajo": trabajo})
+
+
+def checkout_estado_api(request, pk):
+    """Estado del checkout ``pk`` para el sondeo de la página de espera."""
+    trabajo = get_object_or_404(CheckoutStripe, pk=pk)
+    datos = {"estado": trabajo.estado}
+    if trabajo.estado == CheckoutStripe.LISTA:
+        datos["url"] = trabajo.url
+    elif trabajo.estado == CheckoutStripe.ERROR:
+        datos["error"] = trabajo.error
+    return JsonResponse(datos)
 
 
 def pago_success(request):
@@ -291,40 +509,7 @@ def pago_success(request):
     if tx_id and info and info.get("payment_status") == "paid":
         try:
             with transaction.atomic():
-                tx = Transaccion.objects.select_for_update().get(pk=int(tx_id))
-
-                if str(tx.estado) != str(EstadoTransaccionEnum.PAGADA):
-                    # marcar pagada
-                    tx.estado = EstadoTransaccionEnum.PAGADA
-                    # opcional: guardar payment_intent / status si tenés esos campos
-                    if hasattr(tx, "stripe_payment_intent_id") and info.get("payment_intent"):
-                        tx.stripe_payment_intent_id = info["payment_intent"]
-                    if hasattr(tx, "stripe_status"):
-                        tx.stripe_status = "completed"
-                    campos = ["estado"]
-                    if hasattr(tx, "stripe_payment_intent_id") and info.get("payment_intent"):
-                        campos.append("stripe_payment_intent_id")
-                    if hasattr(tx, "stripe_status"):
-                        campos.append("stripe_status")
-                    tx.save(update_fields=campos)
-
-                    # crear movimiento coherente con el tipo
-                    if str(tx.tipo) == str(TipoTransaccionEnum.COMPRA):
-                        mov_tipo = TipoMovimientoEnum.DEBITO
-                        monto_mov = (tx.monto_pyg or 0) + (tx.comision or 0)
-                    else:
-                        mov_tipo = TipoMovimientoEnum.CREDITO
-                        monto_mov = tx.monto_pyg
-
-                    # idempotencia simple: no crear duplicados si ya existe
-                    if not Movimiento.objects.filter(transaccion=tx).exists():
-                        Movimiento.objects.create(
-                            transaccion=tx,
-                            cliente=tx.cliente,
-                            medio=None,
-                            tipo=mov_tipo,
-                            monto=monto_mov,
-                        )
+                registrar_pagos_stripe([int(tx_id)])
         except Exception as e:
             logger.exception(f"[SUCCESS] Error en plan B para tx #{tx_id}: {e}")
 
@@ -361,15 +546,18 @@ def pago_cancel(request):
 # =========================
 @csrf_exempt
 def stripe_webhook(request):
+    """
+    Recibe webhooks de Stripe: verifica la firma, guarda el evento en la
+    bandeja (``EventoStripe``) y responde enseguida.
+
+    El pago se aplica después con ``procesar_webhooks``. Los reintentos de
+    Stripe del mismo evento se descartan por su id único.
+    """
     if request.method != "POST":
         return HttpResponseBadRequest("Método no permitido")
 
-    payload = request.body
-    sig_header = request.META.get("HTTP_STRIPE_SIGNATURE", "")
-    endpoint_secret = getattr(settings, "STRIPE_WEBHOOK_SECRET", "")
-
     try:
-        event = stripe.Webhook.construct_event(payload, sig_header, endpoint_secret)
+        evento = webhooks.verificar(request.body, request.META.get("HTTP_STRIPE_SIGNATURE", ""))
     except ValueError as e:
         logger.warning(f"[STRIPE] Payload inválido: {e}")
         return HttpResponseBadRequest("Payload inválido")
@@ -377,71 +565,6 @@ def stripe_webhook(request):
         logger.warning(f"[STRIPE] Firma inválida: {e}")
         return HttpResponseBadRequest("Firma inválida")
 
-    event_type = event.get("type")
-    obj = event.get("data", {}).get("object", {})
-    logger.info(f"[STRIPE] Webhook recibido: {event_type} id={event.get('id')}")
-
-    # Escuchamos ambos por si el pago es asíncrono
-    if event_type in ("checkout.session.completed", "checkout.session.async_payment_succeeded"):
-        session = obj
-        md = session.get("metadata") or {}
-        tx_id = md.get("transaccion_id")
-
-        if not tx_id:
-            logger.info("[STRIPE] session sin transaccion_id en metadata")
-            return HttpResponse(status=200)
-
-        try:
-            with transaction.atomic():
-                tx = Transaccion.objects.select_for_update().get(pk=int(tx_id))
-                logger.info(f"[STRIPE] Procesando tx #{tx.id} | estado actual: {tx.estado} | tipo: {tx.tipo}")
-
-                # Idempotencia
-                if str(tx.estado) == str(EstadoTransaccionEnum.PAGADA):
-                    logger.info(f"[STRIPE] tx #{tx.id} ya estaba PAGADA (idempotente)")
-                    return HttpResponse(status=200)
-
-                # Guardar info útil
-                updates = {}
-                if hasattr(tx, "stripe_payment_intent_id"):
-                    updates["stripe_payment_intent_id"] = session.get("payment_intent")
-                if hasattr(tx, "stripe_status"):
-                    updates["stripe_status"] = "completed"
-                if updates:
-                    for k, v in updates.items():
-                        setattr(tx, k, v)
-                    tx.save(update_fields=list(updates.keys()))
-
-                # Confirmar negocio
-                tx.estado = EstadoTransaccionEnum.PAGADA
-                tx.save(update_fields=["estado"])
-
-                # Movimiento en caja PYG coherente con el tipo
-                if str(tx.tipo) == str(TipoTransaccionEnum.COMPRA):
-                    mov_tipo = TipoMovimientoEnum.DEBITO
-                    monto_mov = (tx.monto_pyg or 0) + (tx.comision or 0)  # si cobrás comisión por Stripe
-                else:  # VENTA
-                    mov_tipo = TipoMovimientoEnum.CREDITO
-                    monto_mov = tx.monto_pyg  # normalmente no cobrás por Stripe en VENTA
-
-                Movimiento.objects.create(
-                    transaccion=tx,
-                    cliente=tx.cliente,
-                    medio=None,
-                    tipo=mov_tipo,
-                    monto=monto_mov,
-                )
-                logger.info(f"[STRIPE] ✅ tx #{tx.id} marcada PAGADA y movimiento {mov_tipo} creado por ₲ {monto_mov}")
-
-        except Transaccion.DoesNotExist:
-            logger.warning(f"[STRIPE] Transacción {tx_id} no encontrada")
-        except Exception as e:
-            logger.exception(f"[STRIPE] Error al confirmar/movimentar tx #{tx_id}: {e}")
-
-    else:
-        # Logueá otros eventos para diagnóstico
-        logger.info(f"[STRIPE] Evento no manejado: {event_type}")
-
+    if not webhooks.recibir(evento):
+        logger.info(f"[STRIPE] Evento no manejado: {evento.get('type')}")
     return HttpResponse(status=200)
-
-    
\ No newline at end of file
@@ -0,0 +1,189 @@
+"""
+Bandeja de entrada de webhooks de Stripe (tabla EventoStripe).
+
+El endpoint ``stripe_webhook`` verifica la firma, inserta el evento con
+``recibir`` y responde 200 sin tocar transacciones: un reintento o una ráfaga
+de Stripe cuesta un INSERT y no retiene locks ni workers web. El comando
+``procesar_webhooks`` aplica los eventos pendientes por lotes con
+``procesar_lote``: una transacción de base por lote, las transacciones de
+negocio bloqueadas en orden de id y los pagos registrados con sentencias por
+lote (``services.registrar_pagos_stripe``). Si un lote falla, sus eventos se
+reintentan por mitades hasta aislar los que fallan.
+"""
+import json
+import logging
+
+import stripe
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from commons.workers import atender_cola
+from . import services
+from .models import EventoStripe, Transaccion
+
+logger = logging.getLogger(__name__)
+
+#: Eventos que confirman el cobro de una sesión de Checkout (el segundo,
+#: para medios de pago asíncronos). El resto se responde sin guardarse.
+EVENTOS_PAGO = ("checkout.session.completed", "checkout.session.async_payment_succeeded")
+
+#: Segundos de tolerancia del timestamp de la firma (el default de Stripe).
+TOLERANCIA_FIRMA = 300
+
+
+def verificar(payload, firma, secreto=None):
+    """
+    Verifica la cabecera ``Stripe-Signature`` y devuelve el evento como dict.
+
+    :raises ValueError: Si el cuerpo no es JSON válido.
+    :raises stripe.error.SignatureVerificationError: Si la firma no coincide.
+    """
+    if isinstance(payload, bytes):
+        payload = payload.decode("utf-8")
+    secreto = secreto if secreto is not None else settings.STRIPE_WEBHOOK_SECRET
+    stripe.WebhookSignature.verify_header(payload, firma, secreto, TOLERANCIA_FIRMA)
+    return json.loads(payload)
+
+
+def _transaccion_id(evento):
+    metadata = ((evento.get("data") or {}).get("object") or {}).get("metadata") or {}
+    try:
+        return int(metadata["transaccion_id"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def recibir(evento):
+    """
+    Guarda ``evento`` en la bandeja si es un evento de pago y no se recibió antes.
+
+    El duplicado se descarta en la base (índice único de ``evento_id``), sin
+    consulta previa ni error.
+
+    :return: False si el tipo de evento no se procesa
+    """
+    if evento.get("type") not in EVENTOS_PAGO:
+        return False
+    EventoStripe.objects.bulk_create(
+        [
+            EventoStripe(
+                evento_id=evento["id"],
+                tipo=evento["type"],
+                transaccion_id=_transaccion_id(evento),
+                payload=evento,
+            )
+        ],
+        ignore_conflicts=True,
+    )
+    return True
+
+
+def _aplicar(eventos):
+    """
+    Registra los pagos de ``eventos`` y los marca PROCESADOS o IGNORADOS.
+
+    :return: ``(pagadas, ignorados)``
+    """
+    tx_ids = {e.transaccion_id for e in eventos if e.transaccion_id is not None}
+    pagadas = services.registrar_pagos_stripe(tx_ids)
+    existentes = set(Transaccion.objects.filter(pk__in=tx_ids).values_list("pk", flat=True))
+
+    ids = [e.id for e in eventos]
+    ignorados = [e.id for e in eventos if e.transaccion_id not in existentes]
+    ahora = timezone.now()
+    EventoStripe.objects.filter(id__in=ids).exclude(id__in=ignorados).update(
+        estado=EventoStripe.PROCESADO, procesado_en=ahora, intentos=F("intentos") + 1, error=""
+    )
+    if ignorados:
+        logger.warning("[STRIPE] %s eventos sin transacción existente", len(ignorados))
+        EventoStripe.objects.filter(id__in=ignorados).update(
+            estado=EventoStripe.IGNORADO, procesado_en=ahora, intentos=F("intentos") + 1,
+            error="Sin transaccion_id en metadata o transacción inexistente.",
+        )
+    return pagadas, ignorados
+
+
+def _aplicar_aislando(eventos, error):
+    """
+    Reintenta por mitades un grupo que falló con ``error``, cada mitad en su
+    savepoint, hasta dar con los eventos que fallan solos. Solo esos suman un
+    intento (y tras ``STRIPE_WEBHOOK_INTENTOS`` quedan en ERROR); el resto se
+    aplica normalmente.
+
+    :return: ``(pagadas, ignorados, fallidos)``
+    """
+    if len(eventos) == 1:
+        logger.error("[STRIPE] Falló el evento %s: %s", eventos[0].id, error)
+        EventoStripe.objects.filter(id=eventos[0].id).update(
+            intentos=F("intentos") + 1,
+            error=str(error),
+            estado=Case(
+                When(intentos__gte=settings.STRIPE_WEBHOOK_INTENTOS - 1, then=Value(EventoStripe.ERROR)),
+                default=Value(EventoStripe.PENDIENTE),
+            ),
+        )
+        return [], [], 1
+
+    pagadas, ignorados, fallidos = [], [], 0
+    mitad = len(eventos) // 2
+    for grupo in (eventos[:mitad], eventos[mitad:]):
+        try:
+            with transaction.atomic():
+                p, i = _aplicar(grupo)
+            f = 0
+        except Exception as e:
+            p, i, f = _aplicar_aislando(grupo, e)
+        pagadas += p
+        ignorados += i
+        fallidos += f
+    return pagadas, ignorados, fallidos
+
+
+def procesar_lote(limite=None):
+    """
+    Aplica hasta ``limite`` eventos pendientes (por defecto ``STRIPE_WEBHOOK_LOTE``).
+
+    Los eventos se toman con ``FOR UPDATE SKIP LOCKED``, así que varios
+    workers pueden procesar en paralelo. El lote se aplica en un savepoint;
+    si falla, se reintenta por mitades para aislar los eventos que fallan
+    (ver ``_aplicar_aislando``): un evento roto no frena ni consume intentos
+    de los demás.
+
+    :return: ``{"eventos", "pagadas", "ignorados"}`` del lote (``eventos``
+        no cuenta los que fallaron)
+    """
+    limite = limite or settings.STRIPE_WEBHOOK_LOTE
+    with transaction.atomic():
+        eventos = list(
+            EventoStripe.objects.filter(estado=EventoStripe.PENDIENTE)
+            .order_by("id")
+            .select_for_update(skip_locked=True)
+            .only("id", "transaccion_id")[:limite]
+        )
+        if not eventos:
+            return {"eventos": 0, "pagadas": 0, "ignorados": 0}
+        try:
+            with transaction.atomic():
+                pagadas, ignorados = _aplicar(eventos)
+            fallidos = 0
+        except Exception as e:
+            logger.exception("[STRIPE] Falló el lote de %s eventos; se aíslan los que fallan", len(eventos))
+            pagadas, ignorados, fallidos = _aplicar_aislando(eventos, e)
+
+    logger.info(
+        "[STRIPE] Lote de %s eventos: %s transacciones pagadas, %s eventos fallidos",
+        len(eventos), len(pagadas), fallidos,
+    )
+    return {"eventos": len(eventos) - fallidos, "pagadas": len(pagadas), "ignorados": len(ignorados)}
+
+
+def atender(lote=None, una_vez=False, espera=1.0, detener=None):
+    """
+    Bucle del worker: procesa lotes hasta que se active ``detener`` o, con
+    ``una_vez``, hasta que no queden pendientes.
+
+    :return: Totales ``{"eventos", "pagadas", "ignorados"}``
+    """
+    return atender_cola(lambda: procesar_lote(lote), "eventos", una_vez, espera, detener)
@@ -0,0 +1,68 @@
+"""
+Servicios de la app 'usuarios'.
+
+- contadores_dashboard: totales de las tarjetas del dashboard, cacheados.
+- ultimas_cotizaciones: tasa activa de cada moneda operable, en una consulta.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from clientes.models import Cliente
+from monedas.models import Moneda, TasaCambio
+from transaccion.models import Transaccion
+from .models import Role
+
+User = get_user_model()
+
+_CLAVE_CONTADORES = 'dashboard:contadores'
+
+
+def _calcular_contadores():
+    usuarios = User.objects.aggregate(
+        total_usuarios=Count('pk'),
+        usuarios_activos=Count('pk', filter=Q(is_active=True)),
+    )
+    return {
+        **usuarios,
+        'total_roles': Role.objects.count(),
+        'total_clientes': Cliente.objects.count(),
+        'total_monedas': Moneda.objects.count(),
+        'total_cotizaciones': TasaCambio.objects.count(),
+        'total_transacciones': Transaccion.objects.count(),
+    }
+
+
+def contadores_dashboard():
+    """
+    Totales que muestran las tarjetas del dashboard.
+
+    Son informativos, por lo que se toleran unos segundos de atraso: se
+    calculan como mucho una vez cada ``DASHBOARD_CONTADORES_TTL`` segundos y
+    se comparten entre workers a través del cache.
+
+    :return: Diccionario con ``total_usuarios``, ``usuarios_activos``,
+        ``total_roles``, ``total_clientes``, ``total_monedas``,
+        ``total_cotizaciones`` y ``total_transacciones``
+    :rtype: dict
+    """
+    contadores = cache.get(_CLAVE_CONTADORES)
+    if contadores is None:
+        contadores = _calcular_contadores()
+        cache.set(_CLAVE_CONTADORES, contadores, timeout=settings.DASHBOARD_CONTADORES_TTL)
+    return contadores
+
+
+def ultimas_cotizaciones():
+    """
+    Tasa activa de cada moneda operable (activa y no base), ordenada por código.
+
+    Devuelve un QuerySet perezoso de una sola consulta; el dashboard lo
+    evalúa solo cuando el fragmento del tablero no está en cache.
+    """
+    return (
+        TasaCambio.objects.select_related('moneda')
+        .filter(activa=True, moneda__activa=True, moneda__es_base=False)
+        .order_by('moneda__codigo')
+    )
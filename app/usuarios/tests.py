@@ -4,7 +4,14 @@
 from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from clientes.models import Cliente
+from monedas.models import Moneda, TasaCambio
+from transaccion.models import Transaccion
 from .models import Role, User, UserRole
+from .services import contadores_dashboard
 from .forms import RegistroForm, UserCreateForm, RoleForm
 from commons.enums import EstadoRegistroEnum
 
@@ -206,3 +213,51 @@ class UsuariosViewsTest(TestCase):
         self.user.refresh_from_db()
         self.user.refresh_from_db()
         self.assertEqual(self.user.estado, EstadoRegistroEnum.ELIMINADO.value)
+
+
+
+class DashboardEstadisticasTest(TestCase):
+    """
+    El dashboard se renderiza con una cantidad fija de consultas.
+    """
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user(email="dash@example.com", password="testpass123", is_active=True)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def _crear_monedas(self, codigos):
+        for codigo in codigos:
+            moneda = Moneda.objects.create(codigo=codigo, nombre=f"Moneda {codigo}")
+            TasaCambio.objects.create(moneda=moneda, compra=100, venta=110)
+
+    def _consultas_dashboard(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("usuarios:dashboard"))
+        self.assertEqual(response.status_code, 200)
+        return [q["sql"] for q in ctx]
+
+    def test_consultas_no_dependen_del_volumen(self):
+        self._crear_monedas(["USD"])
+        Cliente.objects.create(nombre="Cliente 1", tipo="MIN")
+        cache.clear()
+        con_pocos = len(self._consultas_dashboard())
+        self._crear_monedas(["EUR", "BRL", "ARS", "CLP"])
+        Cliente.objects.bulk_create(Cliente(nombre=f"Cliente {i}", tipo="MIN") for i in range(2, 30))
+        cache.clear()
+        self.assertEqual(len(self._consultas_dashboard()), con_pocos)
+
+    def test_contadores_cacheados(self):
+        self._crear_monedas(["USD"])
+        self._consultas_dashboard()
+        with self.assertNumQueries(0):
+            contadores = contadores_dashboard()
+        self.assertEqual((contadores["total_monedas"], contadores["total_cotizaciones"]), (1, 1))
+
+        # Con el cache caliente la página no cuenta filas ni lee el tablero
+        tablas = [m._meta.db_table for m in (Cliente, Moneda, TasaCambio, Transaccion)]
+        for sql in self._consultas_dashboard():
+            self.assertNotIn("COUNT(", sql)
+            for tabla in tablas:
+                self.assertNotIn(f'"{tabla}"', sql)
@@ -18,10 +18,10 @@ from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from .decorators import role_required
 from .forms import AsignarClientesAUsuarioForm, RegistroForm, LoginForm, UserForm, AsignarRolForm, RoleForm, UserCreateForm, PasswordResetRequestForm
 from .models import Role, UserRole
+from .services import contadores_dashboard, ultimas_cotizaciones
 from commons.enums import EstadoRegistroEnum
+from commons.versiones import TASAS, obtener_version
 from clientes.models import Cliente
-from monedas.models import TasaCambio, Moneda
-from transaccion.models import Transaccion
 
 User = get_user_model()
 
@@ -30,7 +30,8 @@ def dashboard_view(request):
     """
     Vista principal del dashboard.
 
-    Muestra estadísticas generales de usuarios, roles y clientes.
+    Muestra estadísticas generales de usuarios, roles y clientes. La cantidad
+    de consultas no depende del número de monedas (ver ``usuarios.services``).
 
     :param request: HttpRequest
     :return: HttpResponse con el dashboard
@@ -40,40 +41,11 @@ def dashboard_view(request):
     cliente_activo_id = request.session.get('cliente_activo')
     context['cliente_activo_id'] = cliente_activo_id
     if request.user.is_authenticated:
-        total_usuarios = User.objects.count()
-        usuarios_activos = User.objects.filter(is_active=True).count()
-        total_roles = Role.objects.count()
-        total_clientes = Cliente.objects.count()
-
-        monedas_activas = Moneda.objects.filter(
-            activa=True,
-            es_base=False
-        ).order_by('codigo')
-
-        ultimas_cotizaciones = []
-        for moneda in monedas_activas:
-            ultima_tasa = TasaCambio.objects.filter(
-                moneda=moneda,
-                activa=True
-            ).order_by('-fecha_creacion').first()
-
-            if ultima_tasa:
-                ultimas_cotizaciones.append(ultima_tasa)
-
-        # Obtener totales para las tarjetas
-        total_monedas = Moneda.objects.filter(activa=True).count()
-        total_cotizaciones = TasaCambio.objects.count()
-        total_transacciones = Transaccion.objects.count()
-
+        context.update(contadores_dashboard())
         context.update({
-            'total_usuarios': total_usuarios,
-            'total_clientes': total_clientes,
-            'usuarios_activos': usuarios_activos,
-            'total_roles': total_roles,
-            'ultimas_cotizaciones': ultimas_cotizaciones,
-            'total_monedas': total_monedas,
-            'total_cotizaciones': total_cotizaciones,
-            'total_transacciones': total_transacciones,
+            # Perezoso: la plantilla cachea el tablero bajo la versión de tasas.
+            'ultimas_cotizaciones': ultimas_cotizaciones(),
+            'version_tasas': obtener_version(TASAS),
         })
 
     return render(request, "dashboard.html", context)